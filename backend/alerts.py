@@ -0,0 +1,600 @@
+"""
+アラートエンジン
+株価（終値・前日比%）・指数（値・前日比%）・気象データのしきい値ルールを、
+新しく取り込んだ足（日次データ）だけで評価する。
+
+ルールは (取得元, 対象, 項目, 方向) ごとにしきい値のソート済み配列で保持し、
+足ごとに「前回値から今回値の間にあるしきい値」を二分探索で求めるため、
+評価コストはルール数ではなく新しい足の数と発火件数に比例する。
+
+- above: 値がしきい値を下から上に超えたとき（前回値 <= しきい値 < 今回値）
+- below: 値がしきい値を上から下に割り込んだとき（今回値 < しきい値 <= 前回値）
+- 前日比%（changePercent）は日ごとの量のため、毎日0から評価する（その日の騰落率がしきい値を超えたら発火）
+
+初回の取り込みは基準値の設定のみ行い、過去の足では発火しない。
+取り込み済みの最終の足（当日の足など）の値が改訂された場合は、その前の足からの変化で評価し直し、
+改訂前の値でまだ超えていなかったしきい値のルールだけを発火する。
+
+ルール・発火履歴・取り込み済みの直近値は、既定ではプロセス内に保持する（ワーカーごと）。
+環境変数 STACK_WATCHER_ALERTS_PATH を指定すると同一ホストの全ワーカーで共有する SQLite (WAL) ファイルに保持し
+（SharedAlertEngine）、どのワーカーが取り込んでも全ワーカーのルールで1回だけ評価する。
+"""
+
+import asyncio
+import itertools
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from backend.lazy import lazy_singleton
+from backend.weather_processing import VARIABLES
+
+logger = logging.getLogger(__name__)
+
+# 前日比%の元になる項目
+CHANGE_PERCENT = "changePercent"
+CHANGE_BASE_FIELDS = {"stock": "close", "index": "value"}
+
+# 取得元ごとにルールを設定できる項目
+ALERT_FIELDS = {
+    "stock": ("close", CHANGE_PERCENT),
+    "index": ("value", CHANGE_PERCENT),
+    "weather": tuple(VARIABLES),
+}
+ALERT_OPS = ("above", "below")
+
+# 保持する発火履歴の件数
+ALERT_HISTORY_SIZE = 1000
+
+# SSE購読者ごとの未送信アラートの上限（超えた分は履歴APIで取得する）
+SUBSCRIBER_QUEUE_SIZE = 256
+
+# SSEの接続維持用コメントの送信間隔（秒）
+SSE_KEEPALIVE_SECONDS = 15.0
+
+# 共有時に他のワーカーで発火したアラートをSSEに流すための履歴の確認間隔（秒）
+SHARED_POLL_SECONDS = 1.0
+
+
+class AlertRule(NamedTuple):
+    """しきい値ルール"""
+
+    id: int
+    source: str
+    target: str
+    field: str
+    op: str
+    threshold: float
+
+    def to_dict(self) -> Dict[str, Any]:
+        return self._asdict()
+
+
+def validate_rule(source: str, field: str, op: str, threshold: float) -> None:
+    """ルールの取得元・項目・条件・しきい値の妥当性チェック（不正時はValueError）"""
+    if source not in ALERT_FIELDS:
+        raise ValueError(f"無効な取得元: {source}. 有効な値: {list(ALERT_FIELDS)}")
+    if field not in ALERT_FIELDS[source]:
+        raise ValueError(f"無効な項目: {field}. 有効な値: {list(ALERT_FIELDS[source])}")
+    if op not in ALERT_OPS:
+        raise ValueError(f"無効な条件: {op}. 有効な値: {list(ALERT_OPS)}")
+    if not np.isfinite(threshold):
+        raise ValueError("しきい値は有限の数値で指定してください")
+
+
+class _Thresholds:
+    """1つの (取得元, 対象, 項目, 方向) のしきい値（昇順）とルールID"""
+
+    __slots__ = ("values", "rule_ids")
+
+    def __init__(self):
+        self.values: List[float] = []
+        self.rule_ids: List[int] = []
+
+    def add(self, threshold: float, rule_id: int) -> None:
+        i = bisect_right(self.values, threshold)
+        self.values.insert(i, threshold)
+        self.rule_ids.insert(i, rule_id)
+
+    def remove(self, threshold: float, rule_id: int) -> None:
+        i = bisect_left(self.values, threshold)
+        while self.rule_ids[i] != rule_id:
+            i += 1
+        del self.values[i]
+        del self.rule_ids[i]
+
+    def crossed_up(self, previous: float, current: float) -> List[int]:
+        """previous <= しきい値 < current のルールID"""
+        return self.rule_ids[bisect_left(self.values, previous):bisect_left(self.values, current)]
+
+    def crossed_down(self, previous: float, current: float) -> List[int]:
+        """current < しきい値 <= previous のルールID"""
+        return self.rule_ids[bisect_right(self.values, current):bisect_right(self.values, previous)]
+
+
+class _SeriesState:
+    """対象ごとの取り込み済みの最終時刻と、各項目の最終の足の値・その前の足の値"""
+
+    __slots__ = ("last_time", "values", "previous")
+
+    def __init__(self):
+        self.last_time: Optional[int] = None
+        self.values: Dict[str, float] = {}
+        # 最終の足の値が改訂された場合に、評価し直す基準とする値
+        self.previous: Dict[str, float] = {}
+
+
+class AlertEngine:
+    """しきい値ルールの登録と、新しい足の取り込み時の差分評価"""
+
+    # SSEで履歴を確認する間隔（秒）。None は取り込んだプロセス内の通知のみで配信する
+    poll_interval: Optional[float] = None
+
+    def __init__(self, history_size: int = ALERT_HISTORY_SIZE):
+        self._lock = threading.Lock()
+        self._rules: Dict[int, AlertRule] = {}
+        # (取得元, 対象, 項目) -> {"above": _Thresholds, "below": _Thresholds}
+        self._index: Dict[Tuple[str, str, str], Dict[str, _Thresholds]] = {}
+        # (取得元, 対象) -> ルール数（ルールのない対象は最終値の更新のみ行う）
+        self._watched: Dict[Tuple[str, str], int] = {}
+        self._states: Dict[Tuple[str, str], _SeriesState] = {}
+        self._history: deque = deque(maxlen=history_size)
+        self._subscribers: List[Callable[[Dict[str, Any]], None]] = []
+        self._rule_ids = itertools.count(1)
+        self._alert_ids = itertools.count(1)
+
+    # --- ルール ---
+
+    def add_rule(self, source: str, target: str, field: str, op: str, threshold: float) -> AlertRule:
+        """
+        ルールを登録
+
+        Args:
+            source: 取得元（stock / index / weather）
+            target: 銘柄コード・指数コード・観測地点
+            field: 項目（ALERT_FIELDS）
+            op: above（上抜け） / below（下抜け）
+            threshold: しきい値
+
+        Returns:
+            登録したルール
+        """
+        validate_rule(source, field, op, threshold)
+        with self._lock:
+            rule = AlertRule(next(self._rule_ids), source, target, field, op, float(threshold))
+            self._index_rule(rule)
+        return rule
+
+    def remove_rule(self, rule_id: int) -> bool:
+        """ルールを削除（存在しない場合はFalse）"""
+        with self._lock:
+            rule = self._rules.get(rule_id)
+            if rule is None:
+                return False
+            self._unindex_rule(rule)
+        return True
+
+    def _index_rule(self, rule: AlertRule) -> None:
+        """ルールを評価用の索引に追加（ロック取得済みで呼び出す）"""
+        self._rules[rule.id] = rule
+        thresholds = self._index.setdefault((rule.source, rule.target, rule.field),
+                                            {"above": _Thresholds(), "below": _Thresholds()})
+        thresholds[rule.op].add(rule.threshold, rule.id)
+        self._watched[(rule.source, rule.target)] = self._watched.get((rule.source, rule.target), 0) + 1
+
+    def _unindex_rule(self, rule: AlertRule) -> None:
+        """ルールを評価用の索引から削除（ロック取得済みで呼び出す）"""
+        del self._rules[rule.id]
+        self._index[(rule.source, rule.target, rule.field)][rule.op].remove(rule.threshold, rule.id)
+        self._watched[(rule.source, rule.target)] -= 1
+        if not self._watched[(rule.source, rule.target)]:
+            del self._watched[(rule.source, rule.target)]
+
+    def rules(self) -> List[AlertRule]:
+        with self._lock:
+            return list(self._rules.values())
+
+    # --- 取り込み ---
+
+    def ingest(self, source: str, target: str, times: np.ndarray, columns: Dict[str, np.ndarray]) -> List[Dict[str, Any]]:
+        """
+        取得した系列のうち未取り込みの足を評価
+
+        Args:
+            source: 取得元
+            target: 対象
+            times: 各足の時刻（昇順の整数。日付の場合は datetime64[D] の整数値）
+            columns: 項目名 -> 値の配列（NaNは欠損として扱う）
+
+        Returns:
+            発火したアラート
+        """
+        times = np.asarray(times).astype(np.int64, copy=False)
+        if not len(times):
+            return []
+
+        with self._lock:
+            fired = self._ingest(source, target, times, columns)
+            subscribers = list(self._subscribers)
+
+        for alert in fired:
+            for callback in subscribers:
+                try:
+                    callback(alert)
+                except Exception as e:
+                    logger.warning(f"アラートの通知に失敗: {e}")
+        return fired
+
+    def _ingest(self, source: str, target: str, times: np.ndarray,
+                columns: Dict[str, np.ndarray]) -> List[Dict[str, Any]]:
+        """未取り込みの足を評価し、発火したアラートに ID を振って履歴に追加（ロック取得済みで呼び出す）"""
+        state = self._states.get((source, target))
+        first = state is None
+        if first:
+            state = self._states[(source, target)] = _SeriesState()
+        fired = self._advance(source, target, state, first, times, columns)
+        for alert in fired:
+            alert["id"] = next(self._alert_ids)
+            self._history.append(alert)
+        return fired
+
+    def _advance(self, source: str, target: str, state: _SeriesState, first: bool, times: np.ndarray,
+                 columns: Dict[str, np.ndarray]) -> List[Dict[str, Any]]:
+        """state 以降の足を評価して state を進める（ロック取得済みで呼び出す。アラートの ID は未設定）"""
+        start = 0 if state.last_time is None else int(np.searchsorted(times, state.last_time, side="right"))
+        base_field = CHANGE_BASE_FIELDS.get(source)
+        fired: List[Dict[str, Any]] = []
+
+        # 初回・ルールのない対象は直近値の更新のみ（過去の足では発火しない）
+        evaluate = not first and (source, target) in self._watched
+        if start and int(times[start - 1]) == state.last_time:
+            fired.extend(self._revise(source, target, state, evaluate, start - 1, int(times[start - 1]), columns))
+        if start >= len(times):
+            return fired
+
+        # 評価しない場合も、最終の足の改訂に備えてその前の足の値を残す
+        rows = range(start, len(times)) if evaluate else range(max(start, len(times) - 2), len(times))
+        for i in rows:
+            for field, values in columns.items():
+                value = float(values[i])
+                if value != value:
+                    continue
+                previous = state.values.get(field)
+                state.values[field] = value
+                if previous is not None:
+                    state.previous[field] = previous
+                if evaluate and previous is not None:
+                    fired.extend(self._evaluate(source, target, field, previous, value, int(times[i])))
+                if field == base_field and previous:
+                    change = round((value - previous) / previous * 100, 2)
+                    if evaluate:
+                        # 前日比%は日ごとの量のため、毎日0から評価する
+                        fired.extend(self._evaluate(source, target, CHANGE_PERCENT, 0.0, change, int(times[i])))
+        state.last_time = int(times[-1])
+        return fired
+
+    def _revise(self, source: str, target: str, state: _SeriesState, evaluate: bool, i: int, at: int,
+                columns: Dict[str, np.ndarray]) -> List[Dict[str, Any]]:
+        """取り込み済みの最終の足（行 i）の改訂を反映し、前の足からの変化で新たに超えたしきい値を評価"""
+        base_field = CHANGE_BASE_FIELDS.get(source)
+        fired: List[Dict[str, Any]] = []
+        for field, values in columns.items():
+            value = float(values[i])
+            old = state.values.get(field)
+            if value != value or old is None or value == old:
+                continue
+            state.values[field] = value
+            base = state.previous.get(field)
+            if not evaluate or base is None:
+                continue
+            fired.extend(self._evaluate_revision(source, target, field, base, old, value, at))
+            if field == base_field and base:
+                old_change = round((old - base) / base * 100, 2)
+                change = round((value - base) / base * 100, 2)
+                fired.extend(self._evaluate_revision(source, target, CHANGE_PERCENT, 0.0, old_change, change, at))
+        return fired
+
+    def _evaluate_revision(self, source: str, target: str, field: str, base: float, old: float, current: float,
+                           at: int) -> List[Dict[str, Any]]:
+        """base から current への変化で超えたしきい値のうち、改訂前の値 old では超えていなかったルールを発火"""
+        already = {alert["rule"]["id"] for alert in self._evaluate(source, target, field, base, old, at)}
+        return [alert for alert in self._evaluate(source, target, field, base, current, at)
+                if alert["rule"]["id"] not in already]
+
+    def _evaluate(self, source: str, target: str, field: str, previous: float, current: float,
+                  at: int) -> List[Dict[str, Any]]:
+        """前回値から今回値への変化で超えたしきい値のルールを発火（ロック取得済みで呼び出す）"""
+        thresholds = self._index.get((source, target, field))
+        if thresholds is None or previous == current:
+            return []
+        if current > previous:
+            rule_ids = thresholds["above"].crossed_up(previous, current)
+        else:
+            rule_ids = thresholds["below"].crossed_down(previous, current)
+        fired_at = time.time()
+        return [
+            {
+                "id": None,
+                "rule": self._rules[rule_id].to_dict(),
+                "value": current,
+                "previous": previous,
+                "time": at,
+                "firedAt": fired_at,
+            }
+            for rule_id in rule_ids
+        ]
+
+    # --- 発火履歴・通知 ---
+
+    def alerts(self, since: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
+        """ID が since より大きい発火履歴（古い順、最大 limit 件）"""
+        with self._lock:
+            return [alert for alert in self._history if alert["id"] > since][:limit]
+
+    def latest_alert_id(self) -> int:
+        """最新の発火履歴の ID（履歴がない場合は0）"""
+        with self._lock:
+            return self._history[-1]["id"] if self._history else 0
+
+    def subscribe(self, callback: Callable[[Dict[str, Any]], None]) -> Callable[[], None]:
+        """
+        発火時に callback(alert) を呼び出すよう登録（取り込みを行ったスレッドから呼ばれる）
+
+        Returns:
+            登録解除する関数
+        """
+        with self._lock:
+            self._subscribers.append(callback)
+
+        def unsubscribe():
+            with self._lock:
+                if callback in self._subscribers:
+                    self._subscribers.remove(callback)
+
+        return unsubscribe
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "rules": len(self._rules),
+                "watched_targets": len(self._watched),
+                "tracked_series": len(self._states),
+                "history": len(self._history),
+                "subscribers": len(self._subscribers),
+            }
+
+
+class SharedAlertEngine(AlertEngine):
+    """
+    ルール・発火履歴・取り込み済みの直近値を SQLite (WAL) ファイルで全ワーカーと共有するアラートエンジン
+
+    評価用の索引はワーカーごとに持ち、ルールの版数が変わったときだけ読み込み直す。
+    取り込みは直近値の読み込みから発火履歴の書き込みまでを1つのトランザクションで行うため、
+    同じ足を複数のワーカーが取り込んでも評価は1回だけになる。
+    """
+
+    poll_interval = SHARED_POLL_SECONDS
+
+    def __init__(self, path: str, history_size: int = ALERT_HISTORY_SIZE):
+        super().__init__(history_size)
+        self.path = path
+        self.history_size = history_size
+        self._local = threading.local()
+        self._rules_version: Optional[int] = None
+        with self._transaction() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS alert_rules ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT, source TEXT NOT NULL, target TEXT NOT NULL,"
+                " field TEXT NOT NULL, op TEXT NOT NULL, threshold REAL NOT NULL)"
+            )
+            conn.execute("CREATE TABLE IF NOT EXISTS alert_history (id INTEGER PRIMARY KEY AUTOINCREMENT, body TEXT NOT NULL)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS alert_states ("
+                " source TEXT NOT NULL, target TEXT NOT NULL, last_time INTEGER, last_values TEXT NOT NULL,"
+                " previous_values TEXT NOT NULL DEFAULT '{}', PRIMARY KEY (source, target))"
+            )
+            if "previous_values" not in [row[1] for row in conn.execute("PRAGMA table_info(alert_states)")]:
+                # 最終の足の改訂に対応する前に作成したファイル
+                conn.execute("ALTER TABLE alert_states ADD COLUMN previous_values TEXT NOT NULL DEFAULT '{}'")
+            conn.execute("CREATE TABLE IF NOT EXISTS alert_meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            conn.execute("INSERT OR IGNORE INTO alert_meta (key, value) VALUES ('rules_version', 0)")
+        logger.info(f"アラートのルール・履歴を共有します: {path}")
+
+    def _connect(self) -> sqlite3.Connection:
+        """スレッドごとの接続を返す"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """書き込みトランザクション（他のワーカーの書き込みとは直列に実行する）"""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _sync_rules(self) -> None:
+        """他のワーカーでルールが変更されていれば評価用の索引を読み込み直す（ロック取得済みで呼び出す）"""
+        conn = self._connect()
+        version = conn.execute("SELECT value FROM alert_meta WHERE key = 'rules_version'").fetchone()[0]
+        if version == self._rules_version:
+            return
+        self._rules.clear()
+        self._index.clear()
+        self._watched.clear()
+        for row in conn.execute("SELECT id, source, target, field, op, threshold FROM alert_rules ORDER BY id"):
+            self._index_rule(AlertRule(*row))
+        self._rules_version = version
+
+    # --- ルール ---
+
+    def add_rule(self, source: str, target: str, field: str, op: str, threshold: float) -> AlertRule:
+        validate_rule(source, field, op, threshold)
+        with self._lock:
+            with self._transaction() as conn:
+                rule_id = conn.execute(
+                    "INSERT INTO alert_rules (source, target, field, op, threshold) VALUES (?, ?, ?, ?, ?)",
+                    (source, target, field, op, float(threshold)),
+                ).lastrowid
+                conn.execute("UPDATE alert_meta SET value = value + 1 WHERE key = 'rules_version'")
+            self._sync_rules()
+            return self._rules[rule_id]
+
+    def remove_rule(self, rule_id: int) -> bool:
+        with self._lock:
+            with self._transaction() as conn:
+                removed = conn.execute("DELETE FROM alert_rules WHERE id = ?", (rule_id,)).rowcount > 0
+                if removed:
+                    conn.execute("UPDATE alert_meta SET value = value + 1 WHERE key = 'rules_version'")
+            self._sync_rules()
+        return removed
+
+    def rules(self) -> List[AlertRule]:
+        with self._lock:
+            self._sync_rules()
+            return list(self._rules.values())
+
+    # --- 取り込み ---
+
+    def _ingest(self, source: str, target: str, times: np.ndarray,
+                columns: Dict[str, np.ndarray]) -> List[Dict[str, Any]]:
+        try:
+            self._sync_rules()
+            return self._ingest_shared(source, target, times, columns)
+        except sqlite3.Error as e:
+            # 共有ファイルに書き込めない場合も取得処理は続ける（この足は評価しない）
+            logger.warning(f"アラートの取り込みに失敗: {e}")
+            return []
+
+    def _ingest_shared(self, source: str, target: str, times: np.ndarray,
+                       columns: Dict[str, np.ndarray]) -> List[Dict[str, Any]]:
+        """直近値の読み込みから発火履歴の書き込みまでを1つのトランザクションで行う"""
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT last_time, last_values, previous_values FROM alert_states WHERE source = ? AND target = ?",
+                (source, target),
+            ).fetchone()
+            state = _SeriesState()
+            if row is not None:
+                state.last_time, state.values, state.previous = row[0], json.loads(row[1]), json.loads(row[2])
+            fired = self._advance(source, target, state, row is None, times, columns)
+            conn.execute(
+                "INSERT OR REPLACE INTO alert_states (source, target, last_time, last_values, previous_values)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (source, target, state.last_time, json.dumps(state.values), json.dumps(state.previous)),
+            )
+            for alert in fired:
+                alert["id"] = conn.execute(
+                    "INSERT INTO alert_history (body) VALUES (?)", (json.dumps(alert, ensure_ascii=False),)
+                ).lastrowid
+            if fired:
+                conn.execute("DELETE FROM alert_history WHERE id <= ?", (fired[-1]["id"] - self.history_size,))
+        return fired
+
+    # --- 発火履歴・通知 ---
+
+    def alerts(self, since: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
+        rows = self._connect().execute(
+            "SELECT id, body FROM alert_history WHERE id > ? ORDER BY id LIMIT ?", (since, limit)
+        ).fetchall()
+        return [{**json.loads(body), "id": alert_id} for alert_id, body in rows]
+
+    def latest_alert_id(self) -> int:
+        row = self._connect().execute("SELECT MAX(id) FROM alert_history").fetchone()
+        return row[0] or 0
+
+    def stats(self) -> Dict[str, Any]:
+        conn = self._connect()
+        with self._lock:
+            self._sync_rules()
+            return {
+                "rules": len(self._rules),
+                "watched_targets": len(self._watched),
+                "tracked_series": conn.execute("SELECT COUNT(*) FROM alert_states").fetchone()[0],
+                "history": conn.execute("SELECT COUNT(*) FROM alert_history").fetchone()[0],
+                "subscribers": len(self._subscribers),
+            }
+
+
+def format_sse(alert: Dict[str, Any]) -> str:
+    """アラートをServer-Sent Eventsの1イベントに変換"""
+    return f"id: {alert['id']}\nevent: alert\ndata: {json.dumps(alert, ensure_ascii=False)}\n\n"
+
+
+async def alert_event_stream(engine: AlertEngine, is_disconnected: Callable[[], Awaitable[bool]],
+                             since: Optional[int] = None, keepalive: float = SSE_KEEPALIVE_SECONDS):
+    """
+    発火したアラートをSSEとして送り続ける非同期ジェネレーター
+
+    Args:
+        engine: アラートエンジン
+        is_disconnected: クライアントが切断したかを返す関数
+        since: 再接続時の Last-Event-ID（指定時はそれ以降の履歴を先に送る）
+        keepalive: 接続維持用コメントの送信間隔（秒）
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+
+    def offer(alert):
+        if queue.full():
+            logger.warning("SSE購読者の未送信アラートが上限に達したため破棄します")
+            return
+        queue.put_nowait(alert)
+
+    # 取り込みは別スレッドで行われるため、イベントループ経由でキューに入れる
+    unsubscribe = engine.subscribe(lambda alert: loop.call_soon_threadsafe(offer, alert))
+    poll = engine.poll_interval
+    last_id = since if since is not None else (engine.latest_alert_id() if poll is not None else 0)
+    try:
+        if since is not None:
+            for alert in engine.alerts(since=since, limit=ALERT_HISTORY_SIZE):
+                last_id = alert["id"]
+                yield format_sse(alert)
+        last_sent = loop.time()
+        while not await is_disconnected():
+            try:
+                alerts = [await asyncio.wait_for(queue.get(), timeout=poll or keepalive)]
+            except asyncio.TimeoutError:
+                alerts = []
+            if poll is not None:
+                # 共有時は他のワーカーで発火した分も含め、履歴から ID 順に送る（通知は確認のきっかけのみ）
+                alerts = await asyncio.to_thread(engine.alerts, last_id, ALERT_HISTORY_SIZE)
+            for alert in alerts:
+                # 履歴の再送分と重複したものは送らない
+                if alert["id"] > last_id:
+                    last_id = alert["id"]
+                    last_sent = loop.time()
+                    yield format_sse(alert)
+            if loop.time() - last_sent >= keepalive:
+                last_sent = loop.time()
+                yield ": keep-alive\n\n"
+    finally:
+        unsubscribe()
+
+
+def create_alert_engine() -> AlertEngine:
+    """環境変数の設定からアラートエンジンを生成（STACK_WATCHER_ALERTS_PATH 指定時は全ワーカーで共有）"""
+    path = os.getenv("STACK_WATCHER_ALERTS_PATH")
+    return SharedAlertEngine(path) if path else AlertEngine()
+
+
+# プロセス共通のアラートエンジン
+get_alert_engine = lazy_singleton(create_alert_engine)
@@ -0,0 +1,302 @@
+"""
+過去データのバックフィル
+登録済みの全銘柄・全インデックスについて長期間の日足を上流から並行して取得し、
+各サービスのキャッシュ（日付範囲クエリ用のストア・期間指定のキャッシュ）に直接書き込む。
+APIを1件ずつ呼び出すことなく、新しい環境のキャッシュを短時間で温める。
+
+    python -m backend.backfill --years 5 --workers 8 --rate 5
+
+書き込み先はサーバーと同じ環境変数（STACK_WATCHER_CACHE_BACKEND など）で決まる。
+共有キャッシュ（disk / redis）の場合はサーバーからそのまま参照される。
+メモリキャッシュの場合はスナップショット（STACK_WATCHER_SNAPSHOT_PATH）に保存し、サーバーの起動時に読み込ませる。
+
+完了した銘柄はチェックポイントファイルに記録する。中断後に同じコマンドを再実行すると、
+未完了（失敗を含む）の銘柄から再開する（--start/--end を省略した場合はチェックポイントの範囲を引き継ぐ）。
+"""
+
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, timedelta
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from backend.fetch_scheduler import fetch_priority
+from backend.index_service import get_index_service
+from backend.series_store import parse_date_range
+from backend.snapshot import save_snapshot, snapshot_path
+from backend.stock_service import get_stock_service
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHECKPOINT_PATH = "backfill-checkpoint.json"
+DEFAULT_YEARS = 5
+DEFAULT_WORKERS = 8
+DEFAULT_RATE = 5.0
+DEFAULT_RETRIES = 2
+
+# バックフィルした長期間の系列のTTL（秒、既定7日。過去分は変わらないため長めに保持する）
+DEFAULT_RANGE_TTL = 7 * 24 * 3600
+
+KINDS = ("stock", "index")
+
+
+class RateLimiter:
+    """上流へのリクエスト数の制限（1秒あたり rate 件。トークンが貯まるまで待つ）"""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self._lock = threading.Lock()
+        self._tokens = 1.0
+        self._updated = time.monotonic()
+
+    def acquire(self) -> None:
+        """トークンを1つ取得する（rate が0以下なら待たない）"""
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(max(1.0, self.rate), self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class Checkpoint:
+    """
+    完了・失敗した銘柄の記録（JSONファイル）
+
+    1件終わるごとに一時ファイルに書いてから置き換えるため、途中で中断しても直前までの記録が残る
+    """
+
+    def __init__(self, path: Optional[str]):
+        self.path = path or None
+        self._lock = threading.Lock()
+        self.range: Optional[Tuple[str, str]] = None
+        self.done: Dict[str, int] = {}
+        self.failed: Dict[str, str] = {}
+        if self.path and os.path.exists(self.path):
+            try:
+                with open(self.path, encoding="utf-8") as f:
+                    payload = json.load(f)
+                self.range = tuple(payload["range"]) if payload.get("range") else None
+                self.done = dict(payload.get("done", {}))
+                self.failed = dict(payload.get("failed", {}))
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"チェックポイントを読み込めないため最初から実行します: {e}")
+
+    def reset(self, date_range: Tuple[str, str]) -> None:
+        """記録を消して新しい範囲で始める"""
+        with self._lock:
+            self.range = date_range
+            self.done.clear()
+            self.failed.clear()
+            self._save()
+
+    def is_done(self, key: str) -> bool:
+        with self._lock:
+            return key in self.done
+
+    def mark_done(self, key: str, bars: int) -> None:
+        with self._lock:
+            self.done[key] = bars
+            self.failed.pop(key, None)
+            self._save()
+
+    def mark_failed(self, key: str, error: str) -> None:
+        with self._lock:
+            self.failed[key] = error
+            self._save()
+
+    def _save(self) -> None:
+        if not self.path:
+            return
+        payload = {"range": list(self.range) if self.range else None, "done": self.done, "failed": self.failed}
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.path)
+
+
+class BackfillTask(NamedTuple):
+    """バックフィルする1系列"""
+
+    kind: str
+    symbol: str
+
+    @property
+    def key(self) -> str:
+        return f"{self.kind}:{self.symbol}"
+
+
+class Backfiller:
+    """銘柄・インデックスの長期間の日足を並行して取得し、サービスのキャッシュに書き込む"""
+
+    def __init__(self, start: str, end: str, workers: int = DEFAULT_WORKERS, rate: float = DEFAULT_RATE,
+                 checkpoint: Optional[Checkpoint] = None, ttl: float = DEFAULT_RANGE_TTL,
+                 retries: int = DEFAULT_RETRIES, stock_service=None, index_service=None):
+        self.start = start
+        self.end = end
+        self.workers = workers
+        self.limiter = RateLimiter(rate)
+        self.checkpoint = checkpoint or Checkpoint(None)
+        self.ttl = ttl
+        self.retries = retries
+        self.stock_service = stock_service or get_stock_service()
+        self.index_service = index_service or get_index_service()
+
+    def tasks(self, kinds: Iterable[str] = KINDS, symbols: Optional[List[str]] = None) -> List[BackfillTask]:
+        """
+        対象の一覧（インデックスを先に並べる）
+
+        Args:
+            kinds: 対象の種類（stock / index）
+            symbols: 対象を絞り込む銘柄コード・インデックス（省略時は登録済みの全件）
+        """
+        tasks = []
+        if "index" in kinds:
+            tasks += [BackfillTask("index", symbol) for symbol in self.index_service.INDEX_SYMBOLS]
+        if "stock" in kinds:
+            tasks += [BackfillTask("stock", symbol.code) for symbol in self.stock_service.catalog]
+        if symbols:
+            wanted = set(symbols)
+            tasks = [task for task in tasks if task.symbol in wanted]
+        return tasks
+
+    def run(self, tasks: List[BackfillTask], progress=None) -> Dict[str, Any]:
+        """
+        バックフィルを実行
+
+        Args:
+            tasks: 対象の一覧
+            progress: 1件終わるごとに (完了件数, 対象件数, 対象, 本数またはエラー) で呼び出す関数
+
+        Returns:
+            {"total", "skipped", "done", "failed", "bars", "elapsed_seconds"}
+        """
+        pending = [task for task in tasks if not self.checkpoint.is_done(task.key)]
+        summary = {"total": len(tasks), "skipped": len(tasks) - len(pending), "done": 0, "failed": 0, "bars": 0}
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=max(1, self.workers), thread_name_prefix="backfill") as executor:
+            futures = {executor.submit(self._run_one, task): task for task in pending}
+            for finished, future in enumerate(as_completed(futures), 1):
+                task = futures[future]
+                try:
+                    bars = future.result()
+                except Exception as e:
+                    summary["failed"] += 1
+                    self.checkpoint.mark_failed(task.key, f"{type(e).__name__}: {e}")
+                    result: Any = e
+                else:
+                    summary["done"] += 1
+                    summary["bars"] += bars
+                    self.checkpoint.mark_done(task.key, bars)
+                    result = bars
+                if progress is not None:
+                    progress(finished, len(pending), task, result)
+        summary["elapsed_seconds"] = round(time.monotonic() - started, 1)
+        return summary
+
+    def _run_one(self, task: BackfillTask) -> int:
+        """1系列を取得して書き込む（失敗時は待ち時間を倍にしながら retries 回まで再試行）"""
+        service = self.stock_service if task.kind == "stock" else self.index_service
+        for attempt in range(self.retries + 1):
+            self.limiter.acquire()
+            try:
+                # 同じプロセスのAPIリクエスト・裏での再取得より後に実行する
+                with fetch_priority("backfill"):
+                    return service.backfill(task.symbol, self.start, self.end, ttl=self.ttl)
+            except ValueError:
+                raise
+            except Exception as e:
+                if attempt == self.retries:
+                    raise
+                logger.warning(f"{task.key}: 取得に失敗したため再試行します（{attempt + 1}/{self.retries}）: {e}")
+                time.sleep(0.5 * 2 ** attempt)
+        return 0
+
+
+def resolve_range(start: Optional[str], end: Optional[str], years: float,
+                  checkpoint: Checkpoint) -> Tuple[str, str]:
+    """
+    バックフィルする範囲を決める
+
+    start/end を省略した場合、チェックポイントの範囲があればそれを引き継ぎ（再開）、
+    なければ本日から years 年前までとする
+    """
+    if start is None and end is None:
+        if checkpoint.range is not None:
+            return checkpoint.range
+        start = (date.today() - timedelta(days=round(years * 365))).isoformat()
+    elif start is None:
+        raise ValueError("endを指定する場合はstartも指定してください")
+    return parse_date_range(start, end)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="登録済みの銘柄・インデックスの過去データをキャッシュにバックフィルする")
+    parser.add_argument("--years", type=float, default=DEFAULT_YEARS, help="取得する年数（--start 省略時）")
+    parser.add_argument("--start", help="開始日 (YYYY-MM-DD)")
+    parser.add_argument("--end", help="終了日 (YYYY-MM-DD、省略時は本日)")
+    parser.add_argument("--kinds", default=",".join(KINDS), help="対象の種類（stock,index）")
+    parser.add_argument("--symbols", help="対象を絞り込む銘柄コード・インデックス（カンマ区切り）")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="並行して取得する数")
+    parser.add_argument("--rate", type=float, default=DEFAULT_RATE, help="上流への1秒あたりのリクエスト数（0は無制限）")
+    parser.add_argument("--retries", type=int, default=DEFAULT_RETRIES, help="失敗時の再試行回数")
+    parser.add_argument("--ttl", type=float, default=DEFAULT_RANGE_TTL, help="長期間の系列のTTL（秒）")
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT_PATH, help="チェックポイントファイル（空文字で無効）")
+    parser.add_argument("--restart", action="store_true", help="チェックポイントを破棄して最初から実行する")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)s %(name)s: %(message)s")
+    kinds = [kind for kind in args.kinds.split(",") if kind]
+    unknown = set(kinds) - set(KINDS)
+    if unknown:
+        parser.error(f"サポートされていない種類: {sorted(unknown)}")
+
+    checkpoint = Checkpoint(args.checkpoint)
+    try:
+        date_range = resolve_range(args.start, args.end, args.years, Checkpoint(None) if args.restart else checkpoint)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.restart or checkpoint.range != date_range:
+        if checkpoint.done or checkpoint.failed:
+            print(f"チェックポイントの範囲 {checkpoint.range} と異なるため、最初から実行します")
+        checkpoint.reset(date_range)
+
+    backfiller = Backfiller(*date_range, workers=args.workers, rate=args.rate, checkpoint=checkpoint,
+                            ttl=args.ttl, retries=args.retries)
+    tasks = backfiller.tasks(kinds, args.symbols.split(",") if args.symbols else None)
+    print(f"バックフィル開始: {date_range[0]}〜{date_range[1]}  対象 {len(tasks)}件"
+          f"（完了済み {sum(checkpoint.is_done(task.key) for task in tasks)}件）  "
+          f"workers={args.workers} rate={args.rate}/s  キャッシュ: {backfiller.stock_service.cache.name}")
+
+    def progress(finished: int, total: int, task: BackfillTask, result: Any) -> None:
+        status = f"{result}本" if isinstance(result, int) else f"失敗 ({result})"
+        print(f"[{finished}/{total}] {task.key}: {status}")
+
+    summary = backfiller.run(tasks, progress)
+    print(f"完了: 成功 {summary['done']}件 / 失敗 {summary['failed']}件 / スキップ {summary['skipped']}件  "
+          f"{summary['bars']}本  {summary['elapsed_seconds']}秒")
+
+    cache = backfiller.stock_service.cache
+    if cache.name == "memory":
+        # プロセス内のキャッシュはこのコマンドの終了とともに消えるため、サーバーが起動時に読み込むスナップショットに保存する
+        path = snapshot_path()
+        if path:
+            saved = save_snapshot(cache, path, max_entries=max(1, cache.stats()["entries"]))
+            print(f"スナップショットに保存しました: {saved}件 -> {path}")
+        else:
+            print("警告: メモリキャッシュかつスナップショット無効のため、結果はサーバーに引き継がれません")
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
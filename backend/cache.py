@@ -0,0 +1,832 @@
+"""
+データキャッシュ
+各サービスの取得結果を保持するキャッシュ。バックエンドは環境変数で切り替える。
+
+    STACK_WATCHER_CACHE_BACKEND=memory  プロセス内LRU（既定）
+    STACK_WATCHER_CACHE_BACKEND=disk    SQLite (WALモード) ファイル。同一ホストの全ワーカーで共有
+    STACK_WATCHER_CACHE_BACKEND=redis   Redisプロトコル互換サーバー。複数レプリカで共有
+
+disk は STACK_WATCHER_CACHE_PATH（既定はデータディレクトリの cache.sqlite3）、redis は STACK_WATCHER_REDIS_URL で接続先を指定する。
+disk・redis の値は pickle で保存するため、署名（backend.signing）を検証してから読み込む。
+disk の鍵はデータディレクトリの鍵ファイル（または STACK_WATCHER_CACHE_SECRET）、
+redis の鍵は STACK_WATCHER_REDIS_SECRET（未指定の場合は、接続先のRedisに書き込めるのが信頼できるクライアントだけであることが前提）。
+（後方互換: STACK_WATCHER_SHARED_CACHE のみ指定された場合は disk として扱う）
+
+各エントリは保存時刻と鮮度期限（TTL）を持ち、期限切れ後も CACHE_STALE_SECONDS の間は
+保持される。get_or_fetch は期限切れのエントリをそのまま返し、裏で再取得する
+（stale-while-revalidate）。
+
+memory はエントリ数に加えて推定バイト数の上限（STACK_WATCHER_CACHE_MAX_BYTES）を持ち、
+超過時は最近使われていないエントリのうち再取得コスト（取得に要した秒数）の小さいものから追い出す。
+"""
+
+import logging
+import os
+import pickle
+import socket
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+from urllib.parse import urlsplit
+
+from backend.fetch_scheduler import fetch_priority
+from backend.signing import load_secret, private_data_dir, sign, verify
+from backend.tracing import span
+
+logger = logging.getLogger(__name__)
+
+# 取得処理のリース（他ワーカーが同一キーを取得中であることを示す）の有効秒数
+LEASE_SECONDS = 30.0
+
+# リース待ち中のポーリング間隔（秒）
+LEASE_POLL_INTERVAL = 0.05
+
+# メモリキャッシュの既定の最大エントリ数
+DEFAULT_MAX_ENTRIES = 1024
+
+# メモリキャッシュの既定の最大バイト数（推定値の合計）
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# 追い出し候補とする最近使われていないエントリの数（この中で再取得コスト最小のものを追い出す）
+EVICTION_SAMPLE = 8
+
+# 配列を持つ値（系列）の配列以外の部分の概算バイト数
+OBJECT_OVERHEAD_BYTES = 512
+
+# 鮮度期限切れ後もエントリを保持する秒数（この間は古い値を返しつつ裏で再取得する）
+DEFAULT_STALE_SECONDS = 24 * 60 * 60
+
+# disk の既定のファイル名（データディレクトリ内）
+DEFAULT_DISK_FILE = "cache.sqlite3"
+DEFAULT_REDIS_URL = "redis://localhost:6379/0"
+
+
+def estimate_nbytes(value: Any) -> int:
+    """
+    値のおおよそのメモリ使用量（バイト）
+
+    nbytes を持つ値（列指向の系列・配列）は配列のバイト数、
+    辞書・リストは要素を再帰的に合計する
+    """
+    nbytes = getattr(value, "nbytes", None)
+    if isinstance(nbytes, int):
+        return nbytes + OBJECT_OVERHEAD_BYTES
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_nbytes(k) + estimate_nbytes(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(estimate_nbytes(item) for item in value)
+    return sys.getsizeof(value)
+
+
+def dump_entry(entry: "CacheEntry", secret: Optional[bytes]) -> bytes:
+    """エントリを保存用のバイト列に変換（secret 指定時は署名を付ける）"""
+    blob = pickle.dumps(entry, protocol=pickle.HIGHEST_PROTOCOL)
+    return blob if secret is None else sign(secret, blob)
+
+
+def load_entry(key: str, data: bytes, secret: Optional[bytes]) -> Optional["CacheEntry"]:
+    """保存したバイト列をエントリに復元（署名が一致しない場合は pickle.loads を呼ばずにNone）"""
+    if secret is not None:
+        blob = verify(secret, data)
+        if blob is None:
+            logger.warning(f"キャッシュの署名が一致しないため無視します: {key}")
+            return None
+        data = blob
+    return pickle.loads(data)
+
+
+def key_source(key: str) -> str:
+    """キーの取得元（先頭の名前空間。例: stock, index, weather）"""
+    return key.split(":", 1)[0]
+
+
+class CacheEntry(NamedTuple):
+    """鮮度情報つきのキャッシュエントリ（cost は再取得に要する秒数の目安）"""
+
+    value: Any
+    stored_at: float
+    fresh_until: float
+    cost: float = 0.0
+
+    @property
+    def is_fresh(self) -> bool:
+        return time.time() <= self.fresh_until
+
+
+class CacheBackend:
+    """
+    キャッシュバックエンドの共通インターフェース
+
+    サブクラスは CacheEntry を保存・取得する _get/_set/_delete/hot_entries を実装する。
+    一括操作（_get_many/_set_many）は必要に応じてまとめて処理するよう上書きする。
+    """
+
+    name = "base"
+
+    def __init__(self, stale_seconds: float = DEFAULT_STALE_SECONDS):
+        self.stale_seconds = stale_seconds
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+        self._refreshing = set()
+        self._refresh_lock = threading.Lock()
+
+    # --- サブクラスで実装 ---
+
+    def _get(self, key: str) -> Optional[CacheEntry]:
+        raise NotImplementedError
+
+    def _set(self, key: str, entry: CacheEntry, storage_ttl: float) -> None:
+        raise NotImplementedError
+
+    def _delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def hot_entries(self, limit: int) -> List[Tuple[str, CacheEntry]]:
+        """
+        スナップショット対象のエントリ（最近使われたものから最大 limit 件）
+
+        サーバー側で永続化されるバックエンドは空リストを返す
+        """
+        raise NotImplementedError
+
+    def _get_many(self, keys: List[str]) -> Dict[str, CacheEntry]:
+        entries = {}
+        for key in keys:
+            entry = self._get(key)
+            if entry is not None:
+                entries[key] = entry
+        return entries
+
+    def _set_many(self, entries: Dict[str, CacheEntry], storage_ttl: float) -> None:
+        for key, entry in entries.items():
+            self._set(key, entry, storage_ttl)
+
+    def _acquire_lease(self, key: str) -> bool:
+        """キーの取得リースを獲得（他ワーカーが保持中ならFalse）"""
+        return True
+
+    def _release_lease(self, key: str) -> None:
+        pass
+
+    # --- 共通処理 ---
+
+    def _entry(self, value: Any, ttl: float, cost: float = 0.0) -> CacheEntry:
+        now = time.time()
+        return CacheEntry(value, now, now + ttl, cost)
+
+    @staticmethod
+    def _timed(fetch: Callable[[], Optional[Any]]) -> Tuple[Optional[Any], float]:
+        """fetch() を実行し、結果と所要秒数を返す"""
+        started = time.monotonic()
+        value = fetch()
+        return value, time.monotonic() - started
+
+    def _fresh(self, entry: Optional[CacheEntry]) -> Optional[Any]:
+        return entry.value if entry is not None and entry.is_fresh else None
+
+    def _record(self, value: Optional[Any]) -> Optional[Any]:
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def get(self, key: str) -> Optional[Any]:
+        """鮮度期限内の値を返す（なければNone）"""
+        return self._record(self._fresh(self._get(key)))
+
+    def get_entry(self, key: str) -> Optional[CacheEntry]:
+        """期限切れ（保持期間内）も含めてエントリを返す"""
+        return self._get(key)
+
+    def set(self, key: str, value: Any, ttl: float, cost: float = 0.0) -> None:
+        """TTL（秒）付きで値を保存（cost: 再取得に要する秒数。追い出し順序に使用）"""
+        self._set(key, self._entry(value, ttl, cost), ttl + self.stale_seconds)
+
+    def ttl(self, key: str) -> Optional[float]:
+        """鮮度期限までの残り秒数を返す（なければ、または期限切れならNone）"""
+        entry = self._get(key)
+        if entry is None or not entry.is_fresh:
+            return None
+        return entry.fresh_until - time.time()
+
+    def invalidate(self, key: str) -> None:
+        """値を削除"""
+        self._delete(key)
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        """
+        複数キーを一括取得
+
+        Returns:
+            キー -> 値の辞書（鮮度期限内の値があるキーのみ）
+        """
+        keys = list(dict.fromkeys(keys))
+        entries = self._get_many(keys) if keys else {}
+        results = {key: entry.value for key, entry in entries.items() if entry.is_fresh}
+        self.hits += len(results)
+        self.misses += len(keys) - len(results)
+        return results
+
+    def get_many_entries(self, keys: Iterable[str]) -> Dict[str, CacheEntry]:
+        """期限切れ（保持期間内）も含めて複数キーのエントリを一括取得"""
+        keys = list(dict.fromkeys(keys))
+        with span("cache.get_many_entries", keys=len(keys)) as current:
+            entries = self._get_many(keys) if keys else {}
+            fresh = sum(entry.is_fresh for entry in entries.values())
+            if current is not None:
+                current.set("hits", fresh)
+                current.set("stale", len(entries) - fresh)
+        self.hits += len(entries)
+        self.stale_hits += len(entries) - fresh
+        self.misses += len(keys) - len(entries)
+        return entries
+
+    def set_many(self, items: Dict[str, Any], ttl: float, cost: float = 0.0) -> None:
+        """複数の値を同じTTL・再取得コストで一括保存"""
+        if items:
+            self._set_many({key: self._entry(value, ttl, cost) for key, value in items.items()},
+                           ttl + self.stale_seconds)
+
+    def restore(self, entries: Iterable[Tuple[str, CacheEntry]]) -> int:
+        """
+        スナップショットのエントリを鮮度情報ごと書き戻す
+
+        既に存在するキーと保持期間を過ぎたエントリは書き戻さない
+
+        Returns:
+            書き戻した件数
+        """
+        now = time.time()
+        restored = 0
+        for key, entry in entries:
+            storage_ttl = entry.fresh_until + self.stale_seconds - now
+            if storage_ttl <= 0 or self._get(key) is not None:
+                continue
+            self._set(key, entry, storage_ttl)
+            restored += 1
+        return restored
+
+    def refresh_in_background(self, key: str, refresh: Callable[[], None]) -> bool:
+        """
+        refresh() を別スレッドで実行（同一キーの再取得が実行中なら何もしない）
+
+        Returns:
+            再取得を開始した場合True
+        """
+        with self._refresh_lock:
+            if key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+
+        def run():
+            try:
+                if self._acquire_lease(key):
+                    try:
+                        # 裏での再取得はAPIリクエストの上流呼び出しより後に実行する
+                        with fetch_priority("prefetch"):
+                            refresh()
+                    finally:
+                        self._release_lease(key)
+            except Exception as e:
+                logger.warning(f"キャッシュの再取得に失敗: {key}: {e}")
+            finally:
+                with self._refresh_lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=run, name=f"cache-refresh:{key}", daemon=True).start()
+        return True
+
+    def _refresh(self, key: str, fetch: Callable[[], Optional[Any]], ttl: float) -> None:
+        value, cost = self._timed(fetch)
+        if value is not None:
+            self.set(key, value, ttl, cost)
+
+    def get_or_fetch(self, key: str, fetch: Callable[[], Optional[Any]], ttl: float) -> Optional[Any]:
+        """
+        キャッシュにあればその値を、なければ fetch() の結果を保存して返す
+
+        鮮度期限切れのエントリはそのまま返し、fetch() は裏で実行する。
+        他ワーカーが同一キーを取得中の場合は、その結果が保存されるのを待つ
+        （リースの期限切れ時は自分で取得する）。
+        fetch() がNoneを返した場合（モックへのフォールバック等）は保存しない。
+        """
+        with span("cache.get_or_fetch", key=key) as current:
+            entry = self._get(key)
+            if entry is not None:
+                if not entry.is_fresh:
+                    self.stale_hits += 1
+                    self.refresh_in_background(key, lambda: self._refresh(key, fetch, ttl))
+                if current is not None:
+                    current.set("result", "hit" if entry.is_fresh else "stale")
+                return self._record(entry.value)
+            self.misses += 1
+            if current is not None:
+                current.set("result", "miss")
+            return self._fetch_once(key, fetch, ttl)
+
+    def _fetch_once(self, key: str, fetch: Callable[[], Optional[Any]], ttl: float) -> Optional[Any]:
+        """キャッシュミス時の取得（同一キーの同時取得を1回にまとめる）"""
+        deadline = time.time() + LEASE_SECONDS
+        while not self._acquire_lease(key):
+            time.sleep(LEASE_POLL_INTERVAL)
+            value = self._fresh(self._get(key))
+            if value is not None:
+                return value
+            if time.time() > deadline:
+                logger.warning(f"キャッシュのリース待ちがタイムアウトしました: {key}")
+                return fetch()
+
+        try:
+            value = self._fresh(self._get(key))
+            if value is not None:
+                return value
+            value, cost = self._timed(fetch)
+            if value is not None:
+                self.set(key, value, ttl, cost)
+            return value
+        finally:
+            self._release_lease(key)
+
+    def stats(self) -> Dict[str, Any]:
+        """ヒット率などの統計"""
+        total = self.hits + self.misses
+        return {
+            "backend": self.name,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale_hits": self.stale_hits,
+            "hit_rate": round(self.hits / total, 4) if total else None,
+        }
+
+
+class MemoryCache(CacheBackend):
+    """
+    プロセス内のTTL付きキャッシュ（単一ワーカー用）
+
+    エントリ数と推定バイト数の上限を持つ。上限を超えた場合は、最近使われていない
+    EVICTION_SAMPLE 件のうち再取得コストの最も小さい（短い期間などすぐ取り直せる）エントリから追い出す
+    """
+
+    name = "memory"
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, stale_seconds: float = DEFAULT_STALE_SECONDS,
+                 max_bytes: int = DEFAULT_MAX_BYTES):
+        super().__init__(stale_seconds)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        # キー -> (保持期限, CacheEntry, 推定バイト数)。末尾ほど最近使われたキー
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        # 取得中のキー -> (キーごとのロック, 取得中・待機中のスレッド数)。取得が終わり待機がなくなれば削除する
+        self._key_locks: Dict[str, Tuple[threading.Lock, int]] = {}
+        self._bytes = 0
+        self._bytes_by_source: Dict[str, int] = {}
+        self.evictions = 0
+
+    def _remove(self, key: str) -> None:
+        """エントリを削除して使用バイト数を減らす（ロック取得済みで呼び出す）"""
+        item = self._entries.pop(key, None)
+        if item is None:
+            return
+        nbytes = item[2]
+        source = key_source(key)
+        self._bytes -= nbytes
+        self._bytes_by_source[source] -= nbytes
+        if not self._bytes_by_source[source]:
+            del self._bytes_by_source[source]
+
+    def _evict_one(self, keep: str) -> None:
+        """追い出し候補のうち、保持期限切れまたは再取得コスト最小のエントリを追い出す"""
+        now = time.time()
+        candidates = islice(((key, item) for key, item in self._entries.items() if key != keep), EVICTION_SAMPLE)
+        # 同じスコアの場合は最も古いエントリ（min は最初の最小値を返す）
+        victim, _ = min(candidates, key=lambda pair: -1.0 if pair[1][0] < now else pair[1][1].cost)
+        self._remove(victim)
+        self.evictions += 1
+
+    def _get(self, key: str) -> Optional[CacheEntry]:
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            expires_at, entry, _ = item
+            if time.time() > expires_at:
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def _set(self, key: str, entry: CacheEntry, storage_ttl: float) -> None:
+        nbytes = estimate_nbytes(entry.value)
+        with self._lock:
+            self._remove(key)
+            if nbytes > self.max_bytes:
+                logger.warning(f"キャッシュの上限（{self.max_bytes}バイト）を超えるため保存しません: {key} ({nbytes}バイト)")
+                return
+            self._entries[key] = (time.time() + storage_ttl, entry, nbytes)
+            source = key_source(key)
+            self._bytes += nbytes
+            self._bytes_by_source[source] = self._bytes_by_source.get(source, 0) + nbytes
+            while len(self._entries) > 1 and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                self._evict_one(keep=key)
+
+    def _delete(self, key: str) -> None:
+        with self._lock:
+            self._remove(key)
+
+    def hot_entries(self, limit: int) -> List[Tuple[str, CacheEntry]]:
+        now = time.time()
+        with self._lock:
+            items = list(self._entries.items())
+        hot = [(key, entry) for key, (expires_at, entry, _) in reversed(items) if expires_at >= now]
+        return hot[:limit]
+
+    def _fetch_once(self, key: str, fetch: Callable[[], Optional[Any]], ttl: float) -> Optional[Any]:
+        """キャッシュミス時の取得（同一キーの同時取得はキーごとのロックで1回にまとめる）"""
+        with self._lock:
+            key_lock, waiters = self._key_locks.get(key) or (threading.Lock(), 0)
+            self._key_locks[key] = (key_lock, waiters + 1)
+        try:
+            with key_lock:
+                value = self._fresh(self._get(key))
+                if value is not None:
+                    return value
+                value, cost = self._timed(fetch)
+                if value is not None:
+                    self.set(key, value, ttl, cost)
+                return value
+        finally:
+            with self._lock:
+                key_lock, waiters = self._key_locks[key]
+                if waiters == 1:
+                    del self._key_locks[key]
+                else:
+                    self._key_locks[key] = (key_lock, waiters - 1)
+
+    def stats(self) -> Dict[str, Any]:
+        stats = super().stats()
+        with self._lock:
+            stats.update({
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "bytes_by_source": dict(self._bytes_by_source),
+                "evictions": self.evictions,
+            })
+        return stats
+
+
+class DiskCache(CacheBackend):
+    """
+    同一ホストの全ワーカーで共有する SQLite (WAL) キャッシュ
+
+    値には署名を付け、署名が一致しない行は読み込まない（ファイルを書き換えられても pickle.loads に渡さない）。
+    """
+
+    name = "disk"
+
+    def __init__(self, path: Optional[str] = None, stale_seconds: float = DEFAULT_STALE_SECONDS,
+                 secret: Optional[bytes] = None):
+        super().__init__(stale_seconds)
+        self.path = path or os.path.join(private_data_dir(), DEFAULT_DISK_FILE)
+        self._secret = secret or load_secret()
+        path = self.path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS leases ("
+                " key TEXT PRIMARY KEY, expires_at REAL NOT NULL)"
+            )
+        logger.info(f"ディスクキャッシュを使用します: {path}")
+
+    def _connect(self) -> sqlite3.Connection:
+        """スレッドごとの接続を返す"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _get(self, key: str) -> Optional[CacheEntry]:
+        row = self._connect().execute(
+            "SELECT value FROM entries WHERE key = ? AND expires_at >= ?", (key, time.time())
+        ).fetchone()
+        return load_entry(key, row[0], self._secret) if row else None
+
+    def _set(self, key: str, entry: CacheEntry, storage_ttl: float) -> None:
+        self._set_many({key: entry}, storage_ttl)
+
+    def _delete(self, key: str) -> None:
+        self._connect().execute("DELETE FROM entries WHERE key = ?", (key,))
+
+    def _get_many(self, keys: List[str]) -> Dict[str, CacheEntry]:
+        placeholders = ",".join("?" * len(keys))
+        rows = self._connect().execute(
+            f"SELECT key, value FROM entries WHERE key IN ({placeholders}) AND expires_at >= ?",
+            (*keys, time.time()),
+        ).fetchall()
+        entries = {key: load_entry(key, blob, self._secret) for key, blob in rows}
+        return {key: entry for key, entry in entries.items() if entry is not None}
+
+    def _set_many(self, entries: Dict[str, CacheEntry], storage_ttl: float) -> None:
+        expires_at = time.time() + storage_ttl
+        rows = [(key, dump_entry(entry, self._secret), expires_at) for key, entry in entries.items()]
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany("INSERT OR REPLACE INTO entries (key, value, expires_at) VALUES (?, ?, ?)", rows)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def hot_entries(self, limit: int) -> List[Tuple[str, CacheEntry]]:
+        # アクセス順は記録していないため、保持期限の新しい（最近保存された）順とする
+        rows = self._connect().execute(
+            "SELECT key, value FROM entries WHERE expires_at >= ? ORDER BY expires_at DESC LIMIT ?",
+            (time.time(), limit),
+        ).fetchall()
+        entries = [(key, load_entry(key, blob, self._secret)) for key, blob in rows]
+        return [(key, entry) for key, entry in entries if entry is not None]
+
+    def _acquire_lease(self, key: str) -> bool:
+        conn = self._connect()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM leases WHERE key = ? AND expires_at < ?", (key, now))
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO leases (key, expires_at) VALUES (?, ?)", (key, now + LEASE_SECONDS)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return cursor.rowcount == 1
+
+    def _release_lease(self, key: str) -> None:
+        self._connect().execute("DELETE FROM leases WHERE key = ?", (key,))
+
+    def stats(self) -> Dict[str, Any]:
+        stats = super().stats()
+        rows = self._connect().execute(
+            "SELECT key, LENGTH(value) FROM entries WHERE expires_at >= ?", (time.time(),)
+        ).fetchall()
+        bytes_by_source: Dict[str, int] = {}
+        for key, nbytes in rows:
+            source = key_source(key)
+            bytes_by_source[source] = bytes_by_source.get(source, 0) + nbytes
+        stats.update({
+            "entries": len(rows),
+            "path": self.path,
+            "bytes": sum(bytes_by_source.values()),
+            "bytes_by_source": bytes_by_source,
+        })
+        return stats
+
+
+class RedisError(Exception):
+    """Redisサーバーがエラー応答を返した場合の例外"""
+
+
+# キャッシュミスとして扱うRedisの失敗（接続エラー・エラー応答）
+REDIS_ERRORS = (OSError, ConnectionError, RedisError)
+
+
+class RedisCache(CacheBackend):
+    """
+    Redisプロトコル (RESP2) 互換サーバーを使うキャッシュ（複数レプリカで共有）
+
+    追加の依存パッケージなしで SET/MGET/DEL のみを使用する。
+    サーバーに接続できない場合やエラー応答（NOAUTH・READONLY・OOM 等）の場合はキャッシュミスとして扱い、
+    リクエスト自体は失敗させない（同じエラーが続く間はログを1回だけ出力する）。
+
+    値は pickle で保存する。secret を指定すると各値に HMAC-SHA256 の署名を付け、
+    署名が一致しない値は読み込まず（pickle.loads を呼ばず）キャッシュミスとして扱う。
+    secret を指定しない場合、Redisに書き込める全てのクライアントを信頼することになる。
+    """
+
+    name = "redis"
+
+    def __init__(self, url: str = DEFAULT_REDIS_URL, prefix: str = "stack_watcher:", timeout: float = 2.0,
+                 stale_seconds: float = DEFAULT_STALE_SECONDS, secret: Optional[str] = None):
+        super().__init__(stale_seconds)
+        parts = urlsplit(url)
+        self.host = parts.hostname or "localhost"
+        self.port = parts.port or 6379
+        self.password = parts.password
+        self.db = int(parts.path.lstrip("/") or 0)
+        self.prefix = prefix
+        self.timeout = timeout
+        self._secret = secret.encode() if secret else None
+        self._local = threading.local()
+        self._last_error: Optional[str] = None
+        logger.info(f"Redisキャッシュを使用します: {self.host}:{self.port}/{self.db}")
+        if self._secret is None:
+            logger.warning("STACK_WATCHER_REDIS_SECRET が未指定のため、Redisの値を署名なしで読み込みます")
+
+    # --- RESP通信 ---
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+            conn = (sock, sock.makefile("rb"))
+            self._local.conn = conn
+            try:
+                if self.password:
+                    self._roundtrip([("AUTH", self.password)])
+                if self.db:
+                    self._roundtrip([("SELECT", self.db)])
+            except (OSError, ConnectionError, RedisError):
+                # 認証・DB選択に失敗した接続は再利用しない
+                self._close()
+                raise
+        return conn
+
+    def _close(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        self._local.conn = None
+        if conn is not None:
+            conn[1].close()
+            conn[0].close()
+
+    @staticmethod
+    def _encode(args) -> bytes:
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            if isinstance(arg, bytes):
+                data = arg
+            else:
+                data = str(arg).encode()
+            parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        return b"".join(parts)
+
+    def _read_reply(self, reader):
+        line = reader.readline()
+        if not line:
+            raise ConnectionError("Redisサーバーとの接続が切断されました")
+        kind, payload = line[:1], line[1:-2]
+        if kind == b"+":
+            return payload.decode()
+        if kind == b"-":
+            return RedisError(payload.decode())
+        if kind == b":":
+            return int(payload)
+        if kind == b"$":
+            length = int(payload)
+            if length < 0:
+                return None
+            return reader.read(length + 2)[:-2]
+        if kind == b"*":
+            count = int(payload)
+            if count < 0:
+                return None
+            return [self._read_reply(reader) for _ in range(count)]
+        raise RedisError(f"不明な応答: {line!r}")
+
+    def _roundtrip(self, commands: List[tuple]) -> list:
+        sock, reader = self._local.conn
+        sock.sendall(b"".join(self._encode(command) for command in commands))
+        replies = [self._read_reply(reader) for _ in commands]
+        for reply in replies:
+            if isinstance(reply, RedisError):
+                raise reply
+        return replies
+
+    def _execute(self, *commands: tuple) -> list:
+        """コマンドをパイプラインで送信して応答を返す（切断時は1回だけ再接続）"""
+        for attempt in range(2):
+            try:
+                self._connect()
+                replies = self._roundtrip(list(commands))
+            except (OSError, ConnectionError):
+                self._close()
+                if attempt:
+                    raise
+            else:
+                self._last_error = None
+                return replies
+
+    def _warn(self, message: str, e: Exception) -> None:
+        """失敗をログに出力する（同じエラーが続く間は1回だけ）"""
+        error = f"{type(e).__name__}: {e}"
+        if error != self._last_error:
+            self._last_error = error
+            logger.warning(f"{message}: {e}")
+
+    def _key(self, key: str) -> str:
+        return self.prefix + key
+
+
+    # --- CacheBackend ---
+
+    def _get(self, key: str) -> Optional[CacheEntry]:
+        return self._get_many([key]).get(key)
+
+    def _set(self, key: str, entry: CacheEntry, storage_ttl: float) -> None:
+        self._set_many({key: entry}, storage_ttl)
+
+    def _delete(self, key: str) -> None:
+        try:
+            self._execute(("DEL", self._key(key)))
+        except REDIS_ERRORS as e:
+            self._warn("Redisキャッシュ削除に失敗", e)
+
+    def _get_many(self, keys: List[str]) -> Dict[str, CacheEntry]:
+        try:
+            (blobs,) = self._execute(("MGET", *[self._key(key) for key in keys]))
+        except REDIS_ERRORS as e:
+            self._warn("Redisキャッシュ取得に失敗", e)
+            return {}
+        entries = {key: load_entry(key, blob, self._secret) for key, blob in zip(keys, blobs) if blob is not None}
+        return {key: entry for key, entry in entries.items() if entry is not None}
+
+    def _set_many(self, entries: Dict[str, CacheEntry], storage_ttl: float) -> None:
+        ttl_ms = max(int(storage_ttl * 1000), 1)
+        commands = [
+            ("SET", self._key(key), dump_entry(entry, self._secret), "PX", ttl_ms)
+            for key, entry in entries.items()
+        ]
+        try:
+            self._execute(*commands)
+        except REDIS_ERRORS as e:
+            self._warn("Redisキャッシュ保存に失敗", e)
+
+    def hot_entries(self, limit: int) -> List[Tuple[str, CacheEntry]]:
+        # エントリはサーバー側に残るため、スナップショットは不要
+        return []
+
+    def _acquire_lease(self, key: str) -> bool:
+        try:
+            (reply,) = self._execute(
+                ("SET", self._key("lease:" + key), "1", "NX", "PX", int(LEASE_SECONDS * 1000))
+            )
+        except REDIS_ERRORS as e:
+            # サーバーを使えない場合は自分で取得する
+            self._warn("Redisのリース取得に失敗", e)
+            return True
+        return reply == "OK"
+
+    def _release_lease(self, key: str) -> None:
+        try:
+            self._execute(("DEL", self._key("lease:" + key)))
+        except REDIS_ERRORS as e:
+            self._warn("Redisのリース解放に失敗", e)
+
+    def stats(self) -> Dict[str, Any]:
+        stats = super().stats()
+        stats.update({"server": f"{self.host}:{self.port}/{self.db}"})
+        return stats
+
+
+def create_cache(backend: Optional[str] = None) -> CacheBackend:
+    """
+    環境変数の設定に従ってキャッシュバックエンドを生成
+
+    Args:
+        backend: バックエンド名（memory/disk/redis）。省略時は STACK_WATCHER_CACHE_BACKEND
+
+    Returns:
+        キャッシュバックエンド
+    """
+    shared_path = os.getenv("STACK_WATCHER_SHARED_CACHE")
+    backend = backend or os.getenv("STACK_WATCHER_CACHE_BACKEND") or ("disk" if shared_path else "memory")
+    stale_seconds = float(os.getenv("CACHE_STALE_SECONDS", str(DEFAULT_STALE_SECONDS)))
+
+    if backend == "memory":
+        return MemoryCache(int(os.getenv("STACK_WATCHER_CACHE_MAX_ENTRIES", str(DEFAULT_MAX_ENTRIES))),
+                           stale_seconds,
+                           int(os.getenv("STACK_WATCHER_CACHE_MAX_BYTES", str(DEFAULT_MAX_BYTES))))
+    if backend == "disk":
+        return DiskCache(os.getenv("STACK_WATCHER_CACHE_PATH") or shared_path, stale_seconds)
+    if backend == "redis":
+        return RedisCache(os.getenv("STACK_WATCHER_REDIS_URL", DEFAULT_REDIS_URL), stale_seconds=stale_seconds,
+                          secret=os.getenv("STACK_WATCHER_REDIS_SECRET"))
+    raise ValueError(f"無効なキャッシュバックエンド: {backend}. 有効な値: ['memory', 'disk', 'redis']")
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> CacheBackend:
+    """プロセス共通のキャッシュインスタンスを返す"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = create_cache()
+        return _cache
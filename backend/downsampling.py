@@ -0,0 +1,199 @@
+"""
+時系列ダウンサンプリング
+長期間のチャート表示向けに、形状を保ったままデータ点数を削減する
+
+- 終値・指数値: Largest-Triangle-Three-Buckets (LTTB)
+- ローソク足: OHLCバケット集約
+- 気象データ: バケット集約（変数ごとの日次集約と同じ方法。降水量は合計、最高気温は最大など）
+"""
+
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+
+from backend.series import aggregate_ohlc, to_json_list
+from backend.weather_processing import VARIABLES, reduce_buckets, to_array
+
+# ダウンサンプリング時に指定可能な最小点数（先頭・末尾＋1点）
+MIN_MAX_POINTS = 3
+
+
+def validate_max_points(max_points: Optional[int]) -> None:
+    """max_pointsパラメータの妥当性チェック（不正時はValueError）"""
+    if max_points is not None and max_points < MIN_MAX_POINTS:
+        raise ValueError(f"無効なmax_points: {max_points}. {MIN_MAX_POINTS}以上を指定してください")
+
+
+def lttb_indices(y, threshold: int, x=None) -> np.ndarray:
+    """
+    LTTBで残すべき点のインデックスを計算
+
+    Args:
+        y: 値の配列
+        threshold: 出力点数
+        x: X座標の配列（省略時は等間隔）
+
+    Returns:
+        選択された点のインデックス配列（昇順）
+    """
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if threshold >= n or threshold < MIN_MAX_POINTS:
+        return np.arange(n)
+
+    x = np.arange(n, dtype=float) if x is None else np.asarray(x, dtype=float)
+
+    # 先頭・末尾を除いた内側の点を (threshold - 2) 個のバケットに分割
+    inner_x = x[1:n - 1]
+    inner_y = y[1:n - 1]
+    bucket_count = threshold - 2
+    bounds = np.linspace(0, n - 2, bucket_count + 1).astype(int)
+    starts = bounds[:-1]
+    counts = np.diff(bounds)
+
+    # 各バケットの平均点（次バケットの代表点として使用）。最後は末尾の点
+    avg_x = np.append(np.add.reduceat(inner_x, starts) / counts, x[-1])
+    avg_y = np.append(np.add.reduceat(np.nan_to_num(inner_y), starts) / counts, y[-1])
+
+    selected = np.empty(threshold, dtype=int)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    anchor = 0
+    for i in range(bucket_count):
+        lo = bounds[i] + 1
+        hi = bounds[i + 1] + 1
+        next_x = avg_x[i + 1]
+        next_y = avg_y[i + 1]
+        # 前回選択点・次バケット平均点と作る三角形の面積（定数倍は省略）
+        area = np.abs(
+            (x[anchor] - next_x) * (y[lo:hi] - y[anchor])
+            - (x[anchor] - x[lo:hi]) * (next_y - y[anchor])
+        )
+        anchor = lo + int(np.argmax(np.nan_to_num(area, nan=-1.0)))
+        selected[i + 1] = anchor
+
+    return selected
+
+
+def bucket_starts(n: int, max_points: int) -> np.ndarray:
+    """n点を max_points 個の連続バケットに分割した各バケットの開始インデックス"""
+    if max_points >= n:
+        return np.arange(n)
+    return np.linspace(0, n, max_points + 1).astype(int)[:-1]
+
+
+def downsample_stock_data(stock: Dict[str, Any], max_points: Optional[int]) -> Dict[str, Any]:
+    """
+    株価データ（data_points）をOHLCバケット集約でダウンサンプリング
+
+    Args:
+        stock: StockServiceが返す株価データ
+        max_points: 最大データ点数（Noneの場合はそのまま返す）
+
+    Returns:
+        ダウンサンプリング済みの株価データ
+    """
+    points = stock.get("data_points", [])
+    n = len(points)
+    if max_points is None or n <= max_points:
+        return stock
+
+    opens = np.array([p["open"] for p in points], dtype=float)
+    highs = np.array([p["high"] for p in points], dtype=float)
+    lows = np.array([p["low"] for p in points], dtype=float)
+    closes = np.array([p["close"] for p in points], dtype=float)
+    volumes = np.array([p["volume"] for p in points], dtype=np.int64)
+
+    starts = bucket_starts(n, max_points)
+    buckets = aggregate_ohlc(starts, opens, highs, lows, closes, volumes)
+
+    data_points: List[Dict[str, Any]] = [
+        {
+            "date": points[start]["date"],
+            "open": round(float(o), 2),
+            "high": round(float(h), 2),
+            "low": round(float(l), 2),
+            "close": round(float(c), 2),
+            "volume": int(v),
+        }
+        for start, o, h, l, c, v in zip(
+            starts.tolist(), buckets["open"], buckets["high"], buckets["low"], buckets["close"], buckets["volume"]
+        )
+    ]
+
+    result = dict(stock)
+    result["data_points"] = data_points
+    result["downsampling"] = {"method": "ohlc", "original_points": n, "points": len(data_points)}
+    return result
+
+
+def downsample_index_data(index: Dict[str, Any], max_points: Optional[int]) -> Dict[str, Any]:
+    """
+    インデックスデータ（dates/values）をLTTBでダウンサンプリング
+
+    前日比・騰落率は選択された点同士の差分として再計算する
+
+    Args:
+        index: IndexServiceが返す単一インデックスのデータ
+        max_points: 最大データ点数（Noneの場合はそのまま返す）
+
+    Returns:
+        ダウンサンプリング済みのインデックスデータ
+    """
+    values = index.get("values", [])
+    n = len(values)
+    if max_points is None or n <= max_points:
+        return index
+
+    value_array = np.asarray(values, dtype=float)
+    selected = lttb_indices(value_array, max_points)
+    picked = value_array[selected]
+
+    prev = picked[:-1]
+    diff = np.diff(picked)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        percent = np.where(prev != 0, diff / prev * 100, 0.0)
+    changes = np.concatenate(([0.0], np.where(prev != 0, diff, 0.0))).round(2)
+    change_percent = np.concatenate(([0.0], percent)).round(2)
+
+    dates = index.get("dates", [])
+    result = dict(index)
+    result["dates"] = [dates[i] for i in selected.tolist()]
+    result["values"] = picked.round(2).tolist()
+    result["changes"] = changes.tolist()
+    result["changePercent"] = change_percent.tolist()
+    result["downsampling"] = {"method": "lttb", "original_points": n, "points": len(selected)}
+    return result
+
+
+def downsample_weather_data(weather: Dict[str, Any], max_points: Optional[int]) -> Dict[str, Any]:
+    """
+    気象データをバケット集約でダウンサンプリング
+
+    各変数は VARIABLES の集約方法（sum/mean/max/min）でバケット内を集約する
+    （欠損値はバケット内で除外して集約。VARIABLES にない列は平均）
+
+    Args:
+        weather: WeatherServiceが返すレスポンスの "data" 部分
+        max_points: 最大データ点数（Noneの場合はそのまま返す）
+
+    Returns:
+        ダウンサンプリング済みの気象データ
+    """
+    dates = weather.get("dates", [])
+    n = len(dates)
+    if max_points is None or n <= max_points:
+        return weather
+
+    starts = bucket_starts(n, max_points)
+
+    result = dict(weather)
+    result["dates"] = [dates[i] for i in starts.tolist()]
+    for key, values in weather.items():
+        if key == "dates" or not isinstance(values, list) or len(values) != n:
+            continue
+        how = VARIABLES[key]["aggregate"] if key in VARIABLES else "mean"
+        result[key] = to_json_list(reduce_buckets(to_array(values), starts, how))
+    result["downsampling"] = {"method": "bucket", "original_points": n, "points": len(starts)}
+    return result
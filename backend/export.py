@@ -0,0 +1,157 @@
+"""
+バイナリ形式のエクスポート
+キャッシュ済みの列指向の系列（backend.series）から Apache Arrow のテーブルを組み立て、
+Arrow IPC ストリームまたは Parquet として返す。
+欠損のない数値列は NumPy 配列のバッファをコピーせずに Arrow の配列として参照する。
+
+pyarrow はエクスポート専用のオプション依存で、未インストールの場合は ExportUnavailableError を送出する。
+"""
+
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from backend.series import DailySeries, OHLCVSeries
+
+# 形式 -> (Content-Type, 拡張子)
+EXPORT_FORMATS = {
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+# エクスポート可能な列（symbol と date は常に含める）
+STOCK_COLUMNS = ("open", "high", "low", "close", "volume")
+INDEX_COLUMNS = ("value",)
+
+
+class ExportUnavailableError(RuntimeError):
+    """エクスポートに必要な pyarrow がインストールされていない場合の例外"""
+
+
+def import_pyarrow():
+    """pyarrow をインポート（未インストールの場合は ExportUnavailableError）"""
+    try:
+        import pyarrow
+    except ImportError as e:
+        raise ExportUnavailableError("エクスポートには pyarrow が必要です（pip install pyarrow）") from e
+    return pyarrow
+
+
+def validate_format(fmt: str) -> None:
+    """出力形式の妥当性チェック（不正時はValueError）"""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"無効な出力形式: {fmt}. 有効な形式: {list(EXPORT_FORMATS)}")
+
+
+def parse_columns(columns: Optional[str], available: Sequence[str]) -> List[str]:
+    """
+    列指定（カンマ区切り）を解析
+
+    Args:
+        columns: 列名のカンマ区切り（省略時は全列）
+        available: 指定可能な列名
+
+    Returns:
+        列名のリスト（available の並び順）
+    """
+    if not columns:
+        return list(available)
+    requested = {name.strip() for name in columns.split(",") if name.strip()}
+    unknown = sorted(requested - set(available))
+    if unknown:
+        raise ValueError(f"無効な列: {unknown}. 有効な列: {list(available)}")
+    return [name for name in available if name in requested]
+
+
+def _numeric_array(pa, values: np.ndarray, arrow_type):
+    """
+    数値列をArrowの配列に変換
+
+    欠損（NaN）がなければバッファをコピーせずに参照し、欠損がある場合はnullに変換する
+    """
+    if values.dtype.kind == "f" and np.isnan(values).any():
+        return pa.array(values, type=arrow_type, from_pandas=True)
+    values = np.ascontiguousarray(values)
+    return pa.Array.from_buffers(arrow_type, len(values), [None, pa.py_buffer(values)])
+
+
+def _utc_offset(offset_ns: int) -> str:
+    """UTCからのオフセットをArrowのタイムゾーン表記（+09:00 など）に変換"""
+    minutes = offset_ns // 60_000_000_000
+    sign = "+" if minutes >= 0 else "-"
+    return f"{sign}{abs(minutes) // 60:02d}:{abs(minutes) % 60:02d}"
+
+
+def stock_table(items: Sequence[Tuple[str, OHLCVSeries]], columns: Sequence[str]):
+    """
+    銘柄ごとの日足の系列から1つのArrowテーブルを組み立てる
+
+    Args:
+        items: (銘柄コード, 日足の系列) のリスト
+        columns: 出力する列（STOCK_COLUMNS の部分集合）
+
+    Returns:
+        pyarrow.Table（symbol, date, 指定列）
+    """
+    pa = import_pyarrow()
+    types = {"open": pa.float64(), "high": pa.float64(), "low": pa.float64(),
+             "close": pa.float64(), "volume": pa.int64()}
+    sources = {"open": "opens", "high": "highs", "low": "lows", "close": "closes", "volume": "volumes"}
+    tables = []
+    for symbol, series in items:
+        date_type = pa.timestamp("ns", tz=_utc_offset(series.utc_offset_ns))
+        arrays = {
+            "symbol": pa.repeat(pa.scalar(symbol, pa.string()), len(series)),
+            "date": _numeric_array(pa, series.timestamps, date_type),
+        }
+        for name in columns:
+            arrays[name] = _numeric_array(pa, getattr(series, sources[name]), types[name])
+        tables.append(pa.table(arrays))
+    # 銘柄ごとのテーブルはチャンクとして連結する（コピーしない）
+    return pa.concat_tables(tables)
+
+
+def index_table(items: Sequence[Tuple[str, DailySeries]], columns: Sequence[str]):
+    """
+    指数ごとの終値の系列から1つのArrowテーブルを組み立てる
+
+    Args:
+        items: (銘柄コード, 終値の日次系列) のリスト
+        columns: 出力する列（INDEX_COLUMNS の部分集合）
+
+    Returns:
+        pyarrow.Table（symbol, date, 指定列）
+    """
+    pa = import_pyarrow()
+    tables = []
+    for symbol, series in items:
+        arrays = {
+            "symbol": pa.repeat(pa.scalar(symbol, pa.string()), len(series)),
+            "date": pa.array(series.dates, type=pa.date32()),
+        }
+        for name in columns:
+            arrays[name] = _numeric_array(pa, series[name], pa.float64())
+        tables.append(pa.table(arrays))
+    return pa.concat_tables(tables)
+
+
+def write_table(table, fmt: str) -> memoryview:
+    """
+    テーブルを指定形式でシリアライズ
+
+    Args:
+        table: pyarrow.Table
+        fmt: 出力形式（arrow / parquet）
+
+    Returns:
+        シリアライズ結果（Arrowのバッファを参照するmemoryview）
+    """
+    pa = import_pyarrow()
+    sink = pa.BufferOutputStream()
+    if fmt == "arrow":
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+    else:
+        import pyarrow.parquet as pq
+        pq.write_table(table, sink, compression="zstd")
+    return memoryview(sink.getvalue())
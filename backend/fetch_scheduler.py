@@ -0,0 +1,376 @@
+"""
+上流呼び出しのスケジューラー
+株価・インデックス・気象の各サービスの上流呼び出し（backend.upstream_policy.call_upstream）は、
+すべてこのスケジューラーで取得元ごとの同時実行数の枠を得てから実行する。
+
+優先度:
+    interactive  APIリクエストの処理中の呼び出し
+    prefetch     キャッシュの裏での再取得など、リクエスト外の呼び出し（既定）
+    backfill     過去データのバックフィル（backend.backfill）
+
+枠が空くと優先度の高い順（同じ優先度では到着順）に実行する。
+prefetch・backfill が同時に使える枠は全体の一定割合までとし、
+大量のバックフィル中でも APIリクエストの呼び出しがすぐに枠を得られるようにする。
+同じキーの呼び出しが待機中・実行中の場合は新たに呼び出さず、その結果を共有する
+（後から来た方の優先度が高い場合は待機中の呼び出しの優先度を引き上げる）。
+
+環境変数:
+    STACK_WATCHER_FETCH_CONCURRENCY: 取得元ごとの同時実行数（既定 yahoo=8,openmeteo=4。記載のない取得元は8）
+    STACK_WATCHER_FETCH_BACKGROUND_SHARE: prefetch・backfill が使える枠の割合（既定0.5）
+
+優先度は contextvars で引き継ぐため、別スレッドで行う処理は bind_priority() を経由して呼び出す。
+
+fetch が別スレッドに投入した処理を待たずに戻る場合（タイムアウトで打ち切った上流の呼び出しなど）は、
+hold_slot() で枠を確保しておき、その処理が終わるまで枠を解放しない（実行中の呼び出しが同時実行数を超えない）。
+"""
+
+import contextvars
+import functools
+import heapq
+import itertools
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
+
+from backend.lazy import lazy_singleton
+from backend.tracing import span
+
+T = TypeVar("T")
+
+# 優先度（値が小さいほど先に実行する）
+PRIORITIES = {"interactive": 0, "prefetch": 1, "backfill": 2}
+DEFAULT_PRIORITY = "prefetch"
+
+DEFAULT_CONCURRENCY = 8
+DEFAULT_LIMITS = {"yahoo": 8, "openmeteo": 4}
+DEFAULT_BACKGROUND_SHARE = 0.5
+
+# 処理中の呼び出しの優先度
+_priority: contextvars.ContextVar[str] = contextvars.ContextVar("fetch_priority", default=DEFAULT_PRIORITY)
+
+# 実行中の呼び出し（hold_slot で枠を確保する対象）
+_running: contextvars.ContextVar[Optional[Tuple["FetchScheduler", "_SourceQueue", "_Request"]]] = \
+    contextvars.ContextVar("fetch_running", default=None)
+
+
+class QueueTimeoutError(TimeoutError):
+    """期限内に実行の枠を得られない場合の例外"""
+
+
+@contextmanager
+def fetch_priority(name: str) -> Iterator[None]:
+    """
+    この中で行う上流の呼び出しの優先度を設定する
+
+    Args:
+        name: 優先度（interactive / prefetch / backfill）
+    """
+    if name not in PRIORITIES:
+        raise ValueError(f"サポートされていない優先度: {name}")
+    token = _priority.set(name)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority() -> str:
+    return _priority.get()
+
+
+def bind_priority(func: Callable[..., Any]) -> Callable[..., Any]:
+    """現在の優先度で func を実行する関数を返す（スレッドプールへの投入用）"""
+    priority = _priority.get()
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with fetch_priority(priority):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def hold_slot() -> Callable[[], None]:
+    """
+    実行中の呼び出しの枠を、返した関数を呼ぶまで解放しないようにする
+
+    fetch が戻った後も続く処理（別スレッドの上流の呼び出し）の終了時に、返した関数を呼ぶ。
+    スケジューラーの外で呼んだ場合は何もしない関数を返す。
+    """
+    running = _running.get()
+    if running is None:
+        return lambda: None
+    scheduler, queue, request = running
+    return scheduler._hold(queue, request)
+
+
+class _Request:
+    """待機中・実行中の1件の呼び出し"""
+
+    __slots__ = ("key", "rank", "state", "granted", "done", "result", "error", "queued_at", "holds")
+
+    def __init__(self, key: Optional[str], rank: int):
+        self.key = key
+        self.rank = rank
+        self.state = "queued"
+        self.granted = threading.Event()
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.queued_at = time.monotonic()
+        # 枠を解放するまでに終わるべき処理の数（fetch 自身と hold_slot で確保した分）
+        self.holds = 1
+
+
+class _SourceQueue:
+    """取得元ごとの待ち行列と実行中の件数"""
+
+    def __init__(self, limit: int, background_limit: int):
+        self.limit = limit
+        self.background_limit = background_limit
+        self.running = 0
+        self.background_running = 0
+        self.heap: List[Tuple[int, int, _Request]] = []
+        self.keys: Dict[str, _Request] = {}
+        self.depth = [0] * len(PRIORITIES)
+        self.max_depth = 0
+        self.submitted = [0] * len(PRIORITIES)
+        self.deduplicated = 0
+        self.timeouts = 0
+        self.wait_total = [0.0] * len(PRIORITIES)
+        self.wait_max = [0.0] * len(PRIORITIES)
+        self.started = [0] * len(PRIORITIES)
+
+    def _top(self) -> Optional[_Request]:
+        """先頭の待機中の呼び出し（取り消し・優先度の引き上げで残った古い項目は捨てる）"""
+        while self.heap:
+            rank, _, request = self.heap[0]
+            if request.state == "queued" and request.rank == rank:
+                return request
+            heapq.heappop(self.heap)
+        return None
+
+    def can_start(self, rank: int) -> bool:
+        if self.running >= self.limit:
+            return False
+        return rank == 0 or self.background_running < self.background_limit
+
+    def admit(self, request: _Request, seq: int) -> None:
+        """空きがあり先に待つ呼び出しもなければ実行中に、それ以外は待ち行列に入れる"""
+        top = self._top()
+        if (top is None or top.rank > request.rank) and self.can_start(request.rank):
+            self._start(request)
+            return
+        heapq.heappush(self.heap, (request.rank, seq, request))
+        self.depth[request.rank] += 1
+        self.max_depth = max(self.max_depth, sum(self.depth))
+
+    def promote(self, request: _Request, rank: int, seq: int) -> None:
+        """待機中の呼び出しの優先度を引き上げる"""
+        self.depth[request.rank] -= 1
+        self.depth[rank] += 1
+        request.rank = rank
+        heapq.heappush(self.heap, (rank, seq, request))
+        self.dispatch()
+
+    def cancel(self, request: _Request) -> None:
+        request.state = "cancelled"
+        self.depth[request.rank] -= 1
+        self.timeouts += 1
+        if request.key is not None:
+            self.keys.pop(request.key, None)
+
+    def _start(self, request: _Request) -> None:
+        request.state = "running"
+        self.running += 1
+        self.background_running += request.rank > 0
+        waited = time.monotonic() - request.queued_at
+        self.started[request.rank] += 1
+        self.wait_total[request.rank] += waited
+        self.wait_max[request.rank] = max(self.wait_max[request.rank], waited)
+        request.granted.set()
+
+    def finish(self, request: _Request) -> None:
+        """fetch を終えた呼び出しを結果の共有の対象から外す"""
+        request.state = "done"
+        if request.key is not None and self.keys.get(request.key) is request:
+            del self.keys[request.key]
+
+    def release(self, request: _Request) -> None:
+        """枠を確保している処理を1つ終え、すべて終わったら枠を解放する"""
+        request.holds -= 1
+        if request.holds > 0:
+            return
+        self.running -= 1
+        self.background_running -= request.rank > 0
+        self.dispatch()
+
+    def dispatch(self) -> None:
+        """空いている枠を待機中の呼び出しに優先度順に割り当てる"""
+        while True:
+            top = self._top()
+            if top is None or not self.can_start(top.rank):
+                break
+            heapq.heappop(self.heap)
+            self.depth[top.rank] -= 1
+            self._start(top)
+
+    def stats(self) -> Dict[str, Any]:
+        by_priority = {}
+        for name, rank in PRIORITIES.items():
+            started = self.started[rank]
+            by_priority[name] = {
+                "queued": self.depth[rank],
+                "submitted": self.submitted[rank],
+                "wait_ms_avg": round(self.wait_total[rank] / started * 1000, 1) if started else None,
+                "wait_ms_max": round(self.wait_max[rank] * 1000, 1),
+            }
+        return {
+            "limit": self.limit,
+            "background_limit": self.background_limit,
+            "running": self.running,
+            "queued": sum(self.depth),
+            "max_queued": self.max_depth,
+            "deduplicated": self.deduplicated,
+            "timeouts": self.timeouts,
+            "priorities": by_priority,
+        }
+
+
+class FetchScheduler:
+    """取得元ごとの同時実行数の枠を優先度順に割り当てるスケジューラー"""
+
+    def __init__(self, limits: Optional[Dict[str, int]] = None, default_limit: int = DEFAULT_CONCURRENCY,
+                 background_share: float = DEFAULT_BACKGROUND_SHARE):
+        self.limits = dict(DEFAULT_LIMITS if limits is None else limits)
+        self.default_limit = default_limit
+        self.background_share = background_share
+        self._lock = threading.Lock()
+        self._queues: Dict[str, _SourceQueue] = {}
+        self._seq = itertools.count()
+
+    def _queue(self, source: str) -> _SourceQueue:
+        queue = self._queues.get(source)
+        if queue is None:
+            limit = max(1, self.limits.get(source, self.default_limit))
+            queue = _SourceQueue(limit, max(1, math.floor(limit * self.background_share)))
+            self._queues[source] = queue
+        return queue
+
+    def run(self, source: str, fetch: Callable[[], T], key: Optional[str] = None,
+            priority: Optional[str] = None, timeout: Optional[float] = None) -> T:
+        """
+        実行の枠を得てから fetch を呼び出し側のスレッドで実行する
+
+        Args:
+            source: 取得元（yahoo / openmeteo）
+            fetch: 上流を呼び出す関数
+            key: 呼び出しの識別子（同じキーの待機中・実行中の呼び出しとは結果を共有する。Noneは共有しない）
+            priority: 優先度（省略時は現在の優先度）
+            timeout: 枠・共有する結果を待つ上限（秒、Noneは無制限）
+
+        Returns:
+            fetch の戻り値
+
+        Raises:
+            QueueTimeoutError: timeout 以内に枠・結果を得られない
+        """
+        priority = priority or current_priority()
+        rank = PRIORITIES[priority]
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with span("upstream.queue", source=source, priority=priority) as current:
+            while True:
+                with self._lock:
+                    queue = self._queue(source)
+                    queue.submitted[rank] += 1
+                    shared = queue.keys.get(key) if key is not None else None
+                    if shared is None:
+                        request = _Request(key, rank)
+                        if key is not None:
+                            queue.keys[key] = request
+                        queue.admit(request, next(self._seq))
+                        break
+                    queue.deduplicated += 1
+                    if shared.state == "queued" and rank < shared.rank:
+                        queue.promote(shared, rank, next(self._seq))
+                if current is not None:
+                    current.set("shared", True)
+                if not shared.done.wait(self._left(deadline)):
+                    raise QueueTimeoutError(f"{source}: 同じ呼び出しの結果を期限内に得られません")
+                if shared.state == "cancelled":
+                    # 共有していた呼び出しが期限切れで取り消された場合は自分で呼び出す
+                    continue
+                if shared.error is not None:
+                    raise shared.error
+                return shared.result
+
+            if not request.granted.wait(self._left(deadline)):
+                with self._lock:
+                    if request.state == "queued":
+                        queue.cancel(request)
+                        request.done.set()
+                        raise QueueTimeoutError(f"{source}: 期限内に実行の枠を得られません")
+            if current is not None:
+                current.set("wait_ms", round((time.monotonic() - request.queued_at) * 1000, 1))
+
+        token = _running.set((self, queue, request))
+        try:
+            request.result = fetch()
+            return request.result
+        except BaseException as e:
+            request.error = e
+            raise
+        finally:
+            _running.reset(token)
+            with self._lock:
+                queue.finish(request)
+                queue.release(request)
+            request.done.set()
+
+    def _hold(self, queue: _SourceQueue, request: _Request) -> Callable[[], None]:
+        with self._lock:
+            request.holds += 1
+        released = threading.Event()
+
+        def release() -> None:
+            # 複数回呼ばれても1回だけ解放する
+            with self._lock:
+                if released.is_set():
+                    return
+                released.set()
+                queue.release(request)
+        return release
+
+    @staticmethod
+    def _left(deadline: Optional[float]) -> Optional[float]:
+        return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+    def stats(self) -> Dict[str, Any]:
+        """取得元ごとの同時実行数・待ち行列の長さ（優先度別）・待ち時間"""
+        with self._lock:
+            return {source: queue.stats() for source, queue in sorted(self._queues.items())}
+
+
+def parse_limits(value: str) -> Dict[str, int]:
+    """カンマ区切りの「取得元=同時実行数」（yahoo=8,openmeteo=4）を辞書に変換"""
+    limits = {}
+    for item in value.split(","):
+        if item.strip():
+            source, _, limit = item.partition("=")
+            limits[source.strip()] = int(limit)
+    return limits
+
+
+def create_fetch_scheduler() -> FetchScheduler:
+    """環境変数の設定からスケジューラーを生成"""
+    limits = os.getenv("STACK_WATCHER_FETCH_CONCURRENCY")
+    return FetchScheduler(
+        limits=parse_limits(limits) if limits else None,
+        background_share=float(os.getenv("STACK_WATCHER_FETCH_BACKGROUND_SHARE", str(DEFAULT_BACKGROUND_SHARE))),
+    )
+
+
+# プロセス共通のスケジューラー
+get_fetch_scheduler = lazy_singleton(create_fetch_scheduler)
@@ -3,16 +3,32 @@
 日経225、TOPIX、マザーズ指数のデータを取得・処理するサービス
 """
 
-import yfinance as yf
-import pandas as pd
+import os
 from datetime import datetime, timedelta
 from typing import List, Dict, Any, Optional
 import logging
+import threading
+import time
+
+import numpy as np
+
+from backend.alerts import get_alert_engine
+from backend.cache import get_cache
+from backend.lazy import lazy_singleton
+from backend.rollups import Rollups
+from backend.series import CALENDAR_INTERVALS, DailySeries
+from backend.series_store import SeriesRangeStore, parse_date_range, next_day
+from backend.tracing import traced
+from backend.upstream import make_ticker
 
-# ログ設定
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 期間ごとの取得日数
+PERIOD_DAYS = {"7d": 7, "1m": 30, "3m": 90}
+
+# 対応する足種（日足と、集計済みの週足・月足）
+INTERVALS = ["1d", *CALENDAR_INTERVALS]
+
 class IndexService:
     """インデックスデータの取得と処理を担当するサービスクラス"""
     
@@ -37,142 +53,397 @@ class IndexService:
     
     def __init__(self):
         """IndexServiceの初期化"""
+        # 取得結果キャッシュ（共有キャッシュ設定時は全ワーカーで共有）
+        self.cache = get_cache()
+        self.cache_ttl_seconds = int(os.getenv("CACHE_STOCK_DATA_SECONDS", "900"))
+        
+        # 日付範囲クエリ用の取得済み系列ストア
+        self.range_store = SeriesRangeStore(
+            ttl_seconds=self.cache_ttl_seconds, cache=self.cache, namespace="index:range"
+        )
+        
+        # 週足・月足のロールアップ（取得した終値から差分で更新し、長期間の表示で再集計しない）
+        self.rollup_ttl_seconds = int(os.getenv("CACHE_ROLLUP_SECONDS", str(7 * 24 * 3600)))
+        self._rollup_lock = threading.Lock()
+        
+        # 新しく取得した終値をしきい値アラートで評価する
+        self.alerts = get_alert_engine()
         logger.info("IndexService初期化完了")
     
     def get_period_days(self, period: str) -> int:
         """期間文字列を日数に変換"""
-        period_mapping = {
-            "7d": 7,
-            "1m": 30,
-            "3m": 90
-        }
-        return period_mapping.get(period, 7)
+        return PERIOD_DAYS.get(period, 7)
     
     def calculate_changes(self, values: List[float]) -> tuple[List[float], List[float]]:
         """前日比と騰落率を計算"""
+        values = np.asarray(values, dtype=np.float64)
+        changes = np.zeros(len(values))
+        change_percent = np.zeros(len(values))
         if len(values) < 2:
-            return [0.0] * len(values), [0.0] * len(values)
+            return changes.tolist(), change_percent.tolist()
         
-        changes = []
-        change_percent = []
+        prev_values = values[:-1]
+        diffs = values[1:] - prev_values
+        # 前日値が0の日は0.0とする
+        valid = prev_values != 0
+        changes[1:] = np.where(valid, np.round(diffs, 2), 0.0)
+        change_percent[1:] = np.where(
+            valid, np.round(diffs / np.where(valid, prev_values, 1.0) * 100, 2), 0.0
+        )
+        return changes.tolist(), change_percent.tolist()
+    
+    def _build_index_entry(self, symbol: str, series: DailySeries) -> Dict[str, Any]:
+        """終値の系列からレスポンス用のインデックスデータを組み立てる"""
+        values = series["value"]
+        # 前日比と騰落率を計算
+        changes, change_percent = self.calculate_changes(values)
         
-        for i in range(len(values)):
-            if i == 0:
-                changes.append(0.0)
-                change_percent.append(0.0)
-            else:
-                prev_value = values[i-1]
-                current_value = values[i]
-                
-                if prev_value != 0:
-                    change = current_value - prev_value
-                    percent = (change / prev_value) * 100
-                    changes.append(round(change, 2))
-                    change_percent.append(round(percent, 2))
-                else:
-                    changes.append(0.0)
-                    change_percent.append(0.0)
-        
-        return changes, change_percent
-    
-    def get_index_data(self, symbols: List[str] = None, period: str = "7d") -> Dict[str, Any]:
+        return {
+            "name": self.INDEX_SYMBOLS[symbol]["name"],
+            "symbol": symbol,
+            "dates": series.date_strings(),
+            "values": values.tolist(),
+            "changes": changes,
+            "changePercent": change_percent,
+            "description": self.INDEX_SYMBOLS[symbol]["description"]
+        }
+    
+    @traced("index.get_index_data")
+    def get_index_data(self, symbols: List[str] = None, period: str = "7d",
+                       start: Optional[str] = None, end: Optional[str] = None,
+                       interval: str = "1d") -> Dict[str, Any]:
         """
         インデックスデータを取得
         
         Args:
             symbols: 取得する銘柄リスト（None時は全銘柄）
             period: 期間（7d, 1m, 3m）
+            start: 開始日 (YYYY-MM-DD、指定時はperiodより優先)
+            end: 終了日 (YYYY-MM-DD、省略時は本日)
+            interval: 足種（1d, 1wk, 1mo。週足・月足は各週・月の最後の終値）
             
         Returns:
             インデックスデータの辞書
         """
+        if interval not in INTERVALS:
+            raise ValueError(f"サポートされていない足種: {interval}. 有効な足種: {INTERVALS}")
         if symbols is None:
             symbols = list(self.INDEX_SYMBOLS.keys())
         
-        logger.info(f"インデックスデータ取得開始: {symbols}, 期間: {period}")
+        logger.info(f"インデックスデータ取得開始: {symbols}, 期間: {period}, 足種: {interval}")
         
         result = {
             "success": True,
             "data": {},
             "period": period,
+            "interval": interval,
             "lastUpdated": datetime.now().isoformat()
         }
         
+        date_range = parse_date_range(start, end)
+        if date_range is not None:
+            result["start"], result["end"] = date_range
+            for symbol in symbols:
+                if symbol not in self.INDEX_SYMBOLS:
+                    logger.warning(f"未知のインデックス銘柄: {symbol}")
+                    continue
+                result["data"][symbol] = self._get_index_range(symbol, *date_range, interval)
+            return result
+        
         days = self.get_period_days(period)
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=days + 5)  # 余裕をもって取得
         
         for symbol in symbols:
             if symbol not in self.INDEX_SYMBOLS:
                 logger.warning(f"未知のインデックス銘柄: {symbol}")
                 continue
-                
-            try:
-                logger.info(f"情報: {symbol} ({self.INDEX_SYMBOLS[symbol]['name']}) の実データを取得中...")
-                
-                # yfinanceでデータ取得
-                ticker = yf.Ticker(symbol)
-                hist = ticker.history(
-                    start=start_date.strftime('%Y-%m-%d'),
-                    end=end_date.strftime('%Y-%m-%d'),
-                    interval='1d'
-                )
-                
-                if hist.empty:
-                    logger.error(f"エラー: {symbol}のデータが取得できませんでした")
-                    # フォールバックデータ
-                    result["data"][symbol] = self._get_fallback_data(symbol, days)
-                    continue
-                
-                # 最新のN日分のデータを取得
-                hist = hist.tail(days)
-                
-                # データ処理
-                dates = [date.strftime('%Y-%m-%d') for date in hist.index]
-                values = hist['Close'].round(2).tolist()
-                
-                # 前日比と騰落率を計算
-                changes, change_percent = self.calculate_changes(values)
-                
-                result["data"][symbol] = {
-                    "name": self.INDEX_SYMBOLS[symbol]["name"],
-                    "symbol": symbol,
-                    "dates": dates,
-                    "values": values,
-                    "changes": changes,
-                    "changePercent": change_percent,
-                    "description": self.INDEX_SYMBOLS[symbol]["description"]
-                }
-                
-                logger.info(f"成功: {symbol}の実データを取得しました（{len(dates)}日分）")
-                
-            except Exception as e:
-                logger.error(f"エラー: {symbol}のデータ取得でエラーが発生: {str(e)}")
-                # エラー時はフォールバックデータを使用
+            
+            if interval in CALENDAR_INTERVALS:
+                today = datetime.now()
+                series = self._get_rollup_series(symbol, (today - timedelta(days=days)).strftime('%Y-%m-%d'),
+                                                 today.strftime('%Y-%m-%d'), interval, period)
+            else:
+                series = self._get_period_series(symbol, period)
+            # 取得できない場合はフォールバックデータを使用
+            if series is None:
                 result["data"][symbol] = self._get_fallback_data(symbol, days)
+            else:
+                result["data"][symbol] = self._build_index_entry(symbol, series)
         
         return result
     
-    def get_single_index(self, symbol: str, period: str = "7d") -> Dict[str, Any]:
+    def get_index_series(self, symbol: str, period: str = "7d",
+                         start: Optional[str] = None, end: Optional[str] = None) -> Optional[DailySeries]:
+        """
+        終値の日次系列を取得（エクスポート用。フォールバックデータは返さない）
+        
+        Args:
+            symbol: 銘柄コード
+            period: 期間（7d, 1m, 3m）
+            start: 開始日 (YYYY-MM-DD、指定時はperiodより優先)
+            end: 終了日 (YYYY-MM-DD、省略時は本日)
+            
+        Returns:
+            終値の日次系列。上流から取得できない場合はNone
+        """
+        if symbol not in self.INDEX_SYMBOLS:
+            raise ValueError(f"未知のインデックス銘柄: {symbol}")
+        
+        date_range = parse_date_range(start, end)
+        if date_range is not None:
+            return self._get_range_series(symbol, *date_range)
+        
+        valid_periods = ["7d", "1m", "3m"]
+        if period not in valid_periods:
+            raise ValueError(f"無効な期間: {period}. 有効な期間: {valid_periods}")
+        return self._get_period_series(symbol, period)
+    
+    def _get_period_series(self, symbol: str, period: str) -> Optional[DailySeries]:
+        """期間指定の終値の系列を取得（キャッシュ優先、取得できない場合はNone）"""
+        days = self.get_period_days(period)
+        series = self.cache.get_or_fetch(
+            f"index:{symbol}:{period}",
+            lambda: self._fetch_index_series(symbol, days),
+            self.cache_ttl_seconds
+        )
+        if series is None:
+            # 上流の失敗・期限切れ時は、より長い期間のキャッシュ（期限切れを含む）から切り出す
+            series = self._get_cached_fallback(symbol, period)
+        return series
+    
+    def _get_cached_fallback(self, symbol: str, period: str) -> Optional[DailySeries]:
+        """より長い期間のキャッシュ済みの系列から、直近N日分を切り出す（なければNone）"""
+        if period not in PERIOD_DAYS:
+            return None
+        periods = list(PERIOD_DAYS)
+        days = self.get_period_days(period)
+        for longer in periods[periods.index(period) + 1:]:
+            entry = self.cache.get_entry(f"index:{symbol}:{longer}")
+            if entry is not None and entry.value is not None and len(entry.value.dates):
+                logger.info(f"{symbol}の{period}はキャッシュ済みの{longer}から切り出します")
+                dates = entry.value.dates[-days:]
+                return entry.value.slice(str(dates[0]), str(dates[-1]))
+        return None
+    
+    @staticmethod
+    def _close_series(hist) -> DailySeries:
+        """yfinanceのhistory()結果から終値の日次系列を生成"""
+        return DailySeries(
+            hist.index.strftime('%Y-%m-%d').to_numpy(dtype="datetime64[D]"),
+            {"value": hist['Close'].round(2).to_numpy()},
+        )
+    
+    @traced("index._fetch_index_series")
+    def _fetch_index_series(self, symbol: str, days: int) -> Optional[DailySeries]:
+        """
+        yfinanceから直近N日分のインデックスデータを取得
+        
+        Args:
+            symbol: 銘柄コード
+            days: 日数
+            
+        Returns:
+            終値の日次系列。取得できない場合はNone
+        """
+        end_date = datetime.now()
+        start_date = end_date - timedelta(days=days + 5)  # 余裕をもって取得
+        
+        try:
+            logger.info(f"情報: {symbol} ({self.INDEX_SYMBOLS[symbol]['name']}) の実データを取得中...")
+            
+            # yfinanceでデータ取得
+            ticker = self._ticker(symbol)
+            hist = ticker.history(
+                start=start_date.strftime('%Y-%m-%d'),
+                end=end_date.strftime('%Y-%m-%d'),
+                interval='1d'
+            )
+            
+            if hist.empty:
+                logger.error(f"エラー: {symbol}のデータが取得できませんでした")
+                return None
+            
+            # 最新のN日分のデータを取得
+            hist = hist.tail(days)
+            
+            logger.info(f"成功: {symbol}の実データを取得しました（{len(hist)}日分）")
+            series = self._close_series(hist)
+            self.alerts.ingest("index", symbol, series.dates.astype("int64"), {"value": series["value"]})
+            self._update_rollups(symbol, series, str(series.dates[0]), end_date.strftime('%Y-%m-%d'))
+            return series
+            
+        except Exception as e:
+            logger.error(f"エラー: {symbol}のデータ取得でエラーが発生: {str(e)}")
+            return None
+    
+    @traced("index._get_index_range")
+    def _get_index_range(self, symbol: str, start: str, end: str, interval: str = "1d") -> Dict[str, Any]:
+        """
+        日付範囲を指定して単一インデックスのデータを取得
+        
+        Args:
+            symbol: 銘柄コード
+            start: 開始日 (YYYY-MM-DD)
+            end: 終了日 (YYYY-MM-DD)
+            interval: 足種（1d, 1wk, 1mo）
+            
+        Returns:
+            インデックスデータ
+        """
+        if interval in CALENDAR_INTERVALS:
+            series = self._get_rollup_series(symbol, start, end, interval)
+        else:
+            series = self._get_range_series(symbol, start, end)
+        if series is None:
+            days = (datetime.strptime(end, '%Y-%m-%d') - datetime.strptime(start, '%Y-%m-%d')).days + 1
+            return self._get_fallback_data(symbol, days, end_date=datetime.strptime(end, '%Y-%m-%d'))
+        return self._build_index_entry(symbol, series)
+    
+    def _get_range_series(self, symbol: str, start: str, end: str) -> Optional[DailySeries]:
+        """
+        日付範囲の終値の系列を取得
+        
+        取得済みの系列がある場合は二分探索で範囲を切り出し、
+        不足している場合のみ既存範囲との和集合を上流から取得する
+        
+        Returns:
+            終値の日次系列。上流から取得できない場合はNone
+        """
+        series = self.range_store.get(symbol, start, end)
+        if series is not None:
+            return series
+        
+        fetch_start, fetch_end = self.range_store.fetch_range(symbol, start, end)
+        started = time.monotonic()
+        try:
+            logger.info(f"情報: {symbol} の {fetch_start}〜{fetch_end} の実データを取得中...")
+            ticker = self._ticker(symbol)
+            hist = ticker.history(start=fetch_start, end=next_day(fetch_end), interval='1d')
+        except Exception as e:
+            logger.error(f"エラー: {symbol}のデータ取得でエラーが発生: {str(e)}")
+            return None
+        
+        if hist.empty:
+            logger.error(f"エラー: {symbol}の{fetch_start}〜{fetch_end}のデータが取得できませんでした")
+            return None
+        
+        series = self._close_series(hist)
+        self.range_store.put(symbol, series, fetch_start, fetch_end, cost=time.monotonic() - started)
+        self._update_rollups(symbol, series, fetch_start, fetch_end)
+        return self.range_store.get(symbol, start, end)
+    
+    def _update_rollups(self, symbol: str, series: DailySeries, start: str, end: str) -> Rollups:
+        """
+        取得した終値を週足・月足のロールアップに反映（変更のあった週・月だけを集計し直す）
+        
+        Args:
+            symbol: 銘柄コード
+            series: 取得した終値の日次系列
+            start: 取得した範囲の開始日 (YYYY-MM-DD)
+            end: 取得した範囲の終了日 (YYYY-MM-DD)
+            
+        Returns:
+            反映後のロールアップ
+        """
+        key = f"index:rollup:{symbol}"
+        with self._rollup_lock:
+            rollups = self.cache.get(key)
+            rollups = Rollups(series, start, end) if rollups is None else rollups.merge(series, start, end)
+            self.cache.set(key, rollups, self.rollup_ttl_seconds)
+        return rollups
+    
+    def _get_rollup_series(self, symbol: str, start: str, end: str, interval: str,
+                           period: Optional[str] = None) -> Optional[DailySeries]:
+        """
+        集計済みの週足・月足の終値を切り出す
+        
+        ロールアップが範囲を含まない場合は終値を取得（期間指定はキャッシュ優先）して反映してから切り出す。
+        既存の範囲と離れていて反映できない場合は、取得した終値だけから集計する
+        
+        Returns:
+            週足・月足の終値の系列。上流から取得できない場合はNone
+        """
+        rollups = self.cache.get(f"index:rollup:{symbol}")
+        if rollups is None or not rollups.covers(start, end):
+            daily = self._get_period_series(symbol, period) if period else self._get_range_series(symbol, start, end)
+            if daily is None:
+                return None
+            # 上流から取得した場合は取得時に反映済み
+            rollups = self.cache.get(f"index:rollup:{symbol}")
+            if rollups is None or not rollups.covers(start, end):
+                rollups = self._update_rollups(symbol, daily, start, end)
+            if not rollups.covers(start, end):
+                # 既存の範囲と離れた範囲は反映されないため、取得した日足からその場で集計する
+                rollups = Rollups(daily, start, end)
+        return rollups.get(interval, start, end)
+    
+    @traced("index.backfill")
+    def backfill(self, symbol: str, start: str, end: str, ttl: Optional[float] = None) -> int:
+        """
+        長期間の終値を上流から取得し、日付範囲クエリ用のストアと期間指定のキャッシュに書き込む（バックフィル用）
+        
+        Args:
+            symbol: 銘柄コード
+            start: 開始日 (YYYY-MM-DD)
+            end: 終了日 (YYYY-MM-DD)
+            ttl: ストアに保存する系列のTTL（秒、省略時はキャッシュのTTL）
+            
+        Returns:
+            書き込んだ日数（上流にデータがない場合は0）
+            
+        Raises:
+            上流の例外はそのまま送出する（呼び出し元で失敗として記録する）
+        """
+        if symbol not in self.INDEX_SYMBOLS:
+            raise ValueError(f"サポートされていないインデックス: {symbol}")
+        
+        started = time.monotonic()
+        hist = self._ticker(symbol).history(start=start, end=next_day(end), interval='1d')
+        if hist.empty:
+            return 0
+        
+        series = self._close_series(hist)
+        cost = time.monotonic() - started
+        self.range_store.put(symbol, series, start, end, cost, ttl=ttl)
+        self._update_rollups(symbol, series, start, end)
+        
+        # 本日までの取得であれば、期間指定（直近N日分）のキャッシュも同じ系列から切り出して埋める
+        if end >= datetime.now().strftime('%Y-%m-%d'):
+            for period, days in PERIOD_DAYS.items():
+                dates = series.dates[-days:]
+                # 切り出した系列はバックフィルした系列全体のビューのため、コピーして保存する
+                window = series.slice(str(dates[0]), str(dates[-1])).compact()
+                self.cache.set(f"index:{symbol}:{period}", window, self.cache_ttl_seconds, cost)
+        return len(series)
+    
+    def get_single_index(self, symbol: str, period: str = "7d",
+                         start: Optional[str] = None, end: Optional[str] = None,
+                         interval: str = "1d") -> Dict[str, Any]:
         """
         単一のインデックスデータを取得
         
         Args:
             symbol: 銘柄コード
             period: 期間
+            start: 開始日 (YYYY-MM-DD)
+            end: 終了日 (YYYY-MM-DD)
+            interval: 足種（1d, 1wk, 1mo）
             
         Returns:
             単一インデックスデータ
         """
-        data = self.get_index_data([symbol], period)
+        data = self.get_index_data([symbol], period, start, end, interval)
         
         if symbol in data["data"]:
-            return {
+            result = {
                 "success": True,
                 "data": data["data"][symbol],
                 "period": period,
+                "interval": interval,
                 "lastUpdated": data["lastUpdated"]
             }
+            if "start" in data:
+                result["start"], result["end"] = data["start"], data["end"]
+            return result
         else:
             return {
                 "success": False,
@@ -180,10 +451,13 @@ class IndexService:
                 "data": None
             }
     
-    def _get_fallback_data(self, symbol: str, days: int) -> Dict[str, Any]:
+    def _get_fallback_data(self, symbol: str, days: int, end_date: Optional[datetime] = None) -> Dict[str, Any]:
         """フォールバック用のモックデータを生成"""
         import random
         
+        if end_date is None:
+            end_date = datetime.now()
+        
         base_values = {
             "^N225": 28500,
             "^TPX": 1950,
@@ -195,7 +469,7 @@ class IndexService:
         values = []
         
         for i in range(days):
-            date = datetime.now() - timedelta(days=days-1-i)
+            date = end_date - timedelta(days=days-1-i)
             dates.append(date.strftime('%Y-%m-%d'))
             
             # ランダムな変動を追加
@@ -216,6 +490,11 @@ class IndexService:
             "note": "フォールバックデータ"
         }
     
+    @staticmethod
+    def _ticker(symbol: str):
+        """上流のTickerを生成（既定は yfinance、接続先の設定時はチャートAPIを直接呼び出す）"""
+        return make_ticker(symbol)
+    
     def get_available_indices(self) -> Dict[str, Any]:
         """利用可能なインデックス銘柄一覧を取得"""
         return {
@@ -223,5 +502,12 @@ class IndexService:
             "data": self.INDEX_SYMBOLS
         }
 
-# グローバルインスタンス
-index_service = IndexService()
\ No newline at end of file
+# グローバルインスタンス（初回使用時に生成）
+get_index_service = lazy_singleton(IndexService)
+
+
+def __getattr__(name: str):
+    # 後方互換: from backend.index_service import index_service
+    if name == "index_service":
+        return get_index_service()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
\ No newline at end of file
@@ -0,0 +1,93 @@
+"""
+日中足データ
+最小粒度で一度だけ取得した日中足を列指向の系列（backend.series.OHLCVSeries）で保持し、
+より粗い足（5分/15分/60分/日足）はベクトル化したリサンプリングで導出する
+"""
+
+from datetime import datetime, timedelta
+from typing import Optional
+
+import numpy as np
+
+from backend.series import CALENDAR_INTERVALS, NS_PER_MINUTE, OHLCVSeries
+
+# 対応する足種（分）。"1d" は日足
+INTERVAL_MINUTES = {
+    "1m": 1,
+    "5m": 5,
+    "15m": 15,
+    "60m": 60,
+    "1d": 1440,
+}
+
+# 期間ごとに上流（yfinance）から取得できる最小粒度
+# yfinanceの制約: 1分足は直近7日、5分足は直近60日まで
+FINEST_INTERVAL = {
+    "7d": "1m",
+    "1m": "5m",
+    "3m": "60m",
+}
+
+
+def validate_interval(interval: str, period: str) -> None:
+    """足種と期間の組み合わせの妥当性チェック（不正時はValueError。週足・月足はどの期間でも可）"""
+    if interval in CALENDAR_INTERVALS:
+        return
+    if interval not in INTERVAL_MINUTES:
+        raise ValueError(f"サポートされていない足種: {interval}. "
+                         f"有効な足種: {list(INTERVAL_MINUTES) + list(CALENDAR_INTERVALS)}")
+    finest = FINEST_INTERVAL.get(period)
+    if finest is not None and INTERVAL_MINUTES[interval] < INTERVAL_MINUTES[finest]:
+        raise ValueError(f"期間 {period} では {finest} 以上の足種を指定してください")
+
+
+def generate_mock_bars(base_price: float, volatility: float, days: int, interval_minutes: int,
+                       end_date: Optional[datetime] = None) -> OHLCVSeries:
+    """
+    モック日中足を生成（実データが取得できない場合）
+
+    東証の立会時間（9:00-11:30, 12:30-15:30 JST）の平日分を生成する
+
+    Args:
+        base_price: 基準価格
+        volatility: 日次ボラティリティ
+        days: 日数
+        interval_minutes: 足の幅（分）
+        end_date: 最終日（省略時は本日）
+
+    Returns:
+        モック日中足
+    """
+    jst_offset_ns = 9 * 60 * NS_PER_MINUTE
+    end_date = end_date or datetime.now()
+    sessions = [(9 * 60, 11 * 60 + 30), (12 * 60 + 30, 15 * 60 + 30)]
+    minute_of_day = np.concatenate([
+        np.arange(start, stop, interval_minutes) for start, stop in sessions
+    ])
+
+    day_starts = []
+    for i in range(days):
+        day = (end_date - timedelta(days=days - 1 - i)).date()
+        if day.weekday() < 5:
+            midnight = datetime(day.year, day.month, day.day)
+            day_starts.append(int((midnight - datetime(1970, 1, 1)).total_seconds()) * 1_000_000_000)
+    if not day_starts:
+        day_starts.append(int((datetime(end_date.year, end_date.month, end_date.day)
+                               - datetime(1970, 1, 1)).total_seconds()) * 1_000_000_000)
+
+    local = (np.array(day_starts, dtype=np.int64)[:, None]
+             + minute_of_day[None, :].astype(np.int64) * NS_PER_MINUTE).ravel()
+    timestamps = local - jst_offset_ns
+
+    n = len(timestamps)
+    bars_per_day = len(minute_of_day)
+    step_volatility = volatility / np.sqrt(bars_per_day)
+    rng = np.random.default_rng()
+    closes = base_price * np.exp(np.cumsum(rng.normal(0, step_volatility, n)))
+    opens = np.concatenate(([base_price], closes[:-1]))
+    spread = np.abs(rng.normal(0, step_volatility, n)) * closes
+    highs = np.maximum(opens, closes) + spread
+    lows = np.minimum(opens, closes) - spread
+    volumes = rng.integers(1_000, 20_000, n, dtype=np.int64) * interval_minutes
+
+    return OHLCVSeries(timestamps, opens, highs, lows, closes, volumes, jst_offset_ns, interval_minutes)
@@ -0,0 +1,56 @@
+"""
+遅延初期化
+起動（ヘルスチェック応答可能になるまで）の時間を短くするため、
+サービスのシングルトンは初回使用時に生成する
+"""
+
+import importlib
+import threading
+from functools import reduce
+from typing import Any, Callable, TypeVar
+
+T = TypeVar("T")
+
+
+def lazy_singleton(factory: Callable[[], T]) -> Callable[[], T]:
+    """
+    初回呼び出し時に factory() でインスタンスを生成し、以降は同じインスタンスを返す関数を作成
+
+    Args:
+        factory: インスタンスを生成する関数（クラス）
+
+    Returns:
+        シングルトンを返す関数
+    """
+    instance = None
+    lock = threading.Lock()
+
+    def get() -> T:
+        nonlocal instance
+        if instance is None:
+            with lock:
+                if instance is None:
+                    instance = factory()
+        return instance
+
+    return get
+
+
+def lazy_function(module: str, name: str) -> Callable[..., Any]:
+    """
+    呼び出し時に module をインポートして name を呼び出す関数を作成
+    （NumPy 等の重い依存を使うモジュールを、起動時ではなく初回のリクエストで読み込む）
+
+    Args:
+        module: モジュール名
+        name: 呼び出す関数名（"クラス名.メソッド名" も可）
+
+    Returns:
+        name と同じ引数で呼び出せる関数
+    """
+    def call(*args, **kwargs):
+        target = reduce(getattr, name.split("."), importlib.import_module(module))
+        return target(*args, **kwargs)
+
+    call.__name__ = name.rsplit(".", 1)[-1]
+    return call
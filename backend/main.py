@@ -1,17 +1,54 @@
 import os
+import json
 import logging
-from fastapi import FastAPI, HTTPException, Request
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+import threading
+from contextlib import asynccontextmanager
+from datetime import datetime
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List, Optional
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from fastapi.routing import APIRoute
+from pydantic import BaseModel
+from typing import Iterator, List, Optional
 
-# 株価データサービスをインポート
-from backend.stock_service import stock_service
-# インデックスデータサービスをインポート
-from backend.index_service import index_service
-# 気象データサービスをインポート
-from backend.weather_service import weather_service
+# 日付範囲クエリ
+from backend.series_store import parse_date_range
+# データキャッシュ
+from backend.cache import get_cache
+# リクエスト単位のプロファイリング（管理用トークン・サンプリング率で有効化）
+from backend.profiling import ProfilingMiddleware
+# リクエストのトレース（ルート・サービス・キャッシュ・上流・シリアライズのスパン）
+from backend.tracing import TracingMiddleware, get_trace_buffer, span
+# 上流呼び出しのタイムアウト・ヘッジ・リクエストの期限
+from backend.fetch_scheduler import fetch_priority, get_fetch_scheduler
+from backend.upstream_policy import default_deadline_seconds, get_upstream_policies, request_deadline
+# フロントエンドの静的ファイル配信
+from backend.static_files import PrecompressedStaticFiles
+# キャッシュのスナップショット（再起動時のウォームスタート）
+from backend.snapshot import DEFAULT_SNAPSHOT_MAX_ENTRIES, load_snapshot, save_snapshot, snapshot_path
+from backend.lazy import lazy_function
+
+# NumPy を使うモジュール（各サービス・ダウンサンプリング・スクリーナー・アラート）は起動時に読み込まず、
+# 初回の呼び出し（ウォームアップのスレッドまたはリクエスト）で読み込む
+# 株価・インデックス・気象データサービス（各サービスは初回使用時に生成）
+get_stock_service = lazy_function("backend.stock_service", "get_stock_service")
+get_index_service = lazy_function("backend.index_service", "get_index_service")
+get_weather_service = lazy_function("backend.weather_service", "get_weather_service")
+# 長期間チャート向けダウンサンプリング
+validate_max_points = lazy_function("backend.downsampling", "validate_max_points")
+downsample_stock_data = lazy_function("backend.downsampling", "downsample_stock_data")
+downsample_index_data = lazy_function("backend.downsampling", "downsample_index_data")
+downsample_weather_data = lazy_function("backend.downsampling", "downsample_weather_data")
+# 日中足
+validate_interval = lazy_function("backend.intraday", "validate_interval")
+# 気象データの取得・後処理オプション
+build_processing_options = lazy_function("backend.weather_processing", "ProcessingOptions.build")
+# 全銘柄のスクリーニング（銘柄 × 日付の行列）
+get_screener = lazy_function("backend.screener", "get_screener")
+# しきい値アラート
+get_alert_engine = lazy_function("backend.alerts", "get_alert_engine")
+alert_event_stream = lazy_function("backend.alerts", "alert_event_stream")
+# Arrow / Parquet エクスポート（pyarrowはオプション、エクスポートの各エンドポイント内で読み込む）
 
 # --- Logging Setup ---
 logging.basicConfig(
@@ -20,12 +57,66 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+def warm_up():
+    """データ取得系（yfinance・pandas・NumPy・各サービス）を読み込む"""
+    try:
+        import yfinance  # noqa: F401
+        import backend.downsampling  # noqa: F401
+        get_stock_service()
+        get_index_service()
+        get_weather_service()
+        logger.info("データ取得系の読み込みが完了しました")
+    except Exception as e:
+        logger.warning(f"データ取得系の読み込みに失敗: {e}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """起動時にキャッシュのスナップショットを復元し、終了時に保存する"""
+    # /health を先に応答可能にするため、重い依存の読み込みは別スレッドで行う
+    if os.getenv("STACK_WATCHER_WARM_UP", "1") == "1":
+        threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+    path = snapshot_path()
+    if path:
+        load_snapshot(get_cache(), path)
+    yield
+    if path:
+        try:
+            max_entries = int(os.getenv("STACK_WATCHER_SNAPSHOT_MAX_ENTRIES", str(DEFAULT_SNAPSHOT_MAX_ENTRIES)))
+            save_snapshot(get_cache(), path, max_entries)
+        except Exception as e:
+            logger.warning(f"キャッシュのスナップショット保存に失敗: {e}")
+
+class TracedRoute(APIRoute):
+    """ルートハンドラー（引数の検証・エンドポイント・応答の生成）をスパンとして記録するルート"""
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def traced_handler(request: Request):
+            with span("route", route=self.path, endpoint=self.name):
+                return await handler(request)
+
+        return traced_handler
+
+class TracedJSONResponse(JSONResponse):
+    """JSONへのシリアライズをスパンとして記録する応答"""
+
+    def render(self, content) -> bytes:
+        with span("serialize") as current:
+            body = super().render(content)
+            if current is not None:
+                current.set("bytes", len(body))
+            return body
+
 # FastAPIアプリケーション作成
 app = FastAPI(
     title="Stack Watcher API",
     description="株価比較ツール API",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=TracedJSONResponse
 )
+app.router.route_class = TracedRoute
 
 # CORS設定（フロントエンドからのアクセスを許可）
 app.add_middleware(
@@ -42,15 +133,64 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Trace-Id"],
 )
 
+# 指定したリクエストのスタックを採取してフレームグラフ用のファイルを書き出す
+app.add_middleware(ProfilingMiddleware)
+
+# リクエスト全体の期限（超過した上流の呼び出しは打ち切り、キャッシュ済みデータで応答する）
+REQUEST_DEADLINE_SECONDS = default_deadline_seconds()
+
+@app.middleware("http")
+async def apply_request_deadline(request: Request, call_next):
+    """上流の呼び出しにリクエスト全体の期限と最優先（interactive）の優先度を設定する"""
+    with request_deadline(REQUEST_DEADLINE_SECONDS), fetch_priority("interactive"):
+        return await call_next(request)
+
+# リクエストごとにトレースを開始し、X-Trace-Id ヘッダーでトレースIDを返す（最も外側で計測する）
+app.add_middleware(TracingMiddleware)
+
+# 1行1レコードのJSON（ストリーミング応答）
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+def wants_ndjson(request: Request, stream: bool) -> bool:
+    """ストリーミング応答を要求しているか（?stream=1 または Accept: application/x-ndjson）"""
+    return stream or NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+def stream_stocks(symbols: List[str], period: str, start: Optional[str], end: Optional[str],
+                  interval: str, max_points: Optional[int]) -> Iterator[str]:
+    """
+    複数銘柄の株価データをNDJSONの行として取得できた順に返す
+    
+    各行は {"type": "stock", "data": ...} または {"type": "error", "symbol": ..., "error": ...}。
+    最後に件数を含む {"type": "end", ...} を返す（途中で切断された応答と区別するため）
+    """
+    count = 0
+    errors = 0
+    for record in get_stock_service().iter_stocks(symbols, period, start, end, interval):
+        if "error" in record:
+            errors += 1
+            line = {"type": "error", **record}
+        else:
+            count += 1
+            line = {"type": "stock", "data": downsample_stock_data(record["data"], max_points)}
+        yield json.dumps(line, ensure_ascii=False) + "\n"
+    yield json.dumps({
+        "type": "end",
+        "period": period,
+        "count": count,
+        "errors": errors,
+        "timestamp": datetime.now().isoformat()
+    }, ensure_ascii=False) + "\n"
+
 # --- 株価API エンドポイント ---
 
 @app.get("/api/v1/stocks/symbols")
 async def get_available_symbols():
     """利用可能な銘柄一覧を取得"""
     try:
-        symbols = stock_service.get_available_symbols()
+        symbols = get_stock_service().get_available_symbols()
         return {
             "success": True,
             "data": {"symbols": symbols},
@@ -60,11 +200,32 @@ async def get_available_symbols():
         logger.error(f"銘柄一覧取得エラー: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# /stocks/{symbol} より先に宣言する（"search" を銘柄コードとして扱わないため）
+@app.get("/api/v1/stocks/search")
+async def search_symbols(q: str, limit: int = 10):
+    """コード・銘柄名・カナで銘柄を検索（前方一致）"""
+    try:
+        results = get_stock_service().search_symbols(q, limit)
+        return {
+            "success": True,
+            "data": {"query": q, "results": results},
+            "message": f"{len(results)}件の銘柄が見つかりました"
+        }
+    except ValueError as e:
+        logger.warning(f"無効なリクエスト: {e}")
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"銘柄検索エラー: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/api/v1/stocks/{symbol}")
-async def get_stock_data(symbol: str, period: Optional[str] = "7d"):
+async def get_stock_data(symbol: str, period: Optional[str] = "7d", max_points: Optional[int] = None,
+                         start: Optional[str] = None, end: Optional[str] = None, interval: str = "1d"):
     """個別銘柄の株価データを取得"""
     try:
-        data = stock_service.get_stock_data(symbol, period)
+        validate_max_points(max_points)
+        data = get_stock_service().get_stock_data(symbol, period, start, end, interval)
+        data = downsample_stock_data(data, max_points)
         return {
             "success": True,
             "data": data,
@@ -78,16 +239,31 @@ async def get_stock_data(symbol: str, period: Optional[str] = "7d"):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/v1/stocks")
-async def get_multiple_stocks(symbols: str, period: Optional[str] = "7d"):
-    """複数銘柄の株価データを一括取得"""
+async def get_multiple_stocks(request: Request, symbols: str, period: Optional[str] = "7d",
+                              max_points: Optional[int] = None, start: Optional[str] = None,
+                              end: Optional[str] = None, interval: str = "1d", stream: bool = False):
+    """複数銘柄の株価データを一括取得（stream=1 で銘柄ごとにNDJSONで逐次返却）"""
     try:
+        validate_max_points(max_points)
+        
         # カンマ区切りの文字列を配列に変換
         symbol_list = [s.strip() for s in symbols.split(",") if s.strip()]
         
         if not symbol_list:
             raise ValueError("銘柄コードが指定されていません")
         
-        data = stock_service.get_multiple_stocks(symbol_list, period)
+        # 日付範囲・足種は銘柄ごとのエラーに埋もれないよう先に検証
+        parse_date_range(start, end)
+        stock_service = get_stock_service()
+        if period in stock_service.period_map:
+            validate_interval(interval, period)
+        if wants_ndjson(request, stream):
+            return StreamingResponse(
+                stream_stocks(symbol_list, period, start, end, interval, max_points),
+                media_type=NDJSON_MEDIA_TYPE
+            )
+        data = stock_service.get_multiple_stocks(symbol_list, period, start, end, interval)
+        data["stocks"] = [downsample_stock_data(stock, max_points) for stock in data["stocks"]]
         return {
             "success": True,
             "data": data,
@@ -100,9 +276,37 @@ async def get_multiple_stocks(symbols: str, period: Optional[str] = "7d"):
         logger.error(f"複数銘柄データ取得エラー: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# --- スクリーナー ---
+@app.get("/api/v1/screener")
+async def screen_stocks(
+    sort: str = Query("return", description="並べ替えの指標（return / volatility / volume_spike）"),
+    order: str = Query("desc", description="並び順（desc / asc）"),
+    period: str = Query("1m", description="期間（7d / 1m / 3m）"),
+    limit: int = Query(20, description="件数（1〜500）"),
+    market: Optional[str] = Query(None, description="市場で絞り込み"),
+    sector: Optional[str] = Query(None, description="業種で絞り込み"),
+    min_price: Optional[float] = Query(None, description="最新終値の下限"),
+    min_volume: Optional[float] = Query(None, description="期間の平均出来高の下限"),
+):
+    """全銘柄を期間騰落率・ボラティリティ・出来高急増率で並べ替える（取得済みの日足が対象）"""
+    try:
+        data = get_screener().screen(sort, order, period, limit, market, sector, min_price, min_volume)
+        return {
+            "success": True,
+            "data": data,
+            "message": f"{data['matched']}銘柄中{len(data['results'])}件を返しました"
+        }
+    except ValueError as e:
+        logger.warning(f"無効なリクエスト: {e}")
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"スクリーニングエラー: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 # --- インデックスデータAPI (Phase 2) ---
 @app.get("/api/v1/indices")
-async def get_indices(period: str = "7d"):
+async def get_indices(period: str = "7d", max_points: Optional[int] = None,
+                      start: Optional[str] = None, end: Optional[str] = None, interval: str = "1d"):
     """全インデックスデータを取得"""
     try:
         logger.info(f"インデックスデータ取得リクエスト - 期間: {period}")
@@ -112,7 +316,13 @@ async def get_indices(period: str = "7d"):
         if period not in valid_periods:
             raise ValueError(f"無効な期間: {period}. 有効な期間: {valid_periods}")
         
-        data = index_service.get_index_data(period=period)
+        validate_max_points(max_points)
+        
+        data = get_index_service().get_index_data(period=period, start=start, end=end, interval=interval)
+        data["data"] = {
+            symbol: downsample_index_data(index, max_points)
+            for symbol, index in data["data"].items()
+        }
         return data
         
     except ValueError as e:
@@ -123,7 +333,8 @@ async def get_indices(period: str = "7d"):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/v1/indices/{symbol}")
-async def get_single_index(symbol: str, period: str = "7d"):
+async def get_single_index(symbol: str, period: str = "7d", max_points: Optional[int] = None,
+                           start: Optional[str] = None, end: Optional[str] = None, interval: str = "1d"):
     """単一インデックスデータを取得"""
     try:
         logger.info(f"単一インデックスデータ取得リクエスト - 銘柄: {symbol}, 期間: {period}")
@@ -133,11 +344,14 @@ async def get_single_index(symbol: str, period: str = "7d"):
         if period not in valid_periods:
             raise ValueError(f"無効な期間: {period}. 有効な期間: {valid_periods}")
         
-        data = index_service.get_single_index(symbol, period)
+        validate_max_points(max_points)
+        
+        data = get_index_service().get_single_index(symbol, period, start, end, interval)
         
         if not data["success"]:
             raise HTTPException(status_code=404, detail=data["error"])
         
+        data["data"] = downsample_index_data(data["data"], max_points)
         return data
         
     except ValueError as e:
@@ -154,7 +368,7 @@ async def get_available_indices():
     """利用可能なインデックス銘柄一覧を取得"""
     try:
         logger.info("利用可能インデックス一覧取得リクエスト")
-        data = index_service.get_available_indices()
+        data = get_index_service().get_available_indices()
         return data
     except Exception as e:
         logger.error(f"利用可能インデックス一覧取得エラー: {e}")
@@ -162,11 +376,16 @@ async def get_available_indices():
 
 # --- 気象データAPI (Phase 2) ---
 @app.get("/api/v1/weather")
-async def get_weather_data(location: str = "tokyo", period: str = "7d"):
-    """気象データを取得"""
+async def get_weather_data(location: str = "tokyo", period: str = "7d", max_points: Optional[int] = None,
+                           start: Optional[str] = None, end: Optional[str] = None,
+                           variables: Optional[str] = None, gap_strategy: str = "ffill",
+                           aggregate_hourly: bool = False):
+    """気象データを取得（variables: カンマ区切りの変数名、gap_strategy: ffill/interpolate/none）"""
     try:
         logger.info(f"気象データ取得リクエスト - 地域: {location}, 期間: {period}")
         
+        weather_service = get_weather_service()
+        
         # 有効な期間チェック
         if not weather_service.validate_period(period):
             valid_periods = ["7d", "1m", "3m"]
@@ -174,10 +393,15 @@ async def get_weather_data(location: str = "tokyo", period: str = "7d"):
         
         # 有効な地域チェック
         if not weather_service.validate_location(location):
-            valid_locations = ["tokyo"]
+            valid_locations = list(weather_service.LOCATIONS)
             raise ValueError(f"無効な地域: {location}. 有効な地域: {valid_locations}")
         
-        data = weather_service.get_weather_data(location, period)
+        validate_max_points(max_points)
+        options = build_processing_options(variables, gap_strategy, aggregate_hourly)
+        
+        data = weather_service.get_weather_data(location, period, start, end, options)
+        if data.get("data"):
+            data["data"] = downsample_weather_data(data["data"], max_points)
         return data
         
     except ValueError as e:
@@ -187,17 +411,302 @@ async def get_weather_data(location: str = "tokyo", period: str = "7d"):
         logger.error(f"気象データ取得エラー: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/v1/weather/batch")
+async def get_weather_batch(locations: Optional[str] = None, symbol: Optional[str] = None,
+                            period: str = "7d", max_points: Optional[int] = None,
+                            variables: Optional[str] = None, gap_strategy: str = "ffill",
+                            aggregate_hourly: bool = False):
+    """複数地点の気象データを一括取得（locations: カンマ区切り、symbol: 関連する生産拠点）"""
+    try:
+        logger.info(f"気象データ一括取得リクエスト - 地域: {locations}, 銘柄: {symbol}, 期間: {period}")
+        
+        weather_service = get_weather_service()
+        if not weather_service.validate_period(period):
+            valid_periods = ["7d", "1m", "3m"]
+            raise ValueError(f"無効な期間: {period}. 有効な期間: {valid_periods}")
+        validate_max_points(max_points)
+        options = build_processing_options(variables, gap_strategy, aggregate_hourly)
+        
+        if locations:
+            location_list = [l.strip() for l in locations.split(",") if l.strip()]
+        elif symbol:
+            location_list = weather_service.get_locations_for_symbol(symbol)
+        else:
+            location_list = []
+        
+        if not location_list:
+            raise ValueError("地域（locations）または関連銘柄（symbol）を指定してください")
+        
+        data = weather_service.get_weather_batch(location_list, period, options)
+        for result in data.values():
+            if result.get("data"):
+                result["data"] = downsample_weather_data(result["data"], max_points)
+        
+        return {
+            "success": True,
+            "data": data,
+            "period": period,
+            "message": f"{len(location_list)}地点の気象データを取得しました"
+        }
+        
+    except ValueError as e:
+        logger.warning(f"無効なリクエスト: {e}")
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"気象データ一括取得エラー: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/api/v1/weather/locations")
 async def get_available_weather_locations():
     """利用可能な気象観測地点一覧を取得"""
     try:
         logger.info("利用可能気象観測地点一覧取得リクエスト")
-        data = weather_service.get_available_locations()
+        data = get_weather_service().get_available_locations()
         return data
     except Exception as e:
         logger.error(f"利用可能気象観測地点一覧取得エラー: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# --- キャッシュ ---
+@app.get("/api/v1/cache/stats")
+async def get_cache_stats():
+    """キャッシュの統計（バックエンド・ヒット率・エントリ数）を取得"""
+    try:
+        return {
+            "success": True,
+            "data": get_cache().stats(),
+            "message": "キャッシュ統計を取得しました"
+        }
+    except Exception as e:
+        logger.error(f"キャッシュ統計取得エラー: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+# --- 上流 ---
+@app.get("/api/v1/upstream/stats")
+async def get_upstream_stats():
+    """上流の取得元ごとの所要時間（p50/p95/p99）・タイムアウト・ヘッジの統計を取得"""
+    try:
+        return {
+            "success": True,
+            "data": get_upstream_policies().stats(),
+            "message": "上流の統計を取得しました"
+        }
+    except Exception as e:
+        logger.error(f"上流の統計取得エラー: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/v1/upstream/scheduler")
+async def get_scheduler_stats():
+    """上流呼び出しのスケジューラーの取得元ごとの実行数・待ち行列の長さ（優先度別）・待ち時間を取得"""
+    try:
+        return {
+            "success": True,
+            "data": get_fetch_scheduler().stats(),
+            "message": "スケジューラーの統計を取得しました"
+        }
+    except Exception as e:
+        logger.error(f"スケジューラーの統計取得エラー: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+# --- トレース（デバッグ用） ---
+@app.get("/api/v1/debug/traces")
+async def get_traces(limit: int = Query(50, ge=1, le=1000, description="取得件数（新しい順）")):
+    """直近のトレースの概要（ルート・所要時間・スパン数）を取得"""
+    try:
+        return {
+            "success": True,
+            "data": get_trace_buffer().traces(limit),
+            "message": "トレース一覧を取得しました"
+        }
+    except Exception as e:
+        logger.error(f"トレース一覧取得エラー: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/v1/debug/traces/{trace_id}")
+async def get_trace(trace_id: str):
+    """トレースのスパン（開始時刻順、parentId で親子関係を表す）を取得"""
+    spans = get_trace_buffer().get(trace_id)
+    if spans is None:
+        raise HTTPException(status_code=404, detail=f"トレースが見つかりません: {trace_id}")
+    return {
+        "success": True,
+        "data": {"traceId": trace_id, "spans": spans},
+        "message": "トレースを取得しました"
+    }
+
+# --- アラート ---
+class AlertRuleRequest(BaseModel):
+    """しきい値ルールの登録内容"""
+    source: str
+    target: str
+    field: str
+    op: str
+    threshold: float
+
+def validate_alert_target(source: str, target: str) -> None:
+    """ルールの対象（銘柄・指数・観測地点）の妥当性チェック（不正時はValueError）"""
+    if source == "stock" and target not in get_stock_service().catalog:
+        raise ValueError(f"無効な銘柄コード: {target}")
+    if source == "index" and target not in get_index_service().INDEX_SYMBOLS:
+        raise ValueError(f"無効な指数コード: {target}")
+    if source == "weather" and not get_weather_service().validate_location(target):
+        raise ValueError(f"無効な観測地点: {target}")
+
+@app.post("/api/v1/alerts/rules", status_code=201)
+async def create_alert_rule(rule: AlertRuleRequest):
+    """しきい値ルールを登録"""
+    try:
+        validate_alert_target(rule.source, rule.target)
+        created = get_alert_engine().add_rule(rule.source, rule.target, rule.field, rule.op, rule.threshold)
+        return {
+            "success": True,
+            "data": created.to_dict(),
+            "message": "アラートルールを登録しました"
+        }
+    except ValueError as e:
+        logger.warning(f"無効なリクエスト: {e}")
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"アラートルール登録エラー: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/v1/alerts/rules")
+async def list_alert_rules():
+    """登録済みのしきい値ルール一覧を取得"""
+    try:
+        return {
+            "success": True,
+            "data": [rule.to_dict() for rule in get_alert_engine().rules()],
+            "message": "アラートルール一覧を取得しました"
+        }
+    except Exception as e:
+        logger.error(f"アラートルール一覧取得エラー: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.delete("/api/v1/alerts/rules/{rule_id}")
+async def delete_alert_rule(rule_id: int):
+    """しきい値ルールを削除"""
+    if not get_alert_engine().remove_rule(rule_id):
+        raise HTTPException(status_code=404, detail=f"アラートルールが見つかりません: {rule_id}")
+    return {
+        "success": True,
+        "data": {"id": rule_id},
+        "message": "アラートルールを削除しました"
+    }
+
+@app.get("/api/v1/alerts")
+async def list_alerts(since: int = 0, limit: int = 100):
+    """発火したアラートの履歴を取得（ID が since より大きいものを古い順に）"""
+    try:
+        from backend.alerts import ALERT_HISTORY_SIZE
+        if not 1 <= limit <= ALERT_HISTORY_SIZE:
+            raise ValueError(f"件数は1〜{ALERT_HISTORY_SIZE}で指定してください")
+        return {
+            "success": True,
+            "data": get_alert_engine().alerts(since, limit),
+            "message": "アラート履歴を取得しました"
+        }
+    except ValueError as e:
+        logger.warning(f"無効なリクエスト: {e}")
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"アラート履歴取得エラー: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/v1/alerts/stream")
+async def stream_alerts(request: Request):
+    """発火したアラートをServer-Sent Eventsで配信（Last-Event-ID 指定時は以降の履歴から再送）"""
+    last_event_id = request.headers.get("last-event-id")
+    since = int(last_event_id) if last_event_id and last_event_id.isdigit() else None
+    return StreamingResponse(
+        alert_event_stream(get_alert_engine(), request.is_disconnected, since),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# --- エクスポート（Arrow IPC / Parquet） ---
+def export_response(table, fmt: str, name: str) -> Response:
+    """Arrowテーブルを指定形式でダウンロード用のレスポンスにする"""
+    from backend.export import EXPORT_FORMATS, write_table
+    media_type, extension = EXPORT_FORMATS[fmt]
+    return Response(
+        write_table(table, fmt),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{name}.{extension}"'}
+    )
+
+def unavailable_symbols(missing: List[str]) -> HTTPException:
+    """上流から取得できない銘柄がある場合のエラー（エクスポートはモックデータを含めない）"""
+    return HTTPException(status_code=503, detail=f"データを取得できない銘柄があります: {missing}")
+
+@app.get("/api/v1/export/stocks")
+async def export_stocks(symbols: str, fmt: str = Query("arrow", alias="format"), period: str = "7d",
+                        start: Optional[str] = None, end: Optional[str] = None, columns: Optional[str] = None):
+    """複数銘柄の日足を Arrow IPC ストリームまたは Parquet で取得"""
+    from backend.export import (
+        STOCK_COLUMNS, ExportUnavailableError, import_pyarrow, parse_columns, stock_table, validate_format
+    )
+    try:
+        validate_format(fmt)
+        selected = parse_columns(columns, STOCK_COLUMNS)
+        symbol_list = [s.strip() for s in symbols.split(",") if s.strip()]
+        if not symbol_list:
+            raise ValueError("銘柄コードが指定されていません")
+        import_pyarrow()
+        
+        stock_service = get_stock_service()
+        items = [(symbol, stock_service.get_stock_series(symbol, period, start, end)) for symbol in symbol_list]
+        missing = [symbol for symbol, series in items if series is None]
+        if missing:
+            raise unavailable_symbols(missing)
+        name = f"stocks_{start}_{end}" if start else f"stocks_{period}"
+        return export_response(stock_table(items, selected), fmt, name)
+    except HTTPException:
+        raise
+    except ValueError as e:
+        logger.warning(f"無効なリクエスト: {e}")
+        raise HTTPException(status_code=400, detail=str(e))
+    except ExportUnavailableError as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    except Exception as e:
+        logger.error(f"株価データエクスポートエラー: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/v1/export/indices")
+async def export_indices(symbols: Optional[str] = None, fmt: str = Query("arrow", alias="format"),
+                         period: str = "7d", start: Optional[str] = None, end: Optional[str] = None,
+                         columns: Optional[str] = None):
+    """指数の終値を Arrow IPC ストリームまたは Parquet で取得（symbols省略時は全指数）"""
+    from backend.export import (
+        INDEX_COLUMNS, ExportUnavailableError, import_pyarrow, index_table, parse_columns, validate_format
+    )
+    try:
+        validate_format(fmt)
+        selected = parse_columns(columns, INDEX_COLUMNS)
+        index_service = get_index_service()
+        if symbols:
+            symbol_list = [s.strip() for s in symbols.split(",") if s.strip()]
+        else:
+            symbol_list = list(index_service.INDEX_SYMBOLS)
+        import_pyarrow()
+        
+        items = [(symbol, index_service.get_index_series(symbol, period, start, end)) for symbol in symbol_list]
+        missing = [symbol for symbol, series in items if series is None]
+        if missing:
+            raise unavailable_symbols(missing)
+        name = f"indices_{start}_{end}" if start else f"indices_{period}"
+        return export_response(index_table(items, selected), fmt, name)
+    except HTTPException:
+        raise
+    except ValueError as e:
+        logger.warning(f"無効なリクエスト: {e}")
+        raise HTTPException(status_code=400, detail=str(e))
+    except ExportUnavailableError as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    except Exception as e:
+        logger.error(f"指数データエクスポートエラー: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 # --- 既存のAPI エンドポイント ---
 @app.get("/api/hello")
 async def hello():
@@ -214,7 +723,7 @@ async def api_health_check():
     """APIヘルスチェック"""
     try:
         # 簡単なデータ取得テストを実行
-        test_symbols = stock_service.get_available_symbols()
+        test_symbols = get_stock_service().get_available_symbols()
         
         return {
             "success": True,
@@ -246,7 +755,7 @@ async def get_demo_data():
     try:
         # デフォルト3銘柄のデータを取得
         symbols = ["6326", "9984", "1377"]
-        data = stock_service.get_multiple_stocks(symbols, "7d")
+        data = get_stock_service().get_multiple_stocks(symbols, "7d")
         
         return {
             "success": True,
@@ -258,20 +767,8 @@ async def get_demo_data():
         raise HTTPException(status_code=500, detail=str(e))
 
 # --- Static Files Setup ---
+# 事前圧縮ファイル（.br/.gz）・immutableキャッシュ・index.htmlのメモリ保持・SPAルーティングに対応
 static_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
 os.makedirs(static_dir, exist_ok=True)
 
-app.mount("/", StaticFiles(directory=static_dir, html=True), name="static")
-
-# --- Catch-all for React Routes ---
-@app.get("/{full_path:path}")
-async def serve_react(full_path: str):
-    index_html = os.path.join(static_dir, "index.html")
-    if os.path.exists(index_html):
-        logger.info(f"Serving React frontend for path: /{full_path}")
-        return FileResponse(index_html)
-    logger.error("Frontend not built. index.html missing.")
-    raise HTTPException(
-        status_code=404,
-        detail="Frontend not built. Please run 'npm run build' first."
-    )
\ No newline at end of file
+app.mount("/", PrecompressedStaticFiles(directory=static_dir), name="static")
@@ -0,0 +1,242 @@
+"""
+リクエスト単位のプロファイリング
+指定したリクエスト（管理用トークン付きのヘッダー・クエリ）または一定割合のリクエストについて、
+処理中のスタックを採取し、フレームグラフ用のファイルをローカルのディレクトリに書き出す。
+無効時（トークン未設定・サンプリング率0）はヘッダーを確認するだけで、処理には影響しない。
+
+環境変数:
+    STACK_WATCHER_PROFILE_TOKEN: 管理用トークン（未設定の場合、ヘッダー・クエリでの指定は無視する）
+    STACK_WATCHER_PROFILE_SAMPLE_RATE: 指定なしでプロファイルするリクエストの割合（既定0）
+    STACK_WATCHER_PROFILE_DIR: 出力先ディレクトリ（既定: profiles）
+    STACK_WATCHER_PROFILE_INTERVAL_MS: スタックの採取間隔（ミリ秒、既定5）
+    STACK_WATCHER_PROFILE_MAX_FILES: 出力先に残すファイル数（既定200、古いものから削除）
+
+指定方法:
+    X-Profile: {トークン}           （または ?__profile={トークン}）
+    X-Profile-Mode: sample | cprofile（既定 sample）
+
+sample は全スレッド（上流の呼び出しを行うスレッドを含む）のスタックを一定間隔で採取し、
+folded 形式（"スレッド;フレーム;...;フレーム 件数"）で書き出す。flamegraph.pl・speedscope でそのまま表示できる。
+待機中のスレッドは除くが、イベントループのスレッドは待機中も含める（上流待ちの時間を見るため）。
+cprofile はイベントループのスレッドの関数呼び出しを cProfile で計測し、pstats 形式（.prof）で書き出す。
+いずれも同時に処理中の他のリクエストの分を含みうる。
+"""
+
+import cProfile
+import glob
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Optional
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from backend.lazy import lazy_singleton
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = "x-profile"
+PROFILE_MODE_HEADER = "x-profile-mode"
+PROFILE_QUERY = "__profile"
+PROFILE_MODES = ("sample", "cprofile")
+DEFAULT_PROFILE_DIR = "profiles"
+
+# 応答ヘッダー（書き出したファイル名）
+PROFILE_FILE_HEADER = b"x-profile-file"
+
+# 待機中とみなす末端のフレーム（ファイル名:関数名）
+IDLE_FRAMES = frozenset({
+    "threading.py:wait",
+    "threading.py:_wait_for_tstate_lock",
+    "queue.py:get",
+    "selectors.py:select",
+    "socketserver.py:serve_forever",
+    "thread.py:_worker",
+})
+
+
+def frame_label(frame) -> str:
+    """フレームの表示名（ファイル名:関数名）"""
+    return f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_name}"
+
+
+def folded_stack(frame) -> str:
+    """ルートから末端までのフレームを ; で連結した文字列"""
+    labels = []
+    while frame is not None:
+        labels.append(frame_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+class StackSampler:
+    """別スレッドから全スレッドのスタックを一定間隔で採取する"""
+
+    def __init__(self, interval: float = 0.005, focus_thread: Optional[int] = None):
+        self.interval = interval
+        self.focus_thread = focus_thread
+        self.counts: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> Counter:
+        """採取を止め、スタックごとの件数を返す"""
+        self._stop.set()
+        self._thread.join()
+        return self.counts
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            self.samples += 1
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                if ident != self.focus_thread and frame_label(frame) in IDLE_FRAMES:
+                    continue
+                self.counts[f"{names.get(ident, ident)};{folded_stack(frame)}"] += 1
+
+
+class RequestProfiler:
+    """プロファイルの対象判定とファイルの書き出し"""
+
+    def __init__(self, token: Optional[str] = None, sample_rate: float = 0.0,
+                 directory: str = DEFAULT_PROFILE_DIR, interval_ms: float = 5.0, max_files: int = 200):
+        self.token = token or None
+        self.sample_rate = sample_rate
+        self.directory = directory
+        self.interval_ms = interval_ms
+        self.max_files = max_files
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.token is not None or self.sample_rate > 0
+
+    def select(self, scope: Scope) -> Optional[str]:
+        """
+        リクエストをプロファイルするか判定
+
+        Returns:
+            プロファイルする場合はモード（sample / cprofile）、しない場合はNone
+        """
+        headers = dict(scope.get("headers") or ())
+        requested = False
+        if self.token is not None:
+            value = headers.get(PROFILE_HEADER.encode(), b"").decode("latin-1")
+            if not value:
+                query = scope.get("query_string", b"").decode("latin-1")
+                match = re.search(rf"(?:^|&){PROFILE_QUERY}=([^&]*)", query)
+                value = match.group(1) if match else ""
+            requested = value == self.token
+        if not requested and not (self.sample_rate > 0 and random.random() < self.sample_rate):
+            return None
+        mode = headers.get(PROFILE_MODE_HEADER.encode(), b"sample").decode("latin-1")
+        return mode if mode in PROFILE_MODES else "sample"
+
+    def path_for(self, scope: Scope, mode: str) -> str:
+        """出力ファイルのパス（時刻-メソッド-パス-ID.folded|.prof）"""
+        route = re.sub(r"[^A-Za-z0-9]+", "_", scope.get("path", "")).strip("_") or "root"
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{scope.get('method', 'GET')}-{route}-{uuid.uuid4().hex[:8]}"
+        return os.path.join(self.directory, name + (".prof" if mode == "cprofile" else ".folded"))
+
+    def write_folded(self, path: str, counts: Counter) -> None:
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                for stack, count in counts.most_common():
+                    f.write(f"{stack} {count}\n")
+            self._prune()
+
+    def write_cprofile(self, path: str, profile: cProfile.Profile) -> None:
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            profile.dump_stats(path)
+            self._prune()
+
+    def _prune(self) -> None:
+        """古いファイルから削除して max_files 件に抑える"""
+        paths = sorted(glob.glob(os.path.join(self.directory, "*.folded")) +
+                       glob.glob(os.path.join(self.directory, "*.prof")), key=os.path.getmtime)
+        for path in paths[:max(0, len(paths) - self.max_files)]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def create_profiler() -> RequestProfiler:
+    """環境変数の設定からプロファイラーを生成"""
+    return RequestProfiler(
+        token=os.getenv("STACK_WATCHER_PROFILE_TOKEN"),
+        sample_rate=float(os.getenv("STACK_WATCHER_PROFILE_SAMPLE_RATE", "0")),
+        directory=os.getenv("STACK_WATCHER_PROFILE_DIR", DEFAULT_PROFILE_DIR),
+        interval_ms=float(os.getenv("STACK_WATCHER_PROFILE_INTERVAL_MS", "5")),
+        max_files=int(os.getenv("STACK_WATCHER_PROFILE_MAX_FILES", "200")),
+    )
+
+
+# プロセス共通のプロファイラー
+get_profiler = lazy_singleton(create_profiler)
+
+
+class ProfilingMiddleware:
+    """対象のリクエストを応答の送信完了までプロファイルするASGIミドルウェア"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        profiler = get_profiler()
+        if scope["type"] != "http" or not profiler.enabled:
+            await self.app(scope, receive, send)
+            return
+        mode = profiler.select(scope)
+        if mode is None:
+            await self.app(scope, receive, send)
+            return
+
+        path = profiler.path_for(scope, mode)
+
+        async def send_with_header(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((PROFILE_FILE_HEADER, os.path.basename(path).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        started = time.perf_counter()
+        if mode == "cprofile":
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError as e:
+                # 他のプロファイラーが動作中の場合（同時に cprofile 指定のリクエストがある等）は計測しない
+                logger.warning(f"プロファイルを開始できません: {e}")
+                await self.app(scope, receive, send)
+                return
+            try:
+                await self.app(scope, receive, send_with_header)
+            finally:
+                profile.disable()
+                profiler.write_cprofile(path, profile)
+        else:
+            sampler = StackSampler(profiler.interval_ms / 1000, focus_thread=threading.get_ident())
+            sampler.start()
+            try:
+                await self.app(scope, receive, send_with_header)
+            finally:
+                profiler.write_folded(path, sampler.stop())
+        logger.info(f"プロファイルを書き出しました: {path} ({(time.perf_counter() - started) * 1000:.0f} ms)")
+
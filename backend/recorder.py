@@ -0,0 +1,180 @@
+"""
+上流応答の記録・再生
+上流（Yahoo Finance・OpenMeteo）への呼び出しを、リクエスト条件・所要時間・応答ごとにJSON Linesへ記録し、
+再生モードではネットワークに接続せず記録した応答を返す。
+本番の遅延をオフラインで再現し、キャッシュやバッチ化の変更を同じデータで比較するために使う。
+
+環境変数:
+    STACK_WATCHER_UPSTREAM_MODE: live（既定）/ record（記録）/ replay（再生）
+    STACK_WATCHER_RECORDINGS_DIR: 記録先ディレクトリ（既定: recordings）
+    STACK_WATCHER_REPLAY_LATENCY: 再生時に記録時の所要時間を何倍で再現するか（既定0: 待たない、1: 記録時と同じ）
+
+記録ファイルはプロセスごとに upstream-{pid}.jsonl へ追記し、再生時はディレクトリ内の全ファイルを読み込む。
+記録はヘッジ・タイムアウトを適用した1回の呼び出し（backend.upstream.recorded_call）につき1件とする。
+同じ条件の記録が複数ある場合は最後のものを使う。
+直近N日の取得は実行日で日付が変わるため、完全一致する記録がない場合は日付を除いた条件で照合する。
+"""
+
+import glob
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from backend.lazy import lazy_singleton
+
+logger = logging.getLogger(__name__)
+
+UPSTREAM_MODES = ("live", "record", "replay")
+DEFAULT_RECORDINGS_DIR = "recordings"
+
+# 照合時に除く日付のパラメータ（直近N日の取得は実行日で変わる）
+DATE_PARAMS = ("start", "end", "start_date", "end_date")
+
+
+class ReplayMissError(LookupError):
+    """再生モードで一致する記録がない場合の例外"""
+
+
+class RecordedUpstreamError(RuntimeError):
+    """記録時に上流の呼び出しが失敗していた場合に、再生時に送出する例外"""
+
+
+def request_key(source: str, target: str, params: Dict[str, Any]) -> str:
+    """取得元・対象・パラメータから記録のキーを求める"""
+    text = json.dumps([source, target, params], sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha1(text.encode()).hexdigest()
+
+
+def _loose_key(source: str, target: str, params: Dict[str, Any]) -> str:
+    """日付を除いたキー"""
+    return request_key(source, target, {k: v for k, v in params.items() if k not in DATE_PARAMS})
+
+
+class UpstreamRecorder:
+    """上流の呼び出しの記録・再生"""
+
+    def __init__(self, mode: str = "live", directory: str = DEFAULT_RECORDINGS_DIR, latency_scale: float = 0.0):
+        if mode not in UPSTREAM_MODES:
+            raise ValueError(f"無効な上流モード: {mode}. 有効な値: {list(UPSTREAM_MODES)}")
+        self.mode = mode
+        self.directory = directory
+        self.latency_scale = latency_scale
+        self._lock = threading.Lock()
+        self._exact: Optional[Dict[str, Dict]] = None
+        self._loose: Dict[str, Dict] = {}
+        self._recorded = 0
+        self._replayed = 0
+        self._misses = 0
+
+    def call(self, source: str, target: str, params: Dict[str, Any], fetch: Callable[[], Any],
+             encode: Callable[[Any], Any] = lambda value: value,
+             decode: Callable[[Any], Any] = lambda value: value) -> Any:
+        """
+        上流を呼び出す（モードに応じて記録・再生）
+
+        Args:
+            source: 取得元（yahoo / openmeteo）
+            target: 対象（ティッカー・URLなど）
+            params: リクエスト条件（記録のキー）
+            fetch: 上流を呼び出す関数
+            encode: 応答をJSONに変換する関数
+            decode: 記録したJSONを応答に戻す関数
+
+        Returns:
+            応答
+        """
+        if self.mode == "replay":
+            return self._replay(source, target, params, decode)
+        if self.mode == "live":
+            return fetch()
+
+        started = time.monotonic()
+        try:
+            response = fetch()
+        except Exception as e:
+            self._append(source, target, params, time.monotonic() - started, error=f"{type(e).__name__}: {e}")
+            raise
+        self._append(source, target, params, time.monotonic() - started, response=encode(response))
+        return response
+
+    def _append(self, source: str, target: str, params: Dict[str, Any], elapsed: float,
+                response: Any = None, error: Optional[str] = None) -> None:
+        record = {
+            "key": request_key(source, target, params),
+            "looseKey": _loose_key(source, target, params),
+            "source": source,
+            "target": target,
+            "params": params,
+            "elapsed": round(elapsed, 6),
+            "recordedAt": time.time(),
+            "error": error,
+            "response": response,
+        }
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(os.path.join(self.directory, f"upstream-{os.getpid()}.jsonl"), "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+            self._recorded += 1
+
+    def _load(self) -> Dict[str, Dict]:
+        """記録を読み込む（初回の再生時のみ）"""
+        with self._lock:
+            if self._exact is None:
+                exact: Dict[str, Dict] = {}
+                loose: Dict[str, Dict] = {}
+                paths = sorted(glob.glob(os.path.join(self.directory, "*.jsonl")))
+                records = []
+                for path in paths:
+                    with open(path, encoding="utf-8") as f:
+                        records.extend(json.loads(line) for line in f if line.strip())
+                # 複数ファイルにまたがる場合も記録時刻順に後勝ちにする
+                for record in sorted(records, key=lambda r: r["recordedAt"]):
+                    exact[record["key"]] = record
+                    loose[record["looseKey"]] = record
+                self._exact, self._loose = exact, loose
+                logger.info(f"上流の記録を読み込みました: {len(exact)}件 ({self.directory})")
+            return self._exact
+
+    def _replay(self, source: str, target: str, params: Dict[str, Any], decode: Callable[[Any], Any]) -> Any:
+        record = self._load().get(request_key(source, target, params)) \
+            or self._loose.get(_loose_key(source, target, params))
+        if record is None:
+            with self._lock:
+                self._misses += 1
+            raise ReplayMissError(f"記録がありません: {source} {target} {params}")
+        with self._lock:
+            self._replayed += 1
+        if self.latency_scale > 0:
+            time.sleep(record["elapsed"] * self.latency_scale)
+        if record["error"]:
+            raise RecordedUpstreamError(record["error"])
+        return decode(record["response"])
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "mode": self.mode,
+                "directory": self.directory,
+                "recorded": self._recorded,
+                "replayed": self._replayed,
+                "misses": self._misses,
+                "loaded": len(self._exact) if self._exact is not None else 0,
+            }
+
+
+def create_recorder() -> UpstreamRecorder:
+    """環境変数の設定から記録・再生の設定を生成"""
+    return UpstreamRecorder(
+        mode=os.getenv("STACK_WATCHER_UPSTREAM_MODE", "live"),
+        directory=os.getenv("STACK_WATCHER_RECORDINGS_DIR", DEFAULT_RECORDINGS_DIR),
+        latency_scale=float(os.getenv("STACK_WATCHER_REPLAY_LATENCY", "0")),
+    )
+
+
+# プロセス共通の記録・再生の設定
+get_recorder = lazy_singleton(create_recorder)
@@ -0,0 +1,96 @@
+"""
+週足・月足のロールアップ
+銘柄・インデックスごとに取得済みの日足（終値）をまとめて保持し、週足・月足を集計済みの系列として持つ。
+新しい日足が届いた場合は、変更のあった週・月（通常は最新の1本）だけを集計し直し、
+長期間の週足・月足のリクエストでは集計済みの系列から切り出すだけで応答する。
+
+日足は OHLCVSeries（株価）・DailySeries（インデックスの終値）のどちらでもよい。
+"""
+
+from typing import Dict, Optional, Union
+
+import numpy as np
+
+from backend.series import CALENDAR_INTERVALS, DailySeries, OHLCVSeries, calendar_buckets, next_bucket
+
+Series = Union[OHLCVSeries, DailySeries]
+
+
+def _days(series: Series) -> np.ndarray:
+    """各行の日付（datetime64[D]）"""
+    return series.local_days() if isinstance(series, OHLCVSeries) else series.dates
+
+
+def _shift(day: str, days: int) -> str:
+    return str(np.datetime64(day, "D") + np.timedelta64(days, "D"))
+
+
+class Rollups:
+    """1系列分の日足と、そこから集計した週足・月足（更新のたびに新しいインスタンスを返す）"""
+
+    __slots__ = ("daily", "coverage_start", "coverage_end", "series")
+
+    def __init__(self, daily: Series, coverage_start: str, coverage_end: str,
+                 series: Optional[Dict[str, Series]] = None):
+        # 日足は日付範囲ストアの系列から切り出したビューの場合があるため、コピーして持つ
+        self.daily = daily.compact()
+        # 日足を取得済みの範囲（休場日を含む。YYYY-MM-DD）
+        self.coverage_start = coverage_start
+        self.coverage_end = coverage_end
+        self.series = series if series is not None else {
+            interval: daily.rollup(interval) for interval in CALENDAR_INTERVALS
+        }
+
+    @property
+    def nbytes(self) -> int:
+        """保持している配列の合計バイト数（キャッシュの容量計算用）"""
+        return self.daily.nbytes + sum(series.nbytes for series in self.series.values())
+
+    def covers(self, start: str, end: str) -> bool:
+        return self.coverage_start <= start and end <= self.coverage_end
+
+    def get(self, interval: str, start: str, end: str) -> Series:
+        """
+        [start, end] の日を含む週・月の足を切り出す
+
+        Args:
+            interval: 足種（1wk / 1mo）
+            start: 開始日 (YYYY-MM-DD)
+            end: 終了日 (YYYY-MM-DD)
+        """
+        first = calendar_buckets(np.array([start], dtype="datetime64[D]"), interval)[0]
+        return self.series[interval].slice(str(first), end)
+
+    def merge(self, daily: Series, start: str, end: str) -> "Rollups":
+        """
+        新しく取得した日足を反映した Rollups を返す
+
+        既存の範囲より後の日足は、既存の最終日（取得時点で未確定の日）以降の週・月だけを集計し直す。
+        既存の範囲より前に広がる場合は、届いた日足の範囲の週・月を集計し直す。
+        既存の範囲と重ならず間が空く場合は、集計済みの系列に欠けができないよう反映しない。
+
+        Args:
+            daily: 取得した日足
+            start: 取得した範囲の開始日 (YYYY-MM-DD)
+            end: 取得した範囲の終了日 (YYYY-MM-DD)
+        """
+        if start > _shift(self.coverage_end, 1) or end < _shift(self.coverage_start, -1):
+            return self
+        coverage_start, coverage_end = min(start, self.coverage_start), max(end, self.coverage_end)
+        if len(daily) == 0:
+            return Rollups(self.daily, coverage_start, coverage_end, self.series)
+        if len(self.daily) == 0:
+            return Rollups(daily, coverage_start, coverage_end)
+
+        old_days, new_days = _days(self.daily), _days(daily)
+        merged = self.daily.splice(daily)
+        # 集計し直す日付の範囲（確定済みの日足は変わらないため、既存の最終日より前は対象外）
+        lo = new_days[0] if new_days[0] < old_days[0] else max(new_days[0], old_days[-1])
+        hi = new_days[-1]
+        series = dict(self.series)
+        if lo <= hi:
+            for interval in CALENDAR_INTERVALS:
+                first = calendar_buckets(np.array([lo]), interval)[0]
+                last = next_bucket(calendar_buckets(np.array([hi]), interval)[0], interval) - np.timedelta64(1, "D")
+                series[interval] = series[interval].splice(merged.slice(str(first), str(last)).rollup(interval))
+        return Rollups(merged, coverage_start, coverage_end, series)
@@ -0,0 +1,398 @@
+"""
+銘柄スクリーナー
+カタログの全銘柄の終値・出来高を「銘柄 × 日付」の行列として保持し、
+期間騰落率・ボラティリティ・出来高急増率による並べ替えと絞り込みを行列全体に対してまとめて計算する。
+
+行列は株価の取得・バックフィル（StockService）の取り込み時に差分で更新し、スクリーニング時に上流へは問い合わせない。
+他のワーカー・プロセスが取得してキャッシュに保存した日足は、一定間隔ごとにまとめて取り込む（リクエストごとには読まない）。
+銘柄数が多い場合は行（銘柄）を分割してプロセスプールで並行に計算する。
+
+環境変数:
+    STACK_WATCHER_SCREENER_DAYS: 保持する営業日数（既定260）
+    STACK_WATCHER_SCREENER_SHARD_ROWS: 1シャードの銘柄数（既定2000、これ以下はプロセスプールを使わない）
+    STACK_WATCHER_SCREENER_WORKERS: プロセスプールのワーカー数（既定: CPU数）
+    STACK_WATCHER_SCREENER_SYNC_SECONDS: キャッシュ済みの日足を取り込む間隔（秒、既定300）
+"""
+
+import logging
+import math
+import os
+import threading
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from backend.cache import CacheBackend, get_cache
+from backend.lazy import lazy_singleton
+from backend.symbol_catalog import SymbolCatalog, get_symbol_catalog
+
+logger = logging.getLogger(__name__)
+
+# 並べ替えの指標（APIのsort） -> 計算結果の列名
+SCREENER_SORTS = {
+    "return": "return_pct",
+    "volatility": "volatility_pct",
+    "volume_spike": "volume_spike",
+}
+
+# 期間 -> 営業日数
+SCREENER_PERIODS = {"7d": 5, "1m": 21, "3m": 63}
+
+DEFAULT_SCREENER_LIMIT = 20
+DEFAULT_SYNC_SECONDS = 300.0
+MAX_SCREENER_LIMIT = 500
+
+# 年率換算の営業日数
+TRADING_DAYS_PER_YEAR = 252
+
+# 行列の更新元とするキャッシュの期間（長い期間から取り込み、短い期間の新しい値で上書きする）
+_CACHE_PERIODS = ("3m", "1m", "7d")
+
+
+def compute_metrics(closes: np.ndarray, volumes: np.ndarray, window: int) -> Dict[str, np.ndarray]:
+    """
+    直近 window 営業日の指標を全銘柄まとめて計算（プロセスプールから呼び出すためモジュール関数とする）
+
+    Args:
+        closes: 終値の行列（銘柄 × 日付、欠損はNaN）
+        volumes: 出来高の行列（銘柄 × 日付、欠損はNaN）
+        window: 営業日数
+
+    Returns:
+        列名 -> 銘柄ごとの値（計算できない銘柄はNaN）
+        last_close / return_pct / volatility_pct / volume_spike / avg_volume
+    """
+    # 騰落率は期間の前日終値から計算する
+    c = closes[:, -(window + 1):]
+    v = volumes[:, -window:]
+    rows = np.arange(c.shape[0])
+
+    valid = ~np.isnan(c)
+    has_close = valid.any(axis=1)
+    first = c[rows, valid.argmax(axis=1)]
+    last = c[rows, c.shape[1] - 1 - valid[:, ::-1].argmax(axis=1)]
+
+    v_valid = ~np.isnan(v)
+    v_count = v_valid.sum(axis=1)
+    v_last = v[rows, v.shape[1] - 1 - v_valid[:, ::-1].argmax(axis=1)]
+
+    with np.errstate(divide="ignore", invalid="ignore"), warnings.catch_warnings():
+        # 全て欠損の銘柄の nanstd・nanmean の警告は抑える（結果はNaN）
+        warnings.simplefilter("ignore", RuntimeWarning)
+        return_pct = np.where(has_close, (last / first - 1) * 100, np.nan)
+        log_returns = np.diff(np.log(c), axis=1)
+        volatility_pct = np.nanstd(log_returns, axis=1, ddof=1) * math.sqrt(TRADING_DAYS_PER_YEAR) * 100
+        avg_volume = np.nanmean(v, axis=1)
+        # 最新の出来高 / それ以前の平均出来高
+        previous_mean = (np.nansum(v, axis=1) - v_last) / (v_count - 1)
+        volume_spike = np.where(v_count >= 2, v_last / previous_mean, np.nan)
+
+    return {
+        "last_close": np.where(has_close, last, np.nan),
+        "return_pct": return_pct,
+        "volatility_pct": volatility_pct,
+        "volume_spike": np.where(np.isfinite(volume_spike), volume_spike, np.nan),
+        "avg_volume": avg_volume,
+    }
+
+
+class UniverseMatrix:
+    """
+    全銘柄の終値・出来高の行列（銘柄 × 日付）
+
+    行はカタログの銘柄順で固定し、列（日付）は新しい営業日の取り込み時に追加する。
+    保持する日数を超えた古い列は捨てる。読み取りはロック内で複製した行列に対して行う。
+    """
+
+    def __init__(self, codes: Iterable[str], max_days: int = 260):
+        self.codes: List[str] = list(codes)
+        self.max_days = max_days
+        self._rows = {code: i for i, code in enumerate(self.codes)}
+        self._lock = threading.Lock()
+        self._dates = np.array([], dtype="datetime64[D]")
+        self._closes = np.empty((len(self.codes), 0))
+        self._volumes = np.empty((len(self.codes), 0))
+        # キャッシュキー -> 取り込んだエントリの保存時刻（同じエントリを再度取り込まない）
+        self._synced: Dict[str, float] = {}
+        # 取り込みのたびに増える版番号（指標の計算結果の再利用に使う）
+        self.version = 0
+
+    def ingest(self, code: str, days: np.ndarray, closes: np.ndarray, volumes: np.ndarray) -> bool:
+        """
+        1銘柄の日足を取り込む（同じ日付は上書き）
+
+        Args:
+            code: 銘柄コード
+            days: ローカル日付（datetime64[D]、昇順）
+            closes: 終値
+            volumes: 出来高
+
+        Returns:
+            取り込んだ場合True（カタログにない銘柄・空の系列はFalse）
+        """
+        row = self._rows.get(code)
+        if row is None or len(days) == 0:
+            return False
+        days = np.asarray(days, dtype="datetime64[D]")
+        with self._lock:
+            new_days = np.setdiff1d(days, self._dates, assume_unique=False)
+            if new_days.size:
+                self._extend(new_days)
+            # 保持期間より古い日付は捨てる
+            keep = days >= self._dates[0]
+            positions = np.searchsorted(self._dates, days[keep])
+            self._closes[row, positions] = np.asarray(closes, dtype=np.float64)[keep]
+            self._volumes[row, positions] = np.asarray(volumes, dtype=np.float64)[keep]
+            self.version += 1
+        return True
+
+    def _extend(self, new_days: np.ndarray) -> None:
+        """日付の列を追加する（ロック内で呼び出す）"""
+        dates = np.union1d(self._dates, new_days)[-self.max_days:]
+        closes = np.full((len(self.codes), len(dates)), np.nan)
+        volumes = np.full((len(self.codes), len(dates)), np.nan)
+        keep = self._dates >= dates[0]
+        positions = np.searchsorted(dates, self._dates[keep])
+        closes[:, positions] = self._closes[:, keep]
+        volumes[:, positions] = self._volumes[:, keep]
+        self._dates, self._closes, self._volumes = dates, closes, volumes
+
+    def sync_from_cache(self, cache: CacheBackend) -> int:
+        """
+        キャッシュ済みの日足（期間指定の取得・バックフィル）のうち未取り込みのものを取り込む
+
+        Returns:
+            取り込んだエントリ数
+        """
+        keys = {f"stock:{code}:{period}": code for period in _CACHE_PERIODS for code in self.codes}
+        entries = cache.get_many_entries(keys)
+        ingested = 0
+        # 長い期間から取り込み、短い期間（より新しい取得）の値で上書きする
+        for key, code in keys.items():
+            entry = entries.get(key)
+            if entry is None or self._synced.get(key) == entry.stored_at:
+                continue
+            series = entry.value
+            if self.ingest(code, series.local_days(), series.closes, series.volumes):
+                ingested += 1
+            self._synced[key] = entry.stored_at
+        return ingested
+
+    def snapshot(self) -> Tuple[int, np.ndarray, np.ndarray, np.ndarray]:
+        """(版番号, 日付, 終値, 出来高) の複製"""
+        with self._lock:
+            return self.version, self._dates.copy(), self._closes.copy(), self._volumes.copy()
+
+    def coverage(self) -> int:
+        """終値を1日分以上持つ銘柄数"""
+        with self._lock:
+            return int((~np.isnan(self._closes)).any(axis=1).sum()) if self._closes.size else 0
+
+
+def create_universe_matrix() -> UniverseMatrix:
+    """カタログの全銘柄の行列を生成"""
+    return UniverseMatrix(
+        (symbol.code for symbol in get_symbol_catalog()),
+        max_days=int(os.getenv("STACK_WATCHER_SCREENER_DAYS", "260")),
+    )
+
+
+# プロセス共通の行列（StockService の取得結果も取り込む）
+get_universe_matrix = lazy_singleton(create_universe_matrix)
+
+
+class Screener:
+    """行列に対するスクリーニング（指標の計算・絞り込み・並べ替え）"""
+
+    def __init__(self, matrix: UniverseMatrix, catalog: SymbolCatalog, cache: Optional[CacheBackend] = None,
+                 shard_rows: int = 2000, workers: Optional[int] = None,
+                 sync_interval: float = DEFAULT_SYNC_SECONDS):
+        self.matrix = matrix
+        self.catalog = catalog
+        self.cache = cache
+        self.sync_interval = sync_interval
+        self._synced_at: Optional[float] = None
+        self._sync_lock = threading.Lock()
+        self.shard_rows = shard_rows
+        self.workers = workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+        # (版番号, 営業日数) -> (最終日, 指標)
+        self._metrics: Dict[Tuple[int, int], Tuple[Optional[str], Dict[str, np.ndarray]]] = {}
+        symbols = [catalog.get(code) for code in matrix.codes]
+        self._markets = np.array([symbol.market for symbol in symbols], dtype=object)
+        self._sectors = np.array([symbol.sector for symbol in symbols], dtype=object)
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                import multiprocessing
+                # サーバーはスレッドを使うため、fork ではなく spawn でワーカーを起動する
+                self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context("spawn"))
+            return self._pool
+
+    def shutdown(self) -> None:
+        """プロセスプールを終了する"""
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+
+    def _compute(self, closes: np.ndarray, volumes: np.ndarray, window: int) -> Dict[str, np.ndarray]:
+        """指標を計算（銘柄数がシャードの大きさを超える場合はプロセスプールで分割して計算）"""
+        if len(closes) <= self.shard_rows:
+            return compute_metrics(closes, volumes, window)
+        pool = self._get_pool()
+        futures = [
+            pool.submit(compute_metrics, closes[i:i + self.shard_rows], volumes[i:i + self.shard_rows], window)
+            for i in range(0, len(closes), self.shard_rows)
+        ]
+        parts = [future.result() for future in futures]
+        return {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
+
+    def _sync(self) -> None:
+        """
+        前回から sync_interval 秒以上経っていればキャッシュ済みの日足を行列に取り込む
+
+        取り込みは全銘柄のエントリを読むため、リクエストごとには行わない。
+        他のスレッドが取り込み中の場合は待たずに現在の行列を使う。
+        """
+        if self.cache is None:
+            return
+        now = time.monotonic()
+        if self._synced_at is not None and now - self._synced_at < self.sync_interval:
+            return
+        if not self._sync_lock.acquire(blocking=self._synced_at is None):
+            return
+        try:
+            if self._synced_at is None or now - self._synced_at >= self.sync_interval:
+                self.matrix.sync_from_cache(self.cache)
+                self._synced_at = time.monotonic()
+        finally:
+            self._sync_lock.release()
+
+    def metrics(self, window: int) -> Tuple[Optional[str], Dict[str, np.ndarray]]:
+        """
+        最新の行列の指標（行列が更新されていなければ前回の計算結果を使う）
+
+        Returns:
+            (最終日 YYYY-MM-DD, 列名 -> 銘柄ごとの値)
+        """
+        self._sync()
+        version, dates, closes, volumes = self.matrix.snapshot()
+        cached = self._metrics.get((version, window))
+        if cached is not None:
+            return cached
+        as_of = str(dates[-1]) if len(dates) else None
+        if len(dates):
+            result = (as_of, self._compute(closes, volumes, window))
+        else:
+            empty = np.full(len(self.matrix.codes), np.nan)
+            result = (as_of, {name: empty for name in ("last_close", "avg_volume", *SCREENER_SORTS.values())})
+        # 古い版の結果は捨てる
+        self._metrics = {key: value for key, value in self._metrics.items() if key[0] == version}
+        self._metrics[(version, window)] = result
+        return result
+
+    def screen(self, sort: str = "return", order: str = "desc", period: str = "1m",
+               limit: int = DEFAULT_SCREENER_LIMIT, market: Optional[str] = None, sector: Optional[str] = None,
+               min_price: Optional[float] = None, min_volume: Optional[float] = None) -> Dict[str, Any]:
+        """
+        全銘柄を指標で並べ替えて上位を返す
+
+        Args:
+            sort: 並べ替えの指標（return / volatility / volume_spike）
+            order: desc（大きい順）/ asc（小さい順）
+            period: 期間（7d, 1m, 3m）
+            limit: 件数
+            market: 市場で絞り込み
+            sector: 業種で絞り込み
+            min_price: 最新終値の下限
+            min_volume: 期間の平均出来高の下限
+
+        Returns:
+            スクリーニング結果の辞書
+        """
+        if sort not in SCREENER_SORTS:
+            raise ValueError(f"無効な並べ替え: {sort}. 有効な値: {list(SCREENER_SORTS)}")
+        if order not in ("desc", "asc"):
+            raise ValueError(f"無効な並び順: {order}. 有効な値: ['desc', 'asc']")
+        if period not in SCREENER_PERIODS:
+            raise ValueError(f"無効な期間: {period}. 有効な期間: {list(SCREENER_PERIODS)}")
+        if not 1 <= limit <= MAX_SCREENER_LIMIT:
+            raise ValueError(f"件数は1〜{MAX_SCREENER_LIMIT}で指定してください")
+
+        as_of, metrics = self.metrics(SCREENER_PERIODS[period])
+        values = metrics[SCREENER_SORTS[sort]]
+
+        # 絞り込み（全銘柄まとめて真偽値の配列で判定）
+        mask = ~np.isnan(values)
+        if market:
+            mask &= self._markets == market
+        if sector:
+            mask &= self._sectors == sector
+        with np.errstate(invalid="ignore"):
+            if min_price is not None:
+                mask &= metrics["last_close"] >= min_price
+            if min_volume is not None:
+                mask &= metrics["avg_volume"] >= min_volume
+
+        candidates = np.flatnonzero(mask)
+        keys = values[candidates] if order == "asc" else -values[candidates]
+        if len(candidates) > limit:
+            # 上位 limit 件だけを部分ソートで選んでから並べる
+            top = np.argpartition(keys, limit - 1)[:limit]
+            candidates, keys = candidates[top], keys[top]
+        ranked = candidates[np.argsort(keys, kind="stable")]
+
+        results = []
+        for row in ranked:
+            symbol = self.catalog.get(self.matrix.codes[row])
+            results.append({
+                "symbol": symbol.code,
+                "name": symbol.name,
+                "market": symbol.market,
+                "sector": symbol.sector,
+                "last_close": _round(metrics["last_close"][row], 2),
+                "return_pct": _round(metrics["return_pct"][row], 2),
+                "volatility_pct": _round(metrics["volatility_pct"][row], 2),
+                "volume_spike": _round(metrics["volume_spike"][row], 2),
+                "avg_volume": _round(metrics["avg_volume"][row], 0),
+            })
+
+        return {
+            "sort": sort,
+            "order": order,
+            "period": period,
+            "as_of": as_of,
+            "universe": len(self.matrix.codes),
+            "covered": self.matrix.coverage(),
+            "matched": int(mask.sum()),
+            "results": results,
+        }
+
+
+def _round(value: float, decimals: int) -> Optional[float]:
+    """JSON用に丸める（NaNはNone）"""
+    return None if math.isnan(value) else round(float(value), decimals)
+
+
+def create_screener() -> Screener:
+    """環境変数の設定からスクリーナーを生成"""
+    workers = os.getenv("STACK_WATCHER_SCREENER_WORKERS")
+    return Screener(
+        get_universe_matrix(),
+        get_symbol_catalog(),
+        cache=get_cache(),
+        shard_rows=int(os.getenv("STACK_WATCHER_SCREENER_SHARD_ROWS", "2000")),
+        workers=int(workers) if workers else None,
+        sync_interval=float(os.getenv("STACK_WATCHER_SCREENER_SYNC_SECONDS", str(DEFAULT_SYNC_SECONDS))),
+    )
+
+
+# プロセス共通のスクリーナー
+get_screener = lazy_singleton(create_screener)
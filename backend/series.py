@@ -0,0 +1,384 @@
+"""
+列指向の時系列
+キャッシュ・計算では日付（時刻）と値を型付きの連続配列（NumPy）で保持し、
+1本（1日）ごとの辞書はAPIレスポンスに変換する時点でのみ生成する。
+メタデータは __slots__ で保持し、系列あたりのオブジェクト数を一定に抑える。
+"""
+
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Mapping, Optional, Sequence
+
+import numpy as np
+
+NS_PER_MINUTE = 60 * 1_000_000_000
+NS_PER_DAY = 1440 * NS_PER_MINUTE
+
+# 気象データなどの既定の丸め桁数
+DECIMALS = 1
+
+# 暦で区切る足種（週足は月曜始まり、月足は1日始まり）と、足の幅の公称値（分）
+CALENDAR_INTERVALS = {"1wk": 7 * 1440, "1mo": 30 * 1440}
+
+
+def to_json_list(values: np.ndarray, decimals: int = DECIMALS) -> List[Optional[float]]:
+    """丸めた上でリストに変換（NaNはNone）"""
+    rounded = np.round(values, decimals)
+    missing = np.isnan(rounded)
+    if not missing.any():
+        return rounded.tolist()
+    return np.where(missing, None, rounded).tolist()
+
+
+def buffer_nbytes(arrays: Sequence[np.ndarray]) -> int:
+    """
+    配列が保持しているメモリの合計バイト数
+
+    ビュー（切り出した配列）は元の配列全体を保持し続けるため元の配列の大きさで数え、
+    同じ配列を元にする複数のビューは1回だけ数える
+    """
+    owners = {}
+    for values in arrays:
+        owner = values.base if isinstance(values.base, np.ndarray) else values
+        owners[id(owner)] = owner.nbytes
+    return sum(owners.values())
+
+
+def _own(values: np.ndarray) -> np.ndarray:
+    """ビューの場合は必要な範囲だけをコピーした配列（元の配列を保持し続けないようにする）"""
+    return values if values.base is None else values.copy()
+
+
+def _day(value: str) -> np.datetime64:
+    """日付文字列 (YYYY-MM-DD...) を日単位のdatetime64に変換"""
+    return np.datetime64(value[:10], "D")
+
+
+def aggregate_ohlc(starts: np.ndarray, opens: np.ndarray, highs: np.ndarray, lows: np.ndarray,
+                   closes: np.ndarray, volumes: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    連続バケットごとにOHLCVを集約
+
+    Args:
+        starts: 各バケットの開始インデックス（昇順）
+        opens, highs, lows, closes, volumes: 元データの各列
+
+    Returns:
+        集約後の各列（open/high/low/close/volume）
+    """
+    ends = np.append(starts[1:], len(opens)) - 1
+    return {
+        "open": opens[starts],
+        "high": np.maximum.reduceat(highs, starts),
+        "low": np.minimum.reduceat(lows, starts),
+        "close": closes[ends],
+        "volume": np.add.reduceat(volumes, starts),
+    }
+
+
+def calendar_buckets(days: np.ndarray, interval: str) -> np.ndarray:
+    """
+    各日付が属する週・月の開始日
+
+    Args:
+        days: 日付（datetime64[D]）
+        interval: 足種（1wk / 1mo）
+
+    Returns:
+        週の月曜日・月の1日（datetime64[D]）
+    """
+    if interval == "1wk":
+        # 1970-01-01 は木曜日のため、+3 した7の剰余が月曜日からの日数になる
+        return days - ((days.astype(np.int64) + 3) % 7).astype("timedelta64[D]")
+    if interval == "1mo":
+        return days.astype("datetime64[M]").astype("datetime64[D]")
+    raise ValueError(f"サポートされていない足種: {interval}. 有効な足種: {list(CALENDAR_INTERVALS)}")
+
+
+def next_bucket(start: np.datetime64, interval: str) -> np.datetime64:
+    """週・月の開始日の次の週・月の開始日"""
+    if interval == "1wk":
+        return start + np.timedelta64(7, "D")
+    return (start.astype("datetime64[M]") + 1).astype("datetime64[D]")
+
+
+def _bucket_starts(keys: np.ndarray) -> np.ndarray:
+    """値が切り替わる位置（連続バケットの開始インデックス）"""
+    return np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+
+
+class OHLCVSeries:
+    """列ごとに連続配列で保持するローソク足（日中足・日足）"""
+
+    __slots__ = (
+        "timestamps", "opens", "highs", "lows", "closes", "volumes",
+        "utc_offset_ns", "interval_minutes", "fetched_at",
+    )
+
+    def __init__(self, timestamps: np.ndarray, opens: np.ndarray, highs: np.ndarray, lows: np.ndarray,
+                 closes: np.ndarray, volumes: np.ndarray, utc_offset_ns: int, interval_minutes: int,
+                 fetched_at: Optional[float] = None):
+        # timestamps: 足の開始時刻（UTCエポックナノ秒）
+        self.timestamps = timestamps
+        self.opens = opens
+        self.highs = highs
+        self.lows = lows
+        self.closes = closes
+        self.volumes = volumes
+        self.utc_offset_ns = utc_offset_ns
+        self.interval_minutes = interval_minutes
+        self.fetched_at = time.time() if fetched_at is None else fetched_at
+
+    @classmethod
+    def from_frame(cls, frame, interval_minutes: int) -> "OHLCVSeries":
+        """yfinanceのhistory()結果（DatetimeIndex付きDataFrame）から生成"""
+        index = frame.index
+        if index.tz is None:
+            # タイムゾーンなしの場合は東証のローカル時刻として扱う
+            index = index.tz_localize("Asia/Tokyo")
+        utc_offset_ns = int(index[0].utcoffset().total_seconds()) * 1_000_000_000
+        # tz付きDatetimeIndexのasi8はUTCエポックナノ秒
+        timestamps = index.asi8
+        return cls(
+            timestamps=np.ascontiguousarray(timestamps, dtype=np.int64),
+            # DataFrame の列はブロック（複数列の2次元配列）のビューのため、列ごとにコピーして持つ
+            opens=frame["Open"].to_numpy(dtype=np.float64, copy=True),
+            highs=frame["High"].to_numpy(dtype=np.float64, copy=True),
+            lows=frame["Low"].to_numpy(dtype=np.float64, copy=True),
+            closes=frame["Close"].to_numpy(dtype=np.float64, copy=True),
+            volumes=frame["Volume"].to_numpy(dtype=np.int64, copy=True),
+            utc_offset_ns=utc_offset_ns,
+            interval_minutes=interval_minutes,
+        )
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    @property
+    def nbytes(self) -> int:
+        """保持している配列の合計バイト数（ビューは元の配列の大きさで数える）"""
+        return buffer_nbytes([getattr(self, name) for name in ("timestamps", "opens", "highs", "lows", "closes", "volumes")])
+
+    def compact(self) -> "OHLCVSeries":
+        """ビューを含まない系列（切り出した系列をキャッシュに保存する前に使う）"""
+        return OHLCVSeries(
+            *(_own(getattr(self, name)) for name in ("timestamps", "opens", "highs", "lows", "closes", "volumes")),
+            utc_offset_ns=self.utc_offset_ns,
+            interval_minutes=self.interval_minutes,
+            fetched_at=self.fetched_at,
+        )
+
+    def _take(self, index, interval_minutes: Optional[int] = None) -> "OHLCVSeries":
+        return OHLCVSeries(
+            self.timestamps[index], self.opens[index], self.highs[index], self.lows[index],
+            self.closes[index], self.volumes[index], self.utc_offset_ns,
+            interval_minutes or self.interval_minutes, self.fetched_at,
+        )
+
+    def local_days(self) -> np.ndarray:
+        """各足のローカル日付（datetime64[D]）"""
+        return ((self.timestamps + self.utc_offset_ns) // NS_PER_DAY).astype("datetime64[D]")
+
+    def slice(self, start: str, end: str) -> "OHLCVSeries":
+        """ローカル日付が [start, end] の足を切り出す（配列はコピーせずビューを共有）"""
+        days = self.local_days()
+        lo = int(np.searchsorted(days, _day(start), side="left"))
+        hi = int(np.searchsorted(days, _day(end), side="right"))
+        return self._take(slice(lo, hi))
+
+    def resample(self, minutes: int) -> "OHLCVSeries":
+        """
+        より粗い足へリサンプリング
+
+        ローカル時刻で minutes 幅に切り捨てたバケットごとにOHLCVを集約する
+        （日足は minutes=1440 でローカル日付単位となる）
+
+        Args:
+            minutes: 出力する足の幅（分）
+
+        Returns:
+            リサンプリング後の足
+        """
+        if minutes < self.interval_minutes:
+            raise ValueError(f"{self.interval_minutes}分足から{minutes}分足は生成できません")
+        if minutes == self.interval_minutes or len(self) == 0:
+            return self
+
+        width = minutes * NS_PER_MINUTE
+        local = self.timestamps + self.utc_offset_ns
+        keys = local // width
+        starts = _bucket_starts(keys)
+        buckets = aggregate_ohlc(starts, self.opens, self.highs, self.lows, self.closes, self.volumes)
+
+        return OHLCVSeries(
+            timestamps=keys[starts] * width - self.utc_offset_ns,
+            opens=buckets["open"],
+            highs=buckets["high"],
+            lows=buckets["low"],
+            closes=buckets["close"],
+            volumes=buckets["volume"],
+            utc_offset_ns=self.utc_offset_ns,
+            interval_minutes=minutes,
+            fetched_at=self.fetched_at,
+        )
+
+    def rollup(self, interval: str) -> "OHLCVSeries":
+        """
+        週足・月足に集計（足の時刻は週・月の開始日のローカル0時）
+
+        Args:
+            interval: 足種（1wk / 1mo）
+
+        Returns:
+            集計後の足
+        """
+        if len(self) == 0:
+            return self._take(slice(0, 0), CALENDAR_INTERVALS[interval])
+        keys = calendar_buckets(self.local_days(), interval)
+        starts = _bucket_starts(keys)
+        buckets = aggregate_ohlc(starts, self.opens, self.highs, self.lows, self.closes, self.volumes)
+        return OHLCVSeries(
+            timestamps=keys[starts].astype(np.int64) * NS_PER_DAY - self.utc_offset_ns,
+            opens=buckets["open"],
+            highs=buckets["high"],
+            lows=buckets["low"],
+            closes=buckets["close"],
+            volumes=buckets["volume"],
+            utc_offset_ns=self.utc_offset_ns,
+            interval_minutes=CALENDAR_INTERVALS[interval],
+            fetched_at=self.fetched_at,
+        )
+
+    def splice(self, other: "OHLCVSeries") -> "OHLCVSeries":
+        """other の最初から最後の日付までの足を other で置き換えた系列（前後の足はそのまま残す）"""
+        if len(other) == 0:
+            return self
+        if len(self) == 0:
+            return other
+        days, other_days = self.local_days(), other.local_days()
+        lo = int(np.searchsorted(days, other_days[0], side="left"))
+        hi = int(np.searchsorted(days, other_days[-1], side="right"))
+        parts = (self._take(slice(0, lo)), other, self._take(slice(hi, None)))
+        return OHLCVSeries(
+            *(np.concatenate([getattr(part, name) for part in parts])
+              for name in ("timestamps", "opens", "highs", "lows", "closes", "volumes")),
+            utc_offset_ns=other.utc_offset_ns,
+            interval_minutes=other.interval_minutes,
+            fetched_at=max(self.fetched_at, other.fetched_at),
+        )
+
+    def to_data_points(self) -> List[Dict[str, Any]]:
+        """APIレスポンス用のdata_points形式に変換"""
+        tz = timezone(timedelta(seconds=self.utc_offset_ns // 1_000_000_000))
+        seconds = (self.timestamps // 1_000_000_000).tolist()
+        return [
+            {
+                "date": datetime.fromtimestamp(ts, tz).isoformat(),
+                "open": round(o, 2),
+                "high": round(h, 2),
+                "low": round(l, 2),
+                "close": round(c, 2),
+                "volume": v,
+            }
+            for ts, o, h, l, c, v in zip(
+                seconds,
+                self.opens.tolist(),
+                self.highs.tolist(),
+                self.lows.tolist(),
+                self.closes.tolist(),
+                self.volumes.tolist(),
+            )
+        ]
+
+
+class DailySeries:
+    """日付（datetime64[D]）と名前付きの float64 列で保持する日次系列"""
+
+    __slots__ = ("dates", "columns", "attrs", "fetched_at")
+
+    def __init__(self, dates: Sequence, columns: Mapping[str, Sequence], attrs: Optional[Dict[str, Any]] = None,
+                 fetched_at: Optional[float] = None):
+        self.dates = np.asarray(dates, dtype="datetime64[D]")
+        self.columns = {name: np.asarray(values, dtype=np.float64) for name, values in columns.items()}
+        # 系列単位のメタデータ（座標など）
+        self.attrs = attrs if attrs is not None else {}
+        self.fetched_at = time.time() if fetched_at is None else fetched_at
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.columns[name]
+
+    @property
+    def nbytes(self) -> int:
+        """保持している配列の合計バイト数（ビューは元の配列の大きさで数える）"""
+        return buffer_nbytes([self.dates, *self.columns.values()])
+
+    def compact(self) -> "DailySeries":
+        """ビューを含まない系列（切り出した系列をキャッシュに保存する前に使う）"""
+        return DailySeries(
+            _own(self.dates),
+            {name: _own(values) for name, values in self.columns.items()},
+            self.attrs,
+            self.fetched_at,
+        )
+
+    def slice(self, start: str, end: str) -> "DailySeries":
+        """日付が [start, end] の範囲を切り出す（配列はコピーせずビューを共有）"""
+        lo = int(np.searchsorted(self.dates, _day(start), side="left"))
+        hi = int(np.searchsorted(self.dates, _day(end), side="right"))
+        return DailySeries(
+            self.dates[lo:hi],
+            {name: values[lo:hi] for name, values in self.columns.items()},
+            self.attrs,
+            self.fetched_at,
+        )
+
+    def rollup(self, interval: str) -> "DailySeries":
+        """
+        週・月ごとに集計（日付は週・月の開始日、各列はその週・月の最後の値）
+
+        終値の系列（インデックス）を週足・月足の終値にするためのもの
+
+        Args:
+            interval: 足種（1wk / 1mo）
+        """
+        if len(self) == 0:
+            return self
+        keys = calendar_buckets(self.dates, interval)
+        starts = _bucket_starts(keys)
+        ends = np.append(starts[1:], len(self.dates)) - 1
+        return DailySeries(
+            keys[starts],
+            {name: values[ends] for name, values in self.columns.items()},
+            self.attrs,
+            self.fetched_at,
+        )
+
+    def splice(self, other: "DailySeries") -> "DailySeries":
+        """other の最初から最後の日付までを other で置き換えた系列（前後はそのまま残す）"""
+        if len(other) == 0:
+            return self
+        if len(self) == 0:
+            return other
+        lo = int(np.searchsorted(self.dates, other.dates[0], side="left"))
+        hi = int(np.searchsorted(self.dates, other.dates[-1], side="right"))
+        return DailySeries(
+            np.concatenate([self.dates[:lo], other.dates, self.dates[hi:]]),
+            {name: np.concatenate([values[:lo], other.columns[name], values[hi:]])
+             for name, values in self.columns.items()},
+            self.attrs,
+            max(self.fetched_at, other.fetched_at),
+        )
+
+    def date_strings(self) -> List[str]:
+        """日付の文字列リスト (YYYY-MM-DD)"""
+        return np.datetime_as_string(self.dates, unit="D").tolist()
+
+    def to_dict(self, names: Optional[Sequence[str]] = None, decimals: int = DECIMALS) -> Dict[str, list]:
+        """APIレスポンス用の {"dates": [...], 列名: [...]} 形式に変換（NaNはNone）"""
+        result: Dict[str, list] = {"dates": self.date_strings()}
+        for name in (names if names is not None else self.columns):
+            result[name] = to_json_list(self.columns[name], decimals)
+        return result
@@ -0,0 +1,119 @@
+"""
+日付範囲クエリ用の時系列ストア
+取得済みの列指向系列（backend.series）を保持し、二分探索で任意の start/end 範囲を切り出す
+"""
+
+from datetime import datetime, timedelta
+from typing import Any, Optional, Tuple
+
+from backend.cache import MemoryCache
+
+DATE_FORMAT = "%Y-%m-%d"
+
+
+def parse_date_range(start: Optional[str], end: Optional[str]) -> Optional[Tuple[str, str]]:
+    """
+    start/end パラメータを検証して正規化
+
+    Args:
+        start: 開始日 (YYYY-MM-DD)
+        end: 終了日 (YYYY-MM-DD、省略時は本日)
+
+    Returns:
+        (開始日, 終了日) のタプル。どちらも未指定の場合はNone
+    """
+    if start is None and end is None:
+        return None
+    if start is None:
+        raise ValueError("endを指定する場合はstartも指定してください")
+
+    try:
+        start_date = datetime.strptime(start, DATE_FORMAT)
+        end_date = datetime.strptime(end, DATE_FORMAT) if end is not None else datetime.now()
+    except ValueError:
+        raise ValueError(f"無効な日付形式: start={start}, end={end}. YYYY-MM-DD形式で指定してください")
+
+    if start_date > end_date:
+        raise ValueError(f"無効な日付範囲: start={start} は end={end} より後です")
+
+    return start_date.strftime(DATE_FORMAT), end_date.strftime(DATE_FORMAT)
+
+
+def next_day(date_str: str) -> str:
+    """翌日の日付文字列（終端が排他的なAPI向け）"""
+    return (datetime.strptime(date_str, DATE_FORMAT) + timedelta(days=1)).strftime(DATE_FORMAT)
+
+
+class _StoredSeries:
+    """ストア内の1系列"""
+
+    __slots__ = ("series", "coverage_start", "coverage_end")
+
+    def __init__(self, series: Any, coverage_start: str, coverage_end: str):
+        self.series = series
+        self.coverage_start = coverage_start
+        self.coverage_end = coverage_end
+
+    @property
+    def nbytes(self) -> int:
+        """保持している系列の配列の合計バイト数（キャッシュの容量計算用）"""
+        return self.series.nbytes
+
+    def covers(self, start: str, end: str) -> bool:
+        return self.coverage_start <= start and end <= self.coverage_end
+
+
+class SeriesRangeStore:
+    """
+    キーごとに取得済み範囲（カバレッジ）つきの時系列を保持するストア
+
+    系列はキャッシュ（backend.cache）に保存されるため、共有キャッシュ使用時は
+    全ワーカーで同じ系列を参照する
+    """
+
+    def __init__(self, ttl_seconds: float, cache=None, namespace: str = "range"):
+        self.ttl_seconds = ttl_seconds
+        self.cache = cache if cache is not None else MemoryCache()
+        self.namespace = namespace
+
+    def _load(self, key: str) -> Optional[_StoredSeries]:
+        return self.cache.get(f"{self.namespace}:{key}")
+
+    def get(self, key: str, start: str, end: str) -> Optional[Any]:
+        """
+        保持している系列から範囲を切り出す
+
+        Returns:
+            範囲内の系列。未取得の範囲を含む場合はNone
+        """
+        stored = self._load(key)
+        if stored is None or not stored.covers(start, end):
+            return None
+        return stored.series.slice(start, end)
+
+    def fetch_range(self, key: str, start: str, end: str) -> Tuple[str, str]:
+        """
+        上流から取得すべき範囲を返す
+
+        既存のカバレッジと要求範囲の和集合を返すことで、パン操作で隣接範囲を
+        要求された場合もストア内の系列を1本に保つ
+        """
+        stored = self._load(key)
+        if stored is None:
+            return start, end
+        return min(start, stored.coverage_start), max(end, stored.coverage_end)
+
+    def put(self, key: str, series: Any, coverage_start: str, coverage_end: str, cost: float = 0.0,
+            ttl: Optional[float] = None) -> None:
+        """
+        取得済みの系列（slice(start, end) を持つ OHLCVSeries / DailySeries）を保存（ビューはコピーして保存する）
+
+        cost には上流からの取得に要した秒数を渡す（長期間の系列ほど追い出されにくくなる）。
+        ttl を省略した場合はストアのTTLを使う（バックフィルでは長めのTTLを指定する）
+        """
+        self.cache.set(
+            f"{self.namespace}:{key}",
+            _StoredSeries(series.compact(), coverage_start, coverage_end),
+            self.ttl_seconds if ttl is None else ttl,
+            cost,
+        )
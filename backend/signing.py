@@ -0,0 +1,74 @@
+"""
+保存データの署名
+キャッシュ（disk / redis）・スナップショットは値を pickle で保存するため、
+読み込み時に HMAC-SHA256 の署名を検証し、一致しないデータは pickle.loads に渡さない。
+
+同一ホストのワーカーで共有する鍵・ファイルは、本人だけが読み書きできるデータディレクトリに置く。
+
+環境変数:
+    STACK_WATCHER_DATA_DIR: データディレクトリ（既定 $XDG_CACHE_HOME/stack_watcher、未設定時は ~/.cache/stack_watcher）
+    STACK_WATCHER_CACHE_SECRET: 署名の鍵（未指定時はデータディレクトリの secret.key を使い、なければ生成する）
+"""
+
+import hashlib
+import hmac
+import os
+import secrets
+import stat
+from typing import Optional
+
+SIGNATURE_BYTES = hashlib.sha256().digest_size
+
+SECRET_FILE = "secret.key"
+
+
+def private_data_dir() -> str:
+    """
+    本人だけが読み書きできるデータディレクトリ（なければ作成する）
+
+    Raises:
+        PermissionError: 他のユーザーが所有するディレクトリの場合
+    """
+    path = os.getenv("STACK_WATCHER_DATA_DIR") or os.path.join(
+        os.getenv("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"), "stack_watcher")
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    info = os.stat(path)
+    if info.st_uid != os.geteuid():
+        raise PermissionError(f"データディレクトリの所有者が異なります: {path}")
+    if info.st_mode & (stat.S_IRWXG | stat.S_IRWXO):
+        os.chmod(path, 0o700)
+    return path
+
+
+def load_secret() -> bytes:
+    """署名の鍵（STACK_WATCHER_CACHE_SECRET、未指定時はデータディレクトリの鍵ファイル）"""
+    secret = os.getenv("STACK_WATCHER_CACHE_SECRET")
+    if secret:
+        return secret.encode()
+    path = os.path.join(private_data_dir(), SECRET_FILE)
+    try:
+        # 複数のワーカーが同時に起動しても、最初に作成した鍵を全員が使う
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        with open(path, "rb") as f:
+            secret = f.read()
+        if secret:
+            return secret
+        raise ValueError(f"署名の鍵ファイルが空です: {path}")
+    secret = secrets.token_hex(32).encode()
+    with os.fdopen(fd, "wb") as f:
+        f.write(secret)
+    return secret
+
+
+def sign(secret: bytes, blob: bytes) -> bytes:
+    """blob の先頭に署名を付ける"""
+    return hmac.new(secret, blob, hashlib.sha256).digest() + blob
+
+
+def verify(secret: bytes, data: bytes) -> Optional[bytes]:
+    """署名を検証して blob を返す（一致しない場合はNone）"""
+    signature, blob = data[:SIGNATURE_BYTES], data[SIGNATURE_BYTES:]
+    if not hmac.compare_digest(signature, hmac.new(secret, blob, hashlib.sha256).digest()):
+        return None
+    return blob
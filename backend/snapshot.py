@@ -0,0 +1,102 @@
+"""
+キャッシュのスナップショット
+再デプロイ・再起動時に空のキャッシュから始まらないよう、終了時によく使われたエントリを
+鮮度情報ごと圧縮ファイルに保存し、起動時に書き戻す。
+書き戻したエントリのうち鮮度期限切れのものは、最初のアクセス時に古い値を返しつつ裏で再取得される。
+
+ファイルはデータディレクトリに置き、ディスクキャッシュと同じ鍵で署名する。
+署名が一致しないファイルは pickle.loads に渡さずに無視する。
+"""
+
+import logging
+import os
+import pickle
+import time
+import zlib
+from typing import Optional
+
+from backend.cache import CacheBackend
+from backend.signing import load_secret, private_data_dir, sign, verify
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 3
+
+DEFAULT_SNAPSHOT_FILE = "snapshot.bin"
+DEFAULT_SNAPSHOT_MAX_ENTRIES = 512
+
+
+def snapshot_path() -> Optional[str]:
+    """スナップショットの保存先（未指定時はデータディレクトリ、STACK_WATCHER_SNAPSHOT_PATH が空文字の場合は無効）"""
+    path = os.getenv("STACK_WATCHER_SNAPSHOT_PATH")
+    if path is None:
+        try:
+            return os.path.join(private_data_dir(), DEFAULT_SNAPSHOT_FILE)
+        except OSError as e:
+            logger.warning(f"データディレクトリを使用できないため、スナップショットを無効にします: {e}")
+            return None
+    return path or None
+
+
+def save_snapshot(cache: CacheBackend, path: str, max_entries: int = DEFAULT_SNAPSHOT_MAX_ENTRIES,
+                  secret: Optional[bytes] = None) -> int:
+    """
+    最近使われたエントリをスナップショットとして保存
+
+    Args:
+        cache: 保存元のキャッシュ
+        path: 保存先ファイル
+        max_entries: 保存する最大エントリ数
+        secret: 署名の鍵（未指定時は load_secret()）
+
+    Returns:
+        保存した件数
+    """
+    entries = cache.hot_entries(max_entries)
+    if not entries:
+        return 0
+
+    payload = {"version": SNAPSHOT_VERSION, "saved_at": time.time(), "entries": entries}
+    blob = sign(secret or load_secret(), zlib.compress(pickle.dumps(payload, protocol=pickle.HIGHEST_PROTOCOL)))
+
+    # 書き込み途中のファイルを読まないよう、一時ファイルに書いてから置き換える
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "wb") as f:
+        f.write(blob)
+    os.replace(tmp_path, path)
+    logger.info(f"キャッシュのスナップショットを保存しました: {len(entries)}件, {len(blob)}バイト -> {path}")
+    return len(entries)
+
+
+def load_snapshot(cache: CacheBackend, path: str, secret: Optional[bytes] = None) -> int:
+    """
+    スナップショットをキャッシュに書き戻す
+
+    読み込めないファイル（存在しない・署名が一致しない・形式が異なる）は無視する
+
+    Args:
+        cache: 書き戻し先のキャッシュ
+        path: スナップショットファイル
+        secret: 署名の鍵（未指定時は load_secret()）
+
+    Returns:
+        書き戻した件数
+    """
+    if not os.path.exists(path):
+        return 0
+    try:
+        with open(path, "rb") as f:
+            blob = verify(secret or load_secret(), f.read())
+        if blob is None:
+            logger.warning(f"スナップショットの署名が一致しないため無視します: {path}")
+            return 0
+        payload = pickle.loads(zlib.decompress(blob))
+        if payload.get("version") != SNAPSHOT_VERSION:
+            logger.warning(f"スナップショットのバージョンが異なるため無視します: {path}")
+            return 0
+        restored = cache.restore(payload["entries"])
+    except Exception as e:
+        logger.warning(f"スナップショットの読み込みに失敗: {e}")
+        return 0
+    logger.info(f"キャッシュのスナップショットを復元しました: {restored}件 <- {path}")
+    return restored
@@ -0,0 +1,188 @@
+"""
+静的ファイル（フロントエンド）配信
+ビルド時に生成した .br/.gz を Accept-Encoding に応じて返し、
+ハッシュ付きのVite出力（assets/）には immutable な Cache-Control を付与する。
+index.html はメモリに保持し、SPAのルート（拡張子なしのパス）にも返す。
+"""
+
+import gzip
+import hashlib
+import mimetypes
+import os
+import stat
+import time
+from typing import Dict, Optional, Tuple
+
+from starlette.datastructures import Headers
+from starlette.exceptions import HTTPException
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import StaticFiles
+from starlette.types import Scope
+
+# ハッシュ付きファイル名で出力されるディレクトリ（内容が変わればファイル名も変わる）
+IMMUTABLE_PREFIX = "assets" + os.sep
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# index.html は常に再検証させる（参照するアセットのハッシュが変わるため）
+INDEX_CACHE_CONTROL = "no-cache"
+
+# 優先順の圧縮形式（Content-Encoding, 拡張子）
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+# index.html の更新確認間隔（秒）。npm run build 後も再起動なしで反映する
+INDEX_RECHECK_SECONDS = 2.0
+
+FRONTEND_NOT_BUILT = "Frontend not built. Please run 'npm run build' first."
+
+
+def accepted_encodings(accept_encoding: str) -> set:
+    """Accept-Encodingヘッダーから受け入れ可能な圧縮形式を取得（q=0は除外）"""
+    accepted = set()
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        if params.replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        if name:
+            accepted.add(name.strip().lower())
+    return accepted
+
+
+class _IndexDocument:
+    """メモリに保持した index.html（圧縮済みの版を含む）"""
+
+    __slots__ = ("mtime", "etag", "bodies", "checked_at")
+
+    def __init__(self, full_path: str, mtime: float):
+        with open(full_path, "rb") as f:
+            body = f.read()
+        self.mtime = mtime
+        self.etag = '"' + hashlib.md5(body, usedforsecurity=False).hexdigest() + '"'
+        # Content-Encoding -> 本文（"identity" は非圧縮）
+        self.bodies: Dict[str, bytes] = {"identity": body}
+        for encoding, suffix in ENCODINGS:
+            if os.path.exists(full_path + suffix):
+                with open(full_path + suffix, "rb") as f:
+                    self.bodies[encoding] = f.read()
+        if "gzip" not in self.bodies:
+            self.bodies["gzip"] = gzip.compress(body, mtime=0)
+        self.checked_at = time.monotonic()
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """
+    事前圧縮ファイルとキャッシュヘッダーに対応した StaticFiles
+
+    ビルド成果物は配信中に変わらない前提で、圧縮版の有無は一度調べたら記憶する
+    （記憶するのは存在するファイルのパスだけで、存在しないパスへのリクエストでは増えない）
+    """
+
+    def __init__(self, *, directory: str, **kwargs):
+        super().__init__(directory=directory, html=True, **kwargs)
+        # (パス, 拡張子) -> (フルパス, stat) または None
+        self._variants: Dict[Tuple[str, str], Optional[Tuple[str, os.stat_result]]] = {}
+        self._index: Optional[_IndexDocument] = None
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        if scope["method"] not in ("GET", "HEAD"):
+            raise HTTPException(status_code=405)
+
+        if path in (".", "index.html"):
+            return self._index_response(scope)
+
+        response = self._precompressed_response(path, scope)
+        if response is None:
+            try:
+                response = await super().get_response(path, scope)
+            except HTTPException as exc:
+                if exc.status_code == 404 and self._is_spa_route(path):
+                    return self._index_response(scope)
+                raise
+
+        if path.startswith(IMMUTABLE_PREFIX) and response.status_code in (200, 304):
+            response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+        return response
+
+    def _variant(self, path: str, suffix: str) -> Optional[Tuple[str, os.stat_result]]:
+        """圧縮版（path + suffix）のフルパスとstat（なければNone）"""
+        key = (path, suffix)
+        if key in self._variants:
+            return self._variants[key]
+        full_path, stat_result = self.lookup_path(path + suffix)
+        if stat_result is not None and stat.S_ISREG(stat_result.st_mode):
+            variant = (full_path, stat_result)
+        elif self._is_file(path):
+            # 圧縮版のないファイル（画像等）は、毎回調べ直さないよう「なし」を記憶する
+            variant = None
+        else:
+            return None
+        self._variants[key] = variant
+        return variant
+
+    def _is_file(self, path: str) -> bool:
+        """配信ディレクトリに path のファイルがあるか"""
+        _, stat_result = self.lookup_path(path)
+        return stat_result is not None and stat.S_ISREG(stat_result.st_mode)
+
+    def _precompressed_response(self, path: str, scope: Scope) -> Optional[Response]:
+        """受け入れ可能な圧縮版があればそのレスポンス（なければNone）"""
+        request_headers = Headers(scope=scope)
+        accepted = accepted_encodings(request_headers.get("accept-encoding", ""))
+        for encoding, suffix in ENCODINGS:
+            if encoding not in accepted:
+                continue
+            variant = self._variant(path, suffix)
+            if variant is None:
+                continue
+            full_path, stat_result = variant
+            media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+            response = FileResponse(
+                full_path,
+                stat_result=stat_result,
+                media_type=media_type,
+                headers={"Content-Encoding": encoding, "Vary": "Accept-Encoding"},
+            )
+            if self.is_not_modified(response.headers, request_headers):
+                return Response(status_code=304, headers={
+                    "ETag": response.headers["etag"], "Vary": "Accept-Encoding"
+                })
+            return response
+        return None
+
+    @staticmethod
+    def _is_spa_route(path: str) -> bool:
+        """フロントエンドのルーティングに渡すパス（API以外で拡張子なし）"""
+        first = path.split(os.sep, 1)[0]
+        return first != "api" and "." not in os.path.basename(path)
+
+    def _load_index(self) -> Optional[_IndexDocument]:
+        """メモリ上の index.html を返す（ファイルが更新されていれば読み直す）"""
+        index = self._index
+        if index is not None and time.monotonic() - index.checked_at < INDEX_RECHECK_SECONDS:
+            return index
+
+        full_path, stat_result = self.lookup_path("index.html")
+        if stat_result is None or not stat.S_ISREG(stat_result.st_mode):
+            self._index = None
+            return None
+        if index is not None and index.mtime == stat_result.st_mtime:
+            index.checked_at = time.monotonic()
+            return index
+        self._index = _IndexDocument(full_path, stat_result.st_mtime)
+        return self._index
+
+    def _index_response(self, scope: Scope) -> Response:
+        index = self._load_index()
+        if index is None:
+            raise HTTPException(status_code=404, detail=FRONTEND_NOT_BUILT)
+
+        request_headers = Headers(scope=scope)
+        headers = {"ETag": index.etag, "Cache-Control": INDEX_CACHE_CONTROL, "Vary": "Accept-Encoding"}
+        if index.etag in [tag.strip(" W/") for tag in request_headers.get("if-none-match", "").split(",")]:
+            return Response(status_code=304, headers=headers)
+
+        accepted = accepted_encodings(request_headers.get("accept-encoding", ""))
+        for encoding, _ in ENCODINGS:
+            if encoding in accepted and encoding in index.bodies:
+                headers["Content-Encoding"] = encoding
+                return Response(index.bodies[encoding], media_type="text/html", headers=headers)
+        return Response(index.bodies["identity"], media_type="text/html", headers=headers)
@@ -3,22 +3,64 @@
 yfinanceライブラリを使用して日本株のデータを取得
 """
 
-import yfinance as yf
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional
-import pandas as pd
+import os
+import threading
+import time
+from datetime import date, datetime, timedelta
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, Iterator, List, Optional
+
+from backend.alerts import get_alert_engine
+from backend.cache import get_cache
+from backend.fetch_scheduler import bind_priority
+from backend.lazy import lazy_singleton
+from backend.rollups import Rollups
+from backend.screener import get_universe_matrix
+from backend.series import CALENDAR_INTERVALS, OHLCVSeries
+from backend.symbol_catalog import DEFAULT_SEARCH_LIMIT, MAX_SEARCH_LIMIT, get_symbol_catalog
+from backend.series_store import SeriesRangeStore, parse_date_range, next_day
+from backend.tracing import bind, traced
+from backend.upstream import make_ticker
+from backend.intraday import (
+    INTERVAL_MINUTES,
+    FINEST_INTERVAL,
+    validate_interval,
+    generate_mock_bars,
+)
+
+# 期間ごとの暦日数（長い期間のキャッシュから切り出す際に使用）
+PERIOD_DAYS = {"7d": 7, "1m": 31, "3m": 92}
 
 
 class StockService:
     """株価データ取得サービス"""
     
-    def __init__(self):
-        # 日本株の銘柄マッピング
-        self.symbols_map = {
-            "6326": {"code": "6326.T", "name": "クボタ"},
-            "9984": {"code": "9984.T", "name": "ソフトバンクグループ"},
-            "1377": {"code": "1377.T", "name": "サカタのタネ"}
+    # モックデータ用の銘柄ごとの現実的なベース価格と特性
+    MOCK_CHARACTERISTICS = {
+        "6326": {
+            "base_price": 2500, 
+            "volatility": 0.03,  # 3%変動
+            "trend": 0.002,      # 上昇トレンド
+            "name": "クボタ"
+        },
+        "9984": {
+            "base_price": 9000, 
+            "volatility": 0.05,  # 5%変動（テック株らしく）
+            "trend": -0.001,     # 微下降トレンド
+            "name": "ソフトバンクグループ"
+        },
+        "1377": {
+            "base_price": 4000, 
+            "volatility": 0.04,  # 4%変動
+            "trend": 0.001,      # 微上昇トレンド
+            "name": "サカタのタネ"
         }
+    }
+    
+    def __init__(self):
+        # 銘柄カタログ（コード・銘柄名・カナの前方一致インデックス付き）
+        self.catalog = get_symbol_catalog()
+        self._available_symbols: Optional[List[Dict]] = None
         
         # 期間マッピング（Phase 2拡張）
         self.period_map = {
@@ -26,57 +68,451 @@ class StockService:
             "1m": "1mo", 
             "3m": "3mo"
         }
+        
+        # 取得結果キャッシュ（共有キャッシュ設定時は全ワーカーで共有）
+        self.cache = get_cache()
+        self.cache_ttl_seconds = int(os.getenv("CACHE_STOCK_DATA_SECONDS", "900"))
+        self.intraday_ttl_seconds = int(os.getenv("CACHE_INTRADAY_DATA_SECONDS", "60"))
+        
+        # 週足・月足のロールアップ（取得した日足から差分で更新し、長期間の表示で再集計しない）
+        self.rollup_ttl_seconds = int(os.getenv("CACHE_ROLLUP_SECONDS", str(7 * 24 * 3600)))
+        self._rollup_lock = threading.Lock()
+        
+        # 日付範囲クエリ用の取得済み系列ストア
+        self.range_store = SeriesRangeStore(
+            ttl_seconds=self.cache_ttl_seconds, cache=self.cache, namespace="stock:range"
+        )
+        
+        # ストリーミング応答で並行して取得する銘柄数
+        self.stream_workers = int(os.getenv("STOCK_STREAM_WORKERS", "8"))
+        
+        # 新しく取得した日足をしきい値アラートで評価する
+        self.alerts = get_alert_engine()
+        
+        # 新しく取得した日足をスクリーナーの行列（銘柄 × 日付）に取り込む
+        self.universe = get_universe_matrix()
     
-    def get_stock_data(self, symbol: str, period: str = "7d") -> Dict:
+    @traced("stock.get_stock_data")
+    def get_stock_data(self, symbol: str, period: str = "7d",
+                       start: Optional[str] = None, end: Optional[str] = None,
+                       interval: str = "1d") -> Dict:
         """
         指定された銘柄の株価データを取得
         
         Args:
             symbol: 銘柄コード (例: "6326")
             period: 期間 ("7d", "1m", "3m")
+            start: 開始日 (YYYY-MM-DD、指定時はperiodより優先)
+            end: 終了日 (YYYY-MM-DD、省略時は本日)
+            interval: 足種 ("1m", "5m", "15m", "60m", "1d", "1wk", "1mo")
             
         Returns:
             株価データの辞書
         """
         # 銘柄コードの検証
-        if symbol not in self.symbols_map:
+        if symbol not in self.catalog:
             raise ValueError(f"サポートされていない銘柄コード: {symbol}")
         
+        date_range = parse_date_range(start, end)
+        if date_range is not None:
+            if interval in CALENDAR_INTERVALS:
+                return self._get_rollup_data(symbol, *date_range, interval)
+            if interval != "1d":
+                raise ValueError("日中足は期間（period）指定のみ対応しています")
+            return self._get_stock_range(symbol, *date_range)
+        
         # 期間の検証
         if period not in self.period_map:
             raise ValueError(f"サポートされていない期間: {period}")
         
-        stock_info = self.symbols_map[symbol]
-        yahoo_symbol = stock_info["code"]
+        validate_interval(interval, period)
+        if interval in CALENDAR_INTERVALS:
+            today = date.today()
+            return self._get_rollup_data(symbol, (today - timedelta(days=PERIOD_DAYS[period])).isoformat(),
+                                         today.isoformat(), interval, period)
+        if interval != "1d":
+            return self._get_intraday_data(symbol, period, interval)
+        
+        stock_info = self.catalog.get(symbol)
+        
+        # 日中足を保持している場合は日足もリサンプリングで導出（上流への追加リクエスト不要）
+        bars = self.cache.get(f"stock:intraday:{symbol}:{period}")
+        if bars is not None:
+            return self._format_intraday_data(symbol, stock_info.name, bars.resample(INTERVAL_MINUTES["1d"]), "1d")
+        
+        series = self._get_daily_series(symbol, period)
+        if series is None:
+            # データが取得できない場合はモックデータを返す
+            return self._get_mock_data(symbol, stock_info.name, period)
+        return self._format_stock_data(symbol, stock_info.name, series)
+    
+    def get_stock_series(self, symbol: str, period: str = "7d",
+                         start: Optional[str] = None, end: Optional[str] = None) -> Optional[OHLCVSeries]:
+        """
+        日足の系列を取得（エクスポート用。モックデータへのフォールバックは行わない）
+        
+        Args:
+            symbol: 銘柄コード
+            period: 期間 ("7d", "1m", "3m")
+            start: 開始日 (YYYY-MM-DD、指定時はperiodより優先)
+            end: 終了日 (YYYY-MM-DD、省略時は本日)
+            
+        Returns:
+            日足の系列。上流から取得できない場合はNone
+        """
+        if symbol not in self.catalog:
+            raise ValueError(f"サポートされていない銘柄コード: {symbol}")
+        
+        date_range = parse_date_range(start, end)
+        if date_range is not None:
+            return self._get_range_series(symbol, *date_range)
+        
+        if period not in self.period_map:
+            raise ValueError(f"サポートされていない期間: {period}")
+        return self._get_daily_series(symbol, period)
+    
+    def _get_daily_series(self, symbol: str, period: str) -> Optional[OHLCVSeries]:
+        """期間指定の日足の系列を取得（キャッシュ優先、取得できない場合はNone）"""
+        series = self.cache.get_or_fetch(
+            f"stock:{symbol}:{period}",
+            lambda: self._fetch_stock_data(symbol, period),
+            self.cache_ttl_seconds
+        )
+        if series is None:
+            # 上流の失敗・期限切れ時は、より長い期間のキャッシュ（期限切れを含む）から切り出す
+            series = self._get_cached_fallback(symbol, period)
+        return series
+    
+    def _get_cached_fallback(self, symbol: str, period: str) -> Optional[OHLCVSeries]:
+        """より長い期間のキャッシュ済みの日足から、指定期間分を切り出す（なければNone）"""
+        periods = list(self.period_map)
+        start = (date.today() - timedelta(days=PERIOD_DAYS[period])).isoformat()
+        for longer in periods[periods.index(period) + 1:]:
+            entry = self.cache.get_entry(f"stock:{symbol}:{longer}")
+            if entry is not None and entry.value is not None:
+                print(f"情報: {symbol}の{period}はキャッシュ済みの{longer}から切り出します")
+                series = entry.value.slice(start, date.today().isoformat())
+                return series if len(series) else None
+        return None
+    
+    @traced("stock._fetch_stock_data")
+    def _fetch_stock_data(self, symbol: str, period: str) -> Optional[OHLCVSeries]:
+        """
+        yfinanceから日足の株価データを取得
+        
+        Args:
+            symbol: 銘柄コード
+            period: 期間
+            
+        Returns:
+            日足の系列。取得できない場合はNone
+        """
+        stock_info = self.catalog.get(symbol)
+        yahoo_symbol = stock_info.yahoo_code
         yf_period = self.period_map[period]
         
         try:
             # yfinanceでデータ取得
             print(f"情報: {symbol} ({yahoo_symbol}) の実データを取得中...")
-            ticker = yf.Ticker(yahoo_symbol)
+            ticker = self._ticker(yahoo_symbol)
             data = ticker.history(period=yf_period)
             
             if data.empty:
-                # データが取得できない場合はモックデータを返す
                 print(f"警告: {symbol}の実データが取得できません。モックデータを返します。")
-                return self._get_mock_data(symbol, stock_info["name"], period)
+                return None
             
-            # データを整形
             print(f"成功: {symbol}の実データを取得しました（{len(data)}日分）")
-            formatted_data = self._format_stock_data(symbol, stock_info["name"], data)
-            return formatted_data
+            series = OHLCVSeries.from_frame(data, INTERVAL_MINUTES["1d"])
+            self.alerts.ingest("stock", symbol, series.timestamps, {"close": series.closes})
+            self.universe.ingest(symbol, series.local_days(), series.closes, series.volumes)
+            today = date.today()
+            self._update_rollups(symbol, series, (today - timedelta(days=PERIOD_DAYS[period])).isoformat(),
+                                 today.isoformat())
+            return series
             
         except Exception as e:
             print(f"エラー: {str(e)}。モックデータを返します。")
-            return self._get_mock_data(symbol, stock_info["name"], period)
+            return None
+    
+    @traced("stock._get_stock_range")
+    def _get_stock_range(self, symbol: str, start: str, end: str) -> Dict:
+        """
+        日付範囲を指定して株価データを取得
+        
+        取得済みの系列がある場合は二分探索で範囲を切り出し、
+        不足している場合のみ既存範囲との和集合を上流から取得する
+        
+        Args:
+            symbol: 銘柄コード
+            start: 開始日 (YYYY-MM-DD)
+            end: 終了日 (YYYY-MM-DD)
+            
+        Returns:
+            株価データの辞書
+        """
+        stock_info = self.catalog.get(symbol)
+        series = self._get_range_series(symbol, start, end)
+        
+        if series is None:
+            days = (datetime.strptime(end, "%Y-%m-%d") - datetime.strptime(start, "%Y-%m-%d")).days + 1
+            mock = self._get_mock_data(symbol, stock_info.name, None,
+                                       days=days, end_date=datetime.strptime(end, "%Y-%m-%d"))
+            mock.update({"start": start, "end": end})
+            return mock
+        
+        result = self._format_stock_data(symbol, stock_info.name, series)
+        result.update({"start": start, "end": end})
+        return result
+    
+    def _get_range_series(self, symbol: str, start: str, end: str) -> Optional[OHLCVSeries]:
+        """
+        日付範囲の日足の系列を取得
+        
+        取得済みの系列がある場合は二分探索で範囲を切り出し、
+        不足している場合のみ既存範囲との和集合を上流から取得する
+        
+        Returns:
+            日足の系列。上流から取得できない場合はNone
+        """
+        series = self.range_store.get(symbol, start, end)
+        if series is not None:
+            return series
+        
+        stock_info = self.catalog.get(symbol)
+        fetch_start, fetch_end = self.range_store.fetch_range(symbol, start, end)
+        started = time.monotonic()
+        try:
+            print(f"情報: {symbol} ({stock_info.yahoo_code}) の {fetch_start}〜{fetch_end} の実データを取得中...")
+            ticker = self._ticker(stock_info.yahoo_code)
+            data = ticker.history(start=fetch_start, end=next_day(fetch_end))
+        except Exception as e:
+            print(f"エラー: {str(e)}。")
+            return None
+        
+        if data.empty:
+            print(f"警告: {symbol}の{fetch_start}〜{fetch_end}の実データが取得できません。")
+            return None
+        
+        series = OHLCVSeries.from_frame(data, INTERVAL_MINUTES["1d"])
+        self.range_store.put(symbol, series, fetch_start, fetch_end, cost=time.monotonic() - started)
+        self._update_rollups(symbol, series, fetch_start, fetch_end)
+        return self.range_store.get(symbol, start, end)
+    
+    def _update_rollups(self, symbol: str, series: OHLCVSeries, start: str, end: str) -> Rollups:
+        """
+        取得した日足を週足・月足のロールアップに反映（変更のあった週・月だけを集計し直す）
+        
+        Args:
+            symbol: 銘柄コード
+            series: 取得した日足
+            start: 取得した範囲の開始日 (YYYY-MM-DD)
+            end: 取得した範囲の終了日 (YYYY-MM-DD)
+            
+        Returns:
+            反映後のロールアップ
+        """
+        key = f"stock:rollup:{symbol}"
+        with self._rollup_lock:
+            rollups = self.cache.get(key)
+            rollups = Rollups(series, start, end) if rollups is None else rollups.merge(series, start, end)
+            self.cache.set(key, rollups, self.rollup_ttl_seconds)
+        return rollups
+    
+    def _get_rollup_series(self, symbol: str, start: str, end: str, interval: str,
+                           period: Optional[str] = None) -> Optional[OHLCVSeries]:
+        """
+        集計済みの週足・月足を切り出す
+        
+        ロールアップが範囲を含まない場合は日足を取得（期間指定はキャッシュ優先）して反映してから切り出す。
+        既存の範囲と離れていて反映できない場合は、取得した日足だけから集計する
+        
+        Returns:
+            週足・月足。上流から取得できない場合はNone
+        """
+        rollups = self.cache.get(f"stock:rollup:{symbol}")
+        if rollups is None or not rollups.covers(start, end):
+            daily = self._get_daily_series(symbol, period) if period else self._get_range_series(symbol, start, end)
+            if daily is None:
+                return None
+            # 上流から取得した場合は取得時に反映済み
+            rollups = self.cache.get(f"stock:rollup:{symbol}")
+            if rollups is None or not rollups.covers(start, end):
+                rollups = self._update_rollups(symbol, daily, start, end)
+            if not rollups.covers(start, end):
+                # 既存の範囲と離れた範囲は反映されないため、取得した日足からその場で集計する
+                rollups = Rollups(daily, start, end)
+        return rollups.get(interval, start, end)
+    
+    @traced("stock._get_rollup_data")
+    def _get_rollup_data(self, symbol: str, start: str, end: str, interval: str,
+                         period: Optional[str] = None) -> Dict:
+        """
+        週足・月足の株価データを取得
+        
+        Args:
+            symbol: 銘柄コード
+            start: 開始日 (YYYY-MM-DD)
+            end: 終了日 (YYYY-MM-DD)
+            interval: 足種 ("1wk", "1mo")
+            period: 期間指定の場合の期間
+            
+        Returns:
+            株価データの辞書
+        """
+        stock_info = self.catalog.get(symbol)
+        series = self._get_rollup_series(symbol, start, end, interval, period)
+        if series is None:
+            print(f"警告: {symbol}の{interval}足のモックデータを返します。")
+            char = self.MOCK_CHARACTERISTICS.get(symbol, {"base_price": 1000, "volatility": 0.03})
+            days = (datetime.strptime(end, "%Y-%m-%d") - datetime.strptime(start, "%Y-%m-%d")).days + 1
+            mock_bars = generate_mock_bars(char["base_price"], char["volatility"], days, INTERVAL_MINUTES["60m"],
+                                           end_date=datetime.strptime(end, "%Y-%m-%d"))
+            result = self._format_intraday_data(symbol, stock_info.name + " (デモデータ)",
+                                                mock_bars.rollup(interval), interval)
+            result["is_mock"] = True
+            result["note"] = "Yahoo Finance API制限のため、現実的なデモデータを表示しています"
+        else:
+            result = self._format_intraday_data(symbol, stock_info.name, series, interval)
+        if period is None:
+            result.update({"start": start, "end": end})
+        return result
     
-    def get_multiple_stocks(self, symbols: List[str], period: str = "7d") -> Dict:
+    @traced("stock.backfill")
+    def backfill(self, symbol: str, start: str, end: str, ttl: Optional[float] = None) -> int:
+        """
+        長期間の日足を上流から取得し、日付範囲クエリ用のストアと期間指定のキャッシュに書き込む（バックフィル用）
+        
+        Args:
+            symbol: 銘柄コード
+            start: 開始日 (YYYY-MM-DD)
+            end: 終了日 (YYYY-MM-DD)
+            ttl: ストアに保存する系列のTTL（秒、省略時はキャッシュのTTL）
+            
+        Returns:
+            書き込んだ日足の本数（上流にデータがない場合は0）
+            
+        Raises:
+            上流の例外はそのまま送出する（呼び出し元で失敗として記録する）
+        """
+        stock_info = self.catalog.get(symbol)
+        if stock_info is None:
+            raise ValueError(f"サポートされていない銘柄コード: {symbol}")
+        
+        started = time.monotonic()
+        data = self._ticker(stock_info.yahoo_code).history(start=start, end=next_day(end))
+        if data.empty:
+            return 0
+        
+        series = OHLCVSeries.from_frame(data, INTERVAL_MINUTES["1d"])
+        cost = time.monotonic() - started
+        self.range_store.put(symbol, series, start, end, cost, ttl=ttl)
+        self._update_rollups(symbol, series, start, end)
+        self.universe.ingest(symbol, series.local_days(), series.closes, series.volumes)
+        
+        # 本日までの取得であれば、期間指定（7d/1m/3m）のキャッシュも同じ系列から切り出して埋める
+        # （別プロセスで実行した場合は、サーバーのスクリーナーがこのキャッシュから取り込む）
+        today = date.today()
+        if end >= today.isoformat():
+            for period in self.period_map:
+                window = series.slice((today - timedelta(days=PERIOD_DAYS[period])).isoformat(), today.isoformat())
+                if len(window):
+                    # 切り出した系列はバックフィルした系列全体のビューのため、コピーして保存する
+                    self.cache.set(f"stock:{symbol}:{period}", window.compact(), self.cache_ttl_seconds, cost)
+        return len(series)
+    
+    def _get_intraday_bars(self, symbol: str, period: str) -> Optional[OHLCVSeries]:
+        """
+        期間内で取得可能な最小粒度の日中足を取得（キャッシュ優先）
+        
+        Args:
+            symbol: 銘柄コード
+            period: 期間
+            
+        Returns:
+            日中足。取得できない場合はNone
+        """
+        return self.cache.get_or_fetch(
+            f"stock:intraday:{symbol}:{period}",
+            lambda: self._fetch_intraday_bars(symbol, period),
+            self.intraday_ttl_seconds
+        )
+    
+    def _fetch_intraday_bars(self, symbol: str, period: str) -> Optional[OHLCVSeries]:
+        """yfinanceから期間内の最小粒度の日中足を取得（取得できない場合はNone）"""
+        stock_info = self.catalog.get(symbol)
+        finest = FINEST_INTERVAL[period]
+        try:
+            print(f"情報: {symbol} ({stock_info.yahoo_code}) の{finest}足を取得中...")
+            ticker = self._ticker(stock_info.yahoo_code)
+            data = ticker.history(period=self.period_map[period], interval=finest)
+        except Exception as e:
+            print(f"エラー: {str(e)}。")
+            return None
+        
+        if data.empty:
+            print(f"警告: {symbol}の日中足が取得できません。")
+            return None
+        
+        bars = OHLCVSeries.from_frame(data, INTERVAL_MINUTES[finest])
+        print(f"成功: {symbol}の{finest}足を取得しました（{len(bars)}本, {bars.nbytes}バイト）")
+        return bars
+    
+    @traced("stock._get_intraday_data")
+    def _get_intraday_data(self, symbol: str, period: str, interval: str) -> Dict:
+        """
+        日中足の株価データを取得
+        
+        最小粒度の日中足を一度だけ取得し、指定の足種へはリサンプリングで変換する
+        
+        Args:
+            symbol: 銘柄コード
+            period: 期間
+            interval: 足種
+            
+        Returns:
+            株価データの辞書
+        """
+        stock_info = self.catalog.get(symbol)
+        bars = self._get_intraday_bars(symbol, period)
+        
+        if bars is None:
+            print(f"警告: {symbol}の日中足のモックデータを返します。")
+            char = self.MOCK_CHARACTERISTICS.get(symbol, {"base_price": 1000, "volatility": 0.03})
+            days = {"7d": 7, "1m": 30, "3m": 90}[period]
+            mock_bars = generate_mock_bars(char["base_price"], char["volatility"], days,
+                                           INTERVAL_MINUTES[FINEST_INTERVAL[period]])
+            result = self._format_intraday_data(symbol, stock_info.name + " (デモデータ)",
+                                                mock_bars.resample(INTERVAL_MINUTES[interval]), interval)
+            result["is_mock"] = True
+            result["note"] = "Yahoo Finance API制限のため、現実的なデモデータを表示しています"
+            return result
+        
+        return self._format_intraday_data(symbol, stock_info.name,
+                                          bars.resample(INTERVAL_MINUTES[interval]), interval)
+    
+    def _format_intraday_data(self, symbol: str, name: str, bars: OHLCVSeries, interval: str) -> Dict:
+        """日中足をレスポンス形式に変換"""
+        return {
+            "symbol": symbol,
+            "company_name": name,
+            "interval": interval,
+            "data_points": bars.to_data_points(),
+            "last_updated": datetime.now().isoformat()
+        }
+    
+    @traced("stock.get_multiple_stocks")
+    def get_multiple_stocks(self, symbols: List[str], period: str = "7d",
+                            start: Optional[str] = None, end: Optional[str] = None,
+                            interval: str = "1d") -> Dict:
         """
         複数銘柄の株価データを一括取得
         
         Args:
             symbols: 銘柄コードのリスト
             period: 期間
+            start: 開始日 (YYYY-MM-DD)
+            end: 終了日 (YYYY-MM-DD)
+            interval: 足種
             
         Returns:
             複数銘柄の株価データ
@@ -86,7 +522,7 @@ class StockService:
         
         for symbol in symbols:
             try:
-                stock_data = self.get_stock_data(symbol, period)
+                stock_data = self.get_stock_data(symbol, period, start, end, interval)
                 stocks.append(stock_data)
             except Exception as e:
                 errors.append({"symbol": symbol, "error": str(e)})
@@ -98,50 +534,101 @@ class StockService:
             "timestamp": datetime.now().isoformat()
         }
     
+    def iter_stocks(self, symbols: List[str], period: str = "7d",
+                    start: Optional[str] = None, end: Optional[str] = None,
+                    interval: str = "1d") -> Iterator[Dict]:
+        """
+        複数銘柄の株価データを取得できた順に1件ずつ返す（ストリーミング応答用）
+        
+        銘柄ごとの取得を並行して行い、未返却の結果は同時取得数の2倍までに抑える
+        
+        Args:
+            symbols: 銘柄コードのリスト
+            period: 期間
+            start: 開始日 (YYYY-MM-DD)
+            end: 終了日 (YYYY-MM-DD)
+            interval: 足種
+            
+        Yields:
+            {"symbol": 銘柄コード, "data": 株価データ} または {"symbol": 銘柄コード, "error": エラー内容}
+        """
+        executor = ThreadPoolExecutor(max_workers=self.stream_workers, thread_name_prefix="stock-stream")
+        pending = {}
+        remaining = iter(symbols)
+        try:
+            while True:
+                # 未返却の結果が上限に達するまで取得を投入
+                while len(pending) < self.stream_workers * 2:
+                    symbol = next(remaining, None)
+                    if symbol is None:
+                        break
+                    future = executor.submit(bind_priority(bind(self.get_stock_data)), symbol, period, start, end, interval)
+                    pending[future] = symbol
+                if not pending:
+                    return
+                
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    symbol = pending.pop(future)
+                    try:
+                        yield {"symbol": symbol, "data": future.result()}
+                    except Exception as e:
+                        yield {"symbol": symbol, "error": str(e)}
+        finally:
+            # クライアント切断時は未着手の取得を取り消す
+            executor.shutdown(wait=False, cancel_futures=True)
+    
+    @staticmethod
+    def _ticker(code: str):
+        """上流のTickerを生成（既定は yfinance、接続先の設定時はチャートAPIを直接呼び出す）"""
+        return make_ticker(code)
+    
     def get_available_symbols(self) -> List[Dict]:
-        """利用可能な銘柄一覧を取得"""
-        symbols = []
-        for code, info in self.symbols_map.items():
-            symbols.append({
-                "symbol": code,
-                "name": info["name"],
-                "market": "東証プライム"
-            })
-        return symbols
+        """利用可能な銘柄一覧を取得（カタログ読み込み後は不変のため一度だけ組み立てる）"""
+        if self._available_symbols is None:
+            self._available_symbols = [
+                {"symbol": symbol.code, "name": symbol.name, "market": symbol.market, "sector": symbol.sector}
+                for symbol in self.catalog
+            ]
+        return self._available_symbols
+    
+    def search_symbols(self, query: str, limit: int = DEFAULT_SEARCH_LIMIT) -> List[Dict]:
+        """
+        コード・銘柄名・カナで銘柄を検索
+        
+        Args:
+            query: 検索語
+            limit: 最大件数（1〜MAX_SEARCH_LIMIT）
+            
+        Returns:
+            一致した銘柄のリスト（優先度順）
+        """
+        if not 1 <= limit <= MAX_SEARCH_LIMIT:
+            raise ValueError(f"limit は1〜{MAX_SEARCH_LIMIT}で指定してください")
+        return [symbol.to_dict() for symbol in self.catalog.search(query, limit)]
     
-    def _format_stock_data(self, symbol: str, name: str, data: pd.DataFrame) -> Dict:
+    @traced("stock._format_stock_data")
+    def _format_stock_data(self, symbol: str, name: str, series: OHLCVSeries) -> Dict:
         """
-        pandas DataFrameを辞書形式に変換
+        日足の系列をレスポンス形式に変換
         
         Args:
             symbol: 銘柄コード
             name: 銘柄名
-            data: pandas DataFrame
+            series: 日足の系列
             
         Returns:
             整形された株価データ
         """
-        data_points = []
-        
-        # インデックスを日付として扱う
-        for date, row in data.iterrows():
-            data_points.append({
-                "date": date.isoformat(),
-                "open": round(float(row["Open"]), 2),
-                "high": round(float(row["High"]), 2),
-                "low": round(float(row["Low"]), 2),
-                "close": round(float(row["Close"]), 2),
-                "volume": int(row["Volume"])
-            })
-        
         return {
             "symbol": symbol,
             "company_name": name,
-            "data_points": data_points,
-            "last_updated": datetime.now().isoformat()
+            "data_points": series.to_data_points(),
+            "last_updated": datetime.fromtimestamp(series.fetched_at).isoformat()
         }
     
-    def _get_mock_data(self, symbol: str, name: str, period: str) -> Dict:
+    def _get_mock_data(self, symbol: str, name: str, period: Optional[str],
+                       days: Optional[int] = None, end_date: Optional[datetime] = None) -> Dict:
         """
         現実的なモックデータを生成（実データが取得できない場合）
         
@@ -149,6 +636,8 @@ class StockService:
             symbol: 銘柄コード
             name: 銘柄名  
             period: 期間
+            days: 日数（指定時はperiodより優先）
+            end_date: 最終日（省略時は本日）
             
         Returns:
             モック株価データ
@@ -158,31 +647,12 @@ class StockService:
         
         # 期間に応じてデータポイント数を決定
         period_days = {"7d": 7, "1m": 30, "3m": 90}
-        days = period_days.get(period, 7)
-        
-        # 銘柄ごとの現実的なベース価格と特性
-        stock_characteristics = {
-            "6326": {
-                "base_price": 2500, 
-                "volatility": 0.03,  # 3%変動
-                "trend": 0.002,      # 上昇トレンド
-                "name": "クボタ"
-            },
-            "9984": {
-                "base_price": 9000, 
-                "volatility": 0.05,  # 5%変動（テック株らしく）
-                "trend": -0.001,     # 微下降トレンド
-                "name": "ソフトバンクグループ"
-            },
-            "1377": {
-                "base_price": 4000, 
-                "volatility": 0.04,  # 4%変動
-                "trend": 0.001,      # 微上昇トレンド
-                "name": "サカタのタネ"
-            }
-        }
+        if days is None:
+            days = period_days.get(period, 7)
+        if end_date is None:
+            end_date = datetime.now()
         
-        char = stock_characteristics.get(symbol, {
+        char = self.MOCK_CHARACTERISTICS.get(symbol, {
             "base_price": 1000, 
             "volatility": 0.03, 
             "trend": 0, 
@@ -194,8 +664,8 @@ class StockService:
         
         # より現実的な価格変動の生成
         for i in range(days):
-            # 日付を生成（今日から過去に遡る）
-            date = datetime.now() - timedelta(days=days-i-1)
+            # 日付を生成（最終日から過去に遡る）
+            date = end_date - timedelta(days=days-i-1)
             
             # トレンドとランダム変動を組み合わせ
             trend_change = char["trend"] * current_price
@@ -253,5 +723,12 @@ class StockService:
         }
 
 
-# グローバルインスタンス
-stock_service = StockService()
\ No newline at end of file
+# グローバルインスタンス（初回使用時に生成）
+get_stock_service = lazy_singleton(StockService)
+
+
+def __getattr__(name: str):
+    # 後方互換: from backend.stock_service import stock_service
+    if name == "stock_service":
+        return get_stock_service()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
\ No newline at end of file
@@ -0,0 +1,397 @@
+"""
+上流APIのスタブサーバー（負荷試験・オフライン検証用）
+Yahoo Finance チャートAPI（/v8/finance/chart/{symbol}）と
+OpenMeteo アーカイブAPI（/v1/archive）を模擬し、銘柄・地点・日付から決定的に生成した値を返す。
+
+    python -m backend.stub_upstream --port 8900 --latency-ms 80 --jitter-ms 40 --error-rate 0.01 --rate-limit 50
+
+バックエンドは次の環境変数でスタブに向ける:
+
+    STACK_WATCHER_YAHOO_BASE_URL=http://localhost:8900
+    STACK_WATCHER_OPENMETEO_BASE_URL=http://localhost:8900
+
+管理用エンドポイント:
+    GET  /__stub/stats   リクエスト数・ステータス別件数
+    POST /__stub/config  遅延・エラー率・レート制限の変更（JSON: latency_ms, jitter_ms, error_rate, rate_limit）
+"""
+
+import argparse
+import json
+import math
+import random
+import re
+import threading
+import time
+import zlib
+from collections import Counter
+from datetime import date, datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+JST = timezone(timedelta(hours=9))
+
+# チャートAPIの期間指定（range）-> 日数
+RANGE_DAYS = {"1d": 1, "5d": 5, "7d": 7, "1mo": 31, "3mo": 92, "6mo": 183, "1y": 366, "2y": 731, "5y": 1827}
+
+# 取引時間（東証、昼休みは省略）
+SESSION_OPEN = (9, 0)
+SESSION_MINUTES = 390
+
+# OpenMeteo の変数名 -> 単位
+ARCHIVE_UNITS = {
+    "precipitation": "mm",
+    "temperature": "°C",
+    "pressure": "hPa",
+    "relative_humidity": "%",
+    "wind_speed": "km/h",
+}
+
+
+class StubConfig:
+    """スタブの応答特性（実行中に /__stub/config で変更できる）"""
+
+    __slots__ = ("latency_ms", "jitter_ms", "error_rate", "rate_limit")
+
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0, error_rate: float = 0.0,
+                 rate_limit: float = 0.0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        # 1秒あたりの許容リクエスト数（0は無制限、超過分は429）
+        self.rate_limit = rate_limit
+
+    def update(self, values: Dict[str, Any]) -> None:
+        for name in self.__slots__:
+            if name in values:
+                setattr(self, name, float(values[name]))
+
+    def to_dict(self) -> Dict[str, float]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class TokenBucket:
+    """レート制限（1秒あたり rate 件、最大 rate 件までのバースト）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tokens = 0.0
+        self._updated = time.monotonic()
+
+    def take(self, rate: float) -> bool:
+        if rate <= 0:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(rate, self._tokens + (now - self._updated) * rate)
+            self._updated = now
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+def _noise(*parts: Any) -> float:
+    """引数から決定的に求める [-1, 1) の値"""
+    return zlib.crc32(":".join(map(str, parts)).encode()) / 2 ** 31 - 1
+
+
+def _price(symbol: str, seconds: int) -> float:
+    """銘柄と時刻から決定的に求める価格（日単位の緩やかな変動＋足ごとの揺らぎ）"""
+    base = 500 + zlib.crc32(symbol.encode()) % 9500
+    phase = zlib.crc32(symbol[::-1].encode()) % 628 / 100
+    days = seconds / 86400
+    return round(base * (1 + 0.08 * math.sin(days / 11 + phase) + 0.01 * _noise(symbol, seconds)), 1)
+
+
+def _parse_interval(interval: str) -> Optional[int]:
+    """足種を秒数に変換（日中足は Nm / Nh、日足は 1d。対応しない場合はNone）"""
+    if interval == "1d":
+        return 86400
+    match = re.fullmatch(r"(\d+)([mh])", interval)
+    if not match:
+        return None
+    return int(match.group(1)) * (60 if match.group(2) == "m" else 3600)
+
+
+def _bar_times(start: datetime, end: datetime, bar_seconds: int) -> List[int]:
+    """期間 [start, end) 内の平日の取引時間にある足の開始時刻（UNIX秒。日足は取引開始時刻）"""
+    start, end = start.astimezone(JST), end.astimezone(JST)
+    times = []
+    day = start.date()
+    while day <= end.date():
+        if day.weekday() < 5:
+            session = datetime(day.year, day.month, day.day, *SESSION_OPEN, tzinfo=JST)
+            if bar_seconds >= 86400:
+                if day < end.date():
+                    times.append(int(session.timestamp()))
+            else:
+                for offset in range(0, SESSION_MINUTES * 60, bar_seconds):
+                    at = session + timedelta(seconds=offset)
+                    if start <= at < end:
+                        times.append(int(at.timestamp()))
+        day += timedelta(days=1)
+    return times
+
+
+def chart_payload(symbol: str, params: Dict[str, str], now: Optional[datetime] = None) -> Tuple[int, Dict]:
+    """
+    チャートAPIの応答を生成
+
+    Args:
+        symbol: ティッカー
+        params: クエリパラメータ（range または period1/period2、interval）
+        now: 現在時刻（テスト用）
+
+    Returns:
+        (HTTPステータス, 応答JSON)
+    """
+    now = now or datetime.now(JST)
+    interval = params.get("interval", "1d")
+    bar_seconds = _parse_interval(interval)
+    if bar_seconds is None:
+        return 400, {"chart": {"result": None, "error": {"code": "Bad Request", "description": f"Invalid interval: {interval}"}}}
+    if symbol.startswith("INVALID"):
+        return 404, {"chart": {"result": None, "error": {"code": "Not Found", "description": "No data found, symbol may be delisted"}}}
+
+    # 日足は当日分まで、日中足は現在時刻までを返す
+    latest = now + timedelta(days=1) if bar_seconds >= 86400 else now
+    if "period1" in params:
+        start = datetime.fromtimestamp(int(params["period1"]), JST)
+        end = min(datetime.fromtimestamp(int(params.get("period2", now.timestamp())), JST), latest)
+    else:
+        days = RANGE_DAYS.get(params.get("range", "1mo"))
+        if days is None:
+            return 400, {"chart": {"result": None, "error": {"code": "Bad Request", "description": "Invalid range"}}}
+        start = now - timedelta(days=days)
+        end = latest
+
+    times = _bar_times(start, end, bar_seconds)
+    opens = [_price(symbol, t) for t in times]
+    closes = [_price(symbol, t + bar_seconds) for t in times]
+    highs = [round(max(o, c) * (1 + 0.005 * abs(_noise(symbol, t, "h"))), 1) for o, c, t in zip(opens, closes, times)]
+    lows = [round(min(o, c) * (1 - 0.005 * abs(_noise(symbol, t, "l"))), 1) for o, c, t in zip(opens, closes, times)]
+    scale = max(1, min(bar_seconds // 60, SESSION_MINUTES))
+    volumes = [int(1000 * scale * (1.5 + _noise(symbol, t, "v"))) for t in times]
+    meta = {
+        "currency": "JPY",
+        "symbol": symbol,
+        "exchangeName": "JPX",
+        "instrumentType": "INDEX" if symbol.startswith("^") else "EQUITY",
+        "gmtoffset": 32400,
+        "timezone": "JST",
+        "exchangeTimezoneName": "Asia/Tokyo",
+        "regularMarketPrice": closes[-1] if closes else None,
+        "dataGranularity": interval,
+        "range": params.get("range", ""),
+    }
+    result = {
+        "meta": meta,
+        "timestamp": times,
+        "indicators": {"quote": [{"open": opens, "high": highs, "low": lows, "close": closes, "volume": volumes}]},
+    }
+    if bar_seconds >= 86400:
+        result["indicators"]["adjclose"] = [{"adjclose": closes}]
+    return 200, {"chart": {"result": [result], "error": None}}
+
+
+def _archive_value(name: str, latitude: float, longitude: float, day: date, hour: Optional[int] = None) -> float:
+    """変数・地点・日付（時刻）から決定的に求める気象値"""
+    noise = _noise(name, latitude, longitude, day.isoformat(), hour)
+    season = math.sin((day.timetuple().tm_yday - 110) / 365 * 2 * math.pi)
+    if name.startswith("precipitation"):
+        return round(max(0.0, noise * (2 if hour is not None else 30)), 1)
+    if name.startswith("temperature"):
+        offset = 4 if name.endswith("_max") else -4 if name.endswith("_min") else 0
+        return round(16 + 10 * season + offset + 3 * noise, 1)
+    if name.startswith("pressure"):
+        return round(1013 + 8 * noise, 1)
+    if name.startswith("relative_humidity"):
+        return round(65 + 20 * noise, 0)
+    return round(12 + 6 * abs(noise), 1)
+
+
+def _archive_unit(name: str) -> str:
+    return next((unit for prefix, unit in ARCHIVE_UNITS.items() if name.startswith(prefix)), "")
+
+
+def archive_payload(params: Dict[str, str]) -> Tuple[int, Any]:
+    """
+    OpenMeteo アーカイブAPIの応答を生成
+
+    Args:
+        params: クエリパラメータ（latitude, longitude, start_date, end_date, daily または hourly）
+
+    Returns:
+        (HTTPステータス, 応答JSON（複数地点の場合は配列）)
+    """
+    try:
+        latitudes = [float(v) for v in params["latitude"].split(",")]
+        longitudes = [float(v) for v in params["longitude"].split(",")]
+        start = date.fromisoformat(params["start_date"])
+        end = date.fromisoformat(params["end_date"])
+    except (KeyError, ValueError) as e:
+        return 400, {"error": True, "reason": f"Invalid parameters: {e}"}
+    if len(latitudes) != len(longitudes) or end < start:
+        return 400, {"error": True, "reason": "Invalid parameters"}
+
+    days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+    results = []
+    for latitude, longitude in zip(latitudes, longitudes):
+        result = {
+            "latitude": latitude,
+            "longitude": longitude,
+            "generationtime_ms": 0.1,
+            "utc_offset_seconds": 32400,
+            "timezone": params.get("timezone", "Asia/Tokyo"),
+            "timezone_abbreviation": "JST",
+            "elevation": 10.0,
+        }
+        for resolution in ("daily", "hourly"):
+            names = [name for name in params.get(resolution, "").split(",") if name]
+            if not names:
+                continue
+            if resolution == "daily":
+                slots = [(day, None) for day in days]
+                times = [day.isoformat() for day in days]
+            else:
+                slots = [(day, hour) for day in days for hour in range(24)]
+                times = [f"{day.isoformat()}T{hour:02d}:00" for day, hour in slots]
+            result[f"{resolution}_units"] = {"time": "iso8601", **{name: _archive_unit(name) for name in names}}
+            result[resolution] = {
+                "time": times,
+                **{name: [_archive_value(name, latitude, longitude, day, hour) for day, hour in slots] for name in names},
+            }
+        results.append(result)
+    return 200, results[0] if len(results) == 1 else results
+
+
+class StubUpstreamHandler(BaseHTTPRequestHandler):
+    """スタブサーバーのリクエストハンドラー"""
+
+    server: "StubUpstreamServer"
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        if url.path == "/__stub/stats":
+            return self._send_json(200, self.server.stats())
+
+        route = "chart" if url.path.startswith("/v8/finance/chart/") else "archive" if url.path == "/v1/archive" else None
+        if route is None:
+            return self._send_json(404, {"error": True, "reason": "Not Found"}, route="unknown")
+
+        config = self.server.config
+        if not self.server.bucket.take(config.rate_limit):
+            return self._send(429, b"Too Many Requests", "text/plain", route)
+        delay = config.latency_ms + random.uniform(-config.jitter_ms, config.jitter_ms)
+        if delay > 0:
+            time.sleep(delay / 1000)
+        if config.error_rate and random.random() < config.error_rate:
+            return self._send_json(500, {"error": True, "reason": "Injected error"}, route=route)
+
+        if route == "chart":
+            status, payload = chart_payload(url.path.rsplit("/", 1)[-1], params)
+        else:
+            status, payload = archive_payload(params)
+        self._send_json(status, payload, route=route)
+
+    def do_POST(self):
+        if urlparse(self.path).path != "/__stub/config":
+            return self._send_json(404, {"error": True, "reason": "Not Found"})
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            self.server.config.update(json.loads(self.rfile.read(length) or b"{}"))
+        except (ValueError, TypeError) as e:
+            return self._send_json(400, {"error": True, "reason": str(e)})
+        self._send_json(200, self.server.config.to_dict())
+
+    def _send_json(self, status: int, payload: Any, route: Optional[str] = None) -> None:
+        self._send(status, json.dumps(payload).encode(), "application/json", route)
+
+    def _send(self, status: int, body: bytes, content_type: str, route: Optional[str]) -> None:
+        if route is not None:
+            self.server.record(route, status)
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # 負荷試験中のアクセスログは出力しない
+        pass
+
+
+class StubUpstreamServer(ThreadingHTTPServer):
+    """スタブサーバー（リクエストごとにスレッドで応答）"""
+
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], config: Optional[StubConfig] = None):
+        super().__init__(address, StubUpstreamHandler)
+        self.config = config or StubConfig()
+        self.bucket = TokenBucket()
+        self._lock = threading.Lock()
+        self._counts: Counter = Counter()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def record(self, route: str, status: int) -> None:
+        with self._lock:
+            self._counts[(route, status)] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = dict(self._counts)
+        requests: Dict[str, Dict[str, int]] = {}
+        for (route, status), count in counts.items():
+            requests.setdefault(route, {})[str(status)] = count
+        return {"config": self.config.to_dict(), "requests": requests, "total": sum(counts.values())}
+
+
+def start_stub_server(host: str = "127.0.0.1", port: int = 0,
+                      config: Optional[StubConfig] = None) -> StubUpstreamServer:
+    """
+    スタブサーバーを別スレッドで起動（テスト・負荷試験スクリプト用）
+
+    Args:
+        host: 待ち受けアドレス
+        port: ポート（0の場合は空いているポート）
+        config: 応答特性
+
+    Returns:
+        起動したサーバー（終了時は shutdown() と server_close() を呼ぶ）
+    """
+    server = StubUpstreamServer((host, port), config)
+    threading.Thread(target=server.serve_forever, name="stub-upstream", daemon=True).start()
+    return server
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="上流API（Yahoo Finance チャート・OpenMeteo アーカイブ）のスタブサーバー")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="応答の遅延（ミリ秒）")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="遅延の揺らぎ（±ミリ秒、一様分布）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="500を返す割合（0〜1）")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="1秒あたりの許容リクエスト数（超過分は429、0は無制限）")
+    args = parser.parse_args()
+
+    config = StubConfig(args.latency_ms, args.jitter_ms, args.error_rate, args.rate_limit)
+    server = StubUpstreamServer((args.host, args.port), config)
+    print(f"スタブサーバーを起動しました: {server.base_url}  設定: {config.to_dict()}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
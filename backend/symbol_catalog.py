@@ -0,0 +1,166 @@
+"""
+銘柄カタログ
+銘柄（コード・銘柄名・カナ・市場・業種）をCSVから読み込み、
+コード・銘柄名・カナの前方一致検索用のソート済みインデックスをメモリに保持する。
+
+CSVの列: code,name,kana,market,sector（1行目はヘッダー）
+読み込み先は STACK_WATCHER_SYMBOLS_CSV で変更できる（既定: backend/data/symbols.csv）。
+東証プライム全銘柄を扱う場合は、JPXの上場銘柄一覧を同じ列構成のCSVに変換して指定する。
+"""
+
+import csv
+import os
+import unicodedata
+from bisect import bisect_left
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from backend.lazy import lazy_singleton
+
+DEFAULT_CATALOG_PATH = os.path.join(os.path.dirname(__file__), "data", "symbols.csv")
+
+# 検索結果の既定件数と上限
+DEFAULT_SEARCH_LIMIT = 10
+MAX_SEARCH_LIMIT = 50
+
+# ひらがな -> カタカナの変換表（カナ検索をどちらの表記でも一致させる）
+_HIRAGANA_TO_KATAKANA = {code: code + 0x60 for code in range(ord("ぁ"), ord("ゖ") + 1)}
+
+
+def normalize(text: str) -> str:
+    """検索用の正規化（全角英数の半角化・小文字化・ひらがなのカタカナ化・空白と中黒の除去）"""
+    text = unicodedata.normalize("NFKC", text).lower().translate(_HIRAGANA_TO_KATAKANA)
+    return "".join(ch for ch in text if not ch.isspace() and ch not in "・･")
+
+
+class Symbol(NamedTuple):
+    """カタログ内の1銘柄"""
+
+    code: str
+    name: str
+    kana: str
+    market: str
+    sector: str
+
+    @property
+    def yahoo_code(self) -> str:
+        """yfinanceのティッカー（東証は .T）"""
+        return f"{self.code}.T"
+
+    def to_dict(self) -> Dict[str, str]:
+        return {
+            "symbol": self.code,
+            "name": self.name,
+            "kana": self.kana,
+            "market": self.market,
+            "sector": self.sector,
+        }
+
+
+class PrefixIndex:
+    """正規化したキーのソート済み配列に対する前方一致インデックス"""
+
+    __slots__ = ("keys", "codes")
+
+    def __init__(self, pairs: Iterable[Tuple[str, str]]):
+        # (キー, 銘柄コード) をキー順に並べ、キーとコードを別の配列で保持
+        ordered = sorted(set(pairs))
+        self.keys = [key for key, _ in ordered]
+        self.codes = [code for _, code in ordered]
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def prefix(self, prefix: str) -> Iterator[str]:
+        """キーが prefix で始まる銘柄コードをキー順に返す（二分探索で開始位置を特定）"""
+        i = bisect_left(self.keys, prefix)
+        while i < len(self.keys) and self.keys[i].startswith(prefix):
+            yield self.codes[i]
+            i += 1
+
+
+class SymbolCatalog:
+    """
+    銘柄カタログ
+
+    検索はコード・銘柄名・カナの前方一致、銘柄名の部分一致（接尾辞の前方一致）の順に優先する
+    """
+
+    def __init__(self, symbols: Iterable[Symbol]):
+        self._symbols: Dict[str, Symbol] = {symbol.code: symbol for symbol in symbols}
+        ordered = sorted(self._symbols.values())
+        self._indexes = (
+            PrefixIndex((normalize(symbol.code), symbol.code) for symbol in ordered),
+            PrefixIndex((normalize(symbol.name), symbol.code) for symbol in ordered),
+            PrefixIndex((normalize(symbol.kana), symbol.code) for symbol in ordered if symbol.kana),
+            # 部分一致用: 銘柄名の2文字目以降の接尾辞（「UFJ」で三菱UFJ…に一致させる）
+            PrefixIndex(
+                (name[i:], symbol.code)
+                for symbol in ordered
+                for name in (normalize(symbol.name),)
+                for i in range(1, len(name))
+            ),
+        )
+
+    @classmethod
+    def from_csv(cls, path: str) -> "SymbolCatalog":
+        """CSV（code,name,kana,market,sector）から読み込む"""
+        with open(path, encoding="utf-8-sig", newline="") as f:
+            rows = list(csv.DictReader(f))
+        symbols = []
+        for line, row in enumerate(rows, start=2):
+            code = (row.get("code") or "").strip()
+            name = (row.get("name") or "").strip()
+            if not code or not name:
+                raise ValueError(f"銘柄カタログの{line}行目にコードまたは銘柄名がありません: {path}")
+            symbols.append(Symbol(
+                code=code,
+                name=name,
+                kana=(row.get("kana") or "").strip(),
+                market=(row.get("market") or "").strip(),
+                sector=(row.get("sector") or "").strip(),
+            ))
+        return cls(symbols)
+
+    def __len__(self) -> int:
+        return len(self._symbols)
+
+    def __contains__(self, code: str) -> bool:
+        return code in self._symbols
+
+    def __iter__(self) -> Iterator[Symbol]:
+        return iter(self._symbols.values())
+
+    def get(self, code: str) -> Optional[Symbol]:
+        return self._symbols.get(code)
+
+    def search(self, query: str, limit: int = DEFAULT_SEARCH_LIMIT) -> List[Symbol]:
+        """
+        コード・銘柄名・カナで銘柄を検索
+
+        Args:
+            query: 検索語（全角・ひらがな可）
+            limit: 最大件数
+
+        Returns:
+            一致した銘柄（優先度順）
+        """
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        found: Dict[str, Symbol] = {}
+        for index in self._indexes:
+            for code in index.prefix(prefix):
+                if code not in found:
+                    found[code] = self._symbols[code]
+                    if len(found) >= limit:
+                        return list(found.values())
+        return list(found.values())
+
+
+def load_catalog() -> SymbolCatalog:
+    """STACK_WATCHER_SYMBOLS_CSV（既定: 同梱のCSV）から銘柄カタログを読み込む"""
+    return SymbolCatalog.from_csv(os.getenv("STACK_WATCHER_SYMBOLS_CSV") or DEFAULT_CATALOG_PATH)
+
+
+# プロセス共通の銘柄カタログ（初回使用時に読み込み）
+get_symbol_catalog = lazy_singleton(load_catalog)
@@ -0,0 +1,36 @@
+import os
+
+import pytest
+
+from backend.cache import MemoryCache
+from backend.index_service import get_index_service
+from backend.stock_service import get_stock_service
+from backend.stub_upstream import StubConfig, start_stub_server
+from backend.upstream import OPENMETEO_BASE_URL_ENV, YAHOO_BASE_URL_ENV, openmeteo_archive_url
+from backend.weather_service import get_weather_service
+
+
+@pytest.fixture(autouse=True, scope="session")
+def data_dir(tmp_path_factory):
+    """署名の鍵・既定の保存先（キャッシュ・スナップショット）をテスト用のディレクトリに置く"""
+    os.environ["STACK_WATCHER_DATA_DIR"] = str(tmp_path_factory.mktemp("data"))
+
+
+@pytest.fixture
+def stub_upstream(monkeypatch):
+    """
+    上流（Yahoo Finance・OpenMeteo）をローカルのスタブサーバーに向ける
+
+    各サービスのキャッシュはテスト中だけ空のものに差し替え、スタブの応答を他のテストに残さない
+    """
+    server = start_stub_server(config=StubConfig())
+    monkeypatch.setenv(YAHOO_BASE_URL_ENV, server.base_url)
+    monkeypatch.setenv(OPENMETEO_BASE_URL_ENV, server.base_url)
+    monkeypatch.setattr(get_weather_service(), "base_url", openmeteo_archive_url(server.base_url))
+    for service in (get_stock_service(), get_index_service(), get_weather_service()):
+        cache = MemoryCache()
+        monkeypatch.setattr(service, "cache", cache)
+        monkeypatch.setattr(service.range_store, "cache", cache)
+    yield server
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,295 @@
+import asyncio
+import json
+import sqlite3
+from unittest.mock import Mock, patch
+
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+
+from backend.alerts import (
+    AlertEngine,
+    SharedAlertEngine,
+    alert_event_stream,
+    create_alert_engine,
+    format_sse,
+    get_alert_engine,
+)
+from backend.main import app
+from backend.stock_service import StockService
+
+client = TestClient(app)
+
+
+def _days(count: int) -> np.ndarray:
+    """連続した日付（datetime64[D] の整数値）"""
+    return np.arange(20000, 20000 + count, dtype=np.int64)
+
+
+class TestAlertEngine:
+    """アラートエンジンのテストクラス"""
+
+    @pytest.fixture
+    def engine(self):
+        return AlertEngine()
+
+    def test_baseline_does_not_fire(self, engine):
+        """初回の取り込みは基準値の設定のみで、過去の足では発火しない"""
+        engine.add_rule("index", "^N225", "value", "above", 100)
+
+        assert engine.ingest("index", "^N225", _days(3), {"value": np.array([90.0, 110.0, 120.0])}) == []
+
+    def test_crossing_above_and_below(self, engine):
+        """前回値から今回値の間にあるしきい値のルールだけが発火する"""
+        up = engine.add_rule("stock", "6326", "close", "above", 105)
+        high = engine.add_rule("stock", "6326", "close", "above", 200)
+        down = engine.add_rule("stock", "6326", "close", "below", 95)
+        times = _days(3)
+        engine.ingest("stock", "6326", times[:1], {"close": np.array([100.0])})
+
+        fired = engine.ingest("stock", "6326", times, {"close": np.array([100.0, 110.0, 90.0])})
+
+        assert [alert["rule"]["id"] for alert in fired] == [up.id, down.id]
+        assert fired[1]["previous"] == 110.0
+        assert high.id not in [alert["rule"]["id"] for alert in engine.alerts()]
+
+    def test_only_new_bars_are_evaluated(self, engine):
+        """取り込み済みの足は再評価しない"""
+        engine.add_rule("index", "^TPX", "value", "above", 105)
+        times = _days(2)
+        engine.ingest("index", "^TPX", times[:1], {"value": np.array([100.0])})
+
+        assert len(engine.ingest("index", "^TPX", times, {"value": np.array([100.0, 110.0])})) == 1
+        assert engine.ingest("index", "^TPX", times, {"value": np.array([100.0, 110.0])}) == []
+
+    def test_revised_last_bar(self, engine):
+        """取り込み済みの最終の足が改訂された場合は、前の足からの変化で新たに超えたしきい値だけ発火する"""
+        low = engine.add_rule("stock", "6326", "close", "above", 100.5)
+        high = engine.add_rule("stock", "6326", "close", "above", 110)
+        change = engine.add_rule("stock", "6326", "changePercent", "above", 10)
+        times = _days(3)
+        engine.ingest("stock", "6326", times[:1], {"close": np.array([100.0])})
+        assert [alert["rule"]["id"] for alert in
+                engine.ingest("stock", "6326", times[:2], {"close": np.array([100.0, 101.0])})] == [low.id]
+
+        fired = engine.ingest("stock", "6326", times[:2], {"close": np.array([100.0, 115.0])})
+        assert [(alert["rule"]["id"], alert["previous"], alert["value"]) for alert in fired] == [
+            (high.id, 100.0, 115.0), (change.id, 0.0, 15.0)]
+        assert engine.ingest("stock", "6326", times[:2], {"close": np.array([100.0, 112.0])}) == []
+        # 翌日の足は改訂後の値と比較する
+        assert engine.ingest("stock", "6326", times, {"close": np.array([100.0, 112.0, 111.0])}) == []
+
+    def test_change_percent(self, engine):
+        """前日比%は日ごとに評価し、その日の騰落率がしきい値を超えた日に発火する"""
+        rule = engine.add_rule("index", "^N225", "changePercent", "below", -3)
+        times = _days(4)
+        engine.ingest("index", "^N225", times[:1], {"value": np.array([100.0])})
+
+        fired = engine.ingest("index", "^N225", times, {"value": np.array([100.0, 96.0, 92.0, 93.0])})
+
+        assert [alert["value"] for alert in fired] == [-4.0, -4.17]
+        assert all(alert["rule"]["id"] == rule.id for alert in fired)
+
+    def test_weather_missing_values(self, engine):
+        """欠損（NaN）の日は評価せず、直前の有効値と比較する"""
+        engine.add_rule("weather", "tokyo", "precipitation", "above", 50)
+        times = _days(3)
+        engine.ingest("weather", "tokyo", times[:1], {"precipitation": np.array([10.0])})
+
+        fired = engine.ingest("weather", "tokyo", times, {"precipitation": np.array([10.0, np.nan, 80.0])})
+
+        assert [(alert["previous"], alert["value"]) for alert in fired] == [(10.0, 80.0)]
+
+    def test_remove_rule(self, engine):
+        """削除したルールは発火しない"""
+        rule = engine.add_rule("stock", "6326", "close", "above", 105)
+        engine.ingest("stock", "6326", _days(1), {"close": np.array([100.0])})
+
+        assert engine.remove_rule(rule.id) is True
+        assert engine.remove_rule(rule.id) is False
+        assert engine.ingest("stock", "6326", _days(2), {"close": np.array([100.0, 110.0])}) == []
+        assert engine.stats()["rules"] == 0
+
+    def test_invalid_rule(self, engine):
+        """無効な取得元・項目・条件はエラー"""
+        with pytest.raises(ValueError):
+            engine.add_rule("fx", "USDJPY", "close", "above", 1)
+        with pytest.raises(ValueError):
+            engine.add_rule("stock", "6326", "value", "above", 1)
+        with pytest.raises(ValueError):
+            engine.add_rule("stock", "6326", "close", "equal", 1)
+
+    def test_subscriber_and_sse_stream(self, engine):
+        """購読者への通知と、Last-Event-ID 以降の履歴の再送"""
+        received = []
+        unsubscribe = engine.subscribe(received.append)
+        engine.add_rule("stock", "6326", "close", "above", 105)
+        engine.ingest("stock", "6326", _days(1), {"close": np.array([100.0])})
+        engine.ingest("stock", "6326", _days(2), {"close": np.array([100.0, 110.0])})
+        unsubscribe()
+
+        async def first_event():
+            async def connected():
+                return False
+            stream = alert_event_stream(engine, connected, since=0)
+            try:
+                return await stream.__anext__()
+            finally:
+                await stream.aclose()
+
+        event = asyncio.run(first_event())
+        assert len(received) == 1
+        assert event == format_sse(received[0])
+        assert json.loads(event.split("data: ", 1)[1])["value"] == 110.0
+        assert engine.stats()["subscribers"] == 0
+
+
+class TestSharedAlertEngine:
+    """全ワーカーで共有するアラートエンジンのテストクラス（同じファイルを開いた2つのエンジンをワーカーに見立てる）"""
+
+    @pytest.fixture
+    def workers(self, tmp_path):
+        path = str(tmp_path / "alerts.sqlite3")
+        return SharedAlertEngine(path), SharedAlertEngine(path)
+
+    def test_rules_are_shared(self, workers):
+        """一方で登録・削除したルールは他方の一覧・削除に反映され、IDは重複しない"""
+        a, b = workers
+        first = a.add_rule("stock", "6326", "close", "above", 105)
+        second = b.add_rule("stock", "6326", "close", "below", 95)
+
+        assert first.id != second.id
+        assert [rule.id for rule in a.rules()] == [first.id, second.id]
+        assert b.remove_rule(first.id) is True
+        assert a.remove_rule(first.id) is False
+        assert [rule.id for rule in a.rules()] == [second.id]
+
+    def test_ingest_evaluates_once_for_all_workers(self, workers):
+        """どちらのワーカーで取り込んでも全ワーカーのルールで1回だけ評価する"""
+        a, b = workers
+        rule = b.add_rule("index", "^N225", "value", "above", 105)
+        times = _days(3)
+        a.ingest("index", "^N225", times[:1], {"value": np.array([100.0])})
+
+        fired = b.ingest("index", "^N225", times[:2], {"value": np.array([100.0, 110.0])})
+        assert [alert["rule"]["id"] for alert in fired] == [rule.id]
+        assert a.ingest("index", "^N225", times[:2], {"value": np.array([100.0, 110.0])}) == []
+        assert a.alerts() == fired
+        assert a.latest_alert_id() == fired[0]["id"]
+        assert a.stats()["history"] == 1
+
+    def test_revised_last_bar_across_workers(self, workers):
+        """他のワーカーが取り込んだ最終の足の改訂も、前の足からの変化で評価する"""
+        a, b = workers
+        rule = a.add_rule("stock", "6326", "close", "above", 110)
+        times = _days(2)
+        a.ingest("stock", "6326", times[:1], {"close": np.array([100.0])})
+        assert b.ingest("stock", "6326", times, {"close": np.array([100.0, 101.0])}) == []
+
+        fired = a.ingest("stock", "6326", times, {"close": np.array([100.0, 115.0])})
+        assert [(alert["rule"]["id"], alert["previous"]) for alert in fired] == [(rule.id, 100.0)]
+        assert b.ingest("stock", "6326", times, {"close": np.array([100.0, 115.0])}) == []
+
+    def test_migrates_states_table(self, tmp_path):
+        """改訂前の値を持たない既存の共有ファイルも開けること"""
+        path = str(tmp_path / "alerts.sqlite3")
+        conn = sqlite3.connect(path)
+        conn.execute("CREATE TABLE alert_states (source TEXT NOT NULL, target TEXT NOT NULL, last_time INTEGER,"
+                     " last_values TEXT NOT NULL, PRIMARY KEY (source, target))")
+        conn.execute("""INSERT INTO alert_states VALUES ('stock', '6326', 20000, '{"close": 100.0}')""")
+        conn.commit()
+        conn.close()
+
+        engine = SharedAlertEngine(path)
+        rule = engine.add_rule("stock", "6326", "close", "above", 105)
+        fired = engine.ingest("stock", "6326", _days(2), {"close": np.array([100.0, 110.0])})
+        assert [alert["rule"]["id"] for alert in fired] == [rule.id]
+
+    def test_stream_delivers_alerts_from_other_worker(self, workers):
+        """SSEは他のワーカーで発火したアラートも履歴から配信する"""
+        a, b = workers
+        b.poll_interval = 0.01
+        a.add_rule("stock", "6326", "close", "above", 105)
+        a.ingest("stock", "6326", _days(1), {"close": np.array([100.0])})
+
+        async def next_event():
+            async def connected():
+                return False
+            stream = alert_event_stream(b, connected)
+            try:
+                pending = asyncio.ensure_future(stream.__anext__())
+                await asyncio.sleep(0.05)
+                a.ingest("stock", "6326", _days(2), {"close": np.array([100.0, 110.0])})
+                return await asyncio.wait_for(pending, 2)
+            finally:
+                await stream.aclose()
+
+        event = asyncio.run(next_event())
+        assert json.loads(event.split("data: ", 1)[1])["value"] == 110.0
+
+    def test_create_from_env(self, tmp_path, monkeypatch):
+        """STACK_WATCHER_ALERTS_PATH 指定時は共有のエンジンを使う"""
+        monkeypatch.setenv("STACK_WATCHER_ALERTS_PATH", str(tmp_path / "alerts.sqlite3"))
+        assert isinstance(create_alert_engine(), SharedAlertEngine)
+        monkeypatch.delenv("STACK_WATCHER_ALERTS_PATH")
+        assert type(create_alert_engine()) is AlertEngine
+
+
+class TestAlertIngestion:
+    """サービスからの取り込みのテストクラス"""
+
+    def test_stock_fetch_fires_alert(self):
+        """新しい日足の取得でルールが評価される"""
+        engine = get_alert_engine()
+        rule = engine.add_rule("stock", "6301", "close", "above", 150)
+        index = pd.date_range("2021-01-01", periods=3, freq="D", tz="Asia/Tokyo")
+        ticker = Mock()
+        try:
+            with patch.object(StockService, "_ticker", return_value=ticker):
+                ticker.history.return_value = pd.DataFrame(
+                    {"Open": 1.0, "High": 1.0, "Low": 1.0, "Close": [100.0, 120.0, 140.0], "Volume": 1},
+                    index=index)
+                StockService()._fetch_stock_data("6301", "7d")
+                ticker.history.return_value = pd.DataFrame(
+                    {"Open": 1.0, "High": 1.0, "Low": 1.0, "Close": [140.0, 160.0], "Volume": 1},
+                    index=index[1:] + pd.Timedelta(days=1))
+                StockService()._fetch_stock_data("6301", "7d")
+        finally:
+            engine.remove_rule(rule.id)
+
+        fired = [alert for alert in engine.alerts(limit=1000) if alert["rule"]["id"] == rule.id]
+        assert [alert["value"] for alert in fired] == [160.0]
+
+
+class TestAlertAPI:
+    """アラートAPIのテストクラス"""
+
+    def test_rule_lifecycle(self):
+        """ルールの登録・一覧・削除"""
+        response = client.post("/api/v1/alerts/rules", json={
+            "source": "weather", "target": "sakai", "field": "temperature", "op": "above", "threshold": 35
+        })
+        assert response.status_code == 201
+        rule_id = response.json()["data"]["id"]
+
+        rules = client.get("/api/v1/alerts/rules").json()["data"]
+        assert rule_id in [rule["id"] for rule in rules]
+
+        assert client.delete(f"/api/v1/alerts/rules/{rule_id}").status_code == 200
+        assert client.delete(f"/api/v1/alerts/rules/{rule_id}").status_code == 404
+
+    def test_invalid_rule(self):
+        """無効な対象・項目は400"""
+        rule = {"source": "stock", "target": "0000", "field": "close", "op": "above", "threshold": 1}
+        assert client.post("/api/v1/alerts/rules", json=rule).status_code == 400
+        rule.update(target="6326", field="temperature")
+        assert client.post("/api/v1/alerts/rules", json=rule).status_code == 400
+
+    def test_list_alerts(self):
+        """発火履歴の取得"""
+        response = client.get("/api/v1/alerts?since=0&limit=10")
+
+        assert response.status_code == 200
+        assert isinstance(response.json()["data"], list)
+        assert client.get("/api/v1/alerts?limit=0").status_code == 400
@@ -1,3 +1,4 @@
+import json
 import pytest
 from fastapi.testclient import TestClient
 from unittest.mock import Mock, patch
@@ -122,4 +123,120 @@ class TestStocksAPI:
         data = response.json()
         assert "message" in data
         assert "success" in data
-        assert data["success"] is True
\ No newline at end of file
+        assert data["success"] is True
+
+
+    def test_indices_api_max_points(self):
+        """指数API max_points指定のテスト"""
+        response = client.get("/api/v1/indices?period=3m&max_points=20")
+        
+        assert response.status_code == 200
+        data = response.json()
+        for index in data["data"].values():
+            assert len(index["values"]) <= 20
+            assert len(index["dates"]) == len(index["values"])
+            
+    def test_max_points_invalid(self):
+        """無効なmax_points指定のテスト"""
+        response = client.get("/api/v1/weather?period=7d&max_points=1")
+        
+        assert response.status_code == 400
+        assert "max_points" in response.json()["detail"]
+            
+    def test_date_range_query(self):
+        """start/end指定のテスト"""
+        response = client.get("/api/v1/indices?start=2025-01-06&end=2025-01-31")
+        
+        assert response.status_code == 200
+        data = response.json()
+        assert data["start"] == "2025-01-06"
+        for index in data["data"].values():
+            assert all("2025-01-06" <= d <= "2025-01-31" for d in index["dates"])
+            
+    def test_date_range_invalid(self):
+        """無効なstart/end指定のテスト"""
+        response = client.get("/api/v1/stocks?symbols=6326&start=2025-03-01&end=2025-01-01")
+        
+        assert response.status_code == 400
+            
+    def test_intraday_interval(self):
+        """日中足指定のテスト"""
+        response = client.get("/api/v1/stocks/6326?period=7d&interval=15m")
+        
+        assert response.status_code == 200
+        data = response.json()["data"]
+        assert data["interval"] == "15m"
+        assert len(data["data_points"]) > 0
+        
+    def test_intraday_interval_too_fine(self):
+        """期間に対して細かすぎる足種のテスト"""
+        response = client.get("/api/v1/stocks?symbols=6326&period=3m&interval=1m")
+
+        assert response.status_code == 400
+
+    def test_multiple_stocks_ndjson(self):
+        """複数銘柄のNDJSONストリーミング応答のテスト"""
+        for url, headers in [
+            ("/api/v1/stocks?symbols=6326,1377,0000&period=7d&stream=1", {}),
+            ("/api/v1/stocks?symbols=6326,1377,0000&period=7d", {"Accept": "application/x-ndjson"}),
+        ]:
+            response = client.get(url, headers=headers)
+
+            assert response.status_code == 200
+            assert response.headers["content-type"].startswith("application/x-ndjson")
+            lines = [json.loads(line) for line in response.text.splitlines()]
+            stocks = {line["data"]["symbol"] for line in lines if line["type"] == "stock"}
+            assert stocks == {"6326", "1377"}
+            assert [line["symbol"] for line in lines if line["type"] == "error"] == ["0000"]
+            assert lines[-1]["type"] == "end"
+            assert lines[-1]["count"] == 2
+
+    def test_multiple_stocks_ndjson_invalid(self):
+        """ストリーミング応答でも不正なパラメータは開始前に400を返すこと"""
+        response = client.get("/api/v1/stocks?symbols=6326&period=3m&interval=1m&stream=1")
+
+        assert response.status_code == 400
+
+    def test_weather_batch_by_symbol(self):
+        """銘柄の生産拠点の気象データ一括取得のテスト"""
+        response = client.get("/api/v1/weather/batch?symbol=1377&period=7d")
+        
+        assert response.status_code == 200
+        data = response.json()["data"]
+        assert "kimitsu" in data
+        for location_data in data.values():
+            assert "temperature" in location_data["data"]
+            
+    def test_weather_variables_and_gap_strategy(self):
+        """気象変数・欠損補完方式指定のテスト"""
+        response = client.get("/api/v1/weather?period=7d&variables=temperature,humidity&gap_strategy=interpolate")
+        
+        assert response.status_code == 200
+        data = response.json()["data"]
+        assert "humidity" in data
+        assert len(data["humidity"]) == len(data["dates"])
+        
+        response = client.get("/api/v1/weather?period=7d&gap_strategy=unknown")
+        assert response.status_code == 400
+            
+    def test_weather_max_points_keeps_maxima(self, stub_upstream):
+        """最高気温のダウンサンプリングはバケット内の最大値を返すテスト"""
+        full = client.get("/api/v1/weather?period=3m&variables=temperature_max").json()["data"]
+        response = client.get("/api/v1/weather?period=3m&variables=temperature_max&max_points=10")
+        
+        assert response.status_code == 200
+        data = response.json()["data"]
+        starts = [full["dates"].index(d) for d in data["dates"]] + [len(full["dates"])]
+        for i, value in enumerate(data["temperature_max"]):
+            bucket = [v for v in full["temperature_max"][starts[i]:starts[i + 1]] if v is not None]
+            assert value == max(bucket)
+            
+    def test_cache_stats(self):
+        """キャッシュ統計取得のテスト"""
+        client.get("/api/v1/stocks/6326?period=7d")
+        response = client.get("/api/v1/cache/stats")
+        
+        assert response.status_code == 200
+        data = response.json()["data"]
+        assert data["backend"] in ("memory", "disk", "redis")
+        assert data["hits"] + data["misses"] > 0
@@ -0,0 +1,111 @@
+import json
+import time
+from datetime import date, timedelta
+
+from backend import backfill
+from backend.backfill import Backfiller, BackfillTask, Checkpoint, RateLimiter
+from backend.index_service import get_index_service
+from backend.stock_service import get_stock_service
+
+
+def _range(days: int = 400):
+    return (date.today() - timedelta(days=days)).isoformat(), date.today().isoformat()
+
+
+def _chart_requests(stub_upstream) -> int:
+    return sum(sum(counts.values()) for route, counts in stub_upstream.stats()["requests"].items()
+               if route == "chart")
+
+
+class TestBackfill:
+    """過去データのバックフィルのテストクラス"""
+
+    def test_writes_store_and_period_cache(self, stub_upstream, tmp_path):
+        """長期間の系列を日付範囲クエリ用のストアと期間指定のキャッシュに書き込む"""
+        start, end = _range()
+        checkpoint = Checkpoint(str(tmp_path / "checkpoint.json"))
+        backfiller = Backfiller(start, end, workers=2, rate=0, checkpoint=checkpoint)
+        summary = backfiller.run([BackfillTask("stock", "6326"), BackfillTask("index", "^N225")])
+
+        assert summary["done"] == 2
+        assert summary["failed"] == 0
+        assert summary["bars"] > 400
+
+        # 以降の日付範囲・期間指定のリクエストは上流を呼び出さない
+        requests = _chart_requests(stub_upstream)
+        stock = get_stock_service().get_stock_data("6326", start=start, end=end)
+        assert "is_mock" not in stock
+        assert len(stock["data_points"]) > 250
+        assert "is_mock" not in get_stock_service().get_stock_data("6326", "1m")
+        index = get_index_service().get_single_index("^N225", "3m")
+        assert len(index["data"]["dates"]) == 90
+        assert _chart_requests(stub_upstream) == requests
+
+        # 期間指定のキャッシュは長期間の系列のビューを保持しない
+        for window in (get_stock_service().cache.get("stock:6326:3m"), get_index_service().cache.get("index:^N225:3m")):
+            assert window.nbytes == window.compact().nbytes
+
+        saved = json.loads((tmp_path / "checkpoint.json").read_text(encoding="utf-8"))
+        assert saved["done"]["stock:6326"] > 250
+        assert saved["failed"] == {}
+
+    def test_resume_skips_done(self, stub_upstream, tmp_path):
+        """チェックポイントに完了済みの銘柄は再取得しない"""
+        start, end = _range(30)
+        path = str(tmp_path / "checkpoint.json")
+        tasks = [BackfillTask("stock", "6326"), BackfillTask("stock", "9984")]
+        Backfiller(start, end, rate=0, checkpoint=Checkpoint(path)).run(tasks[:1])
+
+        requests = _chart_requests(stub_upstream)
+        summary = Backfiller(start, end, rate=0, checkpoint=Checkpoint(path)).run(tasks)
+        assert summary["skipped"] == 1
+        assert summary["done"] == 1
+        assert _chart_requests(stub_upstream) == requests + 1
+
+    def test_failed_are_retried_on_resume(self, stub_upstream, tmp_path):
+        """失敗した銘柄はチェックポイントに記録し、再実行時に取得し直す"""
+        start, end = _range(30)
+        path = str(tmp_path / "checkpoint.json")
+        stub_upstream.config.update({"error_rate": 1.0})
+        summary = Backfiller(start, end, rate=0, retries=0, checkpoint=Checkpoint(path)).run(
+            [BackfillTask("stock", "6326")])
+        assert summary["failed"] == 1
+        assert "stock:6326" in Checkpoint(path).failed
+
+        stub_upstream.config.update({"error_rate": 0.0})
+        summary = Backfiller(start, end, rate=0, checkpoint=Checkpoint(path)).run([BackfillTask("stock", "6326")])
+        assert summary["done"] == 1
+        assert Checkpoint(path).failed == {}
+
+    def test_tasks(self):
+        """対象は登録済みの全インデックス・全銘柄（銘柄コードで絞り込み可能）"""
+        backfiller = Backfiller(*_range(30))
+        tasks = backfiller.tasks()
+        assert tasks[0].kind == "index"
+        assert len(tasks) == len(get_index_service().INDEX_SYMBOLS) + len(get_stock_service().catalog)
+        assert backfiller.tasks(["stock"], ["6326", "^N225"]) == [BackfillTask("stock", "6326")]
+
+    def test_rate_limiter(self):
+        """1秒あたりのリクエスト数を超えないよう待つ"""
+        limiter = RateLimiter(20)
+        started = time.monotonic()
+        for _ in range(5):
+            limiter.acquire()
+        assert time.monotonic() - started >= 0.15
+
+    def test_main_saves_snapshot(self, stub_upstream, tmp_path, monkeypatch):
+        """メモリキャッシュの場合は結果をスナップショットに保存する"""
+        snapshot = tmp_path / "snapshot.bin"
+        monkeypatch.setenv("STACK_WATCHER_SNAPSHOT_PATH", str(snapshot))
+        checkpoint = tmp_path / "checkpoint.json"
+        args = ["--years", "0.2", "--symbols", "6326,^N225", "--rate", "0", "--checkpoint", str(checkpoint)]
+
+        assert backfill.main(args) == 0
+        assert snapshot.exists()
+        saved = json.loads(checkpoint.read_text(encoding="utf-8"))
+        assert sorted(saved["done"]) == ["index:^N225", "stock:6326"]
+
+        # --start/--end を省略した再実行はチェックポイントの範囲を引き継ぎ、完了済みをスキップする
+        requests = _chart_requests(stub_upstream)
+        assert backfill.main(args) == 0
+        assert _chart_requests(stub_upstream) == requests
@@ -0,0 +1,405 @@
+import pickle
+import socketserver
+import sqlite3
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from backend.cache import CacheEntry, DiskCache, MemoryCache, RedisCache, create_cache, estimate_nbytes
+
+
+class _RespHandler(socketserver.StreamRequestHandler):
+    """テスト用のRedisプロトコル互換サーバー（GET/SET/MGET/PTTL/DEL/SELECT/PING のみ）"""
+
+    def _read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        args = []
+        for _ in range(int(line[1:-2])):
+            length = int(self.rfile.readline()[1:-2])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+    def _bulk(self, value):
+        if value is None:
+            return b"$-1\r\n"
+        return b"$%d\r\n%s\r\n" % (len(value), value)
+
+    def _lookup(self, key):
+        entry = self.server.store.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and time.time() > expires_at:
+            del self.server.store[key]
+            return None
+        return entry
+
+    def handle(self):
+        store = self.server.store
+        while True:
+            args = self._read_command()
+            if args is None:
+                return
+            command = args[0].upper()
+            with self.server.lock:
+                if self.server.error is not None:
+                    reply = self.server.error
+                elif command in (b"PING", b"SELECT"):
+                    reply = b"+OK\r\n"
+                elif command == b"GET":
+                    entry = self._lookup(args[1])
+                    reply = self._bulk(entry[0] if entry else None)
+                elif command == b"MGET":
+                    entries = [self._lookup(key) for key in args[1:]]
+                    reply = b"*%d\r\n" % len(entries) + b"".join(
+                        self._bulk(entry[0] if entry else None) for entry in entries
+                    )
+                elif command == b"SET":
+                    options = [arg.upper() for arg in args[3:]]
+                    expires_at = None
+                    if b"PX" in options:
+                        expires_at = time.time() + int(args[3 + options.index(b"PX") + 1]) / 1000
+                    if b"NX" in options and self._lookup(args[1]) is not None:
+                        reply = b"$-1\r\n"
+                    else:
+                        store[args[1]] = (args[2], expires_at)
+                        reply = b"+OK\r\n"
+                elif command == b"PTTL":
+                    entry = self._lookup(args[1])
+                    if entry is None:
+                        remaining = -2
+                    elif entry[1] is None:
+                        remaining = -1
+                    else:
+                        remaining = int((entry[1] - time.time()) * 1000)
+                    reply = b":%d\r\n" % remaining
+                elif command == b"DEL":
+                    removed = sum(store.pop(key, None) is not None for key in args[1:])
+                    reply = b":%d\r\n" % removed
+                else:
+                    reply = b"-ERR unknown command\r\n"
+            self.wfile.write(reply)
+
+
+@pytest.fixture
+def resp_servers():
+    """テスト用Redis互換サーバーを起動する関数（error を指定すると全コマンドにそのエラー応答を返す）"""
+    servers = []
+
+    def start(error=None):
+        server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), _RespHandler)
+        server.daemon_threads = True
+        server.store = {}
+        server.error = error
+        server.lock = threading.Lock()
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f"redis://127.0.0.1:{server.server_address[1]}/0"
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def resp_server(resp_servers):
+    """テスト用Redis互換サーバーを起動してURLを返す"""
+    return resp_servers()
+
+
+@pytest.fixture(params=["memory", "disk", "redis"])
+def backend(request, tmp_path):
+    """各バックエンドで共通のテストを実行"""
+    if request.param == "memory":
+        return MemoryCache()
+    if request.param == "disk":
+        return DiskCache(str(tmp_path / "cache.sqlite3"))
+    return RedisCache(request.getfixturevalue("resp_server"))
+
+
+class TestCacheBackends:
+    """全バックエンド共通インターフェースのテストクラス"""
+
+    def test_get_set_ttl(self, backend):
+        """TTL付きの保存・残り有効秒数・期限切れ"""
+        backend.set("a", {"x": 1}, ttl=60)
+        backend.set("b", 1, ttl=0.001)
+        time.sleep(0.01)
+
+        assert backend.get("a") == {"x": 1}
+        assert 0 < backend.ttl("a") <= 60
+        assert backend.get("b") is None
+        assert backend.ttl("missing") is None
+
+    def test_invalidate(self, backend):
+        """値の削除"""
+        backend.set("a", [1, 2, 3], ttl=60)
+        backend.invalidate("a")
+
+        assert backend.get("a") is None
+
+    def test_get_many_set_many(self, backend):
+        """一括取得・一括保存（存在しないキーは結果に含まれない）"""
+        backend.set_many({"a": 1, "b": 2}, ttl=60)
+
+        assert backend.get_many(["a", "b", "c"]) == {"a": 1, "b": 2}
+        stats = backend.stats()
+        assert stats["hits"] == 2
+        assert stats["misses"] == 1
+
+    def test_get_or_fetch_skips_none(self, backend):
+        """取得結果がNoneの場合は保存しない"""
+        assert backend.get_or_fetch("a", lambda: None, ttl=60) is None
+        assert backend.get_or_fetch("a", lambda: 1, ttl=60) == 1
+        assert backend.get_or_fetch("a", lambda: 2, ttl=60) == 1
+
+    def test_stale_while_revalidate(self, backend):
+        """鮮度期限切れの値はそのまま返し、裏で再取得する"""
+        backend.set("a", "old", ttl=0.001)
+        time.sleep(0.01)
+        refreshed = threading.Event()
+
+        def fetch():
+            refreshed.set()
+            return "new"
+
+        assert backend.get("a") is None
+        assert backend.get_or_fetch("a", fetch, ttl=60) == "old"
+        assert refreshed.wait(2)
+        for _ in range(100):
+            if backend.get("a") == "new":
+                break
+            time.sleep(0.01)
+        assert backend.get("a") == "new"
+        assert backend.stats()["stale_hits"] == 1
+
+
+class TestMemoryCache:
+    """プロセス内LRUキャッシュのテストクラス"""
+
+    def test_lru_eviction(self):
+        """最大エントリ数を超えると最も古く参照されたキーから削除"""
+        cache = MemoryCache(max_entries=2)
+        cache.set("a", 1, ttl=60)
+        cache.set("b", 2, ttl=60)
+        cache.get("a")
+        cache.set("c", 3, ttl=60)
+
+        assert cache.get("a") == 1
+        assert cache.get("b") is None
+        assert cache.get("c") == 3
+
+    def test_byte_budget_evicts_cheap_refetch(self):
+        """バイト数の上限を超えると、古いエントリのうち再取得コストの小さいものから削除"""
+        series = np.zeros(1000)
+        nbytes = estimate_nbytes(series)
+        cache = MemoryCache(max_bytes=nbytes * 2)
+        cache.set("stock:range:6326", series, ttl=60, cost=2.0)
+        cache.set("weather:tokyo:7d", series.copy(), ttl=60, cost=0.1)
+        cache.set("index:^N225:7d", series.copy(), ttl=60, cost=0.5)
+
+        stats = cache.stats()
+        assert cache.get("stock:range:6326") is not None
+        assert cache.get("weather:tokyo:7d") is None
+        assert stats["bytes"] == nbytes * 2
+        assert stats["evictions"] == 1
+
+    def test_bytes_by_source(self):
+        """取得元ごとの使用バイト数を集計すること"""
+        cache = MemoryCache()
+        cache.set("stock:6326:7d", np.zeros(100), ttl=60)
+        cache.set("stock:1377:7d", np.zeros(100), ttl=60)
+        cache.set("weather:tokyo:7d", np.zeros(10), ttl=60)
+        cache.invalidate("stock:1377:7d")
+
+        assert cache.stats()["bytes_by_source"] == {
+            "stock": estimate_nbytes(np.zeros(100)),
+            "weather": estimate_nbytes(np.zeros(10)),
+        }
+
+    def test_oversized_entry_not_stored(self):
+        """上限を超える単一のエントリは保存しないこと"""
+        cache = MemoryCache(max_bytes=1024)
+        cache.set("stock:6326:3m", np.zeros(1000), ttl=60)
+
+        assert cache.get("stock:6326:3m") is None
+        assert cache.stats()["bytes"] == 0
+
+    def test_records_fetch_cost(self):
+        """get_or_fetch は取得に要した秒数を再取得コストとして記録すること"""
+        cache = MemoryCache()
+
+        def fetch():
+            time.sleep(0.02)
+            return "value"
+
+        cache.get_or_fetch("k", fetch, ttl=60)
+        assert cache.get_entry("k").cost >= 0.02
+
+    def test_key_locks_released_after_fetch(self):
+        """同時取得を1回にまとめ、取得が終わればキーごとのロックを残さないこと"""
+        cache = MemoryCache()
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            time.sleep(0.1)
+            return "value"
+
+        threads = [threading.Thread(target=cache.get_or_fetch, args=("k", fetch, 60)) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        for i in range(100):
+            cache.get_or_fetch(f"miss:{i}", lambda: None, ttl=60)
+
+        assert len(calls) == 1
+        assert cache._key_locks == {}
+
+
+class TestSharedBackends:
+    """ワーカー・レプリカ間で共有するバックエンドのテストクラス"""
+
+    @pytest.fixture(params=["disk", "redis"])
+    def make_worker(self, request, tmp_path):
+        """同じ保存先を参照する別インスタンス（別ワーカー相当）を生成する関数"""
+        if request.param == "disk":
+            path = str(tmp_path / "cache.sqlite3")
+            return lambda: DiskCache(path)
+        url = request.getfixturevalue("resp_server")
+        return lambda: RedisCache(url)
+
+    def test_visible_across_instances(self, make_worker):
+        """別インスタンスから値が参照できること"""
+        worker_a = make_worker()
+        worker_b = make_worker()
+
+        worker_a.set("stock:6326:7d", {"symbol": "6326"}, ttl=60)
+        assert worker_b.get("stock:6326:7d") == {"symbol": "6326"}
+
+        worker_b.invalidate("stock:6326:7d")
+        assert worker_a.get("stock:6326:7d") is None
+
+    def test_single_fetch_across_workers(self, make_worker):
+        """同一キーへの同時リクエストで上流取得が1回にまとめられること"""
+        workers = [make_worker() for _ in range(4)]
+        calls = []
+        results = []
+
+        def fetch():
+            calls.append(1)
+            time.sleep(0.2)
+            return "value"
+
+        threads = [
+            threading.Thread(target=lambda w=w: results.append(w.get_or_fetch("k", fetch, ttl=60)))
+            for w in workers
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert len(calls) == 1
+        assert results == ["value"] * 4
+
+
+class TestDiskCache:
+    """ディスクキャッシュのテストクラス"""
+
+    def test_rejects_unsigned_rows(self, tmp_path):
+        """署名が一致しない行（他の鍵・書き換えられた行）は読み込まない"""
+        path = str(tmp_path / "cache.sqlite3")
+        cache = DiskCache(path, secret=b"s3cret")
+        cache.set("a", {"close": 1.0}, 60)
+
+        assert cache.get("a") == {"close": 1.0}
+        assert DiskCache(path, secret=b"other").get("a") is None
+
+        forged = pickle.dumps(CacheEntry({"close": 2.0}, time.time(), time.time() + 60))
+        with sqlite3.connect(path) as conn:
+            conn.execute("UPDATE entries SET value = ? WHERE key = 'a'", (forged,))
+        assert cache.get("a") is None
+        assert cache.hot_entries(10) == []
+
+    def test_default_path_is_private(self, tmp_path, monkeypatch):
+        """既定の保存先は本人だけが読み書きできるデータディレクトリ"""
+        monkeypatch.setenv("STACK_WATCHER_DATA_DIR", str(tmp_path / "data"))
+        cache = DiskCache()
+
+        assert cache.path == str(tmp_path / "data" / "cache.sqlite3")
+        assert (tmp_path / "data").stat().st_mode & 0o077 == 0
+        assert (tmp_path / "data" / "secret.key").stat().st_mode & 0o077 == 0
+
+
+class TestRedisCache:
+    """Redisキャッシュのテストクラス"""
+
+    def test_unreachable_server_is_cache_miss(self):
+        """サーバーに接続できない場合はキャッシュミスとして取得処理を実行"""
+        cache = RedisCache("redis://127.0.0.1:1/0", timeout=0.2)
+
+        assert cache.get("a") is None
+        assert cache.get_or_fetch("a", lambda: 1, ttl=60) == 1
+        cache.invalidate("a")
+
+    def test_signed_values(self, resp_server):
+        """secret 指定時は署名の一致する値だけを読み込む"""
+        cache = RedisCache(resp_server, secret="s3cret")
+        cache.set("a", {"close": 1.0}, 60)
+
+        assert cache.get("a") == {"close": 1.0}
+        assert RedisCache(resp_server, secret="other").get("a") is None
+        RedisCache(resp_server).set("b", {"close": 2.0}, 60)
+        assert cache.get("b") is None
+
+    @pytest.mark.parametrize("error", [
+        b"-READONLY You can't write against a read only replica.\r\n",
+        b"-NOAUTH Authentication required.\r\n",
+    ])
+    def test_error_reply_is_cache_miss(self, resp_servers, error, caplog):
+        """エラー応答はキャッシュミスとして扱い、同じエラーのログは1回だけ出力する"""
+        cache = RedisCache(resp_servers(error), secret="s3cret")
+
+        cache.set("a", 1, 60)
+        assert cache.get("a") is None
+        assert cache.get_or_fetch("a", lambda: 2, ttl=60) == 2
+        cache.invalidate("a")
+        assert len([r for r in caplog.records if "Redis" in r.getMessage()]) == 1
+
+    def test_failed_auth_is_not_reused(self, resp_servers):
+        """認証に失敗した接続は再利用しない"""
+        url = resp_servers(b"-ERR invalid password\r\n").replace("redis://", "redis://:secret@")
+        cache = RedisCache(url)
+
+        assert cache.get("a") is None
+        assert cache._local.conn is None
+
+
+class TestCreateCache:
+    """環境変数によるバックエンド選択のテストクラス"""
+
+    def test_select_by_env(self, monkeypatch, tmp_path):
+        """STACK_WATCHER_CACHE_BACKEND で選択"""
+        monkeypatch.delenv("STACK_WATCHER_SHARED_CACHE", raising=False)
+        monkeypatch.delenv("STACK_WATCHER_CACHE_BACKEND", raising=False)
+        assert isinstance(create_cache(), MemoryCache)
+
+        monkeypatch.setenv("STACK_WATCHER_CACHE_BACKEND", "disk")
+        monkeypatch.setenv("STACK_WATCHER_CACHE_PATH", str(tmp_path / "cache.sqlite3"))
+        assert isinstance(create_cache(), DiskCache)
+
+        monkeypatch.setenv("STACK_WATCHER_CACHE_BACKEND", "redis")
+        assert isinstance(create_cache(), RedisCache)
+
+    def test_invalid_backend(self, monkeypatch):
+        """不正なバックエンド名"""
+        monkeypatch.setenv("STACK_WATCHER_CACHE_BACKEND", "memcached")
+        with pytest.raises(ValueError):
+            create_cache()
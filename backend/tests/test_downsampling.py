@@ -0,0 +1,107 @@
+import numpy as np
+import pytest
+
+from backend.downsampling import (
+    lttb_indices,
+    validate_max_points,
+    downsample_stock_data,
+    downsample_index_data,
+    downsample_weather_data,
+)
+
+
+class TestLTTB:
+    """LTTBダウンサンプリングのテストクラス"""
+
+    def test_keeps_endpoints_and_count(self):
+        """先頭・末尾を保持し、指定点数に削減されること"""
+        values = np.sin(np.linspace(0, 20, 1000))
+        selected = lttb_indices(values, 50)
+
+        assert len(selected) == 50
+        assert selected[0] == 0
+        assert selected[-1] == 999
+        assert np.all(np.diff(selected) > 0)
+
+    def test_preserves_spike(self):
+        """突出値（スパイク）が残ること"""
+        values = np.zeros(500)
+        values[321] = 100.0
+        selected = lttb_indices(values, 20)
+
+        assert 321 in selected
+
+    def test_no_reduction_when_short(self):
+        """データ点数が閾値以下の場合はそのまま"""
+        selected = lttb_indices([1.0, 2.0, 3.0], 10)
+        assert selected.tolist() == [0, 1, 2]
+
+    def test_validate_max_points(self):
+        """max_pointsのバリデーション"""
+        validate_max_points(None)
+        validate_max_points(3)
+        with pytest.raises(ValueError):
+            validate_max_points(2)
+
+
+class TestSeriesDownsampling:
+    """各データ形式のダウンサンプリングのテストクラス"""
+
+    def test_stock_ohlc_buckets(self):
+        """OHLCバケット集約で高値・安値・出来高が保存されること"""
+        points = [
+            {"date": f"2025-01-{i + 1:02d}", "open": i, "high": i + 10, "low": i - 10, "close": i + 1, "volume": 100}
+            for i in range(30)
+        ]
+        stock = {"symbol": "6326", "company_name": "クボタ", "data_points": points}
+        result = downsample_stock_data(stock, 10)
+
+        assert len(result["data_points"]) == 10
+        assert result["data_points"][0]["open"] == 0
+        assert result["data_points"][-1]["close"] == 30
+        assert max(p["high"] for p in result["data_points"]) == 39
+        assert min(p["low"] for p in result["data_points"]) == -10
+        assert sum(p["volume"] for p in result["data_points"]) == 3000
+        assert result["downsampling"]["original_points"] == 30
+
+    def test_index_changes_recomputed(self):
+        """インデックスの前日比が選択点同士で再計算されること"""
+        values = [float(100 + i) for i in range(100)]
+        index = {"dates": [str(i) for i in range(100)], "values": values, "changes": [], "changePercent": []}
+        result = downsample_index_data(index, 10)
+
+        assert len(result["values"]) == 10
+        assert result["changes"][0] == 0.0
+        for i in range(1, 10):
+            assert result["changes"][i] == pytest.approx(result["values"][i] - result["values"][i - 1], abs=0.01)
+
+    def test_weather_bucket_totals(self):
+        """気象データの降水量合計が保存されること"""
+        weather = {
+            "dates": [str(i) for i in range(60)],
+            "precipitation": [1.0] * 60,
+            "temperature": [20.0] * 60,
+            "pressure": [1013.0] * 60,
+        }
+        result = downsample_weather_data(weather, 12)
+
+        assert len(result["dates"]) == 12
+        assert sum(result["precipitation"]) == pytest.approx(60.0)
+        assert result["temperature"] == [20.0] * 12
+
+    def test_weather_bucket_uses_variable_aggregate(self):
+        """最高気温・最低気温はバケット内の最大・最小で集約すること"""
+        weather = {
+            "dates": [str(i) for i in range(6)],
+            "temperature_max": [30.0, 35.0, 31.0, 29.0, None, 33.0],
+            "temperature_min": [20.0, 18.0, 21.0, 22.0, 19.0, None],
+        }
+        result = downsample_weather_data(weather, 3)
+
+        assert result["temperature_max"] == [35.0, 31.0, 33.0]
+        assert result["temperature_min"] == [18.0, 21.0, 19.0]
+
+    def test_passthrough_without_max_points(self):
+        """max_points未指定時は元データを返すこと"""
+        stock = {"data_points": [{"date": "x", "open": 1, "high": 1, "low": 1, "close": 1, "volume": 1}]}
+        assert downsample_stock_data(stock, None) is stock
@@ -0,0 +1,100 @@
+import sys
+from unittest.mock import Mock, patch
+
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+
+from backend.export import STOCK_COLUMNS, parse_columns
+from backend.index_service import IndexService
+from backend.main import app
+from backend.stock_service import StockService
+
+client = TestClient(app)
+
+
+def _history(start: str, days: int) -> pd.DataFrame:
+    """yfinanceのhistory()と同じ形式の日足"""
+    index = pd.date_range(start, periods=days, freq="D", tz="Asia/Tokyo")
+    values = np.arange(days, dtype=float) + 100
+    return pd.DataFrame({
+        "Open": values, "High": values + 1, "Low": values - 1, "Close": values + 0.5,
+        "Volume": np.full(days, 1000),
+    }, index=index)
+
+
+@pytest.fixture
+def upstream():
+    """上流（yfinance）を固定の日足に差し替える"""
+    ticker = Mock()
+    ticker.history.return_value = _history("2020-01-01", 60)
+    with patch.object(StockService, "_ticker", return_value=ticker), \
+            patch.object(IndexService, "_ticker", return_value=ticker):
+        yield ticker
+
+
+class TestExportParameters:
+    """エクスポートのパラメータ検証のテストクラス"""
+
+    def test_parse_columns(self):
+        """列指定の解析"""
+        assert parse_columns(None, STOCK_COLUMNS) == list(STOCK_COLUMNS)
+        assert parse_columns("volume, close", STOCK_COLUMNS) == ["close", "volume"]
+        with pytest.raises(ValueError):
+            parse_columns("close,vwap", STOCK_COLUMNS)
+
+    def test_invalid_format(self):
+        """無効な出力形式は400"""
+        response = client.get("/api/v1/export/stocks?symbols=6326&format=csv")
+
+        assert response.status_code == 400
+
+    def test_pyarrow_missing(self):
+        """pyarrow が未インストールの場合は501"""
+        with patch.dict(sys.modules, {"pyarrow": None}):
+            response = client.get("/api/v1/export/stocks?symbols=6326")
+
+        assert response.status_code == 501
+
+
+class TestExportEndpoints:
+    """Arrow / Parquet エクスポートのテストクラス"""
+
+    @pytest.fixture(autouse=True)
+    def pyarrow(self):
+        return pytest.importorskip("pyarrow")
+
+    def test_stocks_arrow_stream(self, pyarrow, upstream):
+        """Arrow IPCストリームで日付範囲・列を指定して取得"""
+        response = client.get(
+            "/api/v1/export/stocks?symbols=6326,1377&start=2020-01-10&end=2020-01-19&columns=close,volume"
+        )
+
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/vnd.apache.arrow.stream"
+        table = pyarrow.ipc.open_stream(response.content).read_all()
+        assert table.column_names == ["symbol", "date", "close", "volume"]
+        assert table.num_rows == 20
+        assert table.column("symbol").to_pylist()[::10] == ["6326", "1377"]
+        assert table.column("close").to_pylist()[0] == 109.5
+
+    def test_indices_parquet(self, pyarrow, upstream):
+        """Parquetで指数の終値を取得"""
+        import pyarrow.parquet as pq
+
+        response = client.get("/api/v1/export/indices?symbols=^N225&start=2020-02-01&end=2020-02-05&format=parquet")
+
+        assert response.status_code == 200
+        table = pq.read_table(pyarrow.BufferReader(response.content))
+        assert table.column_names == ["symbol", "date", "value"]
+        assert [d.isoformat() for d in table.column("date").to_pylist()] == [
+            "2020-02-01", "2020-02-02", "2020-02-03", "2020-02-04", "2020-02-05"
+        ]
+
+    def test_upstream_unavailable(self, pyarrow):
+        """上流から取得できない場合はモックデータを含めず503"""
+        with patch.object(StockService, "_ticker", side_effect=OSError("network down")):
+            response = client.get("/api/v1/export/stocks?symbols=6326&start=2019-01-01&end=2019-01-31")
+
+        assert response.status_code == 503
@@ -0,0 +1,251 @@
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend import upstream_policy
+from backend.fetch_scheduler import (
+    FetchScheduler,
+    QueueTimeoutError,
+    bind_priority,
+    current_priority,
+    fetch_priority,
+    parse_limits,
+)
+from backend.main import app
+from backend.upstream_policy import UpstreamPolicies, UpstreamTimeoutError, call_upstream, request_deadline
+
+client = TestClient(app)
+
+
+def _wait_until(condition, timeout: float = 2.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "条件を満たしませんでした"
+        time.sleep(0.005)
+
+
+def _queued(scheduler: FetchScheduler, source: str = "yahoo") -> int:
+    return scheduler.stats().get(source, {}).get("queued", 0)
+
+
+def _hold(scheduler: FetchScheduler, release: threading.Event, priority: str = "interactive",
+          source: str = "yahoo", key=None) -> threading.Thread:
+    """release が立つまで枠を占有する呼び出しを別スレッドで開始する"""
+    thread = threading.Thread(target=scheduler.run, args=(source, lambda: release.wait(5)),
+                              kwargs={"priority": priority, "key": key}, daemon=True)
+    thread.start()
+    return thread
+
+
+class TestFetchScheduler:
+    """上流呼び出しのスケジューラーのテストクラス"""
+
+    def test_priority_order(self):
+        """枠が空くと interactive > prefetch > backfill の順に実行する"""
+        scheduler = FetchScheduler({"yahoo": 1}, background_share=1.0)
+        release = threading.Event()
+        holder = _hold(scheduler, release)
+        _wait_until(lambda: scheduler.stats()["yahoo"]["running"] == 1)
+
+        order = []
+        threads = []
+        for priority in ("backfill", "prefetch", "interactive"):
+            thread = threading.Thread(target=scheduler.run, args=("yahoo", lambda p=priority: order.append(p)),
+                                      kwargs={"priority": priority})
+            thread.start()
+            threads.append(thread)
+            _wait_until(lambda n=len(threads): _queued(scheduler) == n)
+
+        release.set()
+        for thread in threads + [holder]:
+            thread.join(2)
+        assert order == ["interactive", "prefetch", "backfill"]
+
+    def test_background_share_keeps_slots_for_interactive(self):
+        """バックフィルが大量にあっても、APIリクエストの呼び出しは待たずに実行する"""
+        scheduler = FetchScheduler({"yahoo": 4}, background_share=0.5)
+        release = threading.Event()
+        holders = [_hold(scheduler, release, "backfill") for _ in range(6)]
+        _wait_until(lambda: _queued(scheduler) == 4)
+        stats = scheduler.stats()["yahoo"]
+        assert stats["running"] == 2
+        assert stats["priorities"]["backfill"]["queued"] == 4
+
+        started = time.monotonic()
+        assert scheduler.run("yahoo", lambda: "ok", priority="interactive", timeout=1) == "ok"
+        assert time.monotonic() - started < 0.1
+
+        release.set()
+        for holder in holders:
+            holder.join(2)
+        assert scheduler.stats()["yahoo"]["running"] == 0
+
+    def test_per_source_limits(self):
+        """同時実行数の枠は取得元ごと"""
+        scheduler = FetchScheduler({"yahoo": 1, "openmeteo": 1})
+        release = threading.Event()
+        holder = _hold(scheduler, release, source="yahoo")
+        _wait_until(lambda: scheduler.stats()["yahoo"]["running"] == 1)
+
+        assert scheduler.run("openmeteo", lambda: "weather", priority="interactive", timeout=1) == "weather"
+        release.set()
+        holder.join(2)
+
+    def test_deduplicates_same_key(self):
+        """同じキーの呼び出しは1回にまとめて結果を共有する"""
+        scheduler = FetchScheduler({"yahoo": 4})
+        release = threading.Event()
+        calls = []
+        results = []
+
+        def fetch():
+            calls.append(1)
+            release.wait(5)
+            return "bars"
+
+        threads = [threading.Thread(target=lambda: results.append(scheduler.run("yahoo", fetch, key="6326.T")))
+                   for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        _wait_until(lambda: scheduler.stats()["yahoo"]["deduplicated"] == 2)
+        release.set()
+        for thread in threads:
+            thread.join(2)
+
+        assert calls == [1]
+        assert results == ["bars"] * 3
+
+    def test_shared_error_is_raised(self):
+        """まとめた呼び出しの例外は全員に送出する"""
+        scheduler = FetchScheduler({"yahoo": 1})
+        release = threading.Event()
+        errors = []
+
+        def fail():
+            release.wait(5)
+            raise OSError("connection reset")
+
+        def call():
+            try:
+                scheduler.run("yahoo", fail, key="k")
+            except OSError as e:
+                errors.append(str(e))
+
+        threads = [threading.Thread(target=call) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        _wait_until(lambda: scheduler.stats()["yahoo"]["deduplicated"] == 1)
+        release.set()
+        for thread in threads:
+            thread.join(2)
+        assert errors == ["connection reset"] * 2
+
+    def test_promotes_queued_key(self):
+        """待機中の呼び出しと同じキーを高い優先度で呼び出すと、待機中の呼び出しの優先度を引き上げる"""
+        scheduler = FetchScheduler({"yahoo": 1}, background_share=1.0)
+        release = threading.Event()
+        holder = _hold(scheduler, release)
+        _wait_until(lambda: scheduler.stats()["yahoo"]["running"] == 1)
+
+        order = []
+        backfill = threading.Thread(target=scheduler.run, args=("yahoo", lambda: order.append("k") or "k"),
+                                    kwargs={"priority": "backfill", "key": "k"})
+        backfill.start()
+        _wait_until(lambda: _queued(scheduler) == 1)
+        prefetch = threading.Thread(target=scheduler.run, args=("yahoo", lambda: order.append("other")),
+                                    kwargs={"priority": "prefetch"})
+        prefetch.start()
+        _wait_until(lambda: _queued(scheduler) == 2)
+
+        result = []
+        interactive = threading.Thread(
+            target=lambda: result.append(scheduler.run("yahoo", lambda: pytest.fail("重複して呼び出しました"),
+                                                       priority="interactive", key="k")))
+        interactive.start()
+        _wait_until(lambda: scheduler.stats()["yahoo"]["priorities"]["interactive"]["queued"] == 1)
+
+        release.set()
+        for thread in (holder, backfill, prefetch, interactive):
+            thread.join(2)
+        assert order == ["k", "other"]
+        assert result == ["k"]
+
+    def test_queue_timeout(self):
+        """期限内に枠を得られない場合は QueueTimeoutError とし、待ち行列から外す"""
+        scheduler = FetchScheduler({"yahoo": 1})
+        release = threading.Event()
+        holder = _hold(scheduler, release)
+        _wait_until(lambda: scheduler.stats()["yahoo"]["running"] == 1)
+
+        with pytest.raises(QueueTimeoutError):
+            scheduler.run("yahoo", lambda: pytest.fail("期限切れ後に呼び出しました"), priority="interactive", timeout=0.05)
+        stats = scheduler.stats()["yahoo"]
+        assert stats["timeouts"] == 1
+        assert stats["queued"] == 0
+
+        release.set()
+        holder.join(2)
+        assert scheduler.run("yahoo", lambda: "ok") == "ok"
+
+    def test_call_upstream_waits_within_deadline(self, monkeypatch):
+        """上流の呼び出しは順番を待つ時間もリクエストの期限に含める"""
+        scheduler = FetchScheduler({"yahoo": 1})
+        monkeypatch.setattr(upstream_policy, "get_fetch_scheduler", lambda: scheduler)
+        release = threading.Event()
+        holder = _hold(scheduler, release)
+        _wait_until(lambda: scheduler.stats()["yahoo"]["running"] == 1)
+
+        with request_deadline(0.1), fetch_priority("interactive"):
+            with pytest.raises(UpstreamTimeoutError):
+                call_upstream("yahoo", lambda timeout: pytest.fail("期限切れ後に呼び出しました"))
+        release.set()
+        holder.join(2)
+        assert call_upstream("yahoo", lambda timeout: "ok", key="k") == "ok"
+        assert scheduler.stats()["yahoo"]["priorities"]["prefetch"]["submitted"] == 1
+
+    def test_timed_out_call_keeps_slot(self, monkeypatch):
+        """タイムアウトで打ち切った上流の呼び出しは、終わるまで枠を解放しない"""
+        scheduler = FetchScheduler({"yahoo": 1})
+        monkeypatch.setattr(upstream_policy, "get_fetch_scheduler", lambda: scheduler)
+        policies = UpstreamPolicies(min_timeout=0.05, max_timeout=0.05)
+        monkeypatch.setattr(upstream_policy, "get_upstream_policies", lambda: policies)
+        release = threading.Event()
+
+        with pytest.raises(UpstreamTimeoutError):
+            call_upstream("yahoo", lambda timeout: release.wait(5))
+        assert scheduler.stats()["yahoo"]["running"] == 1
+        with request_deadline(0.1):
+            with pytest.raises(UpstreamTimeoutError):
+                call_upstream("yahoo", lambda timeout: pytest.fail("枠を超えて呼び出しました"))
+
+        release.set()
+        _wait_until(lambda: scheduler.stats()["yahoo"]["running"] == 0)
+        assert call_upstream("yahoo", lambda timeout: "ok") == "ok"
+        assert scheduler.stats()["yahoo"]["running"] == 0
+
+    def test_priority_context(self):
+        """優先度は contextvars で設定し、bind_priority で別スレッドに引き継ぐ"""
+        assert current_priority() == "prefetch"
+        seen = []
+        with fetch_priority("backfill"):
+            assert current_priority() == "backfill"
+            bound = bind_priority(lambda: seen.append(current_priority()))
+        thread = threading.Thread(target=bound)
+        thread.start()
+        thread.join()
+        assert seen == ["backfill"]
+        with pytest.raises(ValueError):
+            with fetch_priority("urgent"):
+                pass
+
+    def test_parse_limits(self):
+        assert parse_limits("yahoo=8, openmeteo=4") == {"yahoo": 8, "openmeteo": 4}
+
+    def test_stats_endpoint(self):
+        """取得元ごとの統計を返す"""
+        response = client.get("/api/v1/upstream/scheduler")
+
+        assert response.status_code == 200
+        assert response.json()["success"] is True
@@ -117,8 +117,8 @@ class TestAPIIntegration:
             
         print("✅ エラーハンドリングが一貫しています")
         
-    def test_performance_baseline(self):
-        """基本的なパフォーマンステスト"""
+    def test_performance_baseline(self, stub_upstream):
+        """基本的なパフォーマンステスト（上流はスタブサーバー）"""
         import time
         
         # レスポンス時間の測定
@@ -132,6 +132,10 @@ class TestAPIIntegration:
         end_time = time.time()
         total_time = end_time - start_time
         
+        # 上流から取得した実データであることを確認
+        assert stub_upstream.stats()["requests"]["chart"]["200"] >= 6
+        assert weather_response.json()["source"] == "OpenMeteo API"
+        
         # 全API の取得が10秒以内であることを確認
         assert total_time < 10.0, f"API応答時間が遅すぎます: {total_time:.2f}秒"
         
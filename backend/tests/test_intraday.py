@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from backend.intraday import generate_mock_bars, validate_interval
+from backend.series import OHLCVSeries
+
+
+class TestOHLCVSeries:
+    """日中足のテストクラス"""
+
+    @pytest.fixture
+    def minute_bars(self):
+        index = pd.date_range("2025-01-06 09:00", periods=120, freq="min", tz="Asia/Tokyo")
+        frame = pd.DataFrame({
+            "Open": np.arange(120, dtype=float),
+            "High": np.arange(120, dtype=float) + 1,
+            "Low": np.arange(120, dtype=float) - 1,
+            "Close": np.arange(120, dtype=float) + 0.5,
+            "Volume": np.full(120, 10),
+        }, index=index)
+        return OHLCVSeries.from_frame(frame, 1)
+
+    def test_resample_to_coarser(self, minute_bars):
+        """1分足から15分足・60分足へのリサンプリング"""
+        bars15 = minute_bars.resample(15)
+        bars60 = minute_bars.resample(60)
+
+        assert len(bars15) == 8
+        assert len(bars60) == 2
+        assert bars60.opens[0] == 0
+        assert bars60.highs[0] == 60
+        assert bars60.lows[0] == -1
+        assert bars60.closes[0] == 59.5
+        assert bars60.volumes.sum() == 1200
+
+    def test_resample_to_daily(self, minute_bars):
+        """日足はローカル日付単位で集約されること"""
+        daily = minute_bars.resample(1440)
+        points = daily.to_data_points()
+
+        assert len(points) == 1
+        assert points[0]["date"] == "2025-01-06T00:00:00+09:00"
+        assert points[0]["volume"] == 1200
+
+    def test_resample_finer_rejected(self, minute_bars):
+        """細かい足への変換はエラー"""
+        with pytest.raises(ValueError):
+            minute_bars.resample(15).resample(5)
+
+    def test_data_points_local_time(self, minute_bars):
+        """data_pointsの日時がローカル時刻であること"""
+        points = minute_bars.resample(5).to_data_points()
+        assert points[1]["date"] == "2025-01-06T09:05:00+09:00"
+
+    def test_mock_bars_session_hours(self):
+        """モック日中足が立会時間内に収まること"""
+        bars = generate_mock_bars(1000, 0.03, 7, 5)
+        local_minutes = ((bars.timestamps + bars.utc_offset_ns) // 60_000_000_000) % 1440
+
+        assert len(bars) > 0
+        assert local_minutes.min() >= 9 * 60
+        assert local_minutes.max() < 15 * 60 + 30
+
+    def test_validate_interval(self):
+        """足種と期間の組み合わせチェック"""
+        validate_interval("1m", "7d")
+        validate_interval("60m", "3m")
+        with pytest.raises(ValueError):
+            validate_interval("1m", "3m")
+        with pytest.raises(ValueError):
+            validate_interval("2h", "7d")
@@ -0,0 +1,94 @@
+import os
+import pstats
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend import profiling
+from backend.main import app
+from backend.profiling import RequestProfiler, StackSampler
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def use_profiler(monkeypatch):
+    """ミドルウェアが使うプロファイラーを差し替える"""
+    def use(profiler: RequestProfiler) -> RequestProfiler:
+        monkeypatch.setattr(profiling, "get_profiler", lambda: profiler)
+        return profiler
+    return use
+
+
+def _busy_loop(stop: threading.Event) -> None:
+    while not stop.is_set():
+        sum(range(1000))
+
+
+class TestStackSampler:
+    """スタック採取のテストクラス"""
+
+    def test_samples_busy_thread(self):
+        """処理中のスレッドのスタックを folded 形式で数える"""
+        stop = threading.Event()
+        worker = threading.Thread(target=_busy_loop, args=(stop,), name="busy")
+        worker.start()
+        sampler = StackSampler(interval=0.001)
+        sampler.start()
+        time.sleep(0.05)
+        counts = sampler.stop()
+        stop.set()
+        worker.join()
+
+        busy = [stack for stack in counts if stack.startswith("busy;")]
+        assert busy
+        assert all("test_profiling.py:_busy_loop" in stack for stack in busy)
+        assert sampler.samples > 0
+
+
+class TestProfilingMiddleware:
+    """プロファイリングのミドルウェアのテストクラス"""
+
+    def test_disabled_without_token(self, tmp_path, use_profiler):
+        """トークン未設定の場合は指定があってもプロファイルしない"""
+        use_profiler(RequestProfiler(directory=str(tmp_path)))
+        response = client.get("/api/v1/stocks/symbols", headers={"X-Profile": "secret"})
+
+        assert response.status_code == 200
+        assert "x-profile-file" not in response.headers
+        assert os.listdir(tmp_path) == []
+
+    def test_header_writes_folded(self, tmp_path, use_profiler):
+        """トークンが一致する場合は folded 形式のファイルを書き出す"""
+        use_profiler(RequestProfiler(token="secret", directory=str(tmp_path), interval_ms=1))
+        assert "x-profile-file" not in client.get("/api/v1/stocks/symbols", headers={"X-Profile": "wrong"}).headers
+
+        response = client.get("/api/v1/stocks/symbols", headers={"X-Profile": "secret"})
+        assert response.status_code == 200
+        name = response.headers["x-profile-file"]
+        assert name.endswith(".folded")
+        assert "GET-api_v1_stocks_symbols" in name
+        with open(tmp_path / name, encoding="utf-8") as f:
+            for line in f:
+                stack, count = line.rsplit(" ", 1)
+                assert ";" in stack and int(count) > 0
+
+    def test_query_cprofile(self, tmp_path, use_profiler):
+        """クエリでの指定・cprofile モードは pstats 形式で書き出す"""
+        use_profiler(RequestProfiler(token="secret", directory=str(tmp_path)))
+        response = client.get("/api/v1/stocks/symbols?__profile=secret", headers={"X-Profile-Mode": "cprofile"})
+
+        name = response.headers["x-profile-file"]
+        assert name.endswith(".prof")
+        assert pstats.Stats(str(tmp_path / name)).total_calls > 0
+
+    def test_sample_rate_and_max_files(self, tmp_path, use_profiler):
+        """サンプリング率で指定なしのリクエストもプロファイルし、古いファイルを削除する"""
+        use_profiler(RequestProfiler(sample_rate=1.0, directory=str(tmp_path), max_files=2))
+        for _ in range(3):
+            assert "x-profile-file" in client.get("/health").headers
+            time.sleep(0.01)
+
+        assert len(os.listdir(tmp_path)) == 2
@@ -0,0 +1,121 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from backend import upstream, upstream_policy
+from backend.recorder import RecordedUpstreamError, ReplayMissError, UpstreamRecorder
+from backend.stock_service import StockService
+from backend.upstream_policy import MIN_SAMPLES, UpstreamPolicies
+from backend.weather_processing import DEFAULT_OPTIONS
+from backend.weather_service import WeatherService
+
+
+@pytest.fixture
+def use_recorder(monkeypatch):
+    """上流の呼び出しに使う記録・再生の設定を差し替える"""
+    def use(recorder: UpstreamRecorder) -> UpstreamRecorder:
+        monkeypatch.setattr(upstream, "get_recorder", lambda: recorder)
+        return recorder
+    return use
+
+
+class TestUpstreamRecorder:
+    """記録・再生のテストクラス"""
+
+    def test_invalid_mode(self, tmp_path):
+        """無効なモードはエラー"""
+        with pytest.raises(ValueError):
+            UpstreamRecorder("capture", str(tmp_path))
+
+    def test_record_and_replay(self, tmp_path):
+        """記録した応答を再生し、一致しない条件は ReplayMissError"""
+        recorder = UpstreamRecorder("record", str(tmp_path))
+        assert recorder.call("openmeteo", "/v1/archive", {"start_date": "2025-01-01", "daily": "a"},
+                             lambda: (200, {"x": 1}), encode=list, decode=tuple) == (200, {"x": 1})
+
+        replay = UpstreamRecorder("replay", str(tmp_path))
+        fetch = lambda: pytest.fail("再生モードで上流を呼び出しました")  # noqa: E731
+        assert replay.call("openmeteo", "/v1/archive", {"start_date": "2025-01-01", "daily": "a"},
+                           fetch, decode=tuple) == (200, {"x": 1})
+        # 日付だけが異なる条件は日付を除いた条件で照合する
+        assert replay.call("openmeteo", "/v1/archive", {"start_date": "2025-02-01", "daily": "a"},
+                           fetch, decode=tuple) == (200, {"x": 1})
+        with pytest.raises(ReplayMissError):
+            replay.call("openmeteo", "/v1/archive", {"daily": "b"}, fetch)
+        assert replay.stats()["replayed"] == 2
+        assert replay.stats()["misses"] == 1
+
+    def test_replay_error_and_latency(self, tmp_path):
+        """記録時の失敗を再現し、所要時間を指定倍率で再現する"""
+        recorder = UpstreamRecorder("record", str(tmp_path))
+
+        def slow_failure():
+            time.sleep(0.05)
+            raise OSError("connection reset")
+
+        with pytest.raises(OSError):
+            recorder.call("yahoo", "6326.T", {"period": "7d"}, slow_failure)
+
+        replay = UpstreamRecorder("replay", str(tmp_path), latency_scale=1.0)
+        started = time.monotonic()
+        with pytest.raises(RecordedUpstreamError, match="connection reset"):
+            replay.call("yahoo", "6326.T", {"period": "7d"}, slow_failure)
+        assert time.monotonic() - started >= 0.05
+
+
+class TestServiceReplay:
+    """サービスの上流呼び出しの記録・再生のテストクラス"""
+
+    def test_stock_and_weather_round_trip(self, tmp_path, stub_upstream, use_recorder):
+        """スタブから記録した日足・気象データを、上流に接続せずに同じ値で再生する"""
+        use_recorder(UpstreamRecorder("record", str(tmp_path)))
+        stock = StockService()._fetch_stock_data("6326", "7d")
+        weather = WeatherService()._fetch_openmeteo_batch(["tokyo", "sakai"], 7, options=DEFAULT_OPTIONS)
+        requests_made = stub_upstream.stats()["total"]
+
+        use_recorder(UpstreamRecorder("replay", str(tmp_path)))
+        replayed_stock = StockService()._fetch_stock_data("6326", "7d")
+        replayed_weather = WeatherService()._fetch_openmeteo_batch(["tokyo", "sakai"], 7, options=DEFAULT_OPTIONS)
+
+        assert stub_upstream.stats()["total"] == requests_made
+        assert np.array_equal(replayed_stock.timestamps, stock.timestamps)
+        assert np.array_equal(replayed_stock.closes, stock.closes)
+        assert replayed_stock.volumes.dtype == stock.volumes.dtype
+        assert replayed_weather["sakai"].to_dict(DEFAULT_OPTIONS.variables) == \
+            weather["sakai"].to_dict(DEFAULT_OPTIONS.variables)
+
+    def test_hedged_call_records_result_once(self, tmp_path, monkeypatch, use_recorder):
+        """ヘッジした呼び出しは、負けた試行が後から失敗しても呼び出し元が受け取った応答だけを記録する"""
+        policies = UpstreamPolicies(min_timeout=1, max_timeout=2, hedging=True, hedge_ratio=1.0)
+        for _ in range(MIN_SAMPLES):
+            policies.get("openmeteo").observe(0.02)
+        monkeypatch.setattr(upstream_policy, "get_upstream_policies", lambda: policies)
+        use_recorder(UpstreamRecorder("record", str(tmp_path)))
+        calls = []
+        lock = threading.Lock()
+
+        def fetch(timeout):
+            with lock:
+                calls.append(timeout)
+                first = len(calls) == 1
+            if first:
+                time.sleep(0.3)
+                raise OSError("connection reset")
+            return 200, {"x": 1}
+
+        assert upstream.recorded_call("openmeteo", "/v1/archive", {"daily": "a"}, fetch,
+                                      encode=list, decode=tuple) == (200, {"x": 1})
+        time.sleep(0.4)
+
+        replay = UpstreamRecorder("replay", str(tmp_path))
+        assert replay.call("openmeteo", "/v1/archive", {"daily": "a"}, None, decode=tuple) == (200, {"x": 1})
+        assert replay.stats()["loaded"] == 1
+        assert len(calls) == 2
+
+    def test_replay_miss_falls_back(self, tmp_path, use_recorder):
+        """記録がない場合は取得失敗として扱う（モックデータにフォールバック）"""
+        use_recorder(UpstreamRecorder("replay", str(tmp_path)))
+
+        assert StockService()._fetch_stock_data("9984", "7d") is None
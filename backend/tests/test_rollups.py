@@ -0,0 +1,127 @@
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from backend.index_service import get_index_service
+from backend.main import app
+from backend.rollups import Rollups
+from backend.series import DailySeries
+from backend.stock_service import get_stock_service
+
+client = TestClient(app)
+
+
+def _chart_requests(stub_upstream) -> int:
+    return sum(sum(counts.values()) for route, counts in stub_upstream.stats()["requests"].items()
+               if route == "chart")
+
+
+def _daily(start: str, end: str) -> DailySeries:
+    """休場日（土日）を除いた終値の日次系列（値は日付から決まる）"""
+    dates = np.arange(np.datetime64(start), np.datetime64(end) + 1)
+    dates = dates[np.is_busday(dates)]
+    return DailySeries(dates, {"value": dates.astype("int64").astype(float)})
+
+
+def _assert_same(actual: Rollups, expected: Rollups) -> None:
+    for interval in ("1wk", "1mo"):
+        assert actual.series[interval].date_strings() == expected.series[interval].date_strings()
+        np.testing.assert_array_equal(actual.series[interval]["value"], expected.series[interval]["value"])
+
+
+class TestRollups:
+    """週足・月足のロールアップのテストクラス"""
+
+    @pytest.fixture
+    def rollups(self):
+        return Rollups(_daily("2025-01-01", "2025-03-12"), "2025-01-01", "2025-03-12")
+
+    def test_incremental_merge_matches_full_rebuild(self, rollups):
+        """後ろ・前への差分の反映は、全体から集計し直した結果と一致すること"""
+        merged = rollups.merge(_daily("2025-03-10", "2025-04-02"), "2025-03-10", "2025-04-02")
+        merged = merged.merge(_daily("2024-11-20", "2025-01-05"), "2024-11-20", "2025-01-05")
+
+        _assert_same(merged, Rollups(_daily("2024-11-20", "2025-04-02"), "2024-11-20", "2025-04-02"))
+        assert (merged.coverage_start, merged.coverage_end) == ("2024-11-20", "2025-04-02")
+        # 元のインスタンスは変更しない
+        assert rollups.coverage_end == "2025-03-12"
+
+    def test_merge_updates_current_bucket(self, rollups):
+        """最新の週・月は取得し直した値で置き換えること"""
+        today = _daily("2025-03-12", "2025-03-12")
+        today["value"][0] = -1.0
+        merged = rollups.merge(today, "2025-03-12", "2025-03-12")
+
+        assert merged.series["1wk"]["value"][-1] == -1.0
+        assert merged.series["1mo"]["value"][-1] == -1.0
+        assert rollups.series["1wk"]["value"][-1] != -1.0
+
+    def test_merge_ignores_gap(self, rollups):
+        """既存の範囲と間が空く日足は反映しないこと"""
+        assert rollups.merge(_daily("2025-05-01", "2025-05-31"), "2025-05-01", "2025-05-31") is rollups
+        assert not rollups.covers("2025-03-01", "2025-05-31")
+
+    def test_get_includes_bucket_of_start(self, rollups):
+        """開始日を含む週・月から切り出すこと"""
+        assert rollups.get("1wk", "2025-01-08", "2025-01-20").date_strings() == [
+            "2025-01-06", "2025-01-13", "2025-01-20"]
+        assert rollups.get("1mo", "2025-02-15", "2025-03-12").date_strings() == ["2025-02-01", "2025-03-01"]
+
+
+class TestRollupService:
+    """週足・月足のリクエストのテストクラス"""
+
+    def test_stock_weekly_range(self, stub_upstream):
+        """日付範囲の週足は集計済みの系列から応答し、2回目以降は上流を呼び出さないこと"""
+        service = get_stock_service()
+        start, end = (date.today() - timedelta(days=400)).isoformat(), date.today().isoformat()
+        data = service.get_stock_data("6326", start=start, end=end, interval="1wk")
+
+        assert "is_mock" not in data
+        assert data["interval"] == "1wk"
+        assert 55 <= len(data["data_points"]) <= 59
+        days = [np.datetime64(point["date"][:10]) for point in data["data_points"]]
+        assert all(np.is_busday(day, weekmask="Mon") for day in days)
+
+        requests = _chart_requests(stub_upstream)
+        monthly = service.get_stock_data("6326", start=start, end=end, interval="1mo")
+        assert 13 <= len(monthly["data_points"]) <= 14
+        assert service.get_stock_data("6326", "3m", interval="1wk")["interval"] == "1wk"
+        assert _chart_requests(stub_upstream) == requests
+
+    def test_index_monthly(self, stub_upstream):
+        """インデックスの月足は各月の最後の終値を月初の日付で返すこと"""
+        service = get_index_service()
+        daily = service.get_single_index("^N225", "3m")["data"]
+        monthly = service.get_single_index("^N225", "3m", interval="1mo")
+
+        assert monthly["interval"] == "1mo"
+        assert all(day.endswith("-01") for day in monthly["data"]["dates"])
+        assert monthly["data"]["values"][-1] == daily["values"][-1]
+
+    def test_invalid_interval(self):
+        """週足・月足以外の未対応の足種は400を返すこと"""
+        assert client.get("/api/v1/indices?interval=1y").status_code == 400
+        assert client.get("/api/v1/indices/^N225?interval=1wk").status_code == 200
+
+    def test_range_apart_from_rollups(self, stub_upstream):
+        """ロールアップの範囲と離れた日付範囲も、その範囲の日足から集計して返すこと"""
+        stock = get_stock_service()
+        stock.get_stock_data("6326", "3m", interval="1wk")
+        daily = stock.get_stock_data("6326", start="2022-01-01", end="2022-12-31")
+        weekly = stock.get_stock_data("6326", start="2022-01-01", end="2022-12-31", interval="1wk")
+
+        assert "is_mock" not in weekly
+        assert 52 <= len(weekly["data_points"]) <= 53
+        assert weekly["data_points"][-1]["close"] == daily["data_points"][-1]["close"]
+        # 直近のロールアップは置き換えない
+        assert stock.cache.get("stock:rollup:6326").covers(
+            (date.today() - timedelta(days=30)).isoformat(), date.today().isoformat())
+
+        index = get_index_service()
+        index.get_single_index("^N225", "3m", interval="1wk")
+        monthly = index.get_single_index("^N225", start="2022-01-01", end="2022-12-31", interval="1mo")
+        assert monthly["data"]["dates"][0] == "2022-01-01"
+        assert len(monthly["data"]["dates"]) == 12
@@ -0,0 +1,192 @@
+import math
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from backend.cache import MemoryCache
+from backend.main import app
+from backend.screener import Screener, UniverseMatrix, compute_metrics
+from backend.series import OHLCVSeries
+from backend.symbol_catalog import Symbol, SymbolCatalog
+
+client = TestClient(app)
+
+NS_PER_DAY = 86_400_000_000_000
+JST_OFFSET_NS = 9 * 3600 * 1_000_000_000
+
+CATALOG = SymbolCatalog([
+    Symbol("1001", "銘柄A", "", "東証プライム", "電気機器"),
+    Symbol("1002", "銘柄B", "", "東証プライム", "銀行業"),
+    Symbol("1003", "銘柄C", "", "東証グロース", "電気機器"),
+    Symbol("1004", "銘柄D", "", "東証プライム", "電気機器"),
+])
+
+
+def _days(start: str, count: int) -> np.ndarray:
+    return np.arange(np.datetime64(start), np.datetime64(start) + count)
+
+
+def _daily_series(days: np.ndarray, closes, volumes) -> OHLCVSeries:
+    """ローカル日付の0時を足の開始時刻とする日足"""
+    timestamps = days.astype("int64") * NS_PER_DAY - JST_OFFSET_NS
+    closes = np.asarray(closes, dtype=np.float64)
+    return OHLCVSeries(timestamps, closes, closes, closes, closes, np.asarray(volumes, dtype=np.int64),
+                       JST_OFFSET_NS, 1440)
+
+
+def _screener(**kwargs) -> Screener:
+    """4銘柄・10日分の行列を持つスクリーナー"""
+    matrix = UniverseMatrix([symbol.code for symbol in CATALOG])
+    days = _days("2025-01-01", 10)
+    volumes = [100] * 9 + [300]
+    # 直近5営業日（7d）の騰落率: A +10.2%、D +10%（変動大）、C +5.3%、B -4.8%
+    matrix.ingest("1001", days, np.linspace(100, 120, 10), volumes)
+    matrix.ingest("1002", days, np.linspace(100, 90, 10), [100] * 10)
+    matrix.ingest("1003", days, np.linspace(50, 55, 10), [100] * 10)
+    matrix.ingest("1004", days, [100, 110] * 5, [100] * 10)
+    return Screener(matrix, CATALOG, **kwargs)
+
+
+class TestComputeMetrics:
+    """指標の計算のテストクラス"""
+
+    def test_metrics(self):
+        """騰落率は期間の前日終値から、出来高急増率は最新とそれ以前の平均の比"""
+        closes = np.array([[100, 101, 102, 110], [np.nan, np.nan, np.nan, np.nan]], dtype=float)
+        volumes = np.array([[10, 10, 10, 40], [np.nan] * 4], dtype=float)
+        metrics = compute_metrics(closes, volumes, window=3)
+
+        assert metrics["return_pct"][0] == pytest.approx(10.0)
+        assert metrics["volume_spike"][0] == pytest.approx(4.0)
+        assert metrics["avg_volume"][0] == pytest.approx(20.0)
+        expected = np.std(np.diff(np.log([100, 101, 102, 110])), ddof=1) * math.sqrt(252) * 100
+        assert metrics["volatility_pct"][0] == pytest.approx(expected)
+        # データのない銘柄はNaN
+        assert all(np.isnan(values[1]) for values in metrics.values())
+
+    def test_missing_days(self):
+        """欠損日がある銘柄も前後の有効な終値で騰落率を求める"""
+        closes = np.array([[np.nan, 100, np.nan, 120]], dtype=float)
+        volumes = np.array([[np.nan, 10, np.nan, 20]], dtype=float)
+        metrics = compute_metrics(closes, volumes, window=3)
+
+        assert metrics["return_pct"][0] == pytest.approx(20.0)
+        assert metrics["volume_spike"][0] == pytest.approx(2.0)
+
+
+class TestUniverseMatrix:
+    """銘柄 × 日付の行列のテストクラス"""
+
+    def test_ingest_merges_dates(self):
+        """日付の異なる銘柄を同じ列に揃え、同じ日付は上書きする"""
+        matrix = UniverseMatrix(["1001", "1002"])
+        matrix.ingest("1001", _days("2025-01-01", 3), [1, 2, 3], [10, 20, 30])
+        matrix.ingest("1002", _days("2025-01-03", 2), [5, 6], [50, 60])
+        matrix.ingest("1001", _days("2025-01-03", 1), [4], [40])
+        assert not matrix.ingest("9999", _days("2025-01-01", 1), [1], [1])
+
+        _, dates, closes, volumes = matrix.snapshot()
+        assert [str(d) for d in dates] == ["2025-01-01", "2025-01-02", "2025-01-03", "2025-01-04"]
+        np.testing.assert_array_equal(closes[0], [1, 2, 4, np.nan])
+        np.testing.assert_array_equal(closes[1], [np.nan, np.nan, 5, 6])
+        assert matrix.coverage() == 2
+
+    def test_max_days(self):
+        """保持する日数を超えた古い列は捨てる"""
+        matrix = UniverseMatrix(["1001"], max_days=3)
+        matrix.ingest("1001", _days("2025-01-01", 5), [1, 2, 3, 4, 5], [1] * 5)
+
+        _, dates, closes, _ = matrix.snapshot()
+        assert str(dates[0]) == "2025-01-03"
+        np.testing.assert_array_equal(closes[0], [3, 4, 5])
+
+    def test_sync_from_cache(self):
+        """キャッシュ済みの日足を差分で取り込む"""
+        cache = MemoryCache()
+        cache.set("stock:1001:3m", _daily_series(_days("2025-01-01", 3), [1, 2, 3], [10, 10, 10]), 60)
+        matrix = UniverseMatrix(["1001", "1002"])
+
+        assert matrix.sync_from_cache(cache) == 1
+        assert matrix.sync_from_cache(cache) == 0
+        _, dates, closes, _ = matrix.snapshot()
+        np.testing.assert_array_equal(closes[0], [1, 2, 3])
+
+
+class TestScreener:
+    """スクリーニングのテストクラス"""
+
+    def test_cache_sync_is_throttled(self):
+        """キャッシュ済みの日足の取り込みは sync_interval ごとで、リクエストごとには読まない"""
+        cache = MemoryCache()
+        cache.set("stock:1001:3m", _daily_series(_days("2025-01-01", 3), [1, 2, 3], [10, 10, 10]), 60)
+        screener = _screener(cache=cache, sync_interval=60)
+
+        screener.screen("return", "desc", "7d")
+        reads = cache.stats()["misses"] + cache.stats()["hits"]
+        screener.screen("return", "desc", "7d")
+        assert cache.stats()["misses"] + cache.stats()["hits"] == reads
+
+        screener.sync_interval = 0
+        screener.screen("return", "desc", "7d")
+        assert cache.stats()["misses"] + cache.stats()["hits"] > reads
+
+    def test_rank_and_order(self):
+        """指標の大きい順・小さい順に並べる"""
+        screener = _screener()
+
+        result = screener.screen("return", "desc", "7d", limit=4)
+        assert [row["symbol"] for row in result["results"]] == ["1001", "1004", "1003", "1002"]
+        assert result["as_of"] == "2025-01-10"
+        assert result["covered"] == 4
+
+        assert screener.screen("return", "asc", "7d", limit=1)["results"][0]["symbol"] == "1002"
+        assert screener.screen("volatility", "desc", "7d", limit=1)["results"][0]["symbol"] == "1004"
+        assert screener.screen("volume_spike", "desc", "7d", limit=1)["results"][0]["volume_spike"] == 3.0
+
+    def test_filters(self):
+        """市場・業種・終値・出来高で絞り込む"""
+        screener = _screener()
+
+        result = screener.screen("return", period="7d", market="東証プライム", sector="電気機器")
+        assert [row["symbol"] for row in result["results"]] == ["1001", "1004"]
+        assert result["matched"] == 2
+        assert [row["symbol"] for row in screener.screen("return", period="7d", min_price=100)["results"]] == \
+            ["1001", "1004"]
+        assert [row["symbol"] for row in screener.screen("return", period="7d", min_volume=110)["results"]] == \
+            ["1001"]
+
+    def test_invalid_params(self):
+        """無効な指標・並び順・期間・件数はエラー"""
+        screener = _screener()
+        for kwargs in ({"sort": "price"}, {"order": "up"}, {"period": "1y"}, {"limit": 0}):
+            with pytest.raises(ValueError):
+                screener.screen(**kwargs)
+
+    def test_sharded_matches_single(self):
+        """プロセスプールで分割して計算しても結果は同じ"""
+        single = _screener()
+        sharded = _screener(shard_rows=2, workers=2)
+        try:
+            for sort in ("return", "volatility", "volume_spike"):
+                assert sharded.screen(sort, period="7d") == single.screen(sort, period="7d")
+        finally:
+            sharded.shutdown()
+
+
+class TestScreenerAPI:
+    """スクリーナーのAPIのテストクラス"""
+
+    def test_screener_after_fetch(self, stub_upstream):
+        """取得した日足が行列に取り込まれ、スクリーニングの対象になる"""
+        assert client.get("/api/v1/stocks?symbols=6326,9984&period=3m").status_code == 200
+
+        response = client.get("/api/v1/screener?sort=volatility&period=3m&limit=5")
+        assert response.status_code == 200
+        data = response.json()["data"]
+        assert {"6326", "9984"} <= {row["symbol"] for row in data["results"]}
+        assert data["universe"] >= data["covered"] >= 2
+
+    def test_invalid_sort(self):
+        """無効な指標は400"""
+        assert client.get("/api/v1/screener?sort=price").status_code == 400
@@ -0,0 +1,128 @@
+import numpy as np
+import pytest
+
+from backend.intraday import generate_mock_bars
+from backend.series import DailySeries, calendar_buckets
+
+
+class TestDailySeries:
+    """日次系列のテストクラス"""
+
+    @pytest.fixture
+    def series(self):
+        dates = np.arange(np.datetime64("2025-01-01"), np.datetime64("2025-02-01"))
+        return DailySeries(dates, {"temperature": np.arange(31) + 0.04, "pressure": np.full(31, np.nan)})
+
+    def test_slice_shares_arrays(self, series):
+        """範囲の切り出しは配列をコピーしないこと"""
+        sliced = series.slice("2025-01-10", "2025-01-12")
+
+        assert sliced.date_strings() == ["2025-01-10", "2025-01-11", "2025-01-12"]
+        assert np.shares_memory(sliced["temperature"], series["temperature"])
+        assert len(series.slice("2025-03-01", "2025-03-31")) == 0
+
+    def test_to_dict(self, series):
+        """レスポンス形式への変換（NaNはNone）"""
+        result = series.slice("2025-01-01", "2025-01-02").to_dict(["temperature", "pressure"])
+
+        assert result == {
+            "dates": ["2025-01-01", "2025-01-02"],
+            "temperature": [0.0, 1.0],
+            "pressure": [None, None],
+        }
+
+    def test_nbytes(self, series):
+        """日付と各列の配列のみを保持すること"""
+        assert series.nbytes == 31 * 8 * 3
+
+    def test_view_counts_base_until_compacted(self, series):
+        """切り出したビューは元の配列全体の大きさで数え、compact() で切り出した範囲だけを持つこと"""
+        sliced = series.slice("2025-01-10", "2025-01-12")
+        assert sliced.nbytes == series.nbytes
+
+        compacted = sliced.compact()
+        assert compacted.nbytes == 3 * 8 * 3
+        assert not np.shares_memory(compacted["temperature"], series["temperature"])
+        assert compacted.to_dict() == sliced.to_dict()
+
+    def test_rollup(self, series):
+        """週足・月足は各週・月の最後の値を、週・月の初日の日付で持つこと"""
+        weekly = series.rollup("1wk")
+        assert weekly.date_strings()[:2] == ["2024-12-30", "2025-01-06"]
+        assert weekly["temperature"][:2].tolist() == [4.04, 11.04]
+
+        monthly = series.rollup("1mo")
+        assert monthly.date_strings() == ["2025-01-01"]
+        assert monthly["temperature"].tolist() == [30.04]
+
+    def test_splice(self, series):
+        """other の日付の範囲の行を置き換えること"""
+        dates = np.arange(np.datetime64("2025-01-30"), np.datetime64("2025-02-03"))
+        other = DailySeries(dates, {"temperature": np.full(4, -1.0), "pressure": np.zeros(4)})
+        spliced = series.splice(other)
+
+        assert len(spliced) == 33
+        assert spliced.date_strings()[-4:] == ["2025-01-30", "2025-01-31", "2025-02-01", "2025-02-02"]
+        assert spliced["temperature"][28] == 28.04
+        assert (spliced["temperature"][-4:] == -1.0).all()
+
+
+class TestCalendarBuckets:
+    """週・月の区切りのテストクラス"""
+
+    def test_week_starts_monday(self):
+        days = np.array(["2025-01-05", "2025-01-06", "2025-01-12"], dtype="datetime64[D]")
+        assert calendar_buckets(days, "1wk").astype(str).tolist() == ["2024-12-30", "2025-01-06", "2025-01-06"]
+
+    def test_month_starts_first(self):
+        days = np.array(["2024-02-29", "2025-03-31"], dtype="datetime64[D]")
+        assert calendar_buckets(days, "1mo").astype(str).tolist() == ["2024-02-01", "2025-03-01"]
+
+    def test_unknown_interval(self):
+        with pytest.raises(ValueError):
+            calendar_buckets(np.array(["2025-01-01"], dtype="datetime64[D]"), "1d")
+
+
+class TestOHLCVSeries:
+    """ローソク足系列のテストクラス"""
+
+    def test_compact_per_bar(self):
+        """1本あたり48バイト（6列×8バイト）に収まること"""
+        bars = generate_mock_bars(1000.0, 0.01, 5, 1)
+        assert bars.nbytes == len(bars) * 48
+
+    def test_view_counts_base_until_compacted(self):
+        """切り出したビューは元の配列全体の大きさで数え、compact() で切り出した範囲だけを持つこと"""
+        bars = generate_mock_bars(1000.0, 0.01, 5, 60)
+        day = str(np.unique(bars.local_days())[0])
+        sliced = bars.slice(day, day)
+        assert sliced.nbytes == bars.nbytes
+
+        compacted = sliced.compact()
+        assert compacted.nbytes == len(sliced) * 48
+        assert compacted.to_data_points() == sliced.to_data_points()
+
+    def test_slice_by_local_day(self):
+        """ローカル日付で切り出せること"""
+        bars = generate_mock_bars(1000.0, 0.01, 5, 60)
+        days = np.unique(bars.local_days())
+        day = str(days[1])
+        sliced = bars.slice(day, day)
+
+        assert len(sliced) > 0
+        assert (sliced.local_days() == days[1]).all()
+        assert sliced.to_data_points()[0]["date"].startswith(day)
+
+    def test_rollup(self):
+        """週足は始値・高値・安値・終値・出来高を週ごとにまとめること"""
+        bars = generate_mock_bars(1000.0, 0.01, 20, 60)
+        weekly = bars.rollup("1wk")
+        days = bars.local_days()
+        week = calendar_buckets(days, "1wk") == calendar_buckets(days, "1wk")[0]
+
+        assert weekly.opens[0] == bars.opens[week][0]
+        assert weekly.highs[0] == bars.highs[week].max()
+        assert weekly.lows[0] == bars.lows[week].min()
+        assert weekly.closes[0] == bars.closes[week][-1]
+        assert weekly.volumes[0] == bars.volumes[week].sum()
+        assert weekly.local_days()[0] == calendar_buckets(days, "1wk")[0]
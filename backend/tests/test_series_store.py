@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from backend.series import DailySeries
+from backend.series_store import SeriesRangeStore, parse_date_range
+
+
+def _daily(dates, values):
+    return DailySeries(np.array(dates, dtype="datetime64[D]"), {"value": values})
+
+
+class TestDateRange:
+    """日付範囲パラメータのテストクラス"""
+
+    def test_parse_valid_range(self):
+        """有効な日付範囲"""
+        assert parse_date_range("2025-01-01", "2025-03-31") == ("2025-01-01", "2025-03-31")
+        assert parse_date_range(None, None) is None
+
+    def test_parse_invalid_range(self):
+        """無効な日付範囲"""
+        for start, end in [("2025-03-01", "2025-01-01"), ("20250101", None), (None, "2025-01-01")]:
+            with pytest.raises(ValueError):
+                parse_date_range(start, end)
+
+
+class TestSeriesRangeStore:
+    """時系列ストアのテストクラス"""
+
+    @pytest.fixture
+    def store(self):
+        store = SeriesRangeStore(ttl_seconds=60)
+        dates = [f"2025-01-{d:02d}" for d in range(1, 32)]
+        store.put("6326", _daily(dates, list(range(31))), "2025-01-01", "2025-01-31")
+        return store
+
+    def test_get_covered_range(self, store):
+        """取得済み範囲内の切り出し"""
+        series = store.get("6326", "2025-01-10", "2025-01-12")
+        assert series["value"].tolist() == [9, 10, 11]
+        assert series.date_strings() == ["2025-01-10", "2025-01-11", "2025-01-12"]
+
+    def test_get_uncovered_range(self, store):
+        """取得済み範囲外はNone"""
+        assert store.get("6326", "2024-12-20", "2025-01-05") is None
+        assert store.get("9984", "2025-01-10", "2025-01-12") is None
+
+    def test_fetch_range_extends_coverage(self, store):
+        """パン操作時は既存範囲との和集合を取得"""
+        assert store.fetch_range("6326", "2025-02-01", "2025-02-10") == ("2025-01-01", "2025-02-10")
+        assert store.fetch_range("9984", "2025-02-01", "2025-02-10") == ("2025-02-01", "2025-02-10")
+
+    def test_expired_entry(self):
+        """TTL切れの系列は返さない"""
+        store = SeriesRangeStore(ttl_seconds=-1)
+        store.put("6326", _daily(["2025-01-10"], [0]), "2025-01-01", "2025-01-31")
+        assert store.get("6326", "2025-01-10", "2025-01-12") is None
@@ -0,0 +1,123 @@
+import os
+import pickle
+import time
+import zlib
+
+from fastapi.testclient import TestClient
+
+from backend.cache import CacheEntry, MemoryCache
+from backend.snapshot import SNAPSHOT_VERSION, load_snapshot, save_snapshot, snapshot_path
+
+
+class TestSnapshot:
+    """キャッシュのスナップショットのテストクラス"""
+
+    def test_roundtrip_keeps_freshness(self, tmp_path):
+        """保存・復元で値と鮮度情報が引き継がれること"""
+        path = str(tmp_path / "snapshot.bin")
+        cache = MemoryCache()
+        cache.set("fresh", {"v": 1}, ttl=60)
+        cache.set("stale", {"v": 2}, ttl=0.001)
+        time.sleep(0.01)
+
+        assert save_snapshot(cache, path) == 2
+
+        restored = MemoryCache()
+        assert load_snapshot(restored, path) == 2
+        assert restored.get("fresh") == {"v": 1}
+        assert restored.get("stale") is None
+        entry = restored.get_entry("stale")
+        assert entry.value == {"v": 2}
+        assert not entry.is_fresh
+
+    def test_hot_entries_limit(self, tmp_path):
+        """最近使われたエントリから保存されること"""
+        path = str(tmp_path / "snapshot.bin")
+        cache = MemoryCache()
+        for key in ("a", "b", "c"):
+            cache.set(key, key, ttl=60)
+        cache.get("a")
+
+        assert save_snapshot(cache, path, max_entries=2) == 2
+
+        restored = MemoryCache()
+        load_snapshot(restored, path)
+        assert restored.get("a") == "a"
+        assert restored.get("c") == "c"
+        assert restored.get("b") is None
+
+    def test_restore_skips_expired_and_existing(self):
+        """保持期間切れのエントリと既存キーは書き戻さない"""
+        cache = MemoryCache(stale_seconds=10)
+        cache.set("existing", "current", ttl=60)
+        now = time.time()
+
+        restored = cache.restore([
+            ("existing", CacheEntry("old", now - 100, now - 50)),
+            ("expired", CacheEntry("old", now - 100, now - 50)),
+            ("restored", CacheEntry("old", now - 100, now - 5)),
+        ])
+
+        assert restored == 1
+        assert cache.get("existing") == "current"
+        assert cache.get_entry("expired") is None
+        assert cache.get_entry("restored").value == "old"
+
+    def test_missing_or_corrupt_file(self, tmp_path):
+        """存在しない・壊れたファイルは無視されること"""
+        path = tmp_path / "snapshot.bin"
+        assert load_snapshot(MemoryCache(), str(path)) == 0
+
+        path.write_bytes(b"broken")
+        assert load_snapshot(MemoryCache(), str(path)) == 0
+
+    def test_rejects_unsigned_or_tampered_file(self, tmp_path):
+        """署名のない・改ざんされた・別の鍵で署名されたファイルは読み込まないこと"""
+        path = tmp_path / "snapshot.bin"
+        cache = MemoryCache()
+        cache.set("a", {"v": 1}, ttl=60)
+        save_snapshot(cache, str(path))
+        signed = path.read_bytes()
+
+        path.write_bytes(zlib.compress(pickle.dumps({"version": SNAPSHOT_VERSION, "entries": []})))
+        assert load_snapshot(MemoryCache(), str(path)) == 0
+
+        path.write_bytes(signed[:-1] + bytes([signed[-1] ^ 1]))
+        assert load_snapshot(MemoryCache(), str(path)) == 0
+
+        path.write_bytes(signed)
+        assert load_snapshot(MemoryCache(), str(path), secret=b"other") == 0
+        assert load_snapshot(MemoryCache(), str(path)) == 1
+
+    def test_default_path_is_private(self, tmp_path, monkeypatch):
+        """既定の保存先はデータディレクトリで、ファイルは本人だけが読み書きできること"""
+        monkeypatch.setenv("STACK_WATCHER_DATA_DIR", str(tmp_path / "data"))
+        monkeypatch.delenv("STACK_WATCHER_SNAPSHOT_PATH", raising=False)
+        path = snapshot_path()
+        assert path == str(tmp_path / "data" / "snapshot.bin")
+
+        cache = MemoryCache()
+        cache.set("a", 1, ttl=60)
+        save_snapshot(cache, path)
+        assert os.stat(path).st_mode & 0o077 == 0
+
+        monkeypatch.setenv("STACK_WATCHER_SNAPSHOT_PATH", "")
+        assert snapshot_path() is None
+
+    def test_lifespan_saves_and_restores(self, tmp_path, monkeypatch):
+        """アプリの終了時に保存し、起動時に復元すること"""
+        from backend import main
+
+        path = tmp_path / "snapshot.bin"
+        monkeypatch.setenv("STACK_WATCHER_SNAPSHOT_PATH", str(path))
+        cache = MemoryCache()
+        monkeypatch.setattr(main, "get_cache", lambda: cache)
+
+        cache.set("stock:6326:7d", {"symbol": "6326"}, ttl=60)
+        with TestClient(main.app):
+            pass
+        assert path.exists()
+
+        cache = MemoryCache()
+        with TestClient(main.app):
+            assert cache.get("stock:6326:7d") == {"symbol": "6326"}
@@ -0,0 +1,46 @@
+import os
+import subprocess
+import sys
+
+from fastapi.testclient import TestClient
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class TestStartup:
+    """起動時間短縮（遅延インポート・遅延生成）のテストクラス"""
+
+    def test_main_does_not_import_heavy_dependencies(self):
+        """backend.main のインポート時に yfinance・pandas・requests・NumPy・アラート・スクリーナーを読み込まないこと"""
+        deferred = ("yfinance", "pandas", "requests", "numpy", "backend.alerts", "backend.screener")
+        code = f"import sys, backend.main; print(','.join(m for m in {deferred!r} if m in sys.modules))"
+        result = subprocess.run([sys.executable, "-c", code], cwd=REPO_ROOT,
+                                capture_output=True, text=True, check=True)
+
+        assert result.stdout.strip() == ""
+
+    def test_health_without_warm_up(self, monkeypatch):
+        """データ取得系の読み込み前でも /health が応答すること"""
+        from backend.main import app
+
+        monkeypatch.setenv("STACK_WATCHER_WARM_UP", "0")
+        monkeypatch.setenv("STACK_WATCHER_SNAPSHOT_PATH", "")
+        with TestClient(app) as client:
+            response = client.get("/health")
+
+        assert response.status_code == 200
+        assert response.json() == {"status": "healthy"}
+
+    def test_lazy_function(self):
+        """lazy_function は呼び出し時にモジュールを読み込み、クラスのメソッドも呼び出せること"""
+        from backend.lazy import lazy_function
+
+        build = lazy_function("backend.weather_processing", "ProcessingOptions.build")
+        assert build("precipitation", "none").variables == ("precipitation",)
+
+    def test_lazy_singleton(self):
+        """サービスは初回使用時に1度だけ生成されること（従来の属性名でも参照可能）"""
+        from backend import stock_service as module
+
+        assert module.get_stock_service() is module.get_stock_service()
+        assert module.stock_service is module.get_stock_service()
@@ -0,0 +1,124 @@
+import gzip
+import os
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from backend.static_files import IMMUTABLE_CACHE_CONTROL, PrecompressedStaticFiles, accepted_encodings
+
+INDEX_HTML = b"<!doctype html><html><body><div id='app'></div></body></html>"
+SCRIPT = b"console.log('stack watcher');" * 100
+
+
+@pytest.fixture
+def static_dir(tmp_path):
+    """ビルド成果物を模したディレクトリ"""
+    (tmp_path / "index.html").write_bytes(INDEX_HTML)
+    assets = tmp_path / "assets"
+    assets.mkdir()
+    (assets / "index-abc123.js").write_bytes(SCRIPT)
+    (assets / "index-abc123.js.gz").write_bytes(gzip.compress(SCRIPT))
+    (assets / "index-abc123.css").write_bytes(b"body{margin:0}")
+    return tmp_path
+
+
+@pytest.fixture
+def client(static_dir):
+    app = FastAPI()
+    app.mount("/", PrecompressedStaticFiles(directory=str(static_dir)), name="static")
+    return TestClient(app)
+
+
+class TestPrecompressedStaticFiles:
+    """静的ファイル配信のテストクラス"""
+
+    def test_serves_gzip_variant(self, client):
+        """Accept-Encodingにgzipを含む場合は事前圧縮版を返す"""
+        response = client.get("/assets/index-abc123.js", headers={"Accept-Encoding": "gzip, deflate"})
+
+        assert response.status_code == 200
+        assert response.headers["content-encoding"] == "gzip"
+        assert response.headers["content-type"].startswith("text/javascript")
+        assert response.headers["cache-control"] == IMMUTABLE_CACHE_CONTROL
+        assert response.content == SCRIPT  # クライアント側で展開される
+
+    def test_serves_identity_without_accept_encoding(self, client):
+        """圧縮を受け入れない場合・圧縮版がない場合は元ファイルを返す"""
+        response = client.get("/assets/index-abc123.js", headers={"Accept-Encoding": "identity"})
+        assert response.status_code == 200
+        assert "content-encoding" not in response.headers
+        assert response.content == SCRIPT
+
+        response = client.get("/assets/index-abc123.css", headers={"Accept-Encoding": "gzip"})
+        assert "content-encoding" not in response.headers
+        assert response.headers["cache-control"] == IMMUTABLE_CACHE_CONTROL
+
+    def test_not_modified(self, client):
+        """ETagが一致する場合は304を返す"""
+        headers = {"Accept-Encoding": "gzip"}
+        etag = client.get("/assets/index-abc123.js", headers=headers).headers["etag"]
+
+        response = client.get("/assets/index-abc123.js", headers={**headers, "If-None-Match": etag})
+        assert response.status_code == 304
+
+    def test_index_and_spa_routes(self, client):
+        """index.html はSPAのルートにも返し、再検証を要求する"""
+        for path in ("/", "/index.html", "/dashboard", "/stocks/6326"):
+            response = client.get(path)
+            assert response.status_code == 200
+            assert response.content == INDEX_HTML
+            assert response.headers["cache-control"] == "no-cache"
+
+        etag = client.get("/").headers["etag"]
+        assert client.get("/dashboard", headers={"If-None-Match": etag}).status_code == 304
+
+    def test_index_reloaded_after_rebuild(self, client, static_dir, monkeypatch):
+        """index.html が更新された場合は読み直す"""
+        import backend.static_files as module
+
+        monkeypatch.setattr(module, "INDEX_RECHECK_SECONDS", 0)
+        client.get("/")
+        (static_dir / "index.html").write_bytes(b"<html>rebuilt</html>")
+        os.utime(static_dir / "index.html", (0, 1))
+
+        assert client.get("/").content == b"<html>rebuilt</html>"
+
+    def test_missing_files(self, client):
+        """存在しないアセット・APIパスは404"""
+        assert client.get("/assets/missing.js").status_code == 404
+        assert client.get("/api/v1/unknown").status_code == 404
+
+    def test_missing_paths_not_remembered(self, static_dir):
+        """存在しないパスへのリクエストでは圧縮版の記憶が増えないこと"""
+        static = PrecompressedStaticFiles(directory=str(static_dir))
+        app = FastAPI()
+        app.mount("/", static, name="static")
+        client = TestClient(app)
+
+        for i in range(20):
+            client.get(f"/assets/missing-{i}.js", headers={"Accept-Encoding": "br, gzip"})
+        assert static._variants == {}
+
+        client.get("/assets/index-abc123.js", headers={"Accept-Encoding": "br, gzip"})
+        client.get("/assets/index-abc123.css", headers={"Accept-Encoding": "gzip"})
+        assert set(static._variants) == {
+            (os.path.join("assets", "index-abc123.js"), ".br"),
+            (os.path.join("assets", "index-abc123.js"), ".gz"),
+            (os.path.join("assets", "index-abc123.css"), ".gz"),
+        }
+
+    def test_frontend_not_built(self, tmp_path):
+        """index.html がない場合はビルドを促す404"""
+        app = FastAPI()
+        app.mount("/", PrecompressedStaticFiles(directory=str(tmp_path)), name="static")
+
+        response = TestClient(app).get("/")
+        assert response.status_code == 404
+        assert "npm run build" in response.json()["detail"]
+
+    def test_accepted_encodings(self):
+        """Accept-Encodingの解釈（q=0は除外）"""
+        assert accepted_encodings("gzip, br;q=0.8") == {"gzip", "br"}
+        assert accepted_encodings("br;q=0, gzip") == {"gzip"}
+        assert accepted_encodings("") == set()
@@ -0,0 +1,127 @@
+import importlib.util
+import os
+from datetime import datetime
+
+import pytest
+import requests
+from fastapi.testclient import TestClient
+
+from backend.main import app
+from backend.stub_upstream import JST, StubConfig, archive_payload, chart_payload, start_stub_server
+from backend.upstream import ChartTicker
+
+client = TestClient(app)
+
+NOW = datetime(2025, 3, 14, 12, 0, tzinfo=JST)
+
+
+def _load_script(name: str):
+    """scripts/ 以下のスクリプトをモジュールとして読み込む"""
+    path = os.path.join(os.path.dirname(__file__), "..", "..", "scripts", f"{name}.py")
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class TestStubPayloads:
+    """スタブの応答生成のテストクラス"""
+
+    def test_chart_daily(self):
+        """日足は平日のみ・決定的な値で返す"""
+        status, payload = chart_payload("6326.T", {"range": "7d", "interval": "1d"}, now=NOW)
+        result = payload["chart"]["result"][0]
+
+        assert status == 200
+        assert len(result["timestamp"]) == 6
+        assert result["meta"]["exchangeTimezoneName"] == "Asia/Tokyo"
+        assert chart_payload("6326.T", {"range": "7d", "interval": "1d"}, now=NOW)[1] == payload
+
+    def test_chart_intraday_and_errors(self):
+        """日中足は現在時刻まで、未対応の足種・存在しない銘柄はエラー"""
+        status, payload = chart_payload("^N225", {"range": "1d", "interval": "5m"}, now=NOW)
+        assert status == 200
+        assert len(payload["chart"]["result"][0]["timestamp"]) == 78
+
+        assert chart_payload("6326.T", {"range": "7d", "interval": "1wk"}, now=NOW)[0] == 400
+        assert chart_payload("INVALID.T", {"range": "7d"}, now=NOW)[0] == 404
+
+    def test_archive_multiple_locations(self):
+        """複数地点は配列で、時間値は24時間分を返す"""
+        params = {"latitude": "35.6,34.5", "longitude": "139.6,135.4", "start_date": "2025-01-01",
+                  "end_date": "2025-01-03", "hourly": "temperature_2m"}
+        status, payload = archive_payload(params)
+
+        assert status == 200
+        assert len(payload) == 2
+        assert len(payload[1]["hourly"]["temperature_2m"]) == 72
+        assert archive_payload({"latitude": "35.6"})[0] == 400
+
+
+class TestStubServer:
+    """スタブサーバーのテストクラス"""
+
+    @pytest.fixture
+    def server(self):
+        server = start_stub_server()
+        yield server
+        server.shutdown()
+        server.server_close()
+
+    def test_chart_ticker(self, server):
+        """ChartTicker が yfinance と同じ形式のDataFrameを返す"""
+        frame = ChartTicker("6326.T", server.base_url).history(start="2025-01-06", end="2025-01-11")
+
+        assert list(frame.columns) == ["Open", "High", "Low", "Close", "Volume"]
+        assert [d.strftime("%Y-%m-%d") for d in frame.index] == [
+            "2025-01-06", "2025-01-07", "2025-01-08", "2025-01-09", "2025-01-10"
+        ]
+        assert str(frame.index.tz) == "Asia/Tokyo"
+        assert ChartTicker("INVALID.T", server.base_url).history(period="7d").empty
+
+    def test_injected_errors_and_throttling(self, server):
+        """エラー率・レート制限の設定で500・429を返す"""
+        url = f"{server.base_url}/v8/finance/chart/6326.T"
+        requests.post(f"{server.base_url}/__stub/config", json={"error_rate": 1})
+        assert requests.get(url).status_code == 500
+
+        requests.post(f"{server.base_url}/__stub/config", json={"error_rate": 0, "rate_limit": 1})
+        assert requests.get(url).status_code == 429
+        assert server.stats()["requests"]["chart"] == {"500": 1, "429": 1}
+
+    def test_upstream_error_falls_back(self, stub_upstream):
+        """上流がエラーを返す場合はモックデータで応答する"""
+        stub_upstream.config.update({"error_rate": 1})
+        response = client.get("/api/v1/stocks/9984?period=7d")
+
+        assert response.status_code == 200
+        assert response.json()["data"]["is_mock"] is True
+
+
+class TestLoadGenerator:
+    """負荷試験スクリプトのテストクラス"""
+
+    def test_percentile(self):
+        """最近傍順位法のパーセンタイル"""
+        load_test = _load_script("load_test")
+        values = [i / 1000 for i in range(1, 101)]
+
+        stats = load_test.summarize(values, errors=0, elapsed=2.0)
+        assert stats["p50_ms"] == 50
+        assert stats["p99_ms"] == 99
+        assert stats["throughput_rps"] == 50
+
+    def test_run_against_stub(self):
+        """スタブサーバーに対して指定件数を送り、集計できること"""
+        load_test = _load_script("load_test")
+        server = start_stub_server(config=StubConfig(latency_ms=1))
+        try:
+            generator = load_test.LoadGenerator(server.base_url, ["/v8/finance/chart/6326.T?range=7d"], 4)
+            report = generator.run(duration=10, requests=40)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        assert report["total"]["requests"] == 40
+        assert report["total"]["errors"] == 0
+        assert report["total"]["p99_ms"] >= report["total"]["p50_ms"] > 0
@@ -0,0 +1,99 @@
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend.main import app
+from backend.symbol_catalog import Symbol, SymbolCatalog, get_symbol_catalog, load_catalog
+
+client = TestClient(app)
+
+
+class TestSymbolCatalog:
+    """銘柄カタログのテストクラス"""
+
+    @pytest.fixture
+    def catalog(self):
+        return get_symbol_catalog()
+
+    def test_lookup(self, catalog):
+        """コードによる銘柄の参照"""
+        assert "6326" in catalog
+        assert catalog.get("6326").name == "クボタ"
+        assert catalog.get("6326").yahoo_code == "6326.T"
+        assert catalog.get("0000") is None
+
+    def test_search_code_prefix(self, catalog):
+        """コードの前方一致（全角数字も可）"""
+        assert [s.code for s in catalog.search("63")] == ["6301", "6326", "6367"]
+        assert [s.code for s in catalog.search("６３２")] == ["6326"]
+
+    def test_search_name_and_kana(self, catalog):
+        """銘柄名・カナ（ひらがな可）・銘柄名の部分一致"""
+        assert catalog.search("クボタ")[0].code == "6326"
+        assert catalog.search("さかた")[0].code == "1377"
+        assert catalog.search("ＵＦＪ")[0].code == "8306"
+        assert catalog.search("") == []
+
+    def test_search_priority_and_limit(self, catalog):
+        """前方一致が部分一致より優先され、件数の上限を守ること"""
+        results = catalog.search("ソフトバンク")
+        assert [s.code for s in results] == ["9434", "9984"]
+        assert len(catalog.search("三", limit=2)) == 2
+
+    def test_load_from_env(self, tmp_path, monkeypatch):
+        """STACK_WATCHER_SYMBOLS_CSV から読み込むこと"""
+        path = tmp_path / "symbols.csv"
+        path.write_text("code,name,kana,market,sector\n130A,テスト,テスト,東証グロース,サービス業\n", encoding="utf-8")
+        monkeypatch.setenv("STACK_WATCHER_SYMBOLS_CSV", str(path))
+
+        catalog = load_catalog()
+        assert len(catalog) == 1
+        assert catalog.search("130a")[0].market == "東証グロース"
+
+    def test_invalid_csv(self, tmp_path):
+        """銘柄名のない行はエラー"""
+        path = tmp_path / "symbols.csv"
+        path.write_text("code,name,kana,market,sector\n1234,,,,\n", encoding="utf-8")
+
+        with pytest.raises(ValueError):
+            SymbolCatalog.from_csv(str(path))
+
+    def test_search_latency(self):
+        """プライム全銘柄規模（4000件）でも検索が1ミリ秒未満であること"""
+        catalog = SymbolCatalog(
+            Symbol(f"{1000 + i}", f"銘柄{i}工業", f"メイガラ{i}コウギョウ", "東証プライム", "機械")
+            for i in range(4000)
+        )
+        started = time.perf_counter()
+        for _ in range(100):
+            catalog.search("銘柄1")
+            catalog.search("12")
+            catalog.search("工業")
+        elapsed = (time.perf_counter() - started) / 300
+
+        assert elapsed < 0.001
+
+
+class TestSymbolSearchAPI:
+    """銘柄検索APIのテストクラス"""
+
+    def test_search(self):
+        """銘柄検索エンドポイント"""
+        response = client.get("/api/v1/stocks/search?q=くぼた")
+
+        assert response.status_code == 200
+        results = response.json()["data"]["results"]
+        assert results[0]["symbol"] == "6326"
+        assert results[0]["sector"] == "機械"
+
+    def test_search_invalid_limit(self):
+        """無効な件数指定は400"""
+        response = client.get("/api/v1/stocks/search?q=6&limit=0")
+
+        assert response.status_code == 400
+
+    def test_catalog_symbol_is_valid(self):
+        """カタログに含まれる銘柄は取得でき、含まれない銘柄は400"""
+        assert client.get("/api/v1/stocks/7203?period=7d").status_code == 200
+        assert client.get("/api/v1/stocks/0000?period=7d").status_code == 400
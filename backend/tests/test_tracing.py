@@ -0,0 +1,126 @@
+import json
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend.main import app
+from backend.tracing import Span, TraceBuffer, bind, current_trace_id, get_trace_buffer, span, traced
+
+client = TestClient(app)
+
+
+@traced("test.work")
+def _work(fail: bool = False) -> str:
+    with span("test.inner", step=1):
+        if fail:
+            raise ValueError("失敗")
+    return current_trace_id()
+
+
+def _make_span(trace_id: str) -> Span:
+    record = Span(trace_id, "test")
+    record.finish()
+    return record
+
+
+def _trace_spans(trace_id: str):
+    response = client.get(f"/api/v1/debug/traces/{trace_id}")
+    assert response.status_code == 200
+    return response.json()["data"]["spans"]
+
+
+class TestSpans:
+    """スパンの記録のテストクラス"""
+
+    def test_no_trace_is_noop(self):
+        """トレース外ではスパンを作らない"""
+        with span("test.orphan") as current:
+            assert current is None
+        assert current_trace_id() is None
+
+    def test_nested_spans(self):
+        """親子関係・属性・例外を記録する"""
+        with span("test.root", root=True, trace_id="trace-nested-1") as root:
+            assert _work() == "trace-nested-1"
+            with pytest.raises(ValueError):
+                _work(fail=True)
+
+        spans = get_trace_buffer().get("trace-nested-1")
+        by_name = {}
+        for record in spans:
+            by_name.setdefault(record["name"], []).append(record)
+        assert [record["parentId"] for record in by_name["test.work"]] == [root.span_id, root.span_id]
+        inner = by_name["test.inner"]
+        assert inner[0]["parentId"] == by_name["test.work"][0]["spanId"]
+        assert inner[0]["attributes"] == {"step": 1}
+        assert inner[1]["error"] == "ValueError: 失敗"
+        assert by_name["test.root"][0]["durationMs"] >= 0
+
+    def test_bind_to_thread(self):
+        """bind() で別スレッドの処理を現在のスパンの子にする"""
+        results = []
+        with span("test.root", root=True, trace_id="trace-bind-1"):
+            thread = threading.Thread(target=bind(lambda: results.append(_work())))
+            thread.start()
+            thread.join()
+        assert results == ["trace-bind-1"]
+
+
+class TestTraceBuffer:
+    """リングバッファのテストクラス"""
+
+    def test_evicts_oldest_trace(self):
+        """保持するトレース数を超えたら古いトレースから捨てる"""
+        buffer = TraceBuffer(max_traces=2)
+        for trace_id in ("a" * 8, "b" * 8, "c" * 8):
+            buffer.export(_make_span(trace_id))
+
+        assert buffer.get("a" * 8) is None
+        assert [trace["traceId"] for trace in buffer.traces()] == ["c" * 8, "b" * 8]
+
+    def test_file_exporter(self, tmp_path):
+        """ファイル指定時は終了したスパンをJSON Linesで追記する"""
+        path = tmp_path / "spans.jsonl"
+        buffer = TraceBuffer(path=str(path))
+        buffer.export(_make_span("d" * 8))
+
+        records = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+        assert records[0]["traceId"] == "d" * 8
+
+
+class TestTracingAPI:
+    """トレースのAPIのテストクラス"""
+
+    def test_trace_header_and_spans(self, stub_upstream):
+        """X-Trace-Id を返し、ルート・サービス・キャッシュ・上流・シリアライズのスパンを記録する"""
+        response = client.get("/api/v1/stocks?symbols=6326&period=7d")
+        assert response.status_code == 200
+        trace_id = response.headers["x-trace-id"]
+
+        spans = _trace_spans(trace_id)
+        names = [record["name"] for record in spans]
+        for name in ("GET /api/v1/stocks", "route", "stock.get_multiple_stocks", "cache.get_or_fetch",
+                     "upstream", "upstream.attempt", "serialize"):
+            assert name in names
+        root = spans[0]
+        assert root["parentId"] is None
+        assert root["attributes"]["status"] == 200
+        upstream = next(record for record in spans if record["name"] == "upstream")
+        assert upstream["attributes"]["target"] == "6326.T"
+
+    def test_incoming_trace_id(self):
+        """リクエストの X-Trace-Id を引き継ぐ"""
+        response = client.get("/api/v1/stocks/symbols", headers={"X-Trace-Id": "dashboard-load-0001"})
+
+        assert response.headers["x-trace-id"] == "dashboard-load-0001"
+        summaries = client.get("/api/v1/debug/traces?limit=5").json()["data"]
+        assert summaries[0]["traceId"] == "dashboard-load-0001"
+        assert summaries[0]["attributes"]["route"] == "/api/v1/stocks/symbols"
+
+    def test_unknown_trace(self):
+        """存在しないトレースは404、デバッグ用のエンドポイント自体はトレースしない"""
+        response = client.get("/api/v1/debug/traces/unknown-trace")
+
+        assert response.status_code == 404
+        assert "x-trace-id" not in response.headers
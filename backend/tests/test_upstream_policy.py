@@ -0,0 +1,145 @@
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend.main import app
+from backend.stock_service import get_stock_service
+from backend.upstream_policy import (
+    MIN_SAMPLES,
+    UpstreamPolicies,
+    UpstreamTimeoutError,
+    remaining_time,
+    request_deadline,
+)
+
+client = TestClient(app)
+
+
+def _warm(policies: UpstreamPolicies, source: str, latency: float) -> None:
+    """パーセンタイルを使い始める件数分の所要時間を記録する"""
+    for _ in range(MIN_SAMPLES):
+        policies.get(source).observe(latency)
+
+
+class TestUpstreamPolicy:
+    """上流呼び出しのタイムアウト・ヘッジのテストクラス"""
+
+    def test_adaptive_timeout(self):
+        """記録が少ない間は上限、以降は p99 の倍数を下限・上限に収めた値"""
+        policies = UpstreamPolicies(min_timeout=0.5, max_timeout=10)
+        assert policies.get("yahoo").timeout() == 10
+
+        _warm(policies, "yahoo", 0.3)
+        assert policies.get("yahoo").timeout() == pytest.approx(0.9)
+        _warm(policies, "openmeteo", 0.01)
+        assert policies.get("openmeteo").timeout() == 0.5
+
+    def test_timeout(self):
+        """タイムアウトした呼び出しは UpstreamTimeoutError とし、打ち切った時間を記録する"""
+        policies = UpstreamPolicies(min_timeout=0.05, max_timeout=0.1)
+        release = threading.Event()
+        with pytest.raises(UpstreamTimeoutError):
+            policies.call("yahoo", lambda timeout: release.wait(1))
+        release.set()
+
+        stats = policies.stats()["yahoo"]
+        assert stats["timeouts"] == 1
+        assert stats["samples"] >= 1
+        assert policies.call("yahoo", lambda timeout: timeout) == pytest.approx(0.1)
+
+    def test_error_is_raised(self):
+        """上流の例外はそのまま送出する"""
+        policies = UpstreamPolicies()
+
+        def fail(timeout):
+            raise OSError("connection reset")
+
+        with pytest.raises(OSError, match="connection reset"):
+            policies.call("yahoo", fail)
+
+    def test_hedge_wins(self):
+        """p95 の時間が経過しても応答がない場合、ヘッジの応答を使う"""
+        policies = UpstreamPolicies(min_timeout=1, max_timeout=2, hedging=True, hedge_ratio=1.0)
+        _warm(policies, "yahoo", 0.02)
+        calls = []
+        lock = threading.Lock()
+
+        def fetch(timeout):
+            with lock:
+                calls.append(timeout)
+                first = len(calls) == 1
+            if first:
+                time.sleep(0.5)
+                return "slow"
+            return "hedge"
+
+        started = time.monotonic()
+        assert policies.call("yahoo", fetch) == "hedge"
+        assert time.monotonic() - started < 0.4
+        stats = policies.stats()["yahoo"]
+        assert stats["hedges"] == 1
+        assert stats["hedge_wins"] == 1
+
+    def test_hedge_budget(self):
+        """ヘッジの本数は呼び出し数に対する割合までに抑える"""
+        policies = UpstreamPolicies(min_timeout=1, max_timeout=2, hedging=True, hedge_ratio=0.1)
+        _warm(policies, "yahoo", 0.01)
+
+        def slow(timeout):
+            time.sleep(0.05)
+            return "ok"
+
+        for _ in range(5):
+            assert policies.call("yahoo", slow) == "ok"
+        assert policies.stats()["yahoo"]["hedges"] == 0
+
+
+class TestRequestDeadline:
+    """リクエストの期限のテストクラス"""
+
+    def test_nested_deadline(self):
+        """内側の期限は外側の期限を超えない"""
+        assert remaining_time() is None
+        with request_deadline(0.5):
+            with request_deadline(10):
+                assert remaining_time() <= 0.5
+            with request_deadline(None):
+                assert remaining_time() <= 0.5
+        assert remaining_time() is None
+
+    def test_deadline_caps_timeout(self):
+        """期限までの残り時間を超えて待たず、期限切れなら呼び出さない"""
+        policies = UpstreamPolicies(max_timeout=10)
+        with request_deadline(0.2):
+            assert policies.call("yahoo", lambda timeout: timeout) <= 0.2
+            time.sleep(0.25)
+            with pytest.raises(UpstreamTimeoutError):
+                policies.call("yahoo", lambda timeout: pytest.fail("期限切れ後に上流を呼び出しました"))
+
+    def test_slow_upstream_falls_back_to_cache(self, stub_upstream):
+        """期限内に応答がない場合、より長い期間のキャッシュから切り出して応答する"""
+        service = get_stock_service()
+        full = service.get_stock_data("6326", "3m")
+        assert "is_mock" not in full
+
+        stub_upstream.config.update({"latency_ms": 1000})
+        started = time.monotonic()
+        with request_deadline(0.2):
+            data = service.get_stock_data("6326", "7d")
+            mock = service.get_stock_data("9984", "7d")
+        assert time.monotonic() - started < 0.9
+
+        assert "is_mock" not in data
+        assert 0 < len(data["data_points"]) < len(full["data_points"])
+        assert data["data_points"][-1] == full["data_points"][-1]
+        # キャッシュもない銘柄はモックデータ
+        assert mock["is_mock"] is True
+
+    def test_stats_endpoint(self):
+        """取得元ごとの統計を返す"""
+        response = client.get("/api/v1/upstream/stats")
+
+        assert response.status_code == 200
+        assert response.json()["success"] is True
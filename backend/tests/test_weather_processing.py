@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+
+from backend.weather_processing import (
+    ProcessingOptions,
+    aggregate_daily,
+    fill_gaps,
+    process_openmeteo,
+)
+
+NAN = np.nan
+
+
+class TestGapFilling:
+    """欠損補完のテストクラス"""
+
+    def test_ffill(self):
+        """直前値での補完（先頭は最初の有効値）"""
+        values = np.array([NAN, 1.0, NAN, NAN, 4.0, NAN])
+        assert fill_gaps(values, "ffill").tolist() == [1.0, 1.0, 1.0, 1.0, 4.0, 4.0]
+
+    def test_interpolate(self):
+        """線形補間"""
+        values = np.array([NAN, 1.0, NAN, NAN, 4.0, NAN])
+        assert fill_gaps(values, "interpolate").tolist() == [1.0, 1.0, 2.0, 3.0, 4.0, 4.0]
+
+    def test_passthrough(self):
+        """欠損のまま返す"""
+        values = np.array([1.0, NAN])
+        assert np.isnan(fill_gaps(values, "none")[1])
+
+    def test_all_missing(self):
+        """全て欠損の場合はそのまま"""
+        values = np.array([NAN, NAN])
+        assert np.isnan(fill_gaps(values, "ffill")).all()
+
+
+class TestOpenMeteoPipeline:
+    """OpenMeteo応答処理のテストクラス"""
+
+    def test_hourly_to_daily(self):
+        """時間値の日次集約"""
+        times = [f"2025-01-01T{h:02d}:00" for h in range(24)] + [f"2025-01-02T{h:02d}:00" for h in range(24)]
+        values = np.arange(48, dtype=float)
+        values[30] = NAN
+
+        assert aggregate_daily(times, values, "sum").tolist() == [sum(range(24)), sum(range(24, 48)) - 30]
+        assert aggregate_daily(times, values, "max").tolist() == [23.0, 47.0]
+        assert aggregate_daily(times, values, "mean")[0] == pytest.approx(11.5)
+
+    def test_process_daily_with_passthrough(self):
+        """NaNパススルー時はnullとして返ること"""
+        raw = {
+            "daily": {
+                "time": ["2025-01-01", "2025-01-02"],
+                "precipitation_sum": [None, 1.25],
+                "temperature_2m_mean": [5.04, None],
+                "pressure_msl_mean": [1010.0, 1011.0],
+            }
+        }
+        result = process_openmeteo(raw, ProcessingOptions.build(gap_strategy="none")).to_dict()
+
+        assert result["dates"] == ["2025-01-01", "2025-01-02"]
+        assert result["precipitation"] == [None, 1.2]
+        assert result["temperature"] == [5.0, None]
+
+    def test_process_hourly_options(self):
+        """時間値から複数変数を日次集約"""
+        raw = {
+            "hourly": {
+                "time": [f"2025-01-01T{h:02d}:00" for h in range(24)],
+                "temperature_2m": list(range(24)),
+                "precipitation": [0.5] * 24,
+            }
+        }
+        options = ProcessingOptions.build("temperature_max,temperature_min,precipitation", aggregate_hourly=True)
+        result = process_openmeteo(raw, options).to_dict()
+
+        assert options.request_params() == {"hourly": "temperature_2m,precipitation"}
+        assert result["dates"] == ["2025-01-01"]
+        assert result["temperature_max"] == [23.0]
+        assert result["temperature_min"] == [0.0]
+        assert result["precipitation"] == [12.0]
+
+    def test_invalid_options(self):
+        """無効なオプション"""
+        with pytest.raises(ValueError):
+            ProcessingOptions.build("snow")
+        with pytest.raises(ValueError):
+            ProcessingOptions.build(gap_strategy="bfill")
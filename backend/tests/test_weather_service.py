@@ -0,0 +1,72 @@
+from unittest.mock import Mock, patch
+
+import pytest
+
+from backend.cache import MemoryCache
+from backend.weather_service import WeatherService
+
+
+def _openmeteo_payload(latitude, longitude, days=3):
+    return {
+        "latitude": latitude,
+        "longitude": longitude,
+        "daily": {
+            "time": [f"2025-01-0{i + 1}" for i in range(days)],
+            "precipitation_sum": [0.0, None, 2.5][:days],
+            "temperature_2m_mean": [5.0, None, 7.0][:days],
+            "pressure_msl_mean": [1010.0, 1011.0, None][:days],
+        },
+    }
+
+
+class TestWeatherBatch:
+    """複数地点の気象データ取得のテストクラス"""
+
+    @pytest.fixture
+    def weather_service(self):
+        service = WeatherService()
+        service.cache = MemoryCache()
+        return service
+
+    def test_batch_single_round_trip(self, weather_service):
+        """複数地点を1リクエストで取得し、地点ごとにキャッシュされること"""
+        response = Mock(status_code=200)
+        response.json.return_value = [
+            _openmeteo_payload(35.6762, 139.6503),
+            _openmeteo_payload(34.5733, 135.4830),
+        ]
+
+        with patch("requests.get", return_value=response) as mock_get:
+            data = weather_service.get_weather_batch(["tokyo", "sakai"], "7d")
+            again = weather_service.get_weather_batch(["sakai", "tokyo"], "7d")
+
+        assert mock_get.call_count == 1
+        params = mock_get.call_args.kwargs["params"]
+        assert params["latitude"] == "35.6762,34.5733"
+        assert data["sakai"]["data"]["location"] == "大阪府堺市"
+        assert again["tokyo"] == data["tokyo"]
+
+    def test_batch_fetches_only_missing(self, weather_service):
+        """キャッシュ済みの地点は再取得しないこと"""
+        first = Mock(status_code=200)
+        first.json.return_value = _openmeteo_payload(35.6762, 139.6503)
+        second = Mock(status_code=200)
+        second.json.return_value = _openmeteo_payload(35.3303, 139.9025)
+
+        with patch("requests.get", side_effect=[first, second]) as mock_get:
+            weather_service.get_weather_batch(["tokyo"], "7d")
+            weather_service.get_weather_batch(["tokyo", "kimitsu"], "7d")
+
+        assert mock_get.call_count == 2
+        assert mock_get.call_args.kwargs["params"]["latitude"] == "35.3303"
+
+    def test_unknown_location(self, weather_service):
+        """未登録の地域はエラー"""
+        with pytest.raises(ValueError):
+            weather_service.get_weather_batch(["paris"], "7d")
+
+    def test_locations_for_symbol(self, weather_service):
+        """銘柄に関連する生産拠点"""
+        assert "sakai" in weather_service.get_locations_for_symbol("6326")
+        assert "kimitsu" in weather_service.get_locations_for_symbol("1377")
+        assert weather_service.get_locations_for_symbol("9984") == []
@@ -0,0 +1,273 @@
+"""
+リクエストのトレース
+APIリクエストごとにトレースIDを割り当て、ルートハンドラー・サービスのメソッド・キャッシュの参照・
+上流の呼び出し・シリアライズをスパン（名前・開始時刻・所要時間・属性）として記録する。
+記録したスパンはメモリ上のリングバッファ（直近のトレース）に保持し、デバッグ用のエンドポイントで参照する。
+外部のトレース収集サービスは使わない。
+
+環境変数:
+    STACK_WATCHER_TRACING: 0 で無効（既定1）
+    STACK_WATCHER_TRACE_BUFFER: 保持するトレース数（既定200）
+    STACK_WATCHER_TRACE_FILE: 指定時は終了したスパンをJSON Linesで追記する
+
+トレースIDは応答ヘッダー X-Trace-Id で返す。リクエストに X-Trace-Id がある場合はそれを引き継ぐ。
+スパンの親子関係は contextvars で引き継ぐため、別スレッドで行う処理は
+contextvars.copy_context().run または bind() を経由して呼び出す。
+トレース外（監視スレッド・裏での再取得など）ではスパンを作らない。
+"""
+
+import contextvars
+import functools
+import json
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, TypeVar
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from backend.lazy import lazy_singleton
+
+logger = logging.getLogger(__name__)
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+TRACE_HEADER = "x-trace-id"
+DEFAULT_TRACE_BUFFER = 200
+
+# トレースしないパス（トレースの参照自体で直近のトレースを押し出さないため）
+UNTRACED_PREFIX = "/api/v1/debug/"
+
+# 1トレースに保持するスパン数の上限（超えた分は件数のみ数える）
+MAX_SPANS_PER_TRACE = 2000
+
+# 引き継ぐトレースIDの形式（それ以外は新しく割り当てる）
+_TRACE_ID_PATTERN = re.compile(r"^[0-9A-Za-z-]{8,64}$")
+
+
+class Span:
+    """1区間の処理の記録"""
+
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "start", "_started", "duration_ms",
+                 "attributes", "error")
+
+    def __init__(self, trace_id: str, name: str, parent_id: Optional[str] = None,
+                 attributes: Optional[Dict[str, Any]] = None):
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.name = name
+        self.start = time.time()
+        self._started = time.perf_counter()
+        self.duration_ms: Optional[float] = None
+        self.attributes: Dict[str, Any] = dict(attributes or {})
+        self.error: Optional[str] = None
+
+    def set(self, name: str, value: Any) -> None:
+        """属性を設定"""
+        self.attributes[name] = value
+
+    def finish(self) -> None:
+        self.duration_ms = (time.perf_counter() - self._started) * 1000
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentId": self.parent_id,
+            "name": self.name,
+            "start": self.start,
+            "durationMs": round(self.duration_ms, 3) if self.duration_ms is not None else None,
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+# 処理中のスパン（トレース外はNone）
+_current: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("trace_span", default=None)
+
+
+class TraceBuffer:
+    """直近のトレースのスパンを保持するリングバッファ（古いトレースから捨てる）"""
+
+    def __init__(self, max_traces: int = DEFAULT_TRACE_BUFFER, path: Optional[str] = None):
+        self.max_traces = max_traces
+        self.path = path or None
+        self._lock = threading.Lock()
+        self._traces: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    def export(self, span: Span) -> None:
+        """終了したスパンを保存"""
+        record = span.to_dict()
+        with self._lock:
+            trace = self._traces.get(span.trace_id)
+            if trace is None:
+                trace = {"spans": [], "dropped": 0, "root": None}
+                self._traces[span.trace_id] = trace
+                while len(self._traces) > self.max_traces:
+                    self._traces.popitem(last=False)
+            if len(trace["spans"]) < MAX_SPANS_PER_TRACE:
+                trace["spans"].append(record)
+            else:
+                trace["dropped"] += 1
+            if span.parent_id is None:
+                trace["root"] = record
+            if self.path:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+
+    def traces(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """
+        直近のトレースの概要（新しい順）
+
+        Returns:
+            [{"traceId", "name", "start", "durationMs", "spans", "dropped"}, ...]（処理中のトレースは name がNone）
+        """
+        with self._lock:
+            items = list(self._traces.items())[-limit:] if limit > 0 else []
+        summaries = []
+        for trace_id, trace in reversed(items):
+            root = trace["root"] or {}
+            summaries.append({
+                "traceId": trace_id,
+                "name": root.get("name"),
+                "start": root.get("start", min(span["start"] for span in trace["spans"])),
+                "durationMs": root.get("durationMs"),
+                "attributes": root.get("attributes", {}),
+                "spans": len(trace["spans"]),
+                "dropped": trace["dropped"],
+            })
+        return summaries
+
+    def get(self, trace_id: str) -> Optional[List[Dict[str, Any]]]:
+        """トレースのスパン（開始時刻順。なければNone）"""
+        with self._lock:
+            trace = self._traces.get(trace_id)
+            spans = list(trace["spans"]) if trace is not None else None
+        return sorted(spans, key=lambda span: span["start"]) if spans is not None else None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._traces.clear()
+
+
+def tracing_enabled() -> bool:
+    return os.getenv("STACK_WATCHER_TRACING", "1") == "1"
+
+
+def create_trace_buffer() -> TraceBuffer:
+    """環境変数の設定からリングバッファを生成"""
+    return TraceBuffer(
+        max_traces=int(os.getenv("STACK_WATCHER_TRACE_BUFFER", str(DEFAULT_TRACE_BUFFER))),
+        path=os.getenv("STACK_WATCHER_TRACE_FILE"),
+    )
+
+
+# プロセス共通のリングバッファ
+get_trace_buffer = lazy_singleton(create_trace_buffer)
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+def current_trace_id() -> Optional[str]:
+    span = _current.get()
+    return span.trace_id if span is not None else None
+
+
+@contextmanager
+def span(name: str, root: bool = False, trace_id: Optional[str] = None, **attributes: Any) -> Iterator[Optional[Span]]:
+    """
+    スパンを記録する（トレース外では何もせず None を返す）
+
+    Args:
+        name: スパン名（stock.get_stock_data, cache.get_or_fetch など）
+        root: 新しいトレースを開始する（APIリクエストの入口）
+        trace_id: 新しいトレースのID（省略時は割り当てる）
+        **attributes: 属性
+    """
+    parent = _current.get()
+    if parent is None and not root:
+        yield None
+        return
+    if root:
+        current = Span(trace_id or uuid.uuid4().hex, name, attributes=attributes)
+    else:
+        current = Span(parent.trace_id, name, parent.span_id, attributes)
+    token = _current.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current.reset(token)
+        current.finish()
+        get_trace_buffer().export(current)
+
+
+def traced(name: str) -> Callable[[F], F]:
+    """関数の呼び出しをスパンとして記録するデコレーター"""
+    def decorate(func: F) -> F:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _current.get() is None:
+                return func(*args, **kwargs)
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper  # type: ignore[return-value]
+    return decorate
+
+
+def bind(func: Callable[..., Any]) -> Callable[..., Any]:
+    """現在のスパンを親として func を実行する関数を返す（スレッドプールへの投入用）"""
+    parent = _current.get()
+    if parent is None:
+        return func
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        token = _current.set(parent)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _current.reset(token)
+    return wrapper
+
+
+class TracingMiddleware:
+    """APIリクエストごとにトレースを開始し、応答ヘッダーにトレースIDを付与するASGIミドルウェア"""
+
+    def __init__(self, app: ASGIApp, enabled: Optional[bool] = None):
+        self.app = app
+        self.enabled = tracing_enabled() if enabled is None else enabled
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self.enabled or scope.get("path", "").startswith(UNTRACED_PREFIX):
+            await self.app(scope, receive, send)
+            return
+
+        incoming = dict(scope.get("headers") or ()).get(TRACE_HEADER.encode(), b"").decode("latin-1")
+        trace_id = incoming if _TRACE_ID_PATTERN.match(incoming) else uuid.uuid4().hex
+        with span(f"{scope.get('method', 'GET')} {scope.get('path', '')}", root=True, trace_id=trace_id,
+                  method=scope.get("method"), path=scope.get("path")) as root:
+
+            async def send_with_trace_id(message: Message) -> None:
+                if message["type"] == "http.response.start":
+                    root.set("status", message["status"])
+                    headers = list(message.get("headers", []))
+                    headers.append((TRACE_HEADER.encode(), trace_id.encode()))
+                    message = {**message, "headers": headers}
+                await send(message)
+
+            await self.app(scope, receive, send_with_trace_id)
+            route = scope.get("route")
+            if route is not None and hasattr(route, "path"):
+                root.set("route", route.path)
+
@@ -0,0 +1,243 @@
+"""
+上流API（Yahoo Finance チャートAPI・OpenMeteo アーカイブAPI）の接続先
+既定では yfinance と OpenMeteo の本番APIを使用する。
+
+STACK_WATCHER_YAHOO_BASE_URL を設定すると、yfinance の代わりに
+チャートAPI（/v8/finance/chart/{symbol}）を直接呼び出す ChartTicker を使う。
+スタブサーバー（backend.stub_upstream）や記録した応答の再生に向けるためのもので、
+Yahoo本番のCookie・crumb認証は扱わない。
+
+STACK_WATCHER_OPENMETEO_BASE_URL を設定すると、OpenMeteo の接続先（/v1/archive の前まで）を変更する。
+
+上流の呼び出しは記録・再生（backend.recorder）を経由し、
+取得元ごとのタイムアウト・ヘッジ・リクエストの期限（backend.upstream_policy）を適用する。
+記録はヘッジを含めた1回の呼び出しにつき1件とし、再生時はヘッジ・スケジューラーを経由せずに記録した応答を返す。
+"""
+
+import json
+import os
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+from backend.recorder import get_recorder
+from backend.upstream_policy import call_upstream
+
+YAHOO_BASE_URL_ENV = "STACK_WATCHER_YAHOO_BASE_URL"
+OPENMETEO_BASE_URL_ENV = "STACK_WATCHER_OPENMETEO_BASE_URL"
+DEFAULT_OPENMETEO_BASE_URL = "https://archive-api.open-meteo.com"
+
+# ChartTicker の既定のタイムアウト（秒）
+CHART_TIMEOUT_SECONDS = 10
+
+# 日付指定（start/end）を時刻に変換する際の取引所のタイムゾーン（東証）
+EXCHANGE_TIMEZONE = "Asia/Tokyo"
+
+# 日足以上の粒度（yfinance と同様に日付の0時に正規化する）
+_DAILY_INTERVALS = ("1d", "5d", "1wk", "1mo", "3mo")
+
+
+def yahoo_base_url() -> Optional[str]:
+    """チャートAPIの接続先（未設定の場合はNone: yfinance を使用）"""
+    base_url = os.getenv(YAHOO_BASE_URL_ENV)
+    return base_url.rstrip("/") if base_url else None
+
+
+def openmeteo_archive_url(base_url: Optional[str] = None) -> str:
+    """OpenMeteo Historical Weather API のURL"""
+    base_url = base_url or os.getenv(OPENMETEO_BASE_URL_ENV) or DEFAULT_OPENMETEO_BASE_URL
+    return f"{base_url.rstrip('/')}/v1/archive"
+
+
+def make_ticker(code: str):
+    """
+    銘柄・指数のTickerを生成
+
+    Args:
+        code: yfinanceのティッカー（6326.T, ^N225 など）
+
+    Returns:
+        history() を持つ UpstreamTicker（接続先の設定時は ChartTicker、それ以外は yfinance.Ticker を呼び出す）
+    """
+    if get_recorder().mode == "replay":
+        return UpstreamTicker(code)
+    base_url = yahoo_base_url()
+    if base_url:
+        return UpstreamTicker(code, ChartTicker(code, base_url))
+    # yfinanceは起動を速くするため初回使用時にインポート
+    import yfinance as yf
+    return UpstreamTicker(code, yf.Ticker(code))
+
+
+def fetch_json(source: str, url: str, params: Dict[str, Any], headers: Optional[Dict[str, str]] = None,
+               timeout: float = 10) -> Tuple[int, Any]:
+    """
+    上流のJSON APIを呼び出す（記録・再生に対応）
+
+    Args:
+        source: 取得元（記録のキー）
+        url: URL
+        params: クエリパラメータ
+        headers: リクエストヘッダー
+        timeout: タイムアウトの上限（秒。実際は取得元の所要時間とリクエストの期限から決める）
+
+    Returns:
+        (HTTPステータス, 応答JSON。200以外は応答本文の文字列)
+    """
+    def fetch(adaptive_timeout: float):
+        # requestsは起動を速くするため初回使用時にインポート
+        import requests
+        response = requests.get(url, params=params, headers=headers, timeout=min(timeout, adaptive_timeout))
+        return response.status_code, response.json() if response.status_code == 200 else response.text
+
+    # 接続先（本番・スタブ）が変わっても同じ記録を使えるよう、キーにはパスのみを含める
+    return recorded_call(source, urlparse(url).path, params, fetch, encode=list, decode=tuple)
+
+
+def recorded_call(source: str, target: str, params: Dict[str, Any], fetch: Callable[[float], Any],
+                  encode: Callable[[Any], Any], decode: Callable[[Any], Any]) -> Any:
+    """
+    タイムアウト・ヘッジを適用して上流を呼び出し、その結果を記録・再生する
+
+    ヘッジに負けた試行や打ち切った後に失敗した試行は記録せず、呼び出し元が受け取った結果だけを記録する。
+
+    Args:
+        source: 取得元（yahoo / openmeteo）
+        target: 対象（ティッカー・URLのパス）
+        params: リクエスト条件（記録のキー）
+        fetch: タイムアウト（秒）を受け取って上流を呼び出す関数
+        encode: 応答をJSONに変換する関数
+        decode: 記録したJSONを応答に戻す関数
+    """
+    return get_recorder().call(
+        source, target, params,
+        lambda: call_upstream(source, fetch, target=target, key=call_key(target, params)),
+        encode=encode, decode=decode,
+    )
+
+
+def call_key(target: str, params: Dict[str, Any]) -> str:
+    """同じ内容の上流の呼び出しをまとめるためのキー（対象とパラメータ）"""
+    return f"{target}?{json.dumps(params, sort_keys=True, default=str)}"
+
+
+def frame_to_json(frame) -> Dict[str, Any]:
+    """history() の結果（DatetimeIndex付きDataFrame）を記録用のJSONに変換"""
+    tz = frame.index.tz if hasattr(frame.index, "tz") else None
+    return {
+        "index": [int(value) for value in frame.index.asi8] if len(frame) else [],
+        "indexName": frame.index.name,
+        "tz": str(tz) if tz is not None else None,
+        "columns": {str(name): frame[name].tolist() for name in frame.columns},
+        "dtypes": {str(name): str(dtype) for name, dtype in frame.dtypes.items()},
+    }
+
+
+def frame_from_json(data: Dict[str, Any]):
+    """frame_to_json の結果からDataFrameを復元"""
+    import pandas as pd
+
+    index = pd.to_datetime(data["index"], unit="ns", utc=True)
+    index = index.tz_convert(data["tz"]) if data["tz"] else index.tz_localize(None)
+    index.name = data["indexName"]
+    frame = pd.DataFrame(data["columns"], index=index, columns=list(data["columns"]))
+    return frame.astype(data["dtypes"])
+
+
+def _epoch_seconds(date_str: str) -> int:
+    """日付文字列（YYYY-MM-DD）を取引所のタイムゾーンの0時のUNIX時刻に変換"""
+    import pandas as pd
+    return int(pd.Timestamp(date_str, tz=EXCHANGE_TIMEZONE).timestamp())
+
+
+def chart_to_frame(payload: dict, interval: str = "1d"):
+    """
+    チャートAPIの応答を yfinance の history() と同じ形式のDataFrameに変換
+
+    Args:
+        payload: チャートAPIの応答JSON
+        interval: 足種
+
+    Returns:
+        Open/High/Low/Close/Volume 列と取引所のタイムゾーン付き DatetimeIndex を持つDataFrame
+        （銘柄が見つからない場合は空のDataFrame）
+    """
+    import pandas as pd
+
+    chart = payload.get("chart") or {}
+    results = chart.get("result") or []
+    columns = ["Open", "High", "Low", "Close", "Volume"]
+    if chart.get("error") or not results:
+        return pd.DataFrame(columns=columns)
+    result = results[0]
+    timezone = result.get("meta", {}).get("exchangeTimezoneName", EXCHANGE_TIMEZONE)
+    index = pd.to_datetime(result.get("timestamp") or [], unit="s", utc=True).tz_convert(timezone)
+    if interval in _DAILY_INTERVALS:
+        index = index.normalize()
+    index.name = "Date" if interval in _DAILY_INTERVALS else "Datetime"
+
+    quote = result["indicators"]["quote"][0] if index.size else {}
+    frame = pd.DataFrame(
+        {name: pd.Series(quote.get(name.lower(), []), dtype="float64").to_numpy()
+         for name in columns},
+        index=index,
+    )
+    # 値のない足（取引なし）は除く
+    frame = frame.dropna(subset=["Open", "High", "Low", "Close"], how="all")
+    frame["Volume"] = frame["Volume"].fillna(0).astype("int64")
+    return frame
+
+
+class ChartTicker:
+    """チャートAPIを直接呼び出す最小限のTicker（history() のみ）"""
+
+    def __init__(self, code: str, base_url: str, timeout: float = CHART_TIMEOUT_SECONDS):
+        self.code = code
+        self.base_url = base_url
+        self.timeout = timeout
+
+    def history(self, period: Optional[str] = None, start: Optional[str] = None,
+                end: Optional[str] = None, interval: str = "1d", timeout: Optional[float] = None):
+        """
+        yfinance の Ticker.history() と同じ引数で足を取得
+
+        Args:
+            period: 期間（7d, 1mo, 3mo など。start 指定時は無視）
+            start: 開始日 (YYYY-MM-DD)
+            end: 終了日 (YYYY-MM-DD、排他的)
+            interval: 足種
+            timeout: タイムアウト（秒、省略時は生成時の指定）
+
+        Returns:
+            history() と同じ形式のDataFrame
+        """
+        # requestsは起動を速くするため初回使用時にインポート
+        import requests
+
+        params = {"interval": interval, "includePrePost": "false", "events": "div,splits"}
+        if start is not None:
+            params["period1"] = _epoch_seconds(start)
+            params["period2"] = _epoch_seconds(end) if end else int(datetime.now().timestamp())
+        else:
+            params["range"] = period or "1mo"
+        response = requests.get(f"{self.base_url}/v8/finance/chart/{self.code}", params=params,
+                                timeout=timeout or self.timeout)
+        # 銘柄が見つからない場合（404）は yfinance と同様に空のDataFrameを返す
+        if response.status_code != 404:
+            response.raise_for_status()
+        return chart_to_frame(response.json(), interval)
+
+
+class UpstreamTicker:
+    """history() の呼び出しにタイムアウト・ヘッジを適用し、記録・再生するTicker（再生時は ticker を持たない）"""
+
+    def __init__(self, code: str, ticker=None):
+        self.code = code
+        self.ticker = ticker
+
+    def history(self, **kwargs):
+        # タイムアウトは呼び出しごとに変わるため記録のキーには含めない
+        return recorded_call(
+            "yahoo", self.code, kwargs, lambda timeout: self.ticker.history(timeout=timeout, **kwargs),
+            encode=frame_to_json, decode=frame_from_json,
+        )
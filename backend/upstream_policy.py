@@ -0,0 +1,310 @@
+"""
+上流呼び出しのタイムアウト・ヘッジ・リクエスト期限
+取得元（yahoo / openmeteo）ごとに直近の所要時間を記録し、そのパーセンタイルからタイムアウトを決める。
+ヘッジを有効にすると、p95 の時間が経過しても応答がない呼び出しに同じリクエストをもう1本送り、
+先に成功した応答を使う（ヘッジの本数は呼び出し数の一定割合までに抑える）。
+
+APIリクエストには全体の期限を設定でき、期限までの残り時間を超えて上流を待たない。
+期限切れ・タイムアウトの場合、各サービスはキャッシュ済みのデータ（なければモックデータ）で応答する。
+
+環境変数:
+    STACK_WATCHER_UPSTREAM_TIMEOUT_MIN: タイムアウトの下限（秒、既定2）
+    STACK_WATCHER_UPSTREAM_TIMEOUT_MAX: タイムアウトの上限（秒、既定10。所要時間の記録が少ない間はこの値）
+    STACK_WATCHER_UPSTREAM_HEDGING: 1 でヘッジを有効にする（既定0）
+    STACK_WATCHER_UPSTREAM_HEDGE_RATIO: ヘッジの本数の上限（呼び出し数に対する割合、既定0.1）
+    STACK_WATCHER_REQUEST_DEADLINE_SECONDS: APIリクエスト全体の期限（秒、既定8。0で無効）
+"""
+
+import contextvars
+import logging
+import math
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, Dict, Iterator, Optional, TypeVar
+
+from backend.fetch_scheduler import QueueTimeoutError, get_fetch_scheduler, hold_slot
+from backend.lazy import lazy_singleton
+from backend.tracing import span
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# 所要時間を保持する件数・パーセンタイルを使い始める件数
+LATENCY_WINDOW = 200
+MIN_SAMPLES = 20
+
+# タイムアウトは p99 のこの倍数（通常のばらつきでは打ち切らない）
+TIMEOUT_P99_FACTOR = 3.0
+
+# 上流の呼び出しを行うスレッド数（ヘッジ分を含む）
+UPSTREAM_WORKERS = 32
+
+# APIリクエスト全体の期限（監視スレッドなどリクエスト外の呼び出しでは未設定）
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("upstream_deadline", default=None)
+
+
+class UpstreamTimeoutError(TimeoutError):
+    """上流がタイムアウト・リクエストの期限内に応答しない場合の例外"""
+
+
+def percentile(sorted_values, q: float) -> float:
+    """昇順の値の q パーセンタイル（最近傍順位法）"""
+    rank = min(len(sorted_values), max(1, math.ceil(q / 100 * len(sorted_values)))) - 1
+    return sorted_values[rank]
+
+
+@contextmanager
+def request_deadline(seconds: Optional[float]) -> Iterator[None]:
+    """
+    この中で行う上流の呼び出しの期限を設定する（外側の期限の方が早い場合はそちらを使う）
+
+    Args:
+        seconds: 期限までの秒数（None・0以下は期限なし）
+    """
+    current = _deadline.get()
+    deadline = current
+    if seconds is not None and seconds > 0:
+        deadline = time.monotonic() + seconds
+        if current is not None:
+            deadline = min(deadline, current)
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining_time() -> Optional[float]:
+    """リクエストの期限までの残り秒数（期限なしはNone）"""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def default_deadline_seconds() -> float:
+    """APIリクエスト全体の期限（秒）"""
+    return float(os.getenv("STACK_WATCHER_REQUEST_DEADLINE_SECONDS", "8"))
+
+
+class UpstreamPolicy:
+    """取得元ごとの所要時間の記録とタイムアウト・ヘッジの判断"""
+
+    def __init__(self, source: str, min_timeout: float = 2.0, max_timeout: float = 10.0,
+                 hedging: bool = False, hedge_ratio: float = 0.1):
+        self.source = source
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.hedging = hedging
+        self.hedge_ratio = hedge_ratio
+        self._lock = threading.Lock()
+        self._latencies: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self._calls = 0
+        self._hedges = 0
+        self._hedge_wins = 0
+        self._timeouts = 0
+
+    def observe(self, elapsed: float) -> None:
+        """1回の呼び出しの所要時間を記録（タイムアウトした呼び出しは打ち切った時間を記録）"""
+        with self._lock:
+            self._latencies.append(elapsed)
+
+    def _percentile(self, q: float) -> Optional[float]:
+        with self._lock:
+            if len(self._latencies) < MIN_SAMPLES:
+                return None
+            ordered = sorted(self._latencies)
+        return percentile(ordered, q)
+
+    def timeout(self) -> float:
+        """タイムアウト（p99 の倍数を下限・上限の範囲に収めた秒数）"""
+        p99 = self._percentile(99)
+        if p99 is None:
+            return self.max_timeout
+        return min(self.max_timeout, max(self.min_timeout, p99 * TIMEOUT_P99_FACTOR))
+
+    def hedge_delay(self) -> Optional[float]:
+        """ヘッジを送るまでの待ち時間（p95。ヘッジ無効・記録不足の場合はNone）"""
+        if not self.hedging:
+            return None
+        return self._percentile(95)
+
+    def _start_call(self) -> None:
+        with self._lock:
+            self._calls += 1
+
+    def _try_hedge(self) -> bool:
+        """ヘッジの本数が上限内ならヘッジを1本数える"""
+        with self._lock:
+            if self._hedges + 1 > self._calls * self.hedge_ratio:
+                return False
+            self._hedges += 1
+            return True
+
+    def _count(self, hedge_won: bool = False, timed_out: bool = False) -> None:
+        with self._lock:
+            self._hedge_wins += hedge_won
+            self._timeouts += timed_out
+
+    def stats(self) -> Dict[str, Any]:
+        p50, p95, p99 = self._percentile(50), self._percentile(95), self._percentile(99)
+        with self._lock:
+            samples = len(self._latencies)
+            calls, hedges, hedge_wins, timeouts = self._calls, self._hedges, self._hedge_wins, self._timeouts
+        return {
+            "samples": samples,
+            "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+            "p99_ms": round(p99 * 1000, 1) if p99 is not None else None,
+            "timeout_ms": round(self.timeout() * 1000, 1),
+            "hedging": self.hedging,
+            "calls": calls,
+            "hedges": hedges,
+            "hedge_wins": hedge_wins,
+            "timeouts": timeouts,
+        }
+
+
+class UpstreamPolicies:
+    """取得元ごとの UpstreamPolicy と、上流の呼び出しを行うスレッドプール"""
+
+    def __init__(self, min_timeout: float = 2.0, max_timeout: float = 10.0,
+                 hedging: bool = False, hedge_ratio: float = 0.1):
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.hedging = hedging
+        self.hedge_ratio = hedge_ratio
+        self._lock = threading.Lock()
+        self._policies: Dict[str, UpstreamPolicy] = {}
+        self._executor = ThreadPoolExecutor(max_workers=UPSTREAM_WORKERS, thread_name_prefix="upstream")
+
+    def get(self, source: str) -> UpstreamPolicy:
+        with self._lock:
+            policy = self._policies.get(source)
+            if policy is None:
+                policy = UpstreamPolicy(source, self.min_timeout, self.max_timeout, self.hedging, self.hedge_ratio)
+                self._policies[source] = policy
+            return policy
+
+    def call(self, source: str, fetch: Callable[[float], T], target: Optional[str] = None) -> T:
+        """
+        上流を呼び出す（タイムアウト・ヘッジ・リクエストの期限を適用）
+
+        Args:
+            source: 取得元（yahoo / openmeteo）
+            fetch: タイムアウト（秒）を受け取って上流を呼び出す関数
+            target: 対象（ティッカー・URLのパス。トレースの属性）
+
+        Returns:
+            fetch の戻り値（ヘッジした場合は先に成功した方）
+
+        Raises:
+            UpstreamTimeoutError: タイムアウト・期限切れ
+        """
+        with span("upstream", source=source, target=target) as current:
+            return self._call(source, fetch, current)
+
+    def _call(self, source: str, fetch: Callable[[float], T], current) -> T:
+        policy = self.get(source)
+        timeout = policy.timeout()
+        remaining = remaining_time()
+        if remaining is not None:
+            if remaining <= 0:
+                raise UpstreamTimeoutError(f"{source}: リクエストの期限を過ぎています")
+            timeout = min(timeout, remaining)
+        policy._start_call()
+        if current is not None:
+            current.set("timeout_ms", round(timeout * 1000, 1))
+
+        def attempt() -> T:
+            started = time.monotonic()
+            try:
+                with span("upstream.attempt"):
+                    return fetch(timeout)
+            finally:
+                policy.observe(time.monotonic() - started)
+
+        def submit() -> Future:
+            # 打ち切った後も呼び出しが終わるまでスケジューラーの枠を解放しない
+            release = hold_slot()
+            # 呼び出し元のコンテキスト（記録・再生やトレースの設定）を引き継ぐ
+            try:
+                future = self._executor.submit(contextvars.copy_context().run, attempt)
+            except BaseException:
+                release()
+                raise
+            future.add_done_callback(lambda _: release())
+            return future
+
+        started = time.monotonic()
+        futures = [submit()]
+        delay = policy.hedge_delay()
+        if delay is not None and delay < timeout:
+            done, _ = wait(futures, timeout=delay)
+            if not done and policy._try_hedge():
+                logger.info(f"{source}: {delay * 1000:.0f}ms 応答がないためヘッジを送信します")
+                if current is not None:
+                    current.set("hedged", True)
+                futures.append(submit())
+
+        pending = set(futures)
+        error: Optional[BaseException] = None
+        while pending:
+            left = timeout - (time.monotonic() - started)
+            done, pending = wait(pending, timeout=max(0.0, left), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                if future.exception() is None:
+                    policy._count(hedge_won=len(futures) > 1 and future is futures[1])
+                    return future.result()
+                error = future.exception()
+        if error is not None and not pending:
+            raise error
+        policy._count(timed_out=True)
+        # 打ち切った呼び出しも、少なくともタイムアウトまでかかったものとして記録する
+        policy.observe(timeout)
+        raise UpstreamTimeoutError(f"{source}: {timeout:.2f}秒以内に応答がありません")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            policies = dict(self._policies)
+        return {source: policy.stats() for source, policy in sorted(policies.items())}
+
+
+def create_policies() -> UpstreamPolicies:
+    """環境変数の設定から上流呼び出しの設定を生成"""
+    return UpstreamPolicies(
+        min_timeout=float(os.getenv("STACK_WATCHER_UPSTREAM_TIMEOUT_MIN", "2")),
+        max_timeout=float(os.getenv("STACK_WATCHER_UPSTREAM_TIMEOUT_MAX", "10")),
+        hedging=os.getenv("STACK_WATCHER_UPSTREAM_HEDGING", "0") == "1",
+        hedge_ratio=float(os.getenv("STACK_WATCHER_UPSTREAM_HEDGE_RATIO", "0.1")),
+    )
+
+
+# プロセス共通の上流呼び出しの設定
+get_upstream_policies = lazy_singleton(create_policies)
+
+
+def call_upstream(source: str, fetch: Callable[[float], T], target: Optional[str] = None,
+                  key: Optional[str] = None) -> T:
+    """
+    プロセス共通の設定で上流を呼び出す（UpstreamPolicies.call を参照）
+
+    スケジューラー（backend.fetch_scheduler）で現在の優先度の順番を待ってから呼び出す。
+    順番を待つ時間もリクエストの期限に含める。
+
+    Args:
+        source: 取得元（yahoo / openmeteo）
+        fetch: タイムアウト（秒）を受け取って上流を呼び出す関数
+        target: 対象（ティッカー・URLのパス。トレースの属性）
+        key: 呼び出しの識別子（同じキーの待機中・実行中の呼び出しと結果を共有する）
+    """
+    try:
+        return get_fetch_scheduler().run(source, lambda: get_upstream_policies().call(source, fetch, target),
+                                         key=key, timeout=remaining_time())
+    except QueueTimeoutError as e:
+        raise UpstreamTimeoutError(str(e)) from e
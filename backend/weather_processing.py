@@ -0,0 +1,264 @@
+"""
+気象データの後処理パイプライン
+OpenMeteo APIの応答を列単位のNumPy配列として処理する（欠損補完・丸め・時間→日次集約）
+"""
+
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+from backend.series import DECIMALS, DailySeries
+
+# 欠損補完の方式
+#   ffill: 直前の値で補完（先頭の欠損は最初の有効値で補完）
+#   interpolate: 前後の有効値から線形補間（両端は最も近い有効値）
+#   none: 欠損のまま返す（JSONではnull）
+GAP_STRATEGIES = ("ffill", "interpolate", "none")
+
+# 取得可能な気象変数
+#   daily: OpenMeteoの日次変数名
+#   hourly: OpenMeteoの時間変数名（サーバー側で日次集約する場合に使用）
+#   aggregate: 日次集約・ダウンサンプリング時の集約方法
+#   accumulation: 積算量（欠損は0として扱う）
+#   mock: モックデータ生成用の (基準値, 変動幅)
+VARIABLES = {
+    "precipitation": {
+        "daily": "precipitation_sum",
+        "hourly": "precipitation",
+        "aggregate": "sum",
+        "accumulation": True,
+        "mock": (0.0, 30.0),
+    },
+    "temperature": {
+        "daily": "temperature_2m_mean",
+        "hourly": "temperature_2m",
+        "aggregate": "mean",
+        "accumulation": False,
+        "mock": (24.0, 3.0),
+    },
+    "pressure": {
+        "daily": "pressure_msl_mean",
+        "hourly": "pressure_msl",
+        "aggregate": "mean",
+        "accumulation": False,
+        "mock": (1013.0, 15.0),
+    },
+    "temperature_max": {
+        "daily": "temperature_2m_max",
+        "hourly": "temperature_2m",
+        "aggregate": "max",
+        "accumulation": False,
+        "mock": (28.0, 3.0),
+    },
+    "temperature_min": {
+        "daily": "temperature_2m_min",
+        "hourly": "temperature_2m",
+        "aggregate": "min",
+        "accumulation": False,
+        "mock": (20.0, 3.0),
+    },
+    "humidity": {
+        "daily": "relative_humidity_2m_mean",
+        "hourly": "relative_humidity_2m",
+        "aggregate": "mean",
+        "accumulation": False,
+        "mock": (70.0, 15.0),
+    },
+    "wind_speed": {
+        "daily": "wind_speed_10m_max",
+        "hourly": "wind_speed_10m",
+        "aggregate": "max",
+        "accumulation": False,
+        "mock": (15.0, 8.0),
+    },
+}
+
+# 既定で返す変数（従来のレスポンス互換）
+DEFAULT_VARIABLES = ("precipitation", "temperature", "pressure")
+
+def resolve_variables(variables: Optional[str]) -> tuple:
+    """
+    カンマ区切りの変数指定を検証してタプルに変換
+
+    Args:
+        variables: 変数名のカンマ区切り文字列（Noneの場合は既定の変数）
+
+    Returns:
+        変数名のタプル
+    """
+    if not variables:
+        return DEFAULT_VARIABLES
+    names = tuple(dict.fromkeys(v.strip() for v in variables.split(",") if v.strip()))
+    unknown = [name for name in names if name not in VARIABLES]
+    if unknown or not names:
+        raise ValueError(f"無効な気象変数: {unknown}. 有効な変数: {list(VARIABLES)}")
+    return names
+
+
+def validate_gap_strategy(gap_strategy: str) -> None:
+    """欠損補完方式の妥当性チェック（不正時はValueError）"""
+    if gap_strategy not in GAP_STRATEGIES:
+        raise ValueError(f"無効な欠損補完方式: {gap_strategy}. 有効な方式: {list(GAP_STRATEGIES)}")
+
+
+class ProcessingOptions(NamedTuple):
+    """気象データの取得・後処理オプション（キャッシュキーとしても使用）"""
+
+    variables: tuple = DEFAULT_VARIABLES
+    gap_strategy: str = "ffill"
+    aggregate_hourly: bool = False
+
+    @classmethod
+    def build(cls, variables: Optional[str] = None, gap_strategy: str = "ffill",
+              aggregate_hourly: bool = False) -> "ProcessingOptions":
+        """リクエストパラメータを検証してオプションを生成"""
+        validate_gap_strategy(gap_strategy)
+        return cls(resolve_variables(variables), gap_strategy, bool(aggregate_hourly))
+
+    def request_params(self) -> Dict[str, str]:
+        """OpenMeteo APIへ渡す変数指定パラメータ"""
+        if self.aggregate_hourly:
+            names = dict.fromkeys(VARIABLES[name]["hourly"] for name in self.variables)
+            return {"hourly": ",".join(names)}
+        return {"daily": ",".join(VARIABLES[name]["daily"] for name in self.variables)}
+
+    @property
+    def key(self) -> str:
+        """文字列キー（系列ストアのキー用）"""
+        return f"{','.join(self.variables)}|{self.gap_strategy}|{int(self.aggregate_hourly)}"
+
+
+DEFAULT_OPTIONS = ProcessingOptions()
+
+
+def to_array(values: Optional[Sequence[Any]]) -> np.ndarray:
+    """None を含むリストを float64 配列（欠損はNaN）に変換"""
+    if values is None:
+        return np.empty(0, dtype=np.float64)
+    return np.array(values, dtype=np.float64)
+
+
+def fill_gaps(values: np.ndarray, strategy: str) -> np.ndarray:
+    """
+    欠損値（NaN）を補完
+
+    Args:
+        values: 値の配列
+        strategy: 補完方式（GAP_STRATEGIES）
+
+    Returns:
+        補完済みの配列（全て欠損の場合はそのまま）
+    """
+    missing = np.isnan(values)
+    if strategy == "none" or not missing.any() or missing.all():
+        return values
+
+    positions = np.arange(len(values))
+    valid = ~missing
+
+    if strategy == "interpolate":
+        return np.interp(positions, positions[valid], values[valid])
+
+    # ffill: 各位置について直近の有効値の位置を累積最大で求める
+    last_valid = np.maximum.accumulate(np.where(valid, positions, -1))
+    # 先頭の欠損は最初の有効値で補完
+    last_valid[last_valid < 0] = np.argmax(valid)
+    return values[last_valid]
+
+
+def aggregate_daily(times: Sequence[str], values: np.ndarray, how: str) -> np.ndarray:
+    """
+    時間値を日次に集約（欠損は除外して集約）
+
+    Args:
+        times: ISO形式の時刻文字列（昇順、"YYYY-MM-DDTHH:MM"）
+        values: 値の配列
+        how: 集約方法（sum/mean/max/min）
+
+    Returns:
+        日次値の配列（全て欠損の日はNaN）
+    """
+    days = np.asarray(times, dtype="U10")
+    return reduce_buckets(values, _day_starts(days), how)
+
+
+def reduce_buckets(values: np.ndarray, starts: np.ndarray, how: str) -> np.ndarray:
+    """
+    連続した区間（バケット）ごとに値を集約（欠損は除外して集約）
+
+    Args:
+        values: 値の配列
+        starts: 各バケットの先頭のインデックス（昇順）
+        how: 集約方法（sum/mean/max/min）
+
+    Returns:
+        バケットごとの値の配列（全て欠損のバケットはNaN）
+    """
+    valid = ~np.isnan(values)
+    counts = np.add.reduceat(valid.astype(np.int64), starts)
+
+    if how == "sum":
+        result = np.add.reduceat(np.where(valid, values, 0.0), starts)
+    elif how == "mean":
+        with np.errstate(invalid="ignore", divide="ignore"):
+            result = np.add.reduceat(np.where(valid, values, 0.0), starts) / counts
+    elif how == "max":
+        result = np.maximum.reduceat(np.where(valid, values, -np.inf), starts)
+    elif how == "min":
+        result = np.minimum.reduceat(np.where(valid, values, np.inf), starts)
+    else:
+        raise ValueError(f"無効な集約方法: {how}")
+
+    return np.where(counts > 0, result, np.nan)
+
+
+def daily_dates(times: Sequence[str]) -> List[str]:
+    """時刻文字列の列から日付（YYYY-MM-DD）の一覧を取得"""
+    days = np.asarray(times, dtype="U10")
+    if len(days) == 0:
+        return []
+    return days[_day_starts(days)].tolist()
+
+
+def _day_starts(days: np.ndarray) -> np.ndarray:
+    """日付列（昇順）で日付が切り替わる位置"""
+    return np.flatnonzero(np.concatenate(([True], days[1:] != days[:-1])))
+
+
+def process_openmeteo(raw_data: Dict[str, Any], options: ProcessingOptions) -> DailySeries:
+    """
+    OpenMeteo APIの応答を日次系列に変換
+
+    Args:
+        raw_data: OpenMeteo APIの応答（1地点分）
+        options: 取得・後処理オプション（変数・欠損補完方式・時間値の日次集約）
+
+    Returns:
+        変数名ごとの列を持つ日次系列（値は丸め済み、欠損はNaN）
+    """
+    aggregate_hourly = options.aggregate_hourly
+    gap_strategy = options.gap_strategy
+    block = raw_data.get("hourly" if aggregate_hourly else "daily", {}) or {}
+    times = block.get("time", []) or []
+
+    dates = daily_dates(times) if aggregate_hourly else [t[:10] for t in times]
+    columns: Dict[str, np.ndarray] = {}
+
+    for name in options.variables:
+        spec = VARIABLES[name]
+        values = to_array(block.get(spec["hourly" if aggregate_hourly else "daily"]))
+        if len(values) != len(times):
+            # 変数が応答に含まれない場合は欠損扱い
+            values = np.full(len(times), np.nan)
+        if aggregate_hourly and len(times) > 0:
+            values = aggregate_daily(times, values, spec["aggregate"])
+
+        if gap_strategy != "none":
+            if spec["accumulation"]:
+                values = np.where(np.isnan(values), 0.0, values)
+            else:
+                values = fill_gaps(values, gap_strategy)
+
+        columns[name] = np.round(values, DECIMALS)
+
+    return DailySeries(dates, columns)
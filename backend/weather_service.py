@@ -1,30 +1,95 @@
 """
 気象データサービス
-OpenMeteo APIから東京都の気象データ（降水量、気温、気圧）を取得・処理するサービス
+OpenMeteo APIから各観測地点の気象データ（降水量、気温、気圧）を取得・処理するサービス
 """
 
-import requests
-import pandas as pd
+import os
 from datetime import datetime, timedelta
 from typing import List, Dict, Any, Optional
 import logging
 import time
 
-# ログ設定
-logging.basicConfig(level=logging.INFO)
+from backend.alerts import get_alert_engine
+from backend.cache import get_cache
+from backend.lazy import lazy_singleton
+from backend.series import DailySeries
+from backend.series_store import SeriesRangeStore, parse_date_range
+from backend.tracing import traced
+from backend.upstream import fetch_json, openmeteo_archive_url
+from backend.weather_processing import (
+    ProcessingOptions,
+    DEFAULT_OPTIONS,
+    VARIABLES,
+    process_openmeteo,
+)
+
 logger = logging.getLogger(__name__)
 
 class WeatherService:
     """気象データの取得と処理を担当するサービスクラス"""
     
+    # 観測地点の定義（related_symbols: 関連する銘柄コード）
+    LOCATIONS = {
+        "tokyo": {
+            "name": "東京都",
+            "latitude": 35.6762,
+            "longitude": 139.6503,
+            "description": "東京都内の代表観測点（OpenMeteo API）",
+            "related_symbols": []
+        },
+        "sakai": {
+            "name": "大阪府堺市",
+            "latitude": 34.5733,
+            "longitude": 135.4830,
+            "description": "クボタ 堺製造所",
+            "related_symbols": ["6326"]
+        },
+        "tsukuba": {
+            "name": "茨城県つくばみらい市",
+            "latitude": 35.9630,
+            "longitude": 140.0370,
+            "description": "クボタ 筑波工場",
+            "related_symbols": ["6326"]
+        },
+        "yokohama": {
+            "name": "神奈川県横浜市",
+            "latitude": 35.5036,
+            "longitude": 139.6180,
+            "description": "サカタのタネ 本社",
+            "related_symbols": ["1377"]
+        },
+        "kimitsu": {
+            "name": "千葉県君津市",
+            "latitude": 35.3303,
+            "longitude": 139.9025,
+            "description": "サカタのタネ 君津育種場",
+            "related_symbols": ["1377"]
+        },
+        "kakegawa": {
+            "name": "静岡県掛川市",
+            "latitude": 34.7687,
+            "longitude": 138.0146,
+            "description": "サカタのタネ 掛川総合研究センター",
+            "related_symbols": ["1377"]
+        }
+    }
+    
     def __init__(self):
         """WeatherServiceの初期化"""
-        # OpenMeteo Historical Weather APIのベースURL
-        self.base_url = "https://archive-api.open-meteo.com/v1/archive"
+        # OpenMeteo Historical Weather APIのURL（STACK_WATCHER_OPENMETEO_BASE_URL で変更可能）
+        self.base_url = openmeteo_archive_url()
         
-        # 東京の座標（緯度、経度）
-        self.tokyo_latitude = 35.6762
-        self.tokyo_longitude = 139.6503
+        # 取得結果キャッシュ（共有キャッシュ設定時は全ワーカーで共有）
+        self.cache = get_cache()
+        self.cache_ttl_seconds = int(os.getenv("CACHE_WEATHER_DATA_SECONDS", "1800"))
+        
+        # 日付範囲クエリ用の取得済み系列ストア
+        self.range_store = SeriesRangeStore(
+            ttl_seconds=self.cache_ttl_seconds, cache=self.cache, namespace="weather:range"
+        )
+        
+        # 新しく取得した日次値をしきい値アラートで評価する
+        self.alerts = get_alert_engine()
         
         logger.info("WeatherService初期化完了（OpenMeteo API使用）")
     
@@ -37,60 +102,280 @@ class WeatherService:
         }
         return period_mapping.get(period, 7)
     
-    def get_weather_data(self, location: str = "tokyo", period: str = "7d") -> Dict[str, Any]:
+    @traced("weather.get_weather_data")
+    def get_weather_data(self, location: str = "tokyo", period: str = "7d",
+                         start: Optional[str] = None, end: Optional[str] = None,
+                         options: ProcessingOptions = DEFAULT_OPTIONS) -> Dict[str, Any]:
         """
         OpenMeteo APIから気象データを取得
         
         Args:
-            location: 取得地域（現在は東京のみ対応）
+            location: 取得地域（LOCATIONSのキー）
             period: 期間（7d, 1m, 3m）
+            start: 開始日 (YYYY-MM-DD、指定時はperiodより優先)
+            end: 終了日 (YYYY-MM-DD、省略時は本日)
+            options: 取得・後処理オプション（変数・欠損補完方式・時間値の日次集約）
             
         Returns:
             気象データの辞書
         """
         logger.info(f"気象データ取得開始: 地域={location}, 期間={period}")
         
-        if location != "tokyo":
+        if location not in self.LOCATIONS:
             logger.warning(f"未対応の地域: {location}. 東京データで代替します。")
+            location = "tokyo"
+        
+        date_range = parse_date_range(start, end)
+        if date_range is not None:
+            return self._get_weather_range(location, *date_range, options=options)
+        
+        return self.get_weather_batch([location], period, options)[location]
+    
+    @traced("weather.get_weather_batch")
+    def get_weather_batch(self, locations: List[str], period: str = "7d",
+                          options: ProcessingOptions = DEFAULT_OPTIONS) -> Dict[str, Dict[str, Any]]:
+        """
+        複数地点の気象データを一括取得
+        
+        キャッシュにない地点だけをまとめて1回のOpenMeteoリクエストで取得し、
+        結果は地点ごとにキャッシュする
+        
+        Args:
+            locations: 取得地域のリスト（LOCATIONSのキー）
+            period: 期間（7d, 1m, 3m）
+            options: 取得・後処理オプション
+            
+        Returns:
+            地点キー -> 気象データの辞書
+        """
+        unknown = [location for location in locations if location not in self.LOCATIONS]
+        if unknown:
+            raise ValueError(f"無効な地域: {unknown}. 有効な地域: {list(self.LOCATIONS)}")
         
         days = self.get_period_days(period)
+        results: Dict[str, Dict[str, Any]] = {}
+        missing: List[str] = []
+        
+        keys = {location: self._cache_key(location, period, options) for location in locations}
+        entries = self.cache.get_many_entries(keys.values())
+        stale: List[str] = []
+        for location in locations:
+            entry = entries.get(keys[location])
+            if entry is None:
+                if location not in missing:
+                    missing.append(location)
+                continue
+            results[location] = self._format_weather(location, entry.value, f"{days}d", options)
+            if not entry.is_fresh and location not in stale:
+                stale.append(location)
         
+        if stale:
+            # 鮮度期限切れの地点は古い値を返し、裏でまとめて再取得する
+            self.cache.refresh_in_background(
+                f"weather:refresh:{','.join(stale)}:{period}:{options.key}",
+                lambda: self._fetch_and_store(stale, period, days, options)
+            )
+        
+        if missing:
+            logger.info(f"気象データ一括取得: {missing}（キャッシュ済み: {list(results)}）")
+            fetched = self._fetch_and_store(missing, period, days, options)
+            for location in missing:
+                series = fetched.get(location)
+                if series is None:
+                    # 上流の失敗・期限切れ時は、より長い期間のキャッシュ（期限切れを含む）から切り出す
+                    series = self._get_cached_fallback(location, period, options)
+                if series is None:
+                    # フォールバック: モックデータを生成
+                    logger.info(f"フォールバック気象データを生成します: {location}")
+                    results[location] = self._generate_mock_weather_data(days, period, location=location, options=options)
+                else:
+                    results[location] = self._format_weather(location, series, f"{days}d", options)
+        
+        return {location: results[location] for location in locations}
+    
+    def _fetch_and_store(self, locations: List[str], period: str, days: int,
+                         options: ProcessingOptions) -> Dict[str, DailySeries]:
+        """
+        複数地点をまとめて上流から取得し、取得できた地点をキャッシュに保存
+        
+        Returns:
+            地点キー -> 日次系列の辞書（取得できなかった地点は含まない）
+        """
+        fetched: Dict[str, DailySeries] = {}
+        started = time.monotonic()
         try:
             # OpenMeteo APIからリアルデータを取得
-            real_data = self._fetch_openmeteo_data(days)
-            if real_data:
+            fetched = self._fetch_openmeteo_batch(locations, days, options=options) or {}
+            if fetched:
                 logger.info("OpenMeteo APIから実際の気象データを取得しました")
-                return real_data
         except Exception as e:
             logger.warning(f"OpenMeteo API取得に失敗: {e}")
         
-        # フォールバック: モックデータを生成
-        logger.info("フォールバック気象データを生成します")
-        return self._generate_mock_weather_data(days, period)
+        for location, series in fetched.items():
+            self.alerts.ingest("weather", location, series.dates.astype("int64"), series.columns)
+        
+        self.cache.set_many(
+            {self._cache_key(location, period, options): series for location, series in fetched.items()},
+            self.cache_ttl_seconds,
+            cost=time.monotonic() - started
+        )
+        return fetched
+    
+    def _get_cached_fallback(self, location: str, period: str,
+                             options: ProcessingOptions) -> Optional[DailySeries]:
+        """より長い期間のキャッシュ済みの系列から、直近N日分を切り出す（なければNone）"""
+        periods = ["7d", "1m", "3m"]
+        if period not in periods:
+            return None
+        days = self.get_period_days(period)
+        for longer in periods[periods.index(period) + 1:]:
+            entry = self.cache.get_entry(self._cache_key(location, longer, options))
+            if entry is not None and entry.value is not None and len(entry.value.dates):
+                logger.info(f"{location}の{period}はキャッシュ済みの{longer}から切り出します")
+                dates = entry.value.dates[-days:]
+                return entry.value.slice(str(dates[0]), str(dates[-1]))
+        return None
+    
+    def _cache_key(self, location: str, period: str, options: ProcessingOptions) -> str:
+        """期間指定の取得結果のキャッシュキー"""
+        return f"weather:{location}:{period}:{options.key}"
+    
+    def _get_weather_range(self, location: str, start: str, end: str,
+                           options: ProcessingOptions = DEFAULT_OPTIONS) -> Dict[str, Any]:
+        """
+        日付範囲を指定して気象データを取得
+        
+        取得済みの系列がある場合は二分探索で範囲を切り出し、
+        不足している場合のみ既存範囲との和集合を上流から取得する
+        
+        Args:
+            location: 取得地域
+            start: 開始日 (YYYY-MM-DD)
+            end: 終了日 (YYYY-MM-DD)
+            options: 取得・後処理オプション
+            
+        Returns:
+            気象データの辞書
+        """
+        store_key = f"{location}|{options.key}"
+        series = self.range_store.get(store_key, start, end)
+        
+        if series is None:
+            fetch_start, fetch_end = self.range_store.fetch_range(store_key, start, end)
+            days = (datetime.strptime(fetch_end, "%Y-%m-%d") - datetime.strptime(fetch_start, "%Y-%m-%d")).days + 1
+            fetched = None
+            started = time.monotonic()
+            try:
+                fetched = self._fetch_openmeteo_data(days, start_date=fetch_start, end_date=fetch_end,
+                                                     location=location, options=options)
+            except Exception as e:
+                logger.warning(f"OpenMeteo API取得に失敗: {e}")
+            
+            if fetched is None:
+                logger.info("フォールバック気象データを生成します")
+                days = (datetime.strptime(end, "%Y-%m-%d") - datetime.strptime(start, "%Y-%m-%d")).days + 1
+                mock = self._generate_mock_weather_data(days, f"{days}d", end_date=datetime.strptime(end, "%Y-%m-%d"),
+                                                        location=location, options=options)
+                mock.update({"start": start, "end": end})
+                return mock
+            
+            self.range_store.put(store_key, fetched, fetch_start, fetch_end, cost=time.monotonic() - started)
+            series = self.range_store.get(store_key, start, end)
+        
+        info = self.LOCATIONS[location]
+        result = self._format_weather(location, series, f"{len(series)}d", options, coordinates={
+            "latitude": info["latitude"],
+            "longitude": info["longitude"]
+        })
+        result.update({"start": start, "end": end})
+        return result
     
-    def _fetch_openmeteo_data(self, days: int) -> Optional[Dict[str, Any]]:
+    def _format_weather(self, location: str, series: DailySeries, period: str, options: ProcessingOptions,
+                        coordinates: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """
-        OpenMeteo Historical Weather APIからデータを取得
+        日次系列をレスポンス形式に変換
+        
+        Args:
+            location: 取得地域
+            series: 日次系列
+            period: レスポンスに含める期間文字列
+            options: 取得・後処理オプション（返却する変数）
+            coordinates: 座標（省略時は上流が返した座標）
+            
+        Returns:
+            気象データの辞書
+        """
+        return {
+            "success": True,
+            "data": {
+                "location": self.LOCATIONS[location]["name"],
+                **series.to_dict(options.variables)
+            },
+            "period": period,
+            "lastUpdated": datetime.fromtimestamp(series.fetched_at).isoformat(),
+            "source": "OpenMeteo API",
+            "gapStrategy": options.gap_strategy,
+            "coordinates": coordinates if coordinates is not None else series.attrs.get("coordinates")
+        }
+    
+    @traced("weather._fetch_openmeteo_data")
+    def _fetch_openmeteo_data(self, days: int, start_date: Optional[str] = None,
+                              end_date: Optional[str] = None, location: str = "tokyo",
+                              options: ProcessingOptions = DEFAULT_OPTIONS) -> Optional[DailySeries]:
+        """
+        OpenMeteo Historical Weather APIから単一地点のデータを取得
         
         Args:
             days: 取得日数
+            start_date: 開始日 (YYYY-MM-DD、指定時はdaysより優先)
+            end_date: 終了日 (YYYY-MM-DD)
+            location: 取得地域
+            options: 取得・後処理オプション
             
         Returns:
-            気象データまたはNone
+            日次系列またはNone
         """
+        results = self._fetch_openmeteo_batch([location], days, start_date, end_date, options)
+        return results.get(location) if results else None
+    
+    @traced("weather._fetch_openmeteo_batch")
+    def _fetch_openmeteo_batch(self, locations: List[str], days: int, start_date: Optional[str] = None,
+                               end_date: Optional[str] = None,
+                               options: ProcessingOptions = DEFAULT_OPTIONS) -> Optional[Dict[str, DailySeries]]:
+        """
+        OpenMeteo Historical Weather APIから複数地点のデータを1リクエストで取得
+        
+        OpenMeteoは緯度・経度のカンマ区切りリストを受け付け、
+        指定順に地点ごとの結果を配列で返す
+        
+        Args:
+            locations: 取得地域のリスト
+            days: 取得日数
+            start_date: 開始日 (YYYY-MM-DD、指定時はdaysより優先)
+            end_date: 終了日 (YYYY-MM-DD)
+            options: 取得・後処理オプション
+            
+        Returns:
+            地点キー -> 日次系列の辞書、またはNone
+        """
+        # requestsは起動を速くするため初回使用時にインポート
+        import requests
+        
         try:
             # 日付範囲の計算
-            end_date = datetime.now() - timedelta(days=2)  # 2日前まで（データ遅延のため）
-            start_date = end_date - timedelta(days=days-1)
+            if start_date is None or end_date is None:
+                end = datetime.now() - timedelta(days=2)  # 2日前まで（データ遅延のため）
+                start_date = (end - timedelta(days=days-1)).strftime("%Y-%m-%d")
+                end_date = end.strftime("%Y-%m-%d")
             
-            # APIパラメータ
+            # APIパラメータ（複数地点はカンマ区切り）
             params = {
-                "latitude": self.tokyo_latitude,
-                "longitude": self.tokyo_longitude,
-                "start_date": start_date.strftime("%Y-%m-%d"),
-                "end_date": end_date.strftime("%Y-%m-%d"),
-                "daily": "precipitation_sum,temperature_2m_mean,pressure_msl_mean",
-                "timezone": "Asia/Tokyo"
+                "latitude": ",".join(str(self.LOCATIONS[location]["latitude"]) for location in locations),
+                "longitude": ",".join(str(self.LOCATIONS[location]["longitude"]) for location in locations),
+                "start_date": start_date,
+                "end_date": end_date,
+                "timezone": "Asia/Tokyo",
+                **options.request_params()
             }
             
             headers = {
@@ -98,14 +383,21 @@ class WeatherService:
                 "Accept": "application/json"
             }
             
-            # APIリクエスト送信
-            response = requests.get(self.base_url, params=params, headers=headers, timeout=10)
+            # APIリクエスト送信（記録・再生に対応）
+            status_code, payload = fetch_json("openmeteo", self.base_url, params, headers=headers, timeout=10)
             
-            if response.status_code == 200:
-                data = response.json()
-                return self._process_openmeteo_data(data, days)
+            if status_code == 200:
+                # 単一地点の場合はオブジェクト、複数地点の場合は配列で返る
+                if isinstance(payload, dict):
+                    payload = [payload]
+                results = {}
+                for location, raw_data in zip(locations, payload):
+                    series = self._process_openmeteo_data(raw_data, options)
+                    if series is not None:
+                        results[location] = series
+                return results
             else:
-                logger.warning(f"OpenMeteo API応答エラー: {response.status_code}")
+                logger.warning(f"OpenMeteo API応答エラー: {status_code}")
                 return None
                 
         except requests.exceptions.RequestException as e:
@@ -115,82 +407,55 @@ class WeatherService:
             logger.error(f"OpenMeteo気象データ処理エラー: {e}")
             return None
     
-    def _process_openmeteo_data(self, raw_data: Dict, days: int) -> Dict[str, Any]:
+    @traced("weather._process_openmeteo_data")
+    def _process_openmeteo_data(self, raw_data: Dict,
+                                options: ProcessingOptions = DEFAULT_OPTIONS) -> Optional[DailySeries]:
         """
         OpenMeteo APIの生データを処理
         
+        欠損補完・丸め・時間値の日次集約は列単位でベクトル化して行う
+        （weather_processing.process_openmeteo）
+        
         Args:
             raw_data: OpenMeteo APIからの生データ
-            days: 必要な日数
+            options: 取得・後処理オプション
             
         Returns:
-            処理済み気象データ
+            日次系列（上流が返した座標を attrs に保持）
         """
         try:
-            daily_data = raw_data.get("daily", {})
-            
-            # データの抽出
-            dates = daily_data.get("time", [])
-            precipitation = daily_data.get("precipitation_sum", [])
-            temperature = daily_data.get("temperature_2m_mean", [])
-            pressure = daily_data.get("pressure_msl_mean", [])
-            
-            # Noneを0に変換（降水量）、温度・気圧はデータがない場合は前日値を使用
-            processed_precipitation = [p if p is not None else 0.0 for p in precipitation]
-            processed_temperature = []
-            processed_pressure = []
-            
-            last_temp = 24.0  # デフォルト温度
-            last_pressure = 1013.0  # デフォルト気圧
-            
-            for i, (temp, press) in enumerate(zip(temperature, pressure)):
-                if temp is not None:
-                    processed_temperature.append(round(temp, 1))
-                    last_temp = temp
-                else:
-                    processed_temperature.append(round(last_temp, 1))
-                
-                if press is not None:
-                    processed_pressure.append(round(press, 1))
-                    last_pressure = press
-                else:
-                    processed_pressure.append(round(last_pressure, 1))
-            
-            return {
-                "success": True,
-                "data": {
-                    "location": "東京都",
-                    "dates": dates,
-                    "precipitation": processed_precipitation,
-                    "temperature": processed_temperature,
-                    "pressure": processed_pressure
-                },
-                "period": f"{days}d",
-                "lastUpdated": datetime.now().isoformat(),
-                "source": "OpenMeteo API",
-                "coordinates": {
-                    "latitude": raw_data.get("latitude"),
-                    "longitude": raw_data.get("longitude")
-                }
+            series = process_openmeteo(raw_data, options)
+            series.attrs["coordinates"] = {
+                "latitude": raw_data.get("latitude"),
+                "longitude": raw_data.get("longitude")
             }
+            return series
             
         except Exception as e:
             logger.error(f"OpenMeteoデータ処理エラー: {e}")
             return None
     
-    def _generate_mock_weather_data(self, days: int, period: str) -> Dict[str, Any]:
+    def _generate_mock_weather_data(self, days: int, period: str,
+                                    end_date: Optional[datetime] = None, location: str = "tokyo",
+                                    options: ProcessingOptions = DEFAULT_OPTIONS) -> Dict[str, Any]:
         """
         モック気象データを生成
         
         Args:
             days: 日数
             period: 期間文字列
+            end_date: 最終日（省略時は本日）
+            location: 取得地域
+            options: 取得・後処理オプション（返却する変数）
             
         Returns:
             モック気象データ
         """
         import random
         
+        if end_date is None:
+            end_date = datetime.now()
+        
         # 基準値（東京の季節平均値を想定）
         base_temp = 24.0  # 9月の平均気温
         base_pressure = 1013.0  # 標準気圧
@@ -202,7 +467,7 @@ class WeatherService:
         
         for i in range(days):
             # 日付生成
-            date = datetime.now() - timedelta(days=days-1-i)
+            date = end_date - timedelta(days=days-1-i)
             dates.append(date.strftime('%Y-%m-%d'))
             
             # 降水量（0-50mm、雨の日は20%の確率）
@@ -222,15 +487,22 @@ class WeatherService:
             press = round(base_pressure + pressure_variation, 1)
             pressure.append(press)
         
+        generated = {
+            "precipitation": precipitation,
+            "temperature": temperature,
+            "pressure": pressure
+        }
+        series = {"location": self.LOCATIONS[location]["name"], "dates": dates}
+        for name in options.variables:
+            if name not in generated:
+                # その他の変数は基準値±変動幅の一様乱数
+                base, spread = VARIABLES[name]["mock"]
+                generated[name] = [round(random.uniform(base - spread, base + spread), 1) for _ in range(days)]
+            series[name] = generated[name]
+        
         return {
             "success": True,
-            "data": {
-                "location": "東京都",
-                "dates": dates,
-                "precipitation": precipitation,
-                "temperature": temperature,
-                "pressure": pressure
-            },
+            "data": series,
             "period": period,
             "lastUpdated": datetime.now().isoformat(),
             "source": "モックデータ",
@@ -241,17 +513,16 @@ class WeatherService:
         """利用可能な観測地点一覧を取得"""
         return {
             "success": True,
-            "data": {
-                "tokyo": {
-                    "name": "東京都",
-                    "latitude": self.tokyo_latitude,
-                    "longitude": self.tokyo_longitude,
-                    "description": "東京都内の代表観測点（OpenMeteo API）"
-                }
-            },
-            "note": "現在は東京都のみ対応"
+            "data": self.LOCATIONS
         }
     
+    def get_locations_for_symbol(self, symbol: str) -> List[str]:
+        """銘柄に関連する観測地点（生産拠点）のキー一覧を取得"""
+        return [
+            key for key, info in self.LOCATIONS.items()
+            if symbol in info["related_symbols"]
+        ]
+    
     def validate_period(self, period: str) -> bool:
         """期間の妥当性チェック"""
         valid_periods = ["7d", "1m", "3m"]
@@ -259,8 +530,14 @@ class WeatherService:
     
     def validate_location(self, location: str) -> bool:
         """地域の妥当性チェック"""
-        valid_locations = ["tokyo"]
-        return location in valid_locations
+        return location in self.LOCATIONS
+
+# グローバルインスタンス（初回使用時に生成）
+get_weather_service = lazy_singleton(WeatherService)
+
 
-# グローバルインスタンス
-weather_service = WeatherService()
\ No newline at end of file
+def __getattr__(name: str):
+    # 後方互換: from backend.weather_service import weather_service
+    if name == "weather_service":
+        return get_weather_service()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
\ No newline at end of file
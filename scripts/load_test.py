@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+"""
+APIの負荷試験
+
+    python scripts/load_test.py --base-url http://localhost:8003 --concurrency 16 --duration 30
+
+指定した同時接続数でエンドポイントを順に呼び出し続け、
+エンドポイントごとと全体の p50/p95/p99・スループット・エラー件数を表示する。
+--max-p99-ms を指定した場合、全体の p99 が超過したら終了コード1を返す。
+
+上流（Yahoo Finance・OpenMeteo）に負荷をかけないよう、バックエンドはスタブに向けて起動する:
+
+    python -m backend.stub_upstream --port 8900 --latency-ms 80 --jitter-ms 40
+    STACK_WATCHER_YAHOO_BASE_URL=http://localhost:8900 STACK_WATCHER_OPENMETEO_BASE_URL=http://localhost:8900 \\
+        python -m uvicorn backend.main:app --port 8003
+"""
+
+import argparse
+import http.client
+import json
+import math
+import sys
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Sequence, Tuple
+from urllib.parse import urlparse
+
+DEFAULT_ENDPOINTS = (
+    "/api/v1/stocks?symbols=6326,9984,1377&period=7d",
+    "/api/v1/indices?period=7d",
+    "/api/v1/weather?period=7d",
+    "/api/v1/demo",
+)
+
+
+def percentile(sorted_values: Sequence[float], q: float) -> float:
+    """昇順の値の q パーセンタイル（最近傍順位法）"""
+    if not sorted_values:
+        return 0.0
+    rank = min(len(sorted_values), max(1, math.ceil(q / 100 * len(sorted_values)))) - 1
+    return sorted_values[rank]
+
+
+def summarize(latencies: List[float], errors: int, elapsed: float) -> Dict[str, float]:
+    """レイテンシ（秒）の一覧から集計値を求める"""
+    ordered = sorted(latencies)
+    return {
+        "requests": len(ordered),
+        "errors": errors,
+        "p50_ms": percentile(ordered, 50) * 1000,
+        "p95_ms": percentile(ordered, 95) * 1000,
+        "p99_ms": percentile(ordered, 99) * 1000,
+        "max_ms": (ordered[-1] if ordered else 0.0) * 1000,
+        "throughput_rps": len(ordered) / elapsed if elapsed > 0 else 0.0,
+    }
+
+
+class LoadGenerator:
+    """同時接続数分のスレッドから、Keep-Aliveの接続でエンドポイントを順に呼び出す"""
+
+    def __init__(self, base_url: str, endpoints: Sequence[str], concurrency: int, timeout: float = 30.0):
+        url = urlparse(base_url)
+        self.host = url.hostname or "localhost"
+        self.port = url.port or (443 if url.scheme == "https" else 80)
+        self.https = url.scheme == "https"
+        self.prefix = url.path.rstrip("/")
+        self.endpoints = list(endpoints)
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._latencies: Dict[str, List[float]] = defaultdict(list)
+        self._errors: Dict[str, int] = defaultdict(int)
+        self._statuses: Dict[int, int] = defaultdict(int)
+
+    def _connect(self) -> http.client.HTTPConnection:
+        connection_class = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+        return connection_class(self.host, self.port, timeout=self.timeout)
+
+    def _request(self, connection: http.client.HTTPConnection, path: str) -> Tuple[Optional[int], float]:
+        started = time.perf_counter()
+        try:
+            connection.request("GET", self.prefix + path, headers={"Accept-Encoding": "gzip"})
+            response = connection.getresponse()
+            response.read()
+            return response.status, time.perf_counter() - started
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            return None, time.perf_counter() - started
+
+    def _worker(self, offset: int, deadline: float, remaining: List[int], record: bool) -> None:
+        connection = self._connect()
+        i = offset
+        while time.monotonic() < deadline:
+            with self._lock:
+                if remaining[0] == 0:
+                    break
+                if remaining[0] > 0:
+                    remaining[0] -= 1
+            path = self.endpoints[i % len(self.endpoints)]
+            i += 1
+            status, latency = self._request(connection, path)
+            if not record:
+                continue
+            with self._lock:
+                self._latencies[path].append(latency)
+                self._statuses[status or 0] += 1
+                if status is None or status >= 400:
+                    self._errors[path] += 1
+        connection.close()
+
+    def _run_phase(self, duration: float, requests: int, record: bool) -> float:
+        deadline = time.monotonic() + duration
+        # 残りリクエスト数（-1は時間のみで打ち切り）
+        remaining = [requests if requests > 0 else -1]
+        threads = [
+            threading.Thread(target=self._worker, args=(i, deadline, remaining, record), daemon=True)
+            for i in range(self.concurrency)
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return time.perf_counter() - started
+
+    def run(self, duration: float, requests: int = 0, warmup: float = 0.0) -> Dict:
+        """
+        負荷をかけて集計する
+
+        Args:
+            duration: 計測時間（秒）
+            requests: 総リクエスト数の上限（0は時間のみで打ち切り）
+            warmup: 計測前の暖機時間（秒、キャッシュを温める）
+
+        Returns:
+            {"total": 全体の集計, "endpoints": {パス: 集計}, "statuses": {ステータス: 件数}}
+        """
+        if warmup > 0:
+            self._run_phase(warmup, 0, record=False)
+        elapsed = self._run_phase(duration, requests, record=True)
+        all_latencies = [latency for values in self._latencies.values() for latency in values]
+        return {
+            "concurrency": self.concurrency,
+            "elapsed_s": elapsed,
+            "total": summarize(all_latencies, sum(self._errors.values()), elapsed),
+            "endpoints": {
+                path: summarize(self._latencies[path], self._errors[path], elapsed) for path in self.endpoints
+            },
+            "statuses": {str(status): count for status, count in sorted(self._statuses.items())},
+        }
+
+
+def print_report(report: Dict) -> None:
+    print(f"同時接続数: {report['concurrency']}  計測時間: {report['elapsed_s']:.1f} s")
+    print("")
+    header = f"{'エンドポイント':<52}{'件数':>8}{'エラー':>8}{'p50':>9}{'p95':>9}{'p99':>9}{'rps':>9}"
+    print(header)
+    rows = list(report["endpoints"].items()) + [("(全体)", report["total"])]
+    for path, stats in rows:
+        print(f"{path[:50]:<52}{stats['requests']:>8}{stats['errors']:>8}"
+              f"{stats['p50_ms']:>9.1f}{stats['p95_ms']:>9.1f}{stats['p99_ms']:>9.1f}{stats['throughput_rps']:>9.1f}")
+    print("")
+    print(f"ステータス別件数: {report['statuses']}（0は接続エラー・タイムアウト）")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="APIの負荷試験（p50/p95/p99・スループット）")
+    parser.add_argument("--base-url", default="http://localhost:8003")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=30.0, help="計測時間（秒）")
+    parser.add_argument("--requests", type=int, default=0, help="総リクエスト数の上限（0は時間のみ）")
+    parser.add_argument("--warmup", type=float, default=5.0, help="計測前の暖機時間（秒）")
+    parser.add_argument("--endpoint", action="append", dest="endpoints",
+                        help="呼び出すパス（複数指定可、既定: stocks・indices・weather・demo）")
+    parser.add_argument("--max-p99-ms", type=float, default=None, help="全体の p99 の上限（超過時は終了コード1）")
+    parser.add_argument("--json", action="store_true", help="集計結果をJSONで出力")
+    args = parser.parse_args()
+
+    generator = LoadGenerator(args.base_url, args.endpoints or DEFAULT_ENDPOINTS, args.concurrency)
+    report = generator.run(args.duration, args.requests, args.warmup)
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print_report(report)
+
+    if args.max_p99_ms is not None and report["total"]["p99_ms"] > args.max_p99_ms:
+        print(f"\n❌ p99 が上限を超過: {report['total']['p99_ms']:.1f} ms > {args.max_p99_ms:.0f} ms")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
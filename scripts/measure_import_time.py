@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+"""
+起動時間（backend.main のインポート時間）の計測
+
+    python scripts/measure_import_time.py [--budget-ms 700] [--top 15]
+
+python -X importtime の結果から累積時間の大きいモジュールを表示し、
+予算超過または起動時に読み込むべきでない重い依存がある場合は終了コード1を返す。
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+# 起動時に読み込まない（初回使用時に遅延インポートする）依存
+DEFERRED_MODULES = ("yfinance", "pandas", "requests", "numpy", "backend.alerts", "backend.screener")
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure(module: str = "backend.main"):
+    """
+    モジュールのインポート時間を計測
+
+    Returns:
+        (モジュール名 -> 累積時間(マイクロ秒) の辞書, 読み込まれたモジュール名の集合)
+    """
+    code = f"import sys, {module}; print(','.join(sys.modules))"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=REPO_ROOT, capture_output=True, text=True, check=True,
+    )
+    cumulative = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, self_us, cumulative_us, name = (part.strip() for part in line.replace("import time:", "|").split("|"))
+        cumulative[name.strip()] = int(cumulative_us)
+    loaded = set(result.stdout.strip().split(","))
+    return cumulative, loaded
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="backend.main のインポート時間を計測")
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("IMPORT_BUDGET_MS", "700")))
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    cumulative, loaded = measure()
+    total_ms = cumulative.get("backend.main", 0) / 1000
+
+    print(f"backend.main のインポート時間: {total_ms:.1f} ms（予算: {args.budget_ms:.0f} ms）")
+    print("")
+    print("累積時間の大きいモジュール:")
+    for name, us in sorted(cumulative.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"  {us / 1000:8.1f} ms  {name}")
+
+    deferred = [name for name in DEFERRED_MODULES if name in loaded]
+    ok = True
+    if deferred:
+        print(f"\n❌ 起動時に読み込まれた重い依存: {deferred}")
+        ok = False
+    if total_ms > args.budget_ms:
+        print(f"\n❌ 予算超過: {total_ms:.1f} ms > {args.budget_ms:.0f} ms")
+        ok = False
+    if ok:
+        print("\n✅ 予算内です")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
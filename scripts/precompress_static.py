@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+"""
+フロントエンドのビルド成果物（backend/static）を事前圧縮
+
+    python scripts/precompress_static.py [ディレクトリ]
+
+圧縮対象の各ファイルの隣に .gz（と brotli がインストールされていれば .br）を出力する。
+元ファイルより小さくならない場合は出力しない。npm run build の postbuild で実行される。
+"""
+
+import gzip
+import os
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_DIRECTORY = os.path.join(REPO_ROOT, "backend", "static")
+
+# 圧縮対象の拡張子（画像・フォントなど圧縮済みの形式は対象外）
+COMPRESSIBLE_EXTENSIONS = (".html", ".js", ".mjs", ".css", ".json", ".svg", ".txt", ".map", ".xml", ".wasm")
+
+# これより小さいファイルは圧縮しない（バイト）
+MIN_SIZE = 1024
+
+try:
+    import brotli
+except ImportError:  # brotliは任意の依存
+    brotli = None
+
+
+def _write_if_smaller(path: str, data: bytes, original_size: int) -> bool:
+    if len(data) >= original_size:
+        if os.path.exists(path):
+            os.remove(path)
+        return False
+    with open(path, "wb") as f:
+        f.write(data)
+    return True
+
+
+def precompress(directory: str) -> int:
+    """
+    ディレクトリ以下の圧縮対象ファイルを事前圧縮
+
+    Returns:
+        出力した圧縮ファイル数
+    """
+    written = 0
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if not name.endswith(COMPRESSIBLE_EXTENSIONS):
+                continue
+            path = os.path.join(root, name)
+            with open(path, "rb") as f:
+                data = f.read()
+            if len(data) < MIN_SIZE:
+                continue
+
+            # mtime=0 でビルドごとに同じ内容を出力する
+            if _write_if_smaller(path + ".gz", gzip.compress(data, compresslevel=9, mtime=0), len(data)):
+                written += 1
+            if brotli is not None:
+                if _write_if_smaller(path + ".br", brotli.compress(data, quality=11), len(data)):
+                    written += 1
+            print(f"  {os.path.relpath(path, directory)}")
+    return written
+
+
+def main() -> int:
+    directory = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_DIRECTORY
+    if not os.path.isdir(directory):
+        print(f"ディレクトリが存在しません: {directory}")
+        return 1
+    if brotli is None:
+        print("brotli が未インストールのため .gz のみ出力します（pip install brotli で .br も出力）")
+    written = precompress(directory)
+    print(f"{written}ファイルを出力しました")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())